@@ -27,6 +27,60 @@ class Settings(BaseSettings):
     SMTP_USER: str = ""  # Set in .env
     SMTP_PASSWORD: str = ""  # Set in .env
     SMTP_SENDER: str = "AppTechno Software <devanshd7124g@gmail.com>"
+    # Outgoing mail is queued in email_outbox and sent by a background sender per worker
+    MAIL_BATCH_SIZE: int = 20  # messages claimed per batch
+    MAIL_RATE_PER_MINUTE: int = 60  # per worker
+    MAIL_MAX_ATTEMPTS: int = 5
+    MAIL_IDLE_SECONDS: int = 60  # the SMTP connection is closed after this long without mail
+
+    # QR punch: in-memory day index + batched TimeTracking writes.
+    # Set to false to fall back to the row-locking path.
+    PUNCH_BURST_MODE: bool = True
+
+    # Groq (AI grading / generation / chatbot): one pooled client per worker
+    GROQ_API_URL: str = "https://api.groq.com/openai/v1/chat/completions"
+    GROQ_MAX_CONCURRENCY: int = 4  # in-flight requests per worker
+    GROQ_MAX_RETRIES: int = 3  # extra attempts after a 429
+
+    # Durable AI grading queue (background_jobs table)
+    GRADING_CONCURRENCY: int = 2  # grading workers per process
+    GRADING_MAX_ATTEMPTS: int = 3
+
+    # Cache of Groq results keyed by (model, prompt, params); in memory + ai_result_cache table
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_TTL_HOURS: int = 168
+    AI_CACHE_MAX_ENTRIES: int = 5000  # rows kept in the table (LRU)
+    AI_CACHE_MEMORY_ENTRIES: int = 500  # per worker
+
+    # /run-code: backends tried in order (local, piston, godbolt). "local" runs student
+    # code on this server inside a namespace sandbox; it needs unprivileged user
+    # namespaces and is switched off (with a log line) when the sandbox cannot be set up.
+    CODE_RUNNER_BACKENDS: str = "local,piston,godbolt"
+    CODE_RUNNER_MAX_CONCURRENCY: int = 0  # programs running at once per worker; 0 = CPU count
+    CODE_RUNNER_MAX_QUEUE: int = 64  # requests waiting for a slot before 429
+    CODE_RUNNER_TIMEOUT_SECONDS: int = 5
+    CODE_RUNNER_MEMORY_MB: int = 256
+    CODE_RUNNER_MAX_PROCS: int = 64  # RLIMIT_NPROC per run
+    CODE_RUNNER_POOL_SIZE: int = 2  # pre-started sandboxes kept ready per language and worker
+    # /piston/runtimes: catalogue kept in memory, refreshed in the background, last good copy on disk
+    RUNTIMES_REFRESH_MINUTES: int = 60
+    RUNTIMES_MAX_AGE_SECONDS: int = 300  # browser cache lifetime before revalidating with the ETag
+    RUNTIMES_SNAPSHOT_PATH: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "runtime_catalogue.json")
+
+    # Coding answers are scored against each question's test_cases before the AI grader runs
+    ASSESSMENT_AI_FEEDBACK: bool = True  # also ask the AI grader when every question has test cases
+    # Assessment heartbeats are buffered per worker and written every N seconds
+    # (violations, auto-submit and submit right away). 0 writes every heartbeat.
+    HEARTBEAT_FLUSH_SECONDS: int = 15
+    # Sessions past their time limit are auto-submitted by the server this long after 0:00,
+    # leaving the browser's own final submit time to land first
+    ASSESSMENT_EXPIRY_GRACE_SECONDS: int = 30
+
+    # File uploads: "cloudinary" or "local"; empty picks cloudinary when it is configured
+    STORAGE_BACKEND: str = ""
+    UPLOAD_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")  # served at /uploads
+    UPLOAD_WORKERS: int = 4  # uploads running at once per worker, off the event loop
+    UPLOAD_MAX_MB: int = 20
 
     class Config:
         # Get the absolute path to the root .env file
@@ -28,6 +28,44 @@ async def lifespan(app: FastAPI):
         from sqlalchemy import text
         is_sqlite = "sqlite" in str(engine.url)
 
+        # Composite indexes for the attendance / time-tracking date-range queries
+        attendance_index_migrations = [
+            "CREATE INDEX IF NOT EXISTS ix_attendance_student_batch_date ON attendance (student_id, batch_id, date)",
+            "CREATE INDEX IF NOT EXISTS ix_attendance_batch_date ON attendance (batch_id, date)",
+            "CREATE INDEX IF NOT EXISTS ix_time_tracking_user_date_login ON time_tracking (user_id, date, login_time)",
+            "CREATE INDEX IF NOT EXISTS ix_time_tracking_date ON time_tracking (date)",
+            # One open session per user and day: close open rows that a later row of the day superseded
+            # (the scan path already treated them as closed), then enforce it
+            """UPDATE time_tracking SET logout_time = (
+                SELECT MIN(later.login_time) FROM time_tracking later
+                WHERE later.user_id = time_tracking.user_id AND later.date = time_tracking.date
+                  AND (later.login_time > time_tracking.login_time
+                       OR (later.login_time = time_tracking.login_time AND later.id > time_tracking.id)))
+            WHERE logout_time IS NULL AND EXISTS (
+                SELECT 1 FROM time_tracking later
+                WHERE later.user_id = time_tracking.user_id AND later.date = time_tracking.date
+                  AND (later.login_time > time_tracking.login_time
+                       OR (later.login_time = time_tracking.login_time AND later.id > time_tracking.id)))""",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_time_tracking_open_session ON time_tracking (user_id, date) "
+            "WHERE logout_time IS NULL",
+        ]
+        # (sort key, id) indexes behind the keyset-paginated list endpoints
+        pagination_index_migrations = [
+            "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_leave_requests_created_at_id ON leave_requests (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_leads_created_at_id ON leads (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_jobs_created_at_id ON jobs (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_tasks_created_at_id ON tasks (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_violations_created_at_id ON violations (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_sessions_start_time_id ON sessions (start_time, id)",
+            "CREATE INDEX IF NOT EXISTS ix_student_feedback_created_at_id ON student_feedback (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_time_tracking_login_id ON time_tracking (login_time, id)",
+        ]
+        # A user's notification feed, newest first
+        notification_index_migrations = [
+            "CREATE INDEX IF NOT EXISTS ix_notifications_user_created_at ON notifications (user_id, created_at)",
+        ]
+
         if is_sqlite:
             # For local SQLite development: create tables and run migrations
             async with engine.begin() as conn:
@@ -69,7 +107,10 @@ async def lifespan(app: FastAPI):
                     ("face_violation_count", "INTEGER DEFAULT 0"),
                     ("mic_violation_count", "INTEGER DEFAULT 0"),
                     ("last_heartbeat", "DATETIME"),
-                    ("scheduled_at", "DATETIME")
+                    ("scheduled_at", "DATETIME"),
+                    ("storage_version", "INTEGER DEFAULT 0"),
+                    ("question_set_id", "VARCHAR"),
+                    ("question_order", "TEXT")
                 ]
                 for col_name, col_type in session_migrations:
 
@@ -82,6 +123,13 @@ async def lifespan(app: FastAPI):
                 sugg_cols = [row[1] for row in result.fetchall()]
                 if "screenshot_base64" not in sugg_cols:
                     await conn.execute(text("ALTER TABLE suggestions ADD COLUMN screenshot_base64 TEXT"))
+                for col_name in ("screenshot_url", "thumbnail_url"):
+                    if col_name not in sugg_cols:
+                        await conn.execute(text(f"ALTER TABLE suggestions ADD COLUMN {col_name} TEXT"))
+
+                # create_all only indexes brand-new tables; add them to existing ones
+                for sql in attendance_index_migrations + pagination_index_migrations + notification_index_migrations:
+                    await conn.execute(text(sql))
             print("SQLite startup complete.")
         else:
             # For PostgreSQL production: Run critical startup queries
@@ -177,7 +225,110 @@ async def lifespan(app: FastAPI):
                     "ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS face_violation_count INTEGER DEFAULT 0",
                     "ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS mic_violation_count INTEGER DEFAULT 0",
                     "ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS last_heartbeat TIMESTAMP",
+                    "ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS storage_version INTEGER DEFAULT 0",
+                    # Shared question lists; sessions keep only their order
+                    """CREATE TABLE IF NOT EXISTS assessment_question_sets (
+                        id VARCHAR(64) PRIMARY KEY,
+                        reference_id VARCHAR NOT NULL,
+                        content TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )""",
+                    "ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS question_set_id VARCHAR REFERENCES assessment_question_sets(id)",
+                    "ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS question_order TEXT",
+                    # Structured assessment storage (question snapshot + per-question answers)
+                    """CREATE TABLE IF NOT EXISTS assessment_questions (
+                        session_id VARCHAR NOT NULL REFERENCES assessment_sessions(id),
+                        position INTEGER NOT NULL,
+                        content TEXT NOT NULL,
+                        PRIMARY KEY (session_id, position)
+                    )""",
+                    """CREATE TABLE IF NOT EXISTS assessment_answers (
+                        session_id VARCHAR NOT NULL REFERENCES assessment_sessions(id),
+                        question_key VARCHAR(50) NOT NULL,
+                        value TEXT,
+                        updated_at TIMESTAMP DEFAULT NOW(),
+                        PRIMARY KEY (session_id, question_key)
+                    )""",
                     "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS screenshot_base64 TEXT",
+                    # Screenshots live in the file store; the row keeps their URLs
+                    "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS screenshot_url TEXT",
+                    "ALTER TABLE suggestions ADD COLUMN IF NOT EXISTS thumbnail_url TEXT",
+                    # Durable background jobs (AI grading queue)
+                    """CREATE TABLE IF NOT EXISTS background_jobs (
+                        id VARCHAR PRIMARY KEY,
+                        queue VARCHAR(50) NOT NULL,
+                        ref_id VARCHAR NOT NULL,
+                        status VARCHAR(20) DEFAULT 'pending',
+                        attempts INTEGER DEFAULT 0,
+                        last_error TEXT,
+                        available_at TIMESTAMP DEFAULT NOW(),
+                        enqueued_at TIMESTAMP DEFAULT NOW(),
+                        started_at TIMESTAMP,
+                        finished_at TIMESTAMP,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        updated_at TIMESTAMP DEFAULT NOW(),
+                        CONSTRAINT uq_background_jobs_queue_ref UNIQUE (queue, ref_id)
+                    )""",
+                    "CREATE INDEX IF NOT EXISTS ix_background_jobs_queue_status_available ON background_jobs (queue, status, available_at)",
+                    # Cached Groq results
+                    """CREATE TABLE IF NOT EXISTS ai_result_cache (
+                        key VARCHAR(64) PRIMARY KEY,
+                        kind VARCHAR(30) NOT NULL,
+                        value TEXT NOT NULL,
+                        hits INTEGER DEFAULT 0,
+                        expires_at TIMESTAMP NOT NULL,
+                        last_used_at TIMESTAMP DEFAULT NOW(),
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )""",
+                    "CREATE INDEX IF NOT EXISTS ix_ai_result_cache_last_used_at ON ai_result_cache (last_used_at)",
+                    # Uploaded files, one row per stored content hash
+                    """CREATE TABLE IF NOT EXISTS stored_files (
+                        key VARCHAR PRIMARY KEY,
+                        backend VARCHAR(20) NOT NULL,
+                        sha256 VARCHAR(64) NOT NULL,
+                        size INTEGER NOT NULL,
+                        content_type VARCHAR(100),
+                        url TEXT NOT NULL,
+                        uploads INTEGER DEFAULT 1,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )""",
+                    "CREATE INDEX IF NOT EXISTS ix_stored_files_sha256 ON stored_files (sha256)",
+                    # Outgoing email, sent by the background mailer
+                    """CREATE TABLE IF NOT EXISTS email_outbox (
+                        id VARCHAR PRIMARY KEY,
+                        to_email VARCHAR NOT NULL,
+                        template VARCHAR(50) NOT NULL,
+                        context TEXT,
+                        status VARCHAR(20) DEFAULT 'pending',
+                        attempts INTEGER DEFAULT 0,
+                        last_error TEXT,
+                        claim VARCHAR(36),
+                        available_at TIMESTAMP DEFAULT NOW(),
+                        claimed_at TIMESTAMP,
+                        sent_at TIMESTAMP,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )""",
+                    "CREATE INDEX IF NOT EXISTS ix_email_outbox_status_available ON email_outbox (status, available_at)",
+                    "CREATE INDEX IF NOT EXISTS ix_email_outbox_claim ON email_outbox (claim)",
+                    # Admin broadcasts stored once, and each user's read watermark
+                    """CREATE TABLE IF NOT EXISTS notification_broadcasts (
+                        id VARCHAR PRIMARY KEY,
+                        title VARCHAR NOT NULL,
+                        message VARCHAR NOT NULL,
+                        audience VARCHAR(10) DEFAULT 'ALL',
+                        role VARCHAR(20),
+                        type VARCHAR,
+                        sent_by VARCHAR REFERENCES users(id),
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )""",
+                    "CREATE INDEX IF NOT EXISTS ix_notification_broadcasts_created_at ON notification_broadcasts (created_at)",
+                    """CREATE TABLE IF NOT EXISTS notification_cursors (
+                        user_id VARCHAR PRIMARY KEY REFERENCES users(id),
+                        read_at TIMESTAMP NOT NULL
+                    )""",
+                    *attendance_index_migrations,
+                    *pagination_index_migrations,
+                    *notification_index_migrations,
                 ]
                 for sql in pg_migrations:
                     try:
@@ -195,10 +346,58 @@ async def lifespan(app: FastAPI):
     # Start Scheduler
     scheduler.start()
     print("APScheduler started.")
+
+    # Cross-worker cache invalidation (Postgres LISTEN/NOTIFY)
+    from app.utils.settings_cache import settings_cache  # noqa: F401 — registers its channel
+    from app.utils.principal_cache import principal_cache  # noqa: F401 — registers its channel
+    from app.utils.ai_cache import ai_cache  # noqa: F401 — registers its channel
+    from app.utils.leaderboards import leaderboards  # noqa: F401 — registers its channel
+    from app.utils.punch import punch_pipeline
+    from app.utils.pg_listener import pg_listener
+    await pg_listener.start(engine)
+
+    # AI grading workers; the startup sweep re-queues submissions left ungraded
+    from app.utils.assessment_grading import grading_queue
+    await grading_queue.start()
+
+    # Assessment heartbeats: buffered per worker, written in batches
+    from app.utils.heartbeats import heartbeat_buffer
+    heartbeat_buffer.start()
+
+    # Server-side assessment deadlines: time limit and inactivity, rebuilt from open sessions
+    from app.utils.assessment_timer import assessment_timer
+    await assessment_timer.start(scheduler)
+
+    # Outgoing email: background sender for the email_outbox table
+    from app.utils.mailer import mailer
+    mailer.start()
+
+    # Suggestion screenshots still stored inline move to the file store
+    from app.utils.screenshots import migrate_screenshots
+    scheduler.add_job(migrate_screenshots, id="screenshot_migration", replace_existing=True)
+    # Per-user copies of admin broadcasts fold into one row each
+    from app.utils.notifications import migrate_broadcast_copies
+    scheduler.add_job(migrate_broadcast_copies, id="broadcast_migration", replace_existing=True)
+
+    # Local code runner: detect toolchains, pre-start interpreters
+    from app.utils.code_runner import code_executor
+    await code_executor.start()
+
+    # Editor runtime list: disk snapshot now, refreshed from the backends in the background
+    from app.utils.runtime_catalogue import runtime_catalogue
+    runtime_catalogue.start(scheduler)
     
     yield
     # Shutdown: clean up connection pool
     scheduler.shutdown()
+    await grading_queue.stop()
+    await mailer.stop()
+    await heartbeat_buffer.close()
+    await punch_pipeline.close()
+    from app.utils.groq_client import groq_client
+    await groq_client.close()
+    await code_executor.close()
+    await pg_listener.stop()
     await engine.dispose()
     print("LMS API shut down.")
 
@@ -233,6 +432,11 @@ app.include_router(sessions.router)
 # Mount Socket.io app
 app.mount("/socket.io", sio_app)
 
+# Files stored by the local storage backend (app/utils/storage.py)
+from fastapi.staticfiles import StaticFiles
+os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+
 
 
 
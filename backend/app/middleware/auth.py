@@ -3,12 +3,12 @@ from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.database import get_db
-from app.models.user import User, Role, AdminPermission
+from app.models.user import User, Role
+from app.utils.principal_cache import principal_cache
 
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
@@ -37,8 +37,7 @@ async def get_current_user(
             raise HTTPException(status_code=401, detail="Session expired. Please log out and log in again.")
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
 
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
+    user = await principal_cache.get_user(db, user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     return user
@@ -59,8 +58,7 @@ async def get_optional_user(
         if not user_id:
             return None
             
-        result = await db.execute(select(User).where(User.id == user_id))
-        return result.scalars().first()
+        return await principal_cache.get_user(db, user_id)
     except:
         return None
 
@@ -94,19 +92,18 @@ def require_admin_permissions(
         if user.role != Role.ADMIN:
             raise HTTPException(status_code=403, detail="Admin access required")
             
-        result = await db.execute(select(AdminPermission).where(AdminPermission.user_id == user.id))
-        perm = result.scalars().first()
+        perm = await principal_cache.get_permissions(db, user.id)
         
         if not perm:
             raise HTTPException(status_code=403, detail="Admin permissions not configured")
             
-        if manage_users and not perm.manage_users:
+        if manage_users and not perm["manage_users"]:
             raise HTTPException(status_code=403, detail="Missing permission: manage_users")
-        if manage_batches and not perm.manage_batches:
+        if manage_batches and not perm["manage_batches"]:
             raise HTTPException(status_code=403, detail="Missing permission: manage_batches")
-        if manage_courses and not perm.manage_courses:
+        if manage_courses and not perm["manage_courses"]:
             raise HTTPException(status_code=403, detail="Missing permission: manage_courses")
-        if manage_leaves and not perm.manage_leaves:
+        if manage_leaves and not perm["manage_leaves"]:
             raise HTTPException(status_code=403, detail="Missing permission: manage_leaves")
             
         return user
@@ -4,12 +4,18 @@ from app.models.user import User
 from app.models.course import Course, Batch, BatchStudent
 from app.models.lead import Lead, LeadActivity
 from app.models.attendance import Attendance, LeaveRequest, TimeTracking
-from app.models.project import Project, ProjectMilestone, Task, Assignment, AssignmentSubmission, Violation
+from app.models.project import (Project, ProjectMilestone, Task, Assignment, AssignmentSubmission, Violation,
+                                AssessmentSession, AssessmentQuestionSet, AssessmentQuestion, AssessmentAnswer)
 from app.models.placement import Job, JobApplication, Assessment, AssessmentSubmission, MockInterview, CommunicationPractice
 from app.models.registration import Registration, Document
-from app.models.notification import Notification, Message, Video, Feedback, Suggestion
+from app.models.notification import (Notification, BroadcastNotification, NotificationCursor, Message, Video, Feedback,
+                                     Suggestion)
 from app.models.setting import SystemSetting
 from app.models.session import Session, StudentFeedback
+from app.models.job import BackgroundJob
+from app.models.ai_cache import AIResultCache
+from app.models.upload import StoredFile
+from app.models.outbox import OutboxEmail
 
 __all__ = [
     "User",
@@ -17,10 +23,15 @@ __all__ = [
     "Lead", "LeadActivity",
     "Attendance", "LeaveRequest", "TimeTracking",
     "Project", "ProjectMilestone", "Task", "Assignment", "AssignmentSubmission", "Violation",
+    "AssessmentSession", "AssessmentQuestionSet", "AssessmentQuestion", "AssessmentAnswer",
     "Job", "JobApplication", "Assessment", "AssessmentSubmission", "MockInterview", "CommunicationPractice",
     "Registration", "Document",
-    "Notification", "Message", "Video", "Feedback", "Suggestion",
+    "Notification", "BroadcastNotification", "NotificationCursor", "Message", "Video", "Feedback", "Suggestion",
     "SystemSetting",
+    "BackgroundJob",
+    "AIResultCache",
+    "StoredFile",
+    "OutboxEmail",
 ]
 
 
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy import String, Integer, DateTime, Text, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class AIResultCache(Base):
+    """A cached Groq result, keyed by a hash of the request (see app/utils/ai_cache.py)."""
+    __tablename__ = "ai_result_cache"
+    __table_args__ = (
+        # LRU eviction: least recently used rows first
+        Index("ix_ai_result_cache_last_used_at", "last_used_at"),
+    )
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of model + prompt + params
+    kind: Mapped[str] = mapped_column(String(30))  # grading, instructions, task
+    value: Mapped[str] = mapped_column(Text)  # JSON-encoded result
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -2,7 +2,7 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, Float, Integer, DateTime, Enum, ForeignKey, func
+from sqlalchemy import String, Boolean, Float, Integer, DateTime, Enum, ForeignKey, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -30,6 +30,12 @@ class LeaveType(str, enum.Enum):
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # Per-student lookups (mark_attendance upsert, QR auto-mark)
+        Index("ix_attendance_student_batch_date", "student_id", "batch_id", "date"),
+        # Per-batch day/range reads (get_attendance, export_attendance)
+        Index("ix_attendance_batch_date", "batch_id", "date"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     student_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"))
@@ -48,6 +54,10 @@ class Attendance(Base):
 
 class LeaveRequest(Base):
     __tablename__ = "leave_requests"
+    __table_args__ = (
+        # Newest-first pages of list_leaves
+        Index("ix_leave_requests_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"))
@@ -71,6 +81,17 @@ class LeaveRequest(Base):
 
 class TimeTracking(Base):
     __tablename__ = "time_tracking"
+    __table_args__ = (
+        # A user's sessions for a day, newest first (scan path, get_time_tracking)
+        Index("ix_time_tracking_user_date_login", "user_id", "date", "login_time"),
+        # Everyone's sessions over a date range (export_time_tracking)
+        Index("ix_time_tracking_date", "date"),
+        # Full history, newest first (get_time_tracking without a date)
+        Index("ix_time_tracking_login_id", "login_time", "id"),
+        # At most one open session per user and day, whichever worker handles the scan
+        Index("ux_time_tracking_open_session", "user_id", "date", unique=True,
+              sqlite_where=text("logout_time IS NULL"), postgresql_where=text("logout_time IS NULL")),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"))
@@ -0,0 +1,32 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import String, Integer, DateTime, Text, Index, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class BackgroundJob(Base):
+    """A durable unit of background work (see app/utils/job_queue.py)."""
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        # One job per (queue, subject); re-grading reuses the row
+        UniqueConstraint("queue", "ref_id", name="uq_background_jobs_queue_ref"),
+        # Dispatcher scan: next runnable jobs of a queue
+        Index("ix_background_jobs_queue_status_available", "queue", "status", "available_at"),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    queue: Mapped[str] = mapped_column(String(50))
+    ref_id: Mapped[str] = mapped_column(String)  # e.g. AssessmentSession ID
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, running, done, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # retry backoff
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
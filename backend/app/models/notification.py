@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, Integer, Float, DateTime, ForeignKey, func, Text
+from sqlalchemy import String, Boolean, Integer, Float, DateTime, ForeignKey, Index, func, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -18,10 +18,42 @@ class Notification(Base):
     type: Mapped[str | None] = mapped_column(String, nullable=True)
     reference_id: Mapped[str | None] = mapped_column(String, nullable=True)
     link: Mapped[str | None] = mapped_column(String, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    # Set by the app, to the microsecond: read state is a comparison with the user's watermark
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, server_default=func.now())
 
     user = relationship("User", back_populates="notifications")
 
+    __table_args__ = (
+        # A user's feed, newest first
+        Index("ix_notifications_user_created_at", "user_id", "created_at"),
+    )
+
+
+class BroadcastNotification(Base):
+    """An admin notification to everyone or to one role, stored once (app/utils/notifications.py)."""
+    __tablename__ = "notification_broadcasts"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    title: Mapped[str] = mapped_column(String)
+    message: Mapped[str] = mapped_column(String)
+    audience: Mapped[str] = mapped_column(String(10), default="ALL")  # ALL or ROLE
+    role: Mapped[str | None] = mapped_column(String(20), nullable=True)  # when audience is ROLE
+    type: Mapped[str | None] = mapped_column(String, nullable=True)
+    sent_by: Mapped[str | None] = mapped_column(String, ForeignKey("users.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_notification_broadcasts_created_at", "created_at"),
+    )
+
+
+class NotificationCursor(Base):
+    """Per-user read watermark: everything created up to `read_at` counts as read."""
+    __tablename__ = "notification_cursors"
+
+    user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), primary_key=True)
+    read_at: Mapped[datetime] = mapped_column(DateTime)
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -79,7 +111,10 @@ class Suggestion(Base):
     message: Mapped[str] = mapped_column(String)
     category: Mapped[str | None] = mapped_column(String, nullable=True)  # e.g. General, Curriculum, Technical, Faculty
     is_anonymous: Mapped[bool] = mapped_column(Boolean, default=False)
-    screenshot_base64: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Legacy inline screenshots, moved to the file store at startup (app/utils/screenshots.py)
+    screenshot_base64: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
+    screenshot_url: Mapped[str | None] = mapped_column(Text, nullable=True)
+    thumbnail_url: Mapped[str | None] = mapped_column(Text, nullable=True)
     is_read: Mapped[bool] = mapped_column(Boolean, default=False)
     admin_reply: Mapped[str | None] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -0,0 +1,31 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import String, Integer, DateTime, Text, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class OutboxEmail(Base):
+    """An email waiting for, or done with, the background sender (see app/utils/mailer.py)."""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Sender scan: due messages first
+        Index("ix_email_outbox_status_available", "status", "available_at"),
+        Index("ix_email_outbox_claim", "claim"),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    to_email: Mapped[str] = mapped_column(String)
+    template: Mapped[str] = mapped_column(String(50))  # a name in app/utils/email.py TEMPLATES
+    context: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON; cleared once sent
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, sending, sent, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    claim: Mapped[str | None] = mapped_column(String(36), nullable=True)  # the sender batch holding it
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # retry backoff
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
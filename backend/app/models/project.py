@@ -2,7 +2,7 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, Float, Integer, DateTime, Enum, ForeignKey, Text, func
+from sqlalchemy import String, Boolean, Float, Integer, DateTime, Enum, ForeignKey, Text, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -107,6 +107,10 @@ class ProjectMilestone(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Newest-first pages of list_tasks
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     title: Mapped[str] = mapped_column(String(200), nullable=False)
@@ -180,6 +184,10 @@ class AssignmentSubmission(Base):
 
 class Violation(Base):
     __tablename__ = "violations"
+    __table_args__ = (
+        # Newest-first pages of list_violations
+        Index("ix_violations_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     student_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"))
@@ -224,6 +232,42 @@ class AssessmentSession(Base):
     completion_time_seconds: Mapped[int] = mapped_column(Integer, default=0)
     auto_submitted: Mapped[bool] = mapped_column(Boolean, default=False)
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
+    last_heartbeat: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # written in batches
+    # 0: questions and answers live in `responses`; 1: in assessment_questions /
+    # assessment_answers and `responses` holds results and grading state only;
+    # 2: as 1, but the questions are a shared assessment_question_sets row in question_order
+    storage_version: Mapped[int] = mapped_column(Integer, default=0)
+    question_set_id: Mapped[str | None] = mapped_column(String, ForeignKey("assessment_question_sets.id"), nullable=True)
+    question_order: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON {"q": [...], "o": [[...], ...]}
 
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class AssessmentQuestionSet(Base):
+    """The question list of a Task/Assignment as it was when sessions started; shared, never modified."""
+    __tablename__ = "assessment_question_sets"
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)  # SHA-256 of the questions
+    reference_id: Mapped[str] = mapped_column(String, nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)  # JSON question list
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class AssessmentQuestion(Base):
+    """One question of a session's frozen snapshot, written once when the session starts."""
+    __tablename__ = "assessment_questions"
+
+    session_id: Mapped[str] = mapped_column(String, ForeignKey("assessment_sessions.id"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)  # order shown to the student
+    content: Mapped[str] = mapped_column(Text, nullable=False)  # JSON question (options, answer, test_cases...)
+
+
+class AssessmentAnswer(Base):
+    """The student's current answer to one question; heartbeats update only changed rows."""
+    __tablename__ = "assessment_answers"
+
+    session_id: Mapped[str] = mapped_column(String, ForeignKey("assessment_sessions.id"), primary_key=True)
+    question_key: Mapped[str] = mapped_column(String(50), primary_key=True)  # question position, as sent by the client
+    value: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON answer (option index or code)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, func, Integer, Text
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Index, func, Integer, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -9,6 +9,10 @@ from app.database import Base
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Schedule-ordered pages of get_all_sessions
+        Index("ix_sessions_start_time_id", "start_time", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     title: Mapped[str] = mapped_column(String)
@@ -33,6 +37,10 @@ class Session(Base):
 
 class StudentFeedback(Base):
     __tablename__ = "student_feedback"
+    __table_args__ = (
+        # Newest-first pages of get_all_feedback
+        Index("ix_student_feedback_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     target_type: Mapped[str] = mapped_column(String)  # SESSION, TRAINER, COURSE
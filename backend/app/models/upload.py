@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy import String, Integer, DateTime, Text, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class StoredFile(Base):
+    """An uploaded file, stored once per content hash (see app/utils/storage.py)."""
+    __tablename__ = "stored_files"
+    __table_args__ = (
+        Index("ix_stored_files_sha256", "sha256"),
+    )
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)  # "<backend>:<folder>/<sha256><ext>"
+    backend: Mapped[str] = mapped_column(String(20))  # local, cloudinary
+    sha256: Mapped[str] = mapped_column(String(64))
+    size: Mapped[int] = mapped_column(Integer)
+    content_type: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    url: Mapped[str] = mapped_column(Text)
+    uploads: Mapped[int] = mapped_column(Integer, default=1)  # times this content was uploaded
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -2,7 +2,7 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, DateTime, Enum, func, ForeignKey
+from sqlalchemy import String, Boolean, DateTime, Enum, Index, func, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -33,6 +33,10 @@ class AdminPermission(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Newest-first pages of list_users / list_students
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     email: Mapped[str] = mapped_column(String, unique=True, index=True)
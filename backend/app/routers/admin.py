@@ -27,8 +27,12 @@ from app.schemas.schemas import (
     UserOut, AdminPasswordChangeRequest,
     AdminPermissionUpdate, AdminPermissionOut
 )
-from app.models.setting import SystemSetting
-from app.utils.email import send_leave_status_email
+from app.utils.settings_cache import settings_cache
+from app.utils.pagination import PageParams, empty_page, page_params, paginate
+from app.utils.principal_cache import principal_cache
+from app.utils.queries import count_by, rows_by_id, users_by_id
+from app.utils.email import leave_status_context
+from app.utils.mailer import mailer
 
 class AssignBatchRequest(BaseModel):
     batch_id: str
@@ -67,16 +71,17 @@ async def list_courses(db: AsyncSession = Depends(get_db)):
         select(Course).order_by(Course.created_at.desc())
     )
     courses = result.scalars().all()
+    course_ids = [c.id for c in courses]
+    batch_counts = await count_by(db, Batch.course_id, course_ids)
+    reg_counts = await count_by(db, Registration.course_id, course_ids)
     out = []
     for c in courses:
-        batches_q = await db.execute(select(func.count(Batch.id)).where(Batch.course_id == c.id))
-        regs_q = await db.execute(select(func.count(Registration.id)).where(Registration.course_id == c.id))
         out.append(CourseOut(
             id=c.id, name=c.name, description=c.description,
             duration=c.duration, fee=c.fee, is_active=c.is_active,
             created_at=c.created_at,
-            batch_count=batches_q.scalar() or 0,
-            student_count=regs_q.scalar() or 0,
+            batch_count=batch_counts.get(c.id, 0),
+            student_count=reg_counts.get(c.id, 0),
         ))
     return out
 
@@ -156,18 +161,20 @@ async def list_batches(
         
     result = await db.execute(query.order_by(Batch.created_at.desc()))
     batches = result.scalars().all()
+    courses = await rows_by_id(db, Course, (b.course_id for b in batches))
+    trainers = await users_by_id(db, (b.trainer_id for b in batches))
+    student_counts = await count_by(db, BatchStudent.batch_id, [b.id for b in batches])
     out = []
     for b in batches:
-        course = await db.get(Course, b.course_id)
-        trainer = await db.get(User, b.trainer_id) if b.trainer_id else None
-        stu_q = await db.execute(select(func.count(BatchStudent.id)).where(BatchStudent.batch_id == b.id))
+        course = courses.get(b.course_id)
+        trainer = trainers.get(b.trainer_id)
         out.append(BatchOut(
             id=b.id, name=b.name, start_date=b.start_date, end_date=b.end_date,
             is_active=b.is_active,
             schedule_time=b.schedule_time,
             course_name=course.name if course else "",
             trainer_name=trainer.name if trainer else None,
-            student_count=stu_q.scalar() or 0,
+            student_count=student_counts.get(b.id, 0),
         ))
     return out
 
@@ -274,12 +281,12 @@ async def delete_batch(
 
 @router.get("/users")
 async def list_users(
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN))
 ):
-    result = await db.execute(select(User).order_by(User.created_at.desc()))
-    users = result.scalars().all()
-    return [UserOut.model_validate(u) for u in users]
+    users = await paginate(db, select(User), page)
+    return users.response([UserOut.model_validate(u) for u in users.rows])
 
 class UserStatusUpdate(BaseModel):
     is_active: bool
@@ -299,6 +306,7 @@ async def update_user_status(
     
     target_user.is_active = body.is_active
     await db.flush()
+    await principal_cache.invalidate(db, user_id)
     return {"status": "updated", "is_active": target_user.is_active}
 
 
@@ -323,6 +331,7 @@ async def update_user_password(
     hashed = get_password_hash(body.new_password)
     target_user.password = hashed
     await db.flush()
+    await principal_cache.invalidate(db, user_id)
     return {"status": "password_updated"}
 
 
@@ -342,7 +351,7 @@ async def delete_user(
             raise HTTPException(status_code=403, detail="Cannot delete SUPER_ADMIN")
         
         # Manual cascade delete for related entities across all modules
-        from app.models.notification import Notification, Message, Feedback
+        from app.models.notification import Notification, Message, Feedback, BroadcastNotification, NotificationCursor
         from app.models.attendance import LeaveRequest, TimeTracking, Attendance
         from app.models.lead import Lead, LeadActivity
         from app.models.project import Task, Assignment, AssignmentSubmission, Violation, Project
@@ -354,6 +363,7 @@ async def delete_user(
         # 1. DELETE records where user is the primary subject
         entities = [
             (Notification, "Notification", "user_id"),
+            (NotificationCursor, "NotificationCursor", "user_id"),
             (LeaveRequest, "LeaveRequest", "user_id"),
             (TimeTracking, "TimeTracking", "user_id"),
             (Attendance, "Attendance", "student_id"),
@@ -417,8 +427,15 @@ async def delete_user(
         except Exception as e:
             report.append(f"Failed Nullify Assignment: {str(e)}")
 
+        try:
+            await db.execute(BroadcastNotification.__table__.update().where(BroadcastNotification.sent_by == user_id).values(sent_by=None))
+            report.append("Nullified BroadcastNotification")
+        except Exception as e:
+            report.append(f"Failed Nullify BroadcastNotification: {str(e)}")
+
         # Finally delete user
         await db.delete(target_user)
+        await principal_cache.invalidate(db, user_id)
         await db.commit()
         return {"status": "deleted", "report": report}
 
@@ -485,6 +502,7 @@ async def get_admin_permissions(
         perm = AdminPermission(user_id=user_id)
         db.add(perm)
         await db.flush()
+        await principal_cache.invalidate(db, user_id)
         
     return perm
 
@@ -513,6 +531,7 @@ async def update_admin_permissions(
     perm.manage_leaves = body.manage_leaves
     
     await db.flush()
+    await principal_cache.invalidate(db, user_id)
     return perm
 
 
@@ -521,19 +540,18 @@ async def update_admin_permissions(
 async def list_students(
     role: str = "STUDENT", 
     all: str = "", 
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN))
 ):
-    if all == "true":
-        result = await db.execute(select(User).order_by(User.created_at.desc()))
-    else:
-        result = await db.execute(
-            select(User).where(User.role == role).order_by(User.created_at.desc())
-        )
-    users = result.scalars().all()
+    query = select(User)
+    if all != "true":
+        query = query.where(User.role == role)
+    page = await paginate(db, query, page)
+    users = page.rows
     
     if not users:
-        return []
+        return page.response([])
 
     user_ids = [u.id for u in users]
     from app.models.attendance import Attendance, LeaveRequest
@@ -575,7 +593,7 @@ async def list_students(
         s.leaves_taken = leave_map[u.id]
         response.append(s)
 
-    return response
+    return page.response(response)
 
 
 @router.get("/students/{user_id}/report")
@@ -1013,6 +1031,7 @@ async def global_search(
 @router.get("/leaves")
 async def list_leaves(
     batch_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN, Role.TRAINER))
 ):
@@ -1027,7 +1046,7 @@ async def list_leaves(
         trainer_batch_ids = batch_result.scalars().all()
 
         if not trainer_batch_ids:
-            return []  # Trainer has no batches assigned
+            return empty_page(page).response([])  # Trainer has no batches assigned
 
         # Get students in those batches
         student_result = await db.execute(
@@ -1043,12 +1062,13 @@ async def list_leaves(
     elif batch_id:
         query = query.where(LeaveRequest.batch_id == batch_id)
 
-    result = await db.execute(query.order_by(LeaveRequest.created_at.desc()))
-    leaves = result.scalars().all()
+    page = await paginate(db, query, page)
+    leaves = page.rows
+    users = await users_by_id(db, [l.user_id for l in leaves] + [l.approved_by_id for l in leaves])
     out = []
     for l in leaves:
-        user = await db.get(User, l.user_id)
-        approver = await db.get(User, l.approved_by_id) if l.approved_by_id else None
+        user = users.get(l.user_id)
+        approver = users.get(l.approved_by_id)
         out.append(LeaveOut(
             id=l.id,
             user_name=user.name if user else "",
@@ -1063,14 +1083,13 @@ async def list_leaves(
             approved_by_name=approver.name if approver else None,
             created_at=l.created_at,
         ))
-    return out
+    return page.response(out)
 
 
 
 @router.patch("/leaves")
 async def action_leave(
     body: LeaveAction,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN, Role.TRAINER)),
 ):
@@ -1134,19 +1153,14 @@ async def action_leave(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error while updating leave: {str(db_err)}")
 
-    # Send Email Notification in background (safe — email failure must never block leave action)
+    # Queue the email notification; the mailer sends it after the commit
     try:
         leave_details = {
             "start_date": leave.start_date.strftime("%Y-%m-%d"),
             "end_date": leave.end_date.strftime("%Y-%m-%d")
         }
-        background_tasks.add_task(
-            send_leave_status_email,
-            requester.email,
-            new_status.value,
-            leave_details,
-            body.rejection_reason
-        )
+        await mailer.enqueue(db, requester.email, "leave_status",
+                             leave_status_context(new_status.value, leave_details, body.rejection_reason))
     except Exception as email_err:
         print(f"[Leave Action] Email notification skipped: {email_err}")
 
@@ -1202,29 +1216,34 @@ async def list_notifications(
     db: AsyncSession = Depends(get_db),
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
 ):
-    # Group by title and message for SQLite compatibility to mimic distinct on specific columns
-    result = await db.execute(
-        select(Notification)
-        .where(Notification.reference_id.in_(["admin_broadcast", "admin_direct"]))
-        .group_by(Notification.title, Notification.message)
-        .order_by(Notification.created_at.desc())
-        .limit(50)
-    )
-    notifs = result.scalars().all()
-    return [
-        {
-            "id": n.id, "title": n.title, "message": n.message,
-            "read": n.read, "created_at": n.created_at.isoformat() if n.created_at else None,
-        }
-        for n in notifs
+    from app.models.notification import BroadcastNotification
+    # Broadcasts are stored once; direct messages are single rows
+    broadcasts = (await db.execute(
+        select(BroadcastNotification).order_by(BroadcastNotification.created_at.desc()).limit(50)
+    )).scalars().all()
+    direct = (await db.execute(
+        select(Notification).where(Notification.reference_id == "admin_direct")
+        .order_by(Notification.created_at.desc()).limit(50)
+    )).scalars().all()
+    items = [
+        {"id": b.id, "title": b.title, "message": b.message, "read": False,
+         "target": b.role if b.audience == "ROLE" else "ALL", "created_at": b.created_at}
+        for b in broadcasts
+    ] + [
+        {"id": n.id, "title": n.title, "message": n.message, "read": n.read,
+         "target": "USER", "created_at": n.created_at}
+        for n in direct
     ]
+    items.sort(key=lambda n: n["created_at"] or datetime.min, reverse=True)
+    return [{**n, "created_at": n["created_at"].isoformat() if n["created_at"] else None} for n in items[:50]]
 
 @router.delete("/notifications/all")
 async def delete_all_notifications(
     db: AsyncSession = Depends(get_db),
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
 ):
-    from app.models.notification import Notification
+    from app.models.notification import BroadcastNotification, Notification
+    await db.execute(delete(BroadcastNotification))
     await db.execute(
         delete(Notification).where(
             Notification.reference_id.in_(["admin_broadcast", "admin_direct"])
@@ -1239,13 +1258,15 @@ async def delete_notification(
     db: AsyncSession = Depends(get_db),
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
 ):
-    from app.models.notification import Notification
-    result = await db.execute(
-        delete(Notification).where(
-            Notification.id == notification_id,
-            Notification.reference_id.in_(["admin_broadcast", "admin_direct"])
+    from app.models.notification import BroadcastNotification, Notification
+    result = await db.execute(delete(BroadcastNotification).where(BroadcastNotification.id == notification_id))
+    if result.rowcount == 0:
+        result = await db.execute(
+            delete(Notification).where(
+                Notification.id == notification_id,
+                Notification.reference_id.in_(["admin_broadcast", "admin_direct"])
+            )
         )
-    )
     if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Notification not found")
     await db.flush()
@@ -1258,27 +1279,23 @@ async def send_notification(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
 ):
     from app.models.notification import Notification
+    from app.utils.notifications import broadcast
 
+    # ALL and ROLE sends are one row, whatever the audience size; the count is for the admin UI
     if body.target == "ALL":
-        result = await db.execute(select(User).where(User.is_active == True))
-        users = result.scalars().all()
-        for u in users:
-            n = Notification(user_id=u.id, title=body.title, message=body.message, type="SYSTEM", reference_id="admin_broadcast")
-            db.add(n)
+        count = await db.scalar(select(func.count()).select_from(User).where(User.is_active == True))
+        broadcast(db, title=body.title, message=body.message, sent_by=_user.id)
         await db.flush()
-        return {"status": "sent", "count": len(users)}
+        return {"status": "sent", "count": count}
         
     elif body.target == "ROLE" and body.role:
-        result = await db.execute(select(User).where(User.is_active == True, User.role == body.role))
-        users = result.scalars().all()
-        if not users:
+        count = await db.scalar(
+            select(func.count()).select_from(User).where(User.is_active == True, User.role == body.role))
+        if not count:
             raise HTTPException(status_code=404, detail=f"No active users found with role {body.role}")
-        
-        for u in users:
-            n = Notification(user_id=u.id, title=body.title, message=body.message, type="SYSTEM", reference_id="admin_broadcast")
-            db.add(n)
+        broadcast(db, title=body.title, message=body.message, role=body.role, sent_by=_user.id)
         await db.flush()
-        return {"status": "sent", "count": len(users)}
+        return {"status": "sent", "count": count}
 
     elif body.target == "USER" and body.user_id:
         user = await db.get(User, body.user_id)
@@ -1368,11 +1385,7 @@ async def get_geofence_settings(
     db: AsyncSession = Depends(get_db),
     _user: User = Depends(require_roles(Role.SUPER_ADMIN)),
 ):
-    keys = ["office_latitude", "office_longitude", "office_radius_meters"]
-    result = await db.execute(select(SystemSetting).where(SystemSetting.key.in_(keys)))
-    settings = result.scalars().all()
-    
-    settings_dict = {s.key: s.value for s in settings}
+    settings_dict = await settings_cache.get_all(db)
     return {
         "office_latitude": float(settings_dict.get("office_latitude", 0.0)),
         "office_longitude": float(settings_dict.get("office_longitude", 0.0)),
@@ -1391,19 +1404,99 @@ async def update_geofence_settings(
         "office_radius_meters": str(body.office_radius_meters),
     }
 
-    for key, value in updates.items():
-        result = await db.execute(select(SystemSetting).where(SystemSetting.key == key))
-        setting = result.scalars().first()
-        if setting:
-            setting.value = value
-        else:
-            new_setting = SystemSetting(key=key, value=value)
-            db.add(new_setting)
-
-    await db.flush()
+    await settings_cache.set_many(db, updates)
     return {"status": "success", "message": "Geofence settings updated"}
 
 
+# ─── Background Queues ────────────────────────────────
+@router.get("/queues")
+async def get_queue_metrics(
+    db: AsyncSession = Depends(get_db),
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """Per-queue job counts from the database plus this worker's throughput/latency metrics."""
+    from app.models.job import BackgroundJob
+    from app.utils.job_queue import queues
+    import app.utils.assessment_grading  # noqa: F401 — registers the grading queue
+
+    result = []
+    for name, queue in queues.items():
+        by_status = await count_by(db, BackgroundJob.status, None, BackgroundJob.queue == name)
+        result.append({
+            **queue.metrics(),
+            "depth": {s: by_status.get(s, 0) for s in ("pending", "running", "done", "failed")},
+        })
+    return result
+
+
+# ─── Assessment Heartbeats ────────────────────────────
+@router.get("/heartbeats")
+async def get_heartbeat_stats(
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """This worker's buffered assessment sessions and flush counters."""
+    from app.utils.heartbeats import heartbeat_buffer
+    return heartbeat_buffer.stats()
+
+
+@router.get("/assessment-timer")
+async def get_assessment_timer_stats(
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """Open sessions this worker tracks for expiry, and what it has closed."""
+    from app.utils.assessment_timer import assessment_timer
+    return assessment_timer.stats()
+
+
+@router.get("/leaderboards")
+async def get_leaderboard_stats(
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """Assessment leaderboards held by this worker."""
+    from app.utils.leaderboards import leaderboards
+    return leaderboards.stats()
+
+
+@router.get("/mailer")
+async def get_mailer_stats(
+    db: AsyncSession = Depends(get_db),
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """This worker's sender counters and the outbox by status."""
+    return await mailer.stats(db)
+
+
+@router.get("/storage")
+async def get_storage_stats(
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """Uploads handled by this worker, and how many were already stored."""
+    from app.utils.storage import file_store
+    return file_store.stats()
+
+
+# ─── AI Result Cache ──────────────────────────────────
+@router.get("/ai-cache")
+async def get_ai_cache_stats(
+    db: AsyncSession = Depends(get_db),
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """Hit/miss counters for this worker plus the shared cache size."""
+    from app.utils.ai_cache import ai_cache
+    return await ai_cache.stats(db)
+
+
+@router.delete("/ai-cache")
+async def clear_ai_cache(
+    db: AsyncSession = Depends(get_db),
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN)),
+):
+    from app.utils.ai_cache import ai_cache
+    await ai_cache.clear(db)
+    await db.commit()
+    return {"status": "cleared"}
+
+
 # ─── Suggestion Box ────────────────────────────────────────
 
 @router.get("/suggestions")
@@ -1414,7 +1507,8 @@ async def get_suggestions(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
 ):
     from app.models.notification import Suggestion
-    query = select(Suggestion).order_by(Suggestion.created_at.desc())
+    # Inline (not yet moved) screenshots are only tested for, never loaded
+    query = select(Suggestion, Suggestion.screenshot_base64.isnot(None)).order_by(Suggestion.created_at.desc())
     if is_read == "true":
         query = query.where(Suggestion.is_read == True)
     elif is_read == "false":
@@ -1423,14 +1517,15 @@ async def get_suggestions(
         query = query.where(Suggestion.category == category)
 
     result = await db.execute(query)
-    suggestions = result.scalars().all()
+    rows = result.all()
+    students = await users_by_id(db, (s.student_id for s, _ in rows if not s.is_anonymous))
 
     out = []
-    for s in suggestions:
+    for s, inline_screenshot in rows:
         student_name = "Anonymous"
         student_sid = None
         if s.student_id and not s.is_anonymous:
-            student = await db.get(User, s.student_id)
+            student = students.get(s.student_id)
             if student:
                 student_name = student.name
                 student_sid = student.student_id
@@ -1443,11 +1538,35 @@ async def get_suggestions(
             "is_anonymous": s.is_anonymous,
             "is_read": s.is_read,
             "admin_reply": s.admin_reply,
+            "has_screenshot": bool(s.screenshot_url or inline_screenshot),
+            "thumbnail_url": s.thumbnail_url,
             "created_at": s.created_at.isoformat() if s.created_at else None,
         })
     return out
 
 
+@router.get("/suggestions/{suggestion_id}/screenshot")
+async def get_suggestion_screenshot(
+    suggestion_id: str,
+    db: AsyncSession = Depends(get_db),
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
+):
+    """The attached screenshot, fetched when an admin opens it."""
+    from app.models.notification import Suggestion
+    result = await db.execute(
+        select(Suggestion.screenshot_url, Suggestion.thumbnail_url, Suggestion.screenshot_base64)
+        .where(Suggestion.id == suggestion_id)
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Suggestion not found")
+    url, thumbnail_url, inline = row
+    if not (url or inline):
+        raise HTTPException(status_code=404, detail="No screenshot attached")
+    # Not moved to the file store yet: the stored data URL works as an image source
+    return {"url": url or inline, "thumbnail_url": thumbnail_url}
+
+
 @router.patch("/suggestions/{suggestion_id}/read")
 async def mark_suggestion_read(
     suggestion_id: str,
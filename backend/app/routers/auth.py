@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File
 from starlette.concurrency import run_in_threadpool
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,8 +11,10 @@ from app.models.user import User
 from app.models.registration import Document
 from app.schemas.schemas import LoginRequest, RegisterRequest, TokenResponse, UserOut, SendOTPRequest, VerifyOTPRequest, VerifyEmailRequest
 from app.middleware.auth import create_access_token, get_current_user
+from app.utils.principal_cache import principal_cache
 from app.config import settings
-from app.utils.email import send_verification_email
+from app.utils.email import verification_context
+from app.utils.mailer import mailer
 
 router = APIRouter(prefix="/api/auth", tags=["Auth"])
 
@@ -25,18 +27,6 @@ _otp_store: dict[str, dict] = {}
 def _generate_otp() -> str:
     return str(random.randint(100000, 999999))
 
-def _send_email_otp(to_email: str, otp: str) -> tuple[bool, str]:
-    """Send OTP via SMTP utility."""
-    try:
-        print(f"DEBUG: Attempting to send SMTP email to {to_email} with OTP {otp}")
-        success = send_verification_email(to_email, otp)
-        if success:
-            return True, ""
-        return False, "SMTP utility failed (check logs)"
-    except Exception as e:
-        print(f"DEBUG: Internal error in _send_email_otp: {str(e)}")
-        logger.error(f"Internal error in _send_email_otp: {e}")
-        return False, str(e)
 
 
 
@@ -51,10 +41,6 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception:
         return False
 
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads", "documents")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-
 @router.post("/login", response_model=TokenResponse)
 async def login(body: LoginRequest, db: AsyncSession = Depends(get_db)):
     # Auto-provision super admin if missing
@@ -81,18 +67,15 @@ async def login(body: LoginRequest, db: AsyncSession = Depends(get_db)):
 
 @router.post("/notifications/read-all")
 async def mark_notifications_read(db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
-    from app.models.notification import Notification
-    from sqlalchemy import update
-    await db.execute(
-        update(Notification).where(Notification.user_id == user.id).values(read=True)
-    )
+    from app.utils.notifications import mark_all_read
+    await mark_all_read(db, user.id)
     await db.flush()
     return {"status": "success"}
 
 
 
 @router.post("/send-otp")
-async def send_otp(body: SendOTPRequest):
+async def send_otp(body: SendOTPRequest, db: AsyncSession = Depends(get_db)):
     email = body.email.strip().lower()
     if not email or '@' not in email:
         raise HTTPException(status_code=400, detail="Please provide a valid email address")
@@ -104,11 +87,8 @@ async def send_otp(body: SendOTPRequest):
         "verified": False
     }
     
-    success, err_msg = _send_email_otp(email, otp)
-    if success:
-        return {"status": "success", "message": "OTP sent successfully via Email"}
-    else:
-        raise HTTPException(status_code=500, detail=f"SMTP Server Connection Failed: {err_msg}")
+    await mailer.enqueue(db, email, "verification", verification_context(otp, expires="10 minutes"))
+    return {"status": "success", "message": "OTP sent successfully via Email"}
 
 @router.post("/verify-otp")
 async def verify_otp(body: VerifyOTPRequest):
@@ -150,6 +130,7 @@ async def verify_email(body: VerifyEmailRequest, db: AsyncSession = Depends(get_
     user.verification_code = None
     user.verification_expiry = None
     await db.flush()
+    await principal_cache.invalidate(db, user.id)
     
     return {"status": "success", "message": "Email verified successfully"}
 
@@ -169,11 +150,9 @@ async def resend_verification(body: SendOTPRequest, db: AsyncSession = Depends(g
     user.verification_code = verification_code
     user.verification_expiry = datetime.now(timezone.utc) + timedelta(hours=24)
     
-    success = send_verification_email(user.email, verification_code)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to send verification email")
-        
+    await mailer.enqueue(db, user.email, "verification", verification_context(verification_code))
     await db.flush()
+    await principal_cache.invalidate(db, user.id)
     return {"status": "success", "message": "Verification code resent successfully"}
 
 @router.post("/register", response_model=UserOut)
@@ -315,6 +294,7 @@ async def update_profile(
     if "passing_year" in body:
         user.passing_year = body["passing_year"]
     await db.flush()
+    await principal_cache.invalidate(db, user.id)
     return {"status": "updated", "name": user.name, "phone": user.phone}
 
 
@@ -339,6 +319,7 @@ async def change_own_password(
     
     user.password = get_password_hash(new_password)
     await db.flush()
+    await principal_cache.invalidate(db, user.id)
     return {"status": "password_changed"}
 
 # ─── Document endpoints ──────────────────────────────
@@ -363,48 +344,23 @@ async def list_documents(
 
 @router.post("/documents", status_code=201)
 async def upload_document(
-    body: dict,
+    type: str = Form("OTHER"),
+    file: UploadFile = File(None),
+    file_name: str = Form(None),
+    file_url: str = Form(""),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    """Upload a document with base64 encoded file content."""
-    doc_type = body.get("type", "OTHER")
-    file_name = body.get("file_name", "document")
-    file_data = body.get("file_data")  # base64 encoded
+    """Upload a document as multipart form data, or record a link to one with file_url."""
+    from app.utils.storage import file_store
 
-    if file_data:
-        try:
-            import cloudinary.uploader
-            from app.config import settings
-            
-            # Configure Cloudinary if not done globally
-            if not cloudinary.config().cloud_name:
-                 import cloudinary
-                 cloudinary.config(
-                     cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-                     api_key=settings.CLOUDINARY_API_KEY,
-                     api_secret=settings.CLOUDINARY_API_SECRET
-                 )
-
-            # Upload to Cloudinary
-            upload_result = cloudinary.uploader.upload(
-                f"data:image/png;base64,{file_data}", # Assuming image, cloudinary handles auto-detection via base64 prefix
-                folder="lms_documents",
-                public_id=f"{user.id}_{doc_type}_{uuid.uuid4().hex[:8]}"
-            )
-            file_url = upload_result.get("secure_url")
-            
-        except Exception as e:
-            # Fallback to local storage if Cloudinary fails or is not configured
-            ext = os.path.splitext(file_name)[1] or ".pdf"
-            saved_name = f"{user.id}_{doc_type}_{uuid.uuid4().hex[:8]}{ext}"
-            file_path = os.path.join(UPLOAD_DIR, saved_name)
-            with open(file_path, "wb") as f:
-                f.write(base64.b64decode(file_data))
-            file_url = f"/uploads/documents/{saved_name}"
-            print(f"Cloudinary upload failed/skipped, using local storage: {e}")
-    else:
-        file_url = body.get("file_url", "")
+    doc_type = type
+    if file is not None:
+        file_name = file_name or file.filename or "document"
+        file_url = (await file_store.save(db, file, "lms/documents")).url
+    elif not file_url:
+        raise HTTPException(status_code=400, detail="Attach a file or give its URL")
+    file_name = file_name or "document"
 
     doc = Document(
         student_id=user.id,
@@ -468,22 +424,18 @@ async def get_my_notifications(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    from app.models.notification import Notification
-    result = await db.execute(
-        select(Notification)
-        .where(Notification.user_id == user.id)
-        .order_by(Notification.created_at.desc())
-        .limit(50)
-    )
-    notifs = result.scalars().all()
-    return [
-        {
-            "id": n.id, "title": n.title, "message": n.message,
-            "read": n.read, "type": n.type, "reference_id": n.reference_id,
-            "created_at": n.created_at.isoformat() if n.created_at else None,
-        }
-        for n in notifs
-    ]
+    from app.utils.notifications import feed
+    return await feed(db, user)
+
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    from app.utils.notifications import UNREAD_COUNT_CAP, unread_count
+    count = await unread_count(db, user)
+    return {"unread": count, "capped": count >= UNREAD_COUNT_CAP}
 
 import json
 import base64
@@ -500,6 +452,52 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+async def _punch_with_row_lock(db: AsyncSession, user_id: str, now: datetime):
+    """
+    Original punch path: lock today's TimeTracking rows and toggle in the request's
+    transaction. Used when PUNCH_BURST_MODE is off.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from app.models.attendance import TimeTracking
+    from app.utils.punch import PunchCooldown, PunchResult, COOLDOWN_SECONDS
+    from app.utils.dates import on_day, day_start
+
+    today = now.date()
+
+    # Get all sessions for today — use with_for_update to prevent duplicate concurrent inserts
+    all_today_result = await db.execute(
+        select(TimeTracking).where(
+            TimeTracking.user_id == user_id,
+            on_day(TimeTracking.date, today)
+        ).order_by(TimeTracking.login_time.desc()).with_for_update()
+    )
+    today_records = all_today_result.scalars().all()
+    time_record = today_records[0] if today_records else None
+
+    if time_record:
+        last_event_time = time_record.logout_time or time_record.login_time
+        if last_event_time and (now - last_event_time).total_seconds() < COOLDOWN_SECONDS:
+            await db.rollback()
+            raise PunchCooldown(punched_in=time_record.logout_time is None)
+
+    if not time_record or time_record.logout_time is not None:
+        # Case A: Punch In — no record yet OR latest session already completed → start new session
+        db.add(TimeTracking(user_id=user_id, date=day_start(today), login_time=now))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # ux_time_tracking_open_session: a concurrent scan opened today's session first
+            await db.rollback()
+            raise PunchCooldown(punched_in=True)
+        return PunchResult("IN", len(today_records) + 1, now)
+
+    # Case B: Punch Out — latest session is open
+    time_record.logout_time = now
+    time_record.total_minutes = int((now - time_record.login_time).total_seconds() / 60)
+    await db.commit()
+    return PunchResult("OUT", len(today_records), time_record.login_time, now, time_record.total_minutes)
+
+
 @router.post("/attendance/scan")
 async def scan_attendance_qr(
     body: dict,
@@ -521,23 +519,17 @@ async def scan_attendance_qr(
         )
 
     # --- Geolocation radius check ---
-    from app.models.setting import SystemSetting
+    # Office location and QR secret come from the in-memory settings cache (no DB round trip)
+    from app.utils.settings_cache import settings_cache
+    punch_settings = await settings_cache.punch_settings(db)
     scan_lat = body.get("latitude")
     scan_lng = body.get("longitude")
     
     if scan_lat is not None and scan_lng is not None:
-        # Fetch office location settings
-        loc_result = await db.execute(select(SystemSetting).where(SystemSetting.key == "office_latitude"))
-        lat_setting = loc_result.scalars().first()
-        loc_result2 = await db.execute(select(SystemSetting).where(SystemSetting.key == "office_longitude"))
-        lng_setting = loc_result2.scalars().first()
-        loc_result3 = await db.execute(select(SystemSetting).where(SystemSetting.key == "office_radius_meters"))
-        radius_setting = loc_result3.scalars().first()
-        
-        if lat_setting and lng_setting and lat_setting.value not in ("0.0", "", None) and lng_setting.value not in ("0.0", "", None):
-            office_lat = float(lat_setting.value)
-            office_lng = float(lng_setting.value)
-            allowed_radius = float(radius_setting.value) if radius_setting else 200.0
+        if punch_settings.has_geofence:
+            office_lat = punch_settings.office_latitude
+            office_lng = punch_settings.office_longitude
+            allowed_radius = punch_settings.office_radius_meters
             
             distance = haversine_distance(float(scan_lat), float(scan_lng), office_lat, office_lng)
             if distance > allowed_radius:
@@ -549,15 +541,14 @@ async def scan_attendance_qr(
 
 
     # --- Validate QR token ---
-    result = await db.execute(select(SystemSetting).where(SystemSetting.key == "active_qr_secret"))
-    setting = result.scalars().first()
+    active_qr_secret = punch_settings.active_qr_secret
     
     is_valid = True # Bypassing QR secret check for now as requested to remove all verification
     """
     is_valid = False
     
     # Check against the persistent global QR secret
-    if setting and token == setting.value:
+    if active_qr_secret and token == active_qr_secret:
         is_valid = True
     else:
         # Fallback: check old JSON payload format (batch-specific QR)
@@ -581,54 +572,25 @@ async def scan_attendance_qr(
         raise HTTPException(status_code=400, detail="Invalid or expired QR code. Please scan the current one displayed at the institute.")
 
     # --- Punch In/Out Toggle (TimeTracking only) ---
-    from app.models.attendance import TimeTracking
-    from sqlalchemy import and_, func
-    
-    # Calculate IST as naive datetime (DB stores naive)
-    utc_now = datetime.utcnow()
-    now = utc_now + timedelta(hours=5, minutes=30)
+    from app.utils.punch import punch_pipeline, PunchCooldown, COOLDOWN_SECONDS, ist_now
+
+    now = ist_now()
     today = now.date()
-    
-    # Get all sessions for today — use with_for_update to prevent duplicate concurrent inserts
-    all_today_result = await db.execute(
-        select(TimeTracking).where(
-            and_(
-                TimeTracking.user_id == user.id,
-                func.date(TimeTracking.date) == today
-            )
-        ).order_by(TimeTracking.login_time.desc()).with_for_update()
-    )
-    today_records = all_today_result.scalars().all()
-    time_record = today_records[0] if today_records else None
 
-    # ─── Duplicate / rapid scan guard ──────────────────────
-    # Reject if last event (punch-in OR punch-out) was within 30 seconds.
-    # This prevents the QR scanner firing multiple frames as separate records.
-    COOLDOWN_SECONDS = 30
-    if time_record:
-        last_event_time = time_record.logout_time or time_record.login_time
-        if last_event_time and (now - last_event_time).total_seconds() < COOLDOWN_SECONDS:
-            await db.rollback()
-            punch_type = "OUT" if time_record.logout_time is None else "IN"
-            raise HTTPException(
-                status_code=429,
-                detail=f"Already punched {'in' if punch_type == 'OUT' else 'out'} recently. Please wait {COOLDOWN_SECONDS} seconds between scans."
-            )
-    
-    message = ""
-    session_info = {}
-    
-    if not time_record or time_record.logout_time is not None:
-        # Case A: Punch In — no record yet OR latest session already completed → start new session
-        session_number = len(today_records) + 1
-        time_record = TimeTracking(
-            user_id=user.id,
-            date=datetime.combine(today, time.min),
-            login_time=now
+    try:
+        if settings.PUNCH_BURST_MODE:
+            punch = await punch_pipeline.scan(db, user.id, now)
+        else:
+            punch = await _punch_with_row_lock(db, user.id, now)
+    except PunchCooldown as cooldown:
+        # Duplicate / rapid scan guard: the QR scanner fires multiple frames as separate scans
+        raise HTTPException(
+            status_code=429,
+            detail=f"Already punched {'in' if cooldown.punched_in else 'out'} recently. Please wait {COOLDOWN_SECONDS} seconds between scans."
         )
-        db.add(time_record)
-        
-        message = f"Punch In successful! Session #{session_number} started."
+
+    if punch.punch_type == "IN":
+        message = f"Punch In successful! Session #{punch.session_number} started."
         session_info = {
             "punch_type": "IN",
             "login_time": now.isoformat(),
@@ -636,34 +598,26 @@ async def scan_attendance_qr(
             "user_name": user.name,
             "role": role_val,
             "student_id": user.student_id or user.id,
-            "session_number": session_number
+            "session_number": punch.session_number
         }
     else:
-        # Case B: Punch Out — latest session is open
-        session_number = len(today_records)
-        time_record.logout_time = now
-        diff = now - time_record.login_time
-        time_record.total_minutes = int(diff.total_seconds() / 60)
-        
-        hours = time_record.total_minutes // 60
-        mins = time_record.total_minutes % 60
+        hours = punch.total_minutes // 60
+        mins = punch.total_minutes % 60
         duration_str = f"{hours}h {mins}m" if hours > 0 else f"{mins}m"
             
-        message = f"Punch Out successful! Session #{session_number} Duration: {duration_str}."
+        message = f"Punch Out successful! Session #{punch.session_number} Duration: {duration_str}."
         session_info = {
             "punch_type": "OUT",
-            "login_time": time_record.login_time.isoformat(),
+            "login_time": punch.login_time.isoformat(),
             "logout_time": now.isoformat(),
-            "total_minutes": time_record.total_minutes,
+            "total_minutes": punch.total_minutes,
             "duration": duration_str,
             "date": today.isoformat(),
             "user_name": user.name,
             "role": role_val,
             "student_id": user.student_id or user.id,
-            "session_number": session_number
+            "session_number": punch.session_number
         }
-        
-    await db.commit()
 
     # --- If this scan was from a batch-specific QR, mark the student PRESENT in the Attendance table ---
     # The trainer attendance page reads from Attendance (not TimeTracking), so we must update both.
@@ -672,6 +626,7 @@ async def scan_attendance_qr(
     try:
         from app.models.attendance import Attendance, AttendanceStatus
         from app.models.course import BatchStudent
+        from app.utils.dates import on_day
 
         padded = token + '=' * (-len(token) % 4)
         decoded_bytes = base64.b64decode(padded)
@@ -694,7 +649,7 @@ async def scan_attendance_qr(
                     select(Attendance).where(
                         Attendance.student_id == user.id,
                         Attendance.batch_id == batch_id,
-                        func.date(Attendance.date) == qr_date.date()
+                        on_day(Attendance.date, qr_date.date())
                     )
                 )
                 att = existing.scalars().first()
@@ -740,8 +695,13 @@ async def submit_suggestion(
         message=msg,
         category=body.get("category") or "General",
         is_anonymous=is_anon,
-        screenshot_base64=body.get("screenshot_base64")
     )
+    if body.get("screenshot_base64"):
+        from app.utils.screenshots import store_screenshot
+        try:
+            s.screenshot_url, s.thumbnail_url = await store_screenshot(db, body["screenshot_base64"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Screenshot must be a PNG, JPG or WebP image.")
     db.add(s)
     await db.commit()
     return {"status": "submitted", "message": "Thank you for your suggestion!"}
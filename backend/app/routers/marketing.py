@@ -7,26 +7,29 @@ from app.middleware.auth import get_current_user, require_roles
 from app.models.user import User, Role
 from app.models.lead import Lead, LeadActivity
 from app.schemas.schemas import LeadCreate, LeadUpdate, LeadOut
+from app.utils.pagination import PageParams, page_params, paginate
+from app.utils.queries import count_by, users_by_id
 
 router = APIRouter(prefix="/api/marketing", tags=["Marketing"])
 
 
 @router.get("/leads")
-async def list_leads(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Lead).order_by(Lead.created_at.desc()))
-    leads = result.scalars().all()
+async def list_leads(page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    page = await paginate(db, select(Lead), page)
+    leads = page.rows
+    assignees = await users_by_id(db, (l.assigned_to_id for l in leads))
+    activity_counts = await count_by(db, LeadActivity.lead_id, (l.id for l in leads))
     out = []
     for l in leads:
-        assignee = await db.get(User, l.assigned_to_id) if l.assigned_to_id else None
-        act_q = await db.execute(select(func.count(LeadActivity.id)).where(LeadActivity.lead_id == l.id))
+        assignee = assignees.get(l.assigned_to_id)
         out.append(LeadOut(
             id=l.id, name=l.name, email=l.email, phone=l.phone,
             source=l.source, status=l.status.value, notes=l.notes,
             assigned_to_name=assignee.name if assignee else None,
-            activity_count=act_q.scalar() or 0,
+            activity_count=activity_counts.get(l.id, 0),
             created_at=l.created_at,
         ))
-    return out
+    return page.response(out)
 
 
 @router.post("/leads", status_code=201)
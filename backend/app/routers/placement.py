@@ -7,26 +7,28 @@ from app.middleware.auth import get_current_user, require_roles
 from app.models.user import User, Role
 from app.models.placement import Job, JobApplication, Assessment, AssessmentSubmission, MockInterview
 from app.schemas.schemas import JobCreate, JobOut
+from app.utils.pagination import PageParams, page_params, paginate
+from app.utils.queries import count_by
 
 router = APIRouter(prefix="/api/placement", tags=["Placement"])
 
 
 # ─── Jobs ─────────────────────────────────────────────
 @router.get("/jobs")
-async def list_jobs(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Job).order_by(Job.created_at.desc()))
-    jobs = result.scalars().all()
+async def list_jobs(page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    page = await paginate(db, select(Job), page)
+    jobs = page.rows
+    application_counts = await count_by(db, JobApplication.job_id, (j.id for j in jobs))
     out = []
     for j in jobs:
-        app_q = await db.execute(select(func.count(JobApplication.id)).where(JobApplication.job_id == j.id))
         out.append(JobOut(
             id=j.id, title=j.title, company=j.company,
             description=j.description, location=j.location, salary=j.salary,
             is_active=j.is_active,
-            application_count=app_q.scalar() or 0,
+            application_count=application_counts.get(j.id, 0),
             created_at=j.created_at,
         ))
-    return out
+    return page.response(out)
 
 
 @router.post("/jobs", status_code=201)
@@ -8,34 +8,34 @@ from app.routers.auth import get_current_user
 from app.models.user import User
 from app.models.session import Session, StudentFeedback
 from app.models.course import Batch, BatchStudent
+from app.utils.pagination import PageParams, empty_page, page_params, paginate
+from app.utils.queries import users_by_id
 
 router = APIRouter(prefix="/api/sessions", tags=["Sessions"])
 
 @router.get("/")
 async def get_all_sessions(
     role: str = "ADMIN", 
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db), 
     user: User = Depends(get_current_user)
 ):
+    # Sessions page in schedule order (start_time, id), not by creation time
     if user.role in ["SUPER_ADMIN", "ADMIN"]:
-        result = await db.execute(select(Session).order_by(Session.start_time.asc()))
-        return result.scalars().all()
+        query = select(Session)
     elif user.role == "TRAINER":
-        result = await db.execute(
-            select(Session).where(Session.trainer_id == user.id).order_by(Session.start_time.asc())
-        )
-        return result.scalars().all()
+        query = select(Session).where(Session.trainer_id == user.id)
     elif user.role == "STUDENT":
         # Get student's batches
         batch_res = await db.execute(select(BatchStudent.batch_id).where(BatchStudent.student_id == user.id))
         student_batch_ids = [r[0] for r in batch_res.fetchall()]
         if not student_batch_ids:
-            return []
-        result = await db.execute(
-            select(Session).where(Session.batch_id.in_(student_batch_ids)).order_by(Session.start_time.asc())
-        )
-        return result.scalars().all()
-    return []
+            return empty_page(page).response([])
+        query = select(Session).where(Session.batch_id.in_(student_batch_ids))
+    else:
+        return empty_page(page).response([])
+    sessions = await paginate(db, query, page, key=Session.start_time, descending=False)
+    return sessions.response(sessions.rows)
 
 @router.post("/")
 async def create_session(
@@ -128,14 +128,16 @@ async def submit_feedback(
 
 @router.get("/feedback/admin")
 async def get_all_feedback(
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db), 
     user: User = Depends(get_current_user)
 ):
     if user.role not in ["SUPER_ADMIN", "ADMIN"]:
         raise HTTPException(status_code=403, detail="Not authorized")
         
-    result = await db.execute(select(StudentFeedback).order_by(StudentFeedback.created_at.desc()))
-    feedbacks = result.scalars().all()
+    page = await paginate(db, select(StudentFeedback), page)
+    feedbacks = page.rows
+    students = await users_by_id(db, (f.submitted_by for f in feedbacks if not f.is_anonymous))
     
     # We should enrich this with Student name (if not anonymous) and Target Name
     data = []
@@ -151,9 +153,8 @@ async def get_all_feedback(
             "student_name": "Anonymous"
         }
         if not f.is_anonymous:
-            u_res = await db.execute(select(User.name).where(User.id == f.submitted_by))
-            u_name = u_res.scalars().first()
-            entry["student_name"] = u_name or "Unknown"
+            student = students.get(f.submitted_by)
+            entry["student_name"] = student.name if student and student.name else "Unknown"
         data.append(entry)
         
-    return data
+    return page.response(data)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, BackgroundTasks, Request, Response
 from sqlalchemy import select, func, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone, date
@@ -8,7 +8,7 @@ from app.database import get_db
 from app.middleware.auth import get_current_user, require_roles, get_optional_user
 from app.models.user import User, Role
 from app.models.attendance import Attendance, LeaveRequest, LeaveStatus, LeaveType
-from app.utils.cloudinary import upload_to_cloudinary
+from app.utils.storage import file_store
 from app.models.course import Batch, BatchStudent
 from app.models.project import (
     Project, ProjectMilestone, ProjectStatus,
@@ -20,6 +20,14 @@ from app.models.project import (
 from app.models.notification import Video, Feedback
 
 from app.models.setting import SystemSetting
+from app.utils.settings_cache import settings_cache
+from app.utils.punch import punch_pipeline
+from app.utils.dates import on_day, between_days
+from app.utils.queries import count_by, rows_grouped_by, users_by_id
+from app.utils.pagination import PageParams, page_params, paginate
+from app.utils.assessment_store import (
+    assign_questions, grading_data, load_questions, session_view, session_views, set_grading_data,
+)
 import uuid
 from app.schemas.schemas import LeaveOut
 
@@ -46,18 +54,15 @@ async def get_qr_config(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN))
 ):
     try:
-        result = await db.execute(select(SystemSetting).where(SystemSetting.key == "active_qr_secret"))
-        setting = result.scalars().first()
+        secret = await settings_cache.get(db, "active_qr_secret")
         
-        if not setting:
+        if not secret:
             # Auto-generate if missing
-            new_secret = f"atc_punch_{uuid.uuid4().hex}"
-            setting = SystemSetting(key="active_qr_secret", value=new_secret)
-            db.add(setting)
+            secret = f"atc_punch_{uuid.uuid4().hex}"
+            await settings_cache.set_many(db, {"active_qr_secret": secret})
             await db.commit()
-            await db.refresh(setting)
             
-        return {"qr_secret": setting.value}
+        return {"qr_secret": secret}
     except Exception as e:
         print(f"Error in get_qr_config: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -69,15 +74,7 @@ async def regenerate_qr_config(
 ):
     try:
         new_secret = f"atc_punch_{uuid.uuid4().hex}"
-        result = await db.execute(select(SystemSetting).where(SystemSetting.key == "active_qr_secret"))
-        setting = result.scalars().first()
-        
-        if setting:
-            setting.value = new_secret
-        else:
-            setting = SystemSetting(key="active_qr_secret", value=new_secret)
-            db.add(setting)
-            
+        await settings_cache.set_many(db, {"active_qr_secret": new_secret})
         await db.commit()
         return {"qr_secret": new_secret, "message": "New QR secret generated. Old QR codes are now invalid."}
     except Exception as e:
@@ -91,11 +88,11 @@ async def get_punch_settings(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN))
 ):
     """Get office geolocation settings for punch radius restriction."""
-    settings = {}
-    for key in ["office_latitude", "office_longitude", "office_radius_meters", "late_threshold_time"]:
-        result = await db.execute(select(SystemSetting).where(SystemSetting.key == key))
-        setting = result.scalars().first()
-        settings[key] = setting.value if setting else None
+    all_settings = await settings_cache.get_all(db)
+    settings = {
+        key: all_settings.get(key)
+        for key in ["office_latitude", "office_longitude", "office_radius_meters", "late_threshold_time"]
+    }
     
     return {
         "latitude": float(settings["office_latitude"]) if settings["office_latitude"] else None,
@@ -119,17 +116,7 @@ async def update_punch_settings(
         "late_threshold_time": str(body.get("late_threshold_time", "10:00")),
     }
     
-    for key, value in updates.items():
-        if not value:
-            continue
-        result = await db.execute(select(SystemSetting).where(SystemSetting.key == key))
-        setting = result.scalars().first()
-        if setting:
-            setting.value = value
-        else:
-            setting = SystemSetting(key=key, value=value)
-            db.add(setting)
-    
+    await settings_cache.set_many(db, {key: value for key, value in updates.items() if value})
     await db.commit()
     return {"status": "success", "message": "Punch settings saved successfully."}
 
@@ -212,7 +199,7 @@ async def get_attendance(
         query = query.where(Attendance.student_id == student_id)
     if date:
         day = parse_dt(date)
-        query = query.where(func.date(Attendance.date) == day.date())
+        query = query.where(on_day(Attendance.date, day.date()))
     result = await db.execute(query.order_by(Attendance.date.desc()).limit(100))
     records = result.scalars().all()
     out = []
@@ -227,10 +214,9 @@ async def get_attendance(
     return out
 
 
-import io
-import csv
+from contextlib import aclosing
 from datetime import date, timedelta
-from fastapi.responses import StreamingResponse
+from app.utils.csv_export import csv_response, stream_query
 
 @router.get("/attendance/export")
 async def export_attendance(
@@ -274,59 +260,46 @@ async def export_attendance(
     )
     students = students_result.scalars().all()
 
-    if not students:
-        # Return empty CSV with header
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Batch", "Date", "Student ID", "Student Name", "Status", "Remarks"])
-        output.seek(0)
-        response = StreamingResponse(iter([output.getvalue()]), media_type="text/csv")
-        response.headers["Content-Disposition"] = f"attachment; filename=attendance_{batch_id}_{start_date}_to_{end_date}.csv"
-        return response
-
-    student_map = {s.id: s for s in students}
-
-    # --- Fetch all attendance records in range (single query) ---
-    records_result = await db.execute(
-        select(Attendance)
-        .where(Attendance.batch_id == batch_id)
-        .where(func.date(Attendance.date) >= start_d)
-        .where(func.date(Attendance.date) <= end_d)
-    )
-    records = records_result.scalars().all()
+    async def report_rows():
+        yield ["Batch", "Date", "Student ID", "Student Name", "Status", "Remarks"]
+        if not students:
+            return
 
-    # Build a lookup: (student_id, date_str) -> Attendance record
-    record_lookup: dict[tuple, Attendance] = {}
-    for r in records:
-        day_str = r.date.strftime("%Y-%m-%d") if r.date else ""
-        record_lookup[(r.student_id, day_str)] = r
-
-    # --- Generate complete report: every day x every student ---
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Batch", "Date", "Student ID", "Student Name", "Status", "Remarks"])
-
-    current_d = start_d
-    while current_d <= end_d:
-        day_str = current_d.strftime("%Y-%m-%d")
-        for s in students:
-            rec = record_lookup.get((s.id, day_str))
-            status = rec.status.value if rec else "ABSENT"
-            remarks = rec.remarks or "" if rec else ""
-            writer.writerow([
-                batch_name,
-                day_str,
-                s.student_id or "",
-                s.name or "",
-                status,
-                remarks
-            ])
-        current_d += timedelta(days=1)
-
-    output.seek(0)
-    response = StreamingResponse(iter([output.getvalue()]), media_type="text/csv")
-    response.headers["Content-Disposition"] = f"attachment; filename=attendance_{batch_id}_{start_date}_to_{end_date}.csv"
-    return response
+        # --- Stream attendance records in date order and merge them day by day ---
+        records = stream_query(
+            select(Attendance.student_id, Attendance.date, Attendance.status, Attendance.remarks)
+            .where(Attendance.batch_id == batch_id)
+            .where(between_days(Attendance.date, start_d, end_d))
+            .order_by(Attendance.date)
+        )
+        async with aclosing(records):
+            pending = await anext(records, None)
+
+            # --- Generate complete report: every day x every student ---
+            current_d = start_d
+            while current_d <= end_d:
+                day_str = current_d.strftime("%Y-%m-%d")
+                day_records = {}
+                while pending is not None and pending.date.date() <= current_d:
+                    if pending.date.date() == current_d:
+                        day_records[pending.student_id] = pending
+                    pending = await anext(records, None)
+
+                for s in students:
+                    rec = day_records.get(s.id)
+                    status = rec.status.value if rec else "ABSENT"
+                    remarks = rec.remarks or "" if rec else ""
+                    yield [
+                        batch_name,
+                        day_str,
+                        s.student_id or "",
+                        s.name or "",
+                        status,
+                        remarks
+                    ]
+                current_d += timedelta(days=1)
+
+    return csv_response(report_rows(), f"attendance_{batch_id}_{start_date}_to_{end_date}.csv")
 
 
 import json
@@ -371,18 +344,15 @@ async def get_global_qr(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN, Role.TRAINER))
 ):
     """Fetches the current persistent global QR token for trainees."""
-    query = select(SystemSetting).where(SystemSetting.key == "active_qr_secret")
-    result = await db.execute(query)
-    setting = result.scalars().first()
+    secret = await settings_cache.get(db, "active_qr_secret")
     
-    if not setting:
+    if not secret:
         # Initialize it if it doesn't exist
         secret = str(uuid.uuid4())
-        setting = SystemSetting(key="active_qr_secret", value=secret)
-        db.add(setting)
+        await settings_cache.set_many(db, {"active_qr_secret": secret})
         await db.commit()
     
-    return {"qr_token": setting.value}
+    return {"qr_token": secret}
 
 
 @router.post("/qr/global/rotate")
@@ -391,18 +361,8 @@ async def rotate_global_qr(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN))
 ):
     """Invalidates the old global QR token and creates a new one."""
-    query = select(SystemSetting).where(SystemSetting.key == "active_qr_secret")
-    result = await db.execute(query)
-    setting = result.scalars().first()
-    
     new_secret = str(uuid.uuid4())
-    
-    if setting:
-        setting.value = new_secret
-    else:
-        setting = SystemSetting(key="active_qr_secret", value=new_secret)
-        db.add(setting)
-        
+    await settings_cache.set_many(db, {"active_qr_secret": new_secret})
     await db.commit()
     return {"qr_token": new_secret, "message": "Global QR Code has been regenerated successfully."}
 
@@ -428,7 +388,7 @@ async def mark_attendance(
             select(Attendance).where(
                 Attendance.student_id == item["student_id"],
                 Attendance.batch_id == item["batch_id"],
-                func.date(Attendance.date) == day.date()
+                on_day(Attendance.date, day.date())
             )
         )
         existing = existing_result.scalars().first()
@@ -506,13 +466,10 @@ async def submit_leave(
         if leave_type_enum == LeaveType.MEDICAL and not proof:
             raise HTTPException(status_code=400, detail="Proof of attachment (medical document or certificate) is required for Medical Leave.")
 
-        # 4. Upload proof to Cloudinary
+        # 4. Store the proof
         proof_url = None
         if proof:
-            is_pdf = False
-            if proof.filename:
-                is_pdf = proof.filename.lower().endswith(".pdf")
-            proof_url = upload_to_cloudinary(proof.file, folder="lms/leaves", is_pdf=is_pdf)
+            proof_url = (await file_store.save(db, proof, "lms/leaves")).url
 
 
         target_user_id = user.id
@@ -617,13 +574,14 @@ async def get_leave_stats(db: AsyncSession = Depends(get_db), user: User = Depen
 async def list_projects(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Project).order_by(Project.created_at.desc()))
     projects = result.scalars().all()
+    milestones_by_project = await rows_grouped_by(
+        db, ProjectMilestone, ProjectMilestone.project_id, [p.id for p in projects], ProjectMilestone.order
+    )
+    trainers = await users_by_id(db, (p.trainer_id for p in projects))
     out = []
     for p in projects:
-        ms_result = await db.execute(
-            select(ProjectMilestone).where(ProjectMilestone.project_id == p.id).order_by(ProjectMilestone.order)
-        )
-        milestones = ms_result.scalars().all()
-        trainer = await db.get(User, p.trainer_id) if p.trainer_id else None
+        milestones = milestones_by_project.get(p.id, [])
+        trainer = trainers.get(p.trainer_id)
         total_ms = len(milestones)
         done_ms = len([m for m in milestones if m.is_completed])
 
@@ -699,6 +657,7 @@ async def create_project(
 # ─── Tasks ────────────────────────────────────────────
 @router.get("/tasks")
 async def list_tasks(
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
@@ -719,11 +678,12 @@ async def list_tasks(
         query = query.where(or_(Task.scheduled_at == None, Task.scheduled_at <= datetime.utcnow()))
 
             
-    result = await db.execute(query.order_by(Task.created_at.desc()))
-    tasks = result.scalars().all()
+    page = await paginate(db, query, page)
+    tasks = page.rows
+    trainers = await users_by_id(db, (t.assigned_by for t in tasks))
     out = []
     for t in tasks:
-        trainer = await db.get(User, t.assigned_by) if t.assigned_by else None
+        trainer = trainers.get(t.assigned_by)
         is_overdue = False
         if t.due_date and t.status != TaskStatus.COMPLETED and t.due_date < datetime.utcnow():
             is_overdue = True
@@ -739,7 +699,7 @@ async def list_tasks(
             "has_assessment": bool(getattr(t, 'structured_content', None)),
             "created_at": t.created_at.isoformat() if t.created_at else None,
         })
-    return out
+    return page.response(out)
 
 @router.delete("/tasks/{task_id}")
 async def delete_task(
@@ -759,17 +719,17 @@ async def delete_task(
     return {"status": "deleted"}
 
 from fastapi import Form, UploadFile, File
-from app.utils.cloudinary import upload_to_cloudinary
 
 @router.post("/upload-task-pdf")
 async def upload_task_pdf(
     file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN, Role.TRAINER))
 ):
     is_pdf = file.filename.lower().endswith(".pdf")
     if not is_pdf:
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    pdf_url = upload_to_cloudinary(file.file, folder="lms/tasks", is_pdf=True)
+    pdf_url = (await file_store.save(db, file, "lms/tasks")).url
     return {"url": pdf_url}
 
 
@@ -830,17 +790,15 @@ async def create_task(
         db.add(notif)
         await db.flush()
     elif task.batch_id:
-        bs_result = await db.execute(select(BatchStudent).where(BatchStudent.batch_id == task.batch_id))
-        for bs in bs_result.scalars().all():
-            notif = Notification(
-                user_id=bs.student_id,
-                title="📋 New Task Assigned",
-                message=f"A new task '{task.title}' has been assigned to your batch.",
-                type="TASK",
-                reference_id=task.id,
-                link=f"/student/tasks?open={task.id}"
-            )
-            db.add(notif)
+        from app.utils.notifications import fan_out
+        await fan_out(
+            db, select(BatchStudent.student_id).where(BatchStudent.batch_id == task.batch_id),
+            title="📋 New Task Assigned",
+            message=f"A new task '{task.title}' has been assigned to your batch.",
+            type="TASK",
+            reference_id=task.id,
+            link=f"/student/tasks?open={task.id}"
+        )
         await db.flush()
 
     return {"id": task.id, "status": "created"}
@@ -909,27 +867,37 @@ async def list_assignments(
     
     result = await db.execute(query.order_by(Assignment.created_at.desc()))
     assignments = result.scalars().all()
+    assignment_ids = [a.id for a in assignments]
+    trainers = await users_by_id(db, (a.assigned_by for a in assignments))
+    sub_counts = await count_by(db, AssignmentSubmission.assignment_id, assignment_ids)
+
+    # If student, load their personal AI grades / submissions and the latest
+    # assessment session per submitted assignment (for detailed reports)
+    my_subs, my_sessions = {}, {}
+    if user.role == Role.STUDENT:
+        subs = await rows_grouped_by(
+            db, AssignmentSubmission, AssignmentSubmission.assignment_id, assignment_ids,
+            where=(AssignmentSubmission.student_id == user.id,)
+        )
+        my_subs = {aid: rows[0] for aid, rows in subs.items()}
+        sessions = await rows_grouped_by(
+            db, AssessmentSession, AssessmentSession.reference_id, my_subs.keys(),
+            AssessmentSession.created_at.desc(),
+            where=(AssessmentSession.student_id == user.id, AssessmentSession.reference_type == "ASSIGNMENT")
+        )
+        my_sessions = {aid: rows[0] for aid, rows in sessions.items()}
+        session_views_by_id = await session_views(db, my_sessions.values())
+
     out = []
     
     for a in assignments:
-        trainer = await db.get(User, a.assigned_by) if a.assigned_by else None
-        sub_count = await db.execute(
-            select(func.count(AssignmentSubmission.id)).where(AssignmentSubmission.assignment_id == a.id)
-        )
+        trainer = trainers.get(a.assigned_by)
         
-        # If student, attach their personal AI grade / submission
         student_sub = None
         if user.role == Role.STUDENT:
-            sub_res = await db.execute(select(AssignmentSubmission).where(AssignmentSubmission.assignment_id == a.id, AssignmentSubmission.student_id == user.id))
-            sub = sub_res.scalars().first()
+            sub = my_subs.get(a.id)
             if sub:
-                # Try to find the associated assessment session for detailed reports
-                sess_res = await db.execute(select(AssessmentSession).where(
-                    AssessmentSession.reference_id == a.id,
-                    AssessmentSession.student_id == user.id,
-                    AssessmentSession.reference_type == "ASSIGNMENT"
-                ).order_by(AssessmentSession.created_at.desc()))
-                sess = sess_res.scalars().first()
+                sess = my_sessions.get(a.id)
                 
                 student_sub = {
                     "id": sub.id,
@@ -937,7 +905,7 @@ async def list_assignments(
                     "feedback": sub.feedback,
                     "file_url": sub.file_url,
                     "content": sub.content,
-                    "session_responses": sess.responses if sess else None
+                    "session_responses": json.dumps(session_views_by_id[sess.id]) if sess else None
                 }
 
         out.append({
@@ -949,7 +917,7 @@ async def list_assignments(
             "time_limit": a.time_limit or 0,
             "is_randomized": a.is_randomized,
             "structured_content": a.structured_content,
-            "submission_count": sub_count.scalar() or 0,
+            "submission_count": sub_counts.get(a.id, 0),
             "created_at": a.created_at.isoformat() if a.created_at else None,
             "my_submission": student_sub,
             "status": "COMPLETED" if student_sub else "PENDING"
@@ -1014,17 +982,15 @@ async def create_assignment(
         await db.flush()
     elif assignment.batch_id:
         # Entire batch notification
-        bs_result = await db.execute(select(BatchStudent).where(BatchStudent.batch_id == assignment.batch_id))
-        for bs in bs_result.scalars().all():
-            notif = Notification(
-                user_id=bs.student_id,
-                title="📝 New Assignment Added",
-                message=f"A new assignment '{assignment.title}' has been added to your batch.",
-                type="ASSIGNMENT",
-                reference_id=assignment.id,
-                link=f"/student/assessments?start={assignment.id}"
-            )
-            db.add(notif)
+        from app.utils.notifications import fan_out
+        await fan_out(
+            db, select(BatchStudent.student_id).where(BatchStudent.batch_id == assignment.batch_id),
+            title="📝 New Assignment Added",
+            message=f"A new assignment '{assignment.title}' has been added to your batch.",
+            type="ASSIGNMENT",
+            reference_id=assignment.id,
+            link=f"/student/assessments?start={assignment.id}"
+        )
         await db.flush()
 
     return {"id": assignment.id, "status": "created"}
@@ -1051,16 +1017,17 @@ async def delete_assignment(
 
 
 from fastapi import Form, UploadFile, File
-from app.utils.cloudinary import upload_to_cloudinary
 from app.utils.ai_grader import evaluate_submission, extract_text_from_pdf, generate_assignment_instructions
+from starlette.concurrency import run_in_threadpool
 
 @router.post("/assignments/ai-generate")
 async def ai_generate_assignment(
     topic: str = Form(...),
+    no_cache: bool = Form(False),
     user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN, Role.TRAINER)),
 ):
     """Generates an assignment description automatically based on a topic string."""
-    description = generate_assignment_instructions(topic)
+    description = await generate_assignment_instructions(topic, bypass_cache=no_cache)
     return {"description": description}
 
 
@@ -1197,20 +1164,19 @@ async def submit_assignment(
         )
         db.add(violation)
 
-    # 1. Cloudinary Upload if a Physical PDF is submitted
+    # 1. Store the file if a Physical PDF is submitted
     pdf_url = None
     extracted_pdf_text = None
     
     if file:
         is_pdf = file.filename.lower().endswith(".pdf")
-        # Save securely to Cloudinary CDN
-        pdf_url = upload_to_cloudinary(file.file, folder="lms/assignments", is_pdf=is_pdf)
+        pdf_url = (await file_store.save(db, file, "lms/assignments")).url
         
         # If it's a PDF, we need to extract the text for the AI Grader
         if is_pdf:
-            file.file.seek(0) # Reset pointer
-            pdf_bytes = file.file.read()
-            extracted_pdf_text = extract_text_from_pdf(pdf_bytes)
+            await file.seek(0) # Reset pointer
+            pdf_bytes = await file.read()
+            extracted_pdf_text = await run_in_threadpool(extract_text_from_pdf, pdf_bytes)
 
     # 2. Determine what the AI evaluates (Prioritize raw code if they pasted it, else fallback to extracted PDF text)
     ai_eval_content = content or extracted_pdf_text or ""
@@ -1219,7 +1185,7 @@ async def submit_assignment(
 
     if ai_eval_content:
         # 3. Trigger the Gemini Auto-Grader!
-        eval_result = evaluate_submission(
+        eval_result = await evaluate_submission(
             assignment_instructions=assignment.description or assignment.title,
             student_content=ai_eval_content,
             max_marks=assignment.total_marks
@@ -1260,6 +1226,7 @@ async def list_violations(
     student_id: str = "",
     type: str = "",
     status: str = "",
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db),
 ):
     query = select(Violation)
@@ -1269,12 +1236,13 @@ async def list_violations(
         query = query.where(Violation.type == type)
     if status:
         query = query.where(Violation.status == status)
-    result = await db.execute(query.order_by(Violation.created_at.desc()))
-    violations = result.scalars().all()
+    page = await paginate(db, query, page)
+    violations = page.rows
+    users = await users_by_id(db, [v.student_id for v in violations] + [v.resolved_by_id for v in violations])
     out = []
     for v in violations:
-        student = await db.get(User, v.student_id) if v.student_id else None
-        resolver = await db.get(User, v.resolved_by_id) if v.resolved_by_id else None
+        student = users.get(v.student_id)
+        resolver = users.get(v.resolved_by_id)
         out.append({
             "id": v.id,
             "student_id": v.student_id,
@@ -1292,7 +1260,7 @@ async def list_violations(
             "resolved_at": v.resolved_at.isoformat() if v.resolved_at else None,
             "created_at": v.created_at.isoformat() if v.created_at else None,
         })
-    return out
+    return page.response(out)
 
 
 @router.post("/violations", status_code=201)
@@ -1442,9 +1410,10 @@ async def violation_summary(db: AsyncSession = Depends(get_db)):
 async def list_feedback(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Feedback).order_by(Feedback.created_at.desc()))
     feedbacks = result.scalars().all()
+    students = await users_by_id(db, (f.student_id for f in feedbacks))
     out = []
     for f in feedbacks:
-        student = await db.get(User, f.student_id) if f.student_id else None
+        student = students.get(f.student_id)
         out.append({
             "id": f.id,
             "student_name": student.name if student else "Unknown",
@@ -1471,6 +1440,7 @@ async def list_videos(db: AsyncSession = Depends(get_db)):
 async def get_time_tracking(
     date: str = "",
     user_id: str = "",
+    page: PageParams = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -1487,14 +1457,17 @@ async def get_time_tracking(
         
     if date:
         day = parse_dt(date)
-        query = query.where(func.date(TimeTracking.date) == day.date())
+        query = query.where(on_day(TimeTracking.date, day.date()))
         
-    result = await db.execute(query.order_by(TimeTracking.login_time.desc()))
-    records = result.scalars().all()
+    # A single day is already bounded (and feeds the stats below), so only the
+    # full history is paged
+    page = await paginate(db, query, PageParams() if date else page, key=TimeTracking.login_time)
+    records = page.rows
+    users = await users_by_id(db, (r.user_id for r in records))
     
     out_logs = []
     for r in records:
-        student = await db.get(User, r.user_id)
+        student = users.get(r.user_id)
         out_logs.append({
             "id": r.id,
             "date": r.date.isoformat(),
@@ -1520,17 +1493,7 @@ async def get_time_tracking(
         stats["avgHours"] = f"{avg_mins/60:.1f}h"
         
         # Get configurable late threshold from settings (default 10:00 AM)
-        late_hour = 10
-        late_minute = 0
-        try:
-            threshold_result = await db.execute(select(SystemSetting).where(SystemSetting.key == "late_threshold_time"))
-            threshold_setting = threshold_result.scalars().first()
-            if threshold_setting and threshold_setting.value:
-                parts = threshold_setting.value.split(":")
-                late_hour = int(parts[0])
-                late_minute = int(parts[1]) if len(parts) > 1 else 0
-        except:
-            pass
+        late_hour, late_minute = (await settings_cache.punch_settings(db)).late_threshold
         
         # Calculate On Time vs Late (login_time is already stored as IST-naive)
         on_time = 0
@@ -1557,6 +1520,8 @@ async def get_time_tracking(
         except:
             stats["absent"] = 0
 
+    if page.params.enabled:
+        return {"logs": out_logs, "stats": stats, "next_cursor": page.next_cursor, "total": page.total}
     return {"logs": out_logs, "stats": stats}
 
 @router.get("/time-tracking/export")
@@ -1569,12 +1534,9 @@ async def export_time_tracking(
     _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN)),
 ):
     """Export time tracking data as CSV grouped by role and batch."""
-    import csv
-    import io
-    from fastapi.responses import StreamingResponse
     from app.models.attendance import TimeTracking
     from app.models.course import BatchStudent, Batch
-    from sqlalchemy import and_, func
+    from sqlalchemy import case
     
     # Parse dates
     if not start_date or not end_date:
@@ -1582,187 +1544,174 @@ async def export_time_tracking(
     
     dt_start = parse_dt(start_date)
     dt_end = parse_dt(end_date)
-    s_date = dt_start.date() if dt_start else None
-    e_date = dt_end.date() if dt_end else None
+    if not dt_start or not dt_end:
+        raise HTTPException(status_code=400, detail="start_date and end_date are required (YYYY-MM-DD)")
+    s_date = dt_start.date()
+    e_date = dt_end.date()
     
-    # Fetch all records in range
-    query = select(TimeTracking).where(
-        and_(
-            func.date(TimeTracking.date) >= s_date,
-            func.date(TimeTracking.date) <= e_date
+    # Get late threshold setting
+    late_hour, late_minute = (await settings_cache.punch_settings(db)).late_threshold
+
+    # --- Logs query ---
+    # Sections are ADMINS, TRAINERS, MARKETERS, then STUDENTS per batch. Batches and
+    # users inside a section appear in order of their first log, and each user's logs
+    # in date order. All of that is one ordered query so rows can be streamed.
+    ranked_q = select(
+        TimeTracking.user_id, TimeTracking.date, TimeTracking.login_time,
+        TimeTracking.logout_time, TimeTracking.total_minutes,
+        func.row_number().over(order_by=(TimeTracking.date, TimeTracking.login_time)).label("rn"),
+    ).where(between_days(TimeTracking.date, s_date, e_date))
+    if user_id:
+        ranked_q = ranked_q.where(TimeTracking.user_id == user_id)
+    ranked = ranked_q.subquery("ranked")
+
+    first_seen = (
+        select(ranked.c.user_id, func.min(ranked.c.rn).label("first_rn"))
+        .group_by(ranked.c.user_id)
+        .subquery("first_seen")
+    )
+    # A student's batch is the first BatchStudent row found for them
+    first_batch_id = (
+        select(BatchStudent.batch_id)
+        .where(BatchStudent.student_id == User.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    users_q = (
+        select(
+            first_seen.c.user_id, first_seen.c.first_rn,
+            User.name, User.student_id, User.role,
+            first_batch_id.label("batch_id"),
         )
+        .join(User, User.id == first_seen.c.user_id)
     )
-    if user_id:
-        query = query.where(TimeTracking.user_id == user_id)
-        
-    result = await db.execute(query.order_by(TimeTracking.date, TimeTracking.login_time))
-    records = result.scalars().all()
-    
-    # Get late threshold setting
-    late_hour, late_minute = 10, 0
-    try:
-        threshold_result = await db.execute(select(SystemSetting).where(SystemSetting.key == "late_threshold_time"))
-        threshold_setting = threshold_result.scalars().first()
-        if threshold_setting and threshold_setting.value:
-            parts = threshold_setting.value.split(":")
-            late_hour = int(parts[0])
-            late_minute = int(parts[1]) if len(parts) > 1 else 0
-    except:
-        pass
-    
-    # Group records by user, enrich with user info
-    user_records = {}
-    for r in records:
-        if r.user_id not in user_records:
-            u = await db.get(User, r.user_id)
-            if not u:
-                continue
-            role_val = u.role.value if hasattr(u.role, 'value') else str(u.role)
-            if role and role_val != role:
-                continue
-            
-            # Find batch for students
-            batch_name = "N/A"
-            if role_val == "STUDENT":
-                bs_result = await db.execute(
-                    select(BatchStudent.batch_id).where(BatchStudent.student_id == u.id)
-                )
-                batch_id = bs_result.scalars().first()
-                if batch_id:
-                    batch = await db.get(Batch, batch_id)
-                    batch_name = batch.name if batch else "Unknown Batch"
-            
-            user_records[r.user_id] = {
-                "user": u,
-                "role": role_val,
-                "batch_name": batch_name,
-                "logs": []
-            }
-        
-        # Skip records for users who were filtered out (not added to user_records)
-        if r.user_id not in user_records:
-            continue
+    if role:
+        users_q = users_q.where(User.role == role)
+    users = users_q.subquery("u")
+
+    section = case(
+        (users.c.role == Role.ADMIN, 0),
+        (users.c.role == Role.TRAINER, 1),
+        (users.c.role == Role.MARKETER, 2),
+        (users.c.role == Role.STUDENT, 3),
+    )
+    batch_name = case(
+        (users.c.role != Role.STUDENT, "N/A"),
+        (users.c.batch_id.is_(None), "N/A"),
+        else_=func.coalesce(Batch.name, "Unknown Batch"),
+    )
+    logs = (
+        select(
+            users.c.user_id, users.c.name, users.c.student_id, users.c.first_rn,
+            section.label("section"), batch_name.label("batch_name"),
+            func.min(users.c.first_rn).over(partition_by=(section, batch_name)).label("group_rn"),
+            ranked.c.rn, ranked.c.date, ranked.c.login_time, ranked.c.logout_time, ranked.c.total_minutes,
+        )
+        .join(ranked, ranked.c.user_id == users.c.user_id)
+        .outerjoin(Batch, Batch.id == users.c.batch_id)
+        .where(section.is_not(None))
+        .subquery("logs")
+    )
+    logs_query = select(logs).order_by(logs.c.section, logs.c.group_rn, logs.c.first_rn, logs.c.rn)
 
-        # Determine on-time/late
-        status = "N/A"
-        if r.login_time:
-            if r.login_time.hour < late_hour or (r.login_time.hour == late_hour and r.login_time.minute <= late_minute):
-                status = "On Time"
-            else:
-                status = "Late"
-        
-        duration_mins = r.total_minutes or 0
-        hours_val = duration_mins // 60
-        mins_val = duration_mins % 60
-        duration_str = f"{hours_val}h {mins_val}m" if hours_val > 0 else f"{mins_val}m"
-        
-        user_records[r.user_id]["logs"].append({
-            "date": r.date.strftime("%Y-%m-%d") if r.date else "",
-            "login_time": r.login_time.strftime("%I:%M %p") if r.login_time else "-",
-            "logout_time": r.logout_time.strftime("%I:%M %p") if r.logout_time else "-",
-            "duration": duration_str,
-            "status": status
-        })
-    
-    # Group by role
-    admins = {uid: data for uid, data in user_records.items() if data["role"] == "ADMIN"}
-    trainers = {uid: data for uid, data in user_records.items() if data["role"] == "TRAINER"}
-    students = {uid: data for uid, data in user_records.items() if data["role"] == "STUDENT"}
-    marketers = {uid: data for uid, data in user_records.items() if data["role"] == "MARKETER"}
-    
-    # Group students by batch
-    students_by_batch = {}
-    for uid, data in students.items():
-        bn = data["batch_name"]
-        if bn not in students_by_batch:
-            students_by_batch[bn] = {}
-        students_by_batch[bn][uid] = data
-    
-    # Build CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([f"Attendance Report: {start_date} to {end_date}"])
-    writer.writerow([f"Late Threshold: {late_hour:02d}:{late_minute:02d}"])
-    writer.writerow([])
-    
-    def write_section(title, group):
-        if not group:
-            return
-        writer.writerow([f"=== {title} ==="])
-        writer.writerow(["Name", "ID", "Date", "Punch In", "Punch Out", "Duration", "Status"])
-        for uid, data in group.items():
-            u = data["user"]
-            for log in data["logs"]:
-                writer.writerow([
-                    u.name,
-                    u.student_id or u.id[:8],
-                    log["date"],
-                    log["login_time"],
-                    log["logout_time"],
-                    log["duration"],
-                    log["status"]
-                ])
-        writer.writerow([])
-    
-    write_section("ADMINS", admins)
-    write_section("TRAINERS", trainers)
-    write_section("MARKETERS", marketers)
-    
-    for batch_name, batch_students in students_by_batch.items():
-        write_section(f"STUDENTS - {batch_name}", batch_students)
-    
-    # --- ABSENT SECTION ---
-    # Get all active users (non-SUPER_ADMIN)
-    absent_query = select(User).where(User.role != Role.SUPER_ADMIN)
+    # --- Absent query: users (non-SUPER_ADMIN) who must punch in ---
+    absent_query = select(User.id, User.name, User.student_id, User.role).where(User.role != Role.SUPER_ADMIN)
     if role:
         absent_query = absent_query.where(User.role == role)
     if user_id:
         absent_query = absent_query.where(User.id == user_id)
-        
-    all_users_result = await db.execute(absent_query)
-    all_users = all_users_result.scalars().all()
-    
-    # For each day in range, find who didn't punch in
-    from datetime import timedelta as td
-    current_day = s_date
-    absent_rows = []
-    while current_day <= e_date:
-        # Get user IDs who punched in on this day
-        day_result = await db.execute(
-            select(TimeTracking.user_id).where(
-                func.date(TimeTracking.date) == current_day
-            )
+
+    section_titles = ["ADMINS", "TRAINERS", "MARKETERS", "STUDENTS"]
+
+    async def report_rows():
+        yield [f"Attendance Report: {start_date} to {end_date}"]
+        yield [f"Late Threshold: {late_hour:02d}:{late_minute:02d}"]
+        yield []
+
+        current_group = None
+        async for r in stream_query(logs_query):
+            group = (r.section, r.batch_name)
+            if group != current_group:
+                if current_group is not None:
+                    yield []
+                title = section_titles[r.section]
+                if title == "STUDENTS":
+                    title = f"STUDENTS - {r.batch_name}"
+                yield [f"=== {title} ==="]
+                yield ["Name", "ID", "Date", "Punch In", "Punch Out", "Duration", "Status"]
+                current_group = group
+
+            # Determine on-time/late
+            status = "N/A"
+            if r.login_time:
+                if r.login_time.hour < late_hour or (r.login_time.hour == late_hour and r.login_time.minute <= late_minute):
+                    status = "On Time"
+                else:
+                    status = "Late"
+
+            duration_mins = r.total_minutes or 0
+            hours_val = duration_mins // 60
+            mins_val = duration_mins % 60
+            duration_str = f"{hours_val}h {mins_val}m" if hours_val > 0 else f"{mins_val}m"
+
+            yield [
+                r.name,
+                r.student_id or r.user_id[:8],
+                r.date.strftime("%Y-%m-%d") if r.date else "",
+                r.login_time.strftime("%I:%M %p") if r.login_time else "-",
+                r.logout_time.strftime("%I:%M %p") if r.logout_time else "-",
+                duration_str,
+                status
+            ]
+        if current_group is not None:
+            yield []
+
+        # --- ABSENT SECTION ---
+        # calendar x users minus punched (user, day) pairs, as a single merge pass
+        # over one date-ordered stream of punches
+        all_users = [u async for u in stream_query(absent_query)]
+        punched_query = (
+            select(TimeTracking.date, TimeTracking.user_id)
+            .where(between_days(TimeTracking.date, s_date, e_date))
+            .distinct()
+            .order_by(TimeTracking.date)
         )
-        punched_ids = set(day_result.scalars().all())
-        
-        for u in all_users:
-            if u.id not in punched_ids:
-                role_val = u.role.value if hasattr(u.role, 'value') else str(u.role)
-                absent_rows.append([
-                    u.name,
-                    u.student_id or u.id[:8],
-                    role_val,
-                    current_day.strftime("%Y-%m-%d"),
-                    "Absent"
-                ])
-        current_day = current_day + td(days=1)
-    
-    if absent_rows:
-        writer.writerow(["=== ABSENT (Did Not Punch In) ==="])
-        writer.writerow(["Name", "ID", "Role", "Date", "Status"])
-        for row in absent_rows:
-            writer.writerow(row)
-        writer.writerow([])
-    
-    output.seek(0)
-    filename = f"attendance_{start_date}_to_{end_date}.csv"
-    
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+        if user_id:
+            punched_query = punched_query.where(TimeTracking.user_id == user_id)
+
+        any_absent = False
+        punches = stream_query(punched_query)
+        async with aclosing(punches):
+            pending = await anext(punches, None)
+            current_day = s_date
+            while current_day <= e_date:
+                # User IDs who punched in on this day
+                punched_ids = set()
+                while pending is not None and pending.date.date() <= current_day:
+                    punched_ids.add(pending.user_id)
+                    pending = await anext(punches, None)
+
+                day_str = current_day.strftime("%Y-%m-%d")
+                for u in all_users:
+                    if u.id not in punched_ids:
+                        if not any_absent:
+                            yield ["=== ABSENT (Did Not Punch In) ==="]
+                            yield ["Name", "ID", "Role", "Date", "Status"]
+                            any_absent = True
+                        role_val = u.role.value if hasattr(u.role, 'value') else str(u.role)
+                        yield [
+                            u.name,
+                            u.student_id or u.id[:8],
+                            role_val,
+                            day_str,
+                            "Absent"
+                        ]
+                current_day = current_day + timedelta(days=1)
+
+        if any_absent:
+            yield []
+
+    return csv_response(report_rows(), f"attendance_{start_date}_to_{end_date}.csv")
 
 @router.post("/time-tracking")
 async def create_time_tracking(
@@ -1775,6 +1724,7 @@ async def create_time_tracking(
         
     from app.models.attendance import TimeTracking
     from app.models.user import User
+    from sqlalchemy.exc import IntegrityError
     
     user_id = body.get("user_id")
     date_str = body.get("date")
@@ -1805,7 +1755,12 @@ async def create_time_tracking(
         total_minutes=total_minutes
     )
     db.add(log)
-    await db.flush()
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="User already has an open session on that day")
+    await punch_pipeline.invalidate(db, user_id)
     return {"status": "success", "id": log.id}
 
 @router.patch("/time-tracking/{log_id}")
@@ -1819,6 +1774,7 @@ async def update_time_tracking(
         raise HTTPException(status_code=403, detail="Students cannot edit logs")
         
     from app.models.attendance import TimeTracking
+    from sqlalchemy.exc import IntegrityError
     log = await db.get(TimeTracking, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
@@ -1834,7 +1790,13 @@ async def update_time_tracking(
     else:
         log.total_minutes = None
         
-    await db.flush()
+    user_id = log.user_id
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="User already has an open session on that day")
+    await punch_pipeline.invalidate(db, user_id)
     return {"status": "success"}
 
 @router.delete("/time-tracking/{log_id}")
@@ -1851,6 +1813,7 @@ async def delete_time_tracking(
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
     if log:
+        await punch_pipeline.invalidate(db, log.user_id)
         db.delete(log)
         await db.commit()
     return {"status": "success"}
@@ -1860,6 +1823,8 @@ async def delete_time_tracking(
 import os
 import httpx
 from pydantic import BaseModel as PydanticBaseModel
+from app.utils.groq_client import groq_client
+from app.utils.ai_cache import ai_cache
 from typing import List as TypingList
 from app.ws.socket_manager import emit_violation_alert
 
@@ -1871,6 +1836,7 @@ class GenerateTaskRequest(PydanticBaseModel):
     question_count: int = 5
     time_limit: int = 0  # 0 = no limit
     is_randomized: bool = True
+    no_cache: bool = False  # force a new generation instead of reusing the cached one
 
 @router.post("/generate-task")
 async def generate_task(
@@ -1903,7 +1869,7 @@ IMPORTANT: 'answer' must be the 0-based INDEX of the correct option in the 'opti
     elif body.task_type.upper() == "CODING":
         # Build example question slots to show the AI exactly how many to generate
         example_qs = ",\n    ".join([
-            f'{{"index": {i}, "question": "Problem {i+1} statement here — be specific and detailed", "initial_code": "# starter code for problem {i+1}\\n", "constraints": ["constraint 1", "constraint 2"], "hints": ["hint 1"]}}'
+            f'{{"index": {i}, "question": "Problem {i+1} statement here — be specific and detailed", "initial_code": "# starter code for problem {i+1}\\n", "constraints": ["constraint 1", "constraint 2"], "hints": ["hint 1"], "test_cases": [{{"input": "stdin for case 1", "output": "exact expected stdout for case 1"}}]}}'
             for i in range(body.question_count)
         ])
         format_instr = f"""Create EXACTLY {body.question_count} distinct coding problems about "{body.topic}".
@@ -1916,7 +1882,8 @@ Return ONLY a JSON object in this EXACT format with ALL {body.question_count} qu
   ],
   "estimated_hours": {max(1, body.question_count // 2)}
 }}
-IMPORTANT: The "questions" array MUST contain EXACTLY {body.question_count} items. Each problem must be unique and clearly described."""
+IMPORTANT: The "questions" array MUST contain EXACTLY {body.question_count} items. Each problem must be unique and clearly described.
+Each problem's program reads its input from stdin and prints its answer to stdout. Give every problem 3-5 "test_cases" covering normal and edge inputs; "output" must be exactly what a correct Python solution prints."""
     else:
         format_instr = f"""Create EXACTLY {body.question_count} specific requirements/steps for this {body.task_type} task.
 Return ONLY a JSON object in this EXACT format:
@@ -1930,22 +1897,22 @@ Return ONLY a JSON object in this EXACT format:
 
     prompt = f"Generate a {body.difficulty}-level {body.task_type} task for a software training program on the topic: \"{body.topic}\"\n\n{format_instr}"
 
+    payload = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "system", "content": "You are an expert software trainer. Return ONLY valid JSON. No markdown, no explanation."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.5,
+        "max_tokens": 4096,
+        "response_format": {"type": "json_object"}
+    }
+    cached = await ai_cache.get(payload, bypass=body.no_cache)
+    if cached is not None:
+        return cached
+
     try:
-        async with httpx.AsyncClient(timeout=40.0) as client:
-            resp = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-                json={
-                    "model": "llama-3.3-70b-versatile",
-                    "messages": [
-                        {"role": "system", "content": "You are an expert software trainer. Return ONLY valid JSON. No markdown, no explanation."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.5,
-                    "max_tokens": 4096,
-                    "response_format": {"type": "json_object"}
-                }
-            )
+        resp = await groq_client.chat(payload)
         if not resp.is_success:
             raise HTTPException(status_code=502, detail=f"AI error: {resp.status_code}")
         data = resp.json()
@@ -1957,6 +1924,7 @@ Return ONLY a JSON object in this EXACT format:
             raw = raw[start_idx:end_idx+1]
         import json as json_lib
         task = json_lib.loads(raw)
+        await ai_cache.put(payload, "task", task)
         return task
     except json_lib.JSONDecodeError:
         raise HTTPException(status_code=500, detail="AI returned invalid format. Please try again.")
@@ -1979,7 +1947,6 @@ async def start_assessment_session(
 ):
     from app.models.project import AssessmentSession, Task, Assignment
     import json as json_lib
-    import random
     import uuid
     from datetime import datetime
 
@@ -1996,7 +1963,8 @@ async def start_assessment_session(
     # If a session exists but is not completed, resume it
     session = sessions[0] if sessions else None
     if session:
-        return {"session_id": session.id, "start_time": session.start_time.isoformat(), "resumed": True, "responses": session.responses}
+        return {"session_id": session.id, "start_time": session.start_time.isoformat(), "resumed": True,
+                "responses": json_lib.dumps(await session_view(db, session))}
 
     # Load the task/assignment for structured content
     if ref_type.upper() == "TASK":
@@ -2006,52 +1974,37 @@ async def start_assessment_session(
     if not item:
         raise HTTPException(status_code=404, detail="Assessment not found")
 
-    # Prepare frozen question list (Snapshot)
-    questions = []
-    if item.structured_content:
-        content = json_lib.loads(item.structured_content)
-        if "questions" in content:
-            questions = content["questions"]
-            # Shuffle ONLY if randomization is enabled in the assignment/task
-            if getattr(item, 'is_randomized', False):
-                try:
-                    random.shuffle(questions)
-                    for q in questions:
-                        opts = list(enumerate(q["options"]))
-                        random.shuffle(opts)
-                        
-                        # Re-map the correct answer index to its new shuffled position
-                        orig_answer_raw = q.get("answer", 0)
-                        try:
-                            orig_answer = int(orig_answer_raw)
-                        except (ValueError, TypeError):
-                            orig_answer = 0
-                        
-                        for new_idx, (old_idx, opt_text) in enumerate(opts):
-                            if old_idx == orig_answer:
-                                q["answer"] = new_idx
-                        q["options"] = [opt_text for old_idx, opt_text in opts]
-                except Exception as ex:
-                    print(f"Randomization error: {ex}")
-
-    # Create the session and store the FROZEN question snapshot immediately
+    # The item's questions are parsed and stored once per version; a randomized
+    # session keeps only its own order of them
+    from app.utils.question_sets import apply_order, question_sets, shuffled_order
+    snapshot = await question_sets.for_item("TASK" if ref_type.upper() == "TASK" else "ASSIGNMENT", item)
+    session_id = str(uuid.uuid4())
+    order = None
+    if getattr(item, 'is_randomized', False) and snapshot.questions:
+        order = shuffled_order(snapshot.questions, session_id)
+
     session = AssessmentSession(
-        id=str(uuid.uuid4()),
+        id=session_id,
         student_id=user.id,
         reference_id=ref_id,
         reference_type=ref_type.upper(),
-        responses=json_lib.dumps({"questions": questions}),
         start_time=datetime.utcnow()
     )
+    assign_questions(session, snapshot, order)
     db.add(session)
-    await db.commit() # Commit fully to ensure session.responses is persisted
+    await db.commit()
     await db.refresh(session)
 
+    # The server closes it at the time limit (or after 10 minutes without a heartbeat)
+    from app.utils.assessment_timer import assessment_timer
+    assessment_timer.track(session.id, session.start_time, getattr(item, 'time_limit', 0) or 0)
+
     return {
         "session_id": session.id, 
         "start_time": session.start_time.isoformat(), 
         "resumed": False,
-        "responses": session.responses
+        "responses": snapshot.responses_json if order is None
+        else json_lib.dumps({"questions": apply_order(snapshot.questions, order)})
     }
 
 
@@ -2077,16 +2030,22 @@ async def get_session_questions(
         time_limit = getattr(item, 'time_limit', 0)
 
     # Calculation for response
+    elapsed = (datetime.utcnow() - session.start_time).total_seconds()
     remaining_seconds = max(0, time_limit * 60 - int(elapsed)) if time_limit > 0 else None
 
     # Inactivity check (10-minute rule) for resumption
-    if not session.is_completed and session.updated_at:
-        inactive_seconds = (datetime.utcnow() - session.updated_at.replace(tzinfo=None)).total_seconds()
-        if inactive_seconds > 600: # 10 minutes
+    from app.utils.heartbeats import heartbeat_buffer, INACTIVITY_SECONDS
+    last_active = heartbeat_buffer.last_active(session)
+    if not session.is_completed and last_active:
+        inactive_seconds = (datetime.utcnow() - last_active).total_seconds()
+        if inactive_seconds > INACTIVITY_SECONDS:
             session.is_completed = True
             session.auto_submitted = True
             session.end_time = datetime.utcnow()
+            heartbeat_buffer.forget(session.id)
             await db.flush()
+            from app.utils.leaderboards import leaderboards
+            await leaderboards.record(db, session)
             return {
                 "session_id": session.id,
                 "is_completed": True,
@@ -2094,28 +2053,14 @@ async def get_session_questions(
                 "reason": "inactivity_timeout"
             }
 
-    # Smart content source: session.responses may contain either:
-    #   a) Randomized question data (has 'questions' key) → use it
-    #   b) Heartbeat-saved answers (has 'saved_answers' key only) → use item.structured_content instead
-    content_raw = None
-    if session.responses:
-        try:
-            sess_data = json_lib.loads(session.responses)
-            if isinstance(sess_data, dict) and "questions" in sess_data:
-                # This is a randomized question snapshot — use it
-                content_raw = session.responses
-            # else: heartbeat saved_answers — fall through to item.structured_content
-        except Exception:
-            pass
-
-    # Always fall back to the original item content
-    if content_raw is None:
-        content_raw = item.structured_content if item else None
-
+    # The session's frozen (possibly randomized) question snapshot, else the original item content
     content = {}
-    if content_raw:
+    snapshot = await load_questions(db, session)
+    if snapshot is not None:
+        content = {"questions": snapshot}
+    elif item and item.structured_content:
         try:
-            content = json_lib.loads(content_raw)
+            content = json_lib.loads(item.structured_content)
         except Exception:
             pass
 
@@ -2158,15 +2103,9 @@ async def get_session_questions(
 
     # Extract score and results from responses if available
     session_score = session.score or 0
-    session_results = []
-    ai_status = "n/a"
-    if session.responses:
-        try:
-            resp_data = json_lib.loads(session.responses)
-            session_results = resp_data.get("results", [])
-            ai_status = resp_data.get("ai_grading", "n/a")
-        except Exception:
-            pass
+    resp_data = grading_data(session)
+    session_results = resp_data.get("results", [])
+    ai_status = resp_data.get("ai_grading", "n/a")
 
     return {
         "session_id": session.id,
@@ -2192,103 +2131,62 @@ async def session_heartbeat(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    from app.models.project import AssessmentSession
-    import json as json_lib
+    from app.utils.heartbeats import heartbeat_buffer, INACTIVITY_SECONDS, MAX_TAB_SWITCHES
 
-    session = await db.get(AssessmentSession, session_id)
-    if not session or session.student_id != user.id:
+    # Live state is held in memory by this worker and written in batches
+    live = await heartbeat_buffer.get(db, session_id)
+    if not live or live.student_id != user.id:
         raise HTTPException(status_code=404, detail="Session not found")
-    if session.is_completed:
-        return {"status": "already_completed", "score": session.score}
+    if live.completed:
+        return {"status": "already_completed", "score": live.score}
 
     # Auto-submit check: check time limit server-side
-    if session.reference_type == "TASK":
-        item = await db.get(Task, session.reference_id)
-    else:
-        item = await db.get(Assignment, session.reference_id)
+    now = datetime.utcnow()
+    remaining_seconds = live.remaining_seconds(now)
 
-    time_limit = getattr(item, 'time_limit', 0) if item else 0
-    elapsed = (datetime.utcnow() - session.start_time).total_seconds()
-    remaining_seconds = max(0, time_limit * 60 - int(elapsed)) if time_limit > 0 else 9999
+    # Inactivity check (10-minute rule): the student resumes a session after being
+    # 'gone' for > 10 mins. Measured before this heartbeat counts as activity;
+    # also checked in get_questions
+    inactive = await heartbeat_buffer.inactive_seconds(db, live, now) > INACTIVITY_SECONDS
 
-    # Save answers WITHOUT overwriting the question data (CRITICAL STABILITY FIX)
-    if "answers" in body:
-        existing_resp = session.responses or "{}"
-        try:
-            import json as json_lib
-            resp_data = json_lib.loads(existing_resp)
-            if isinstance(resp_data, dict) and "questions" in resp_data:
-                # Preserve question data, merge saved answers
-                resp_data["saved_answers"] = body["answers"]
-                session.responses = json_lib.dumps(resp_data)
-            else:
-                # No question data yet, just save answers
-                session.responses = json_lib.dumps({"saved_answers": body["answers"]})
-        except Exception:
-            pass
-
-    # Log proctoring violations
-    violation_sent = False
-    
-    if body.get("tab_switched"):
-        session.tab_switch_count = (session.tab_switch_count or 0) + 1
-        violation_sent = "TAB_SWITCHING"
-    if body.get("fullscreen_exited"):
-        session.fullscreen_exit_count = (session.fullscreen_exit_count or 0) + 1
-        violation_sent = "FULLSCREEN_EXIT"
-    if body.get("face_violation"):
-        session.face_violation_count = (session.face_violation_count or 0) + 1
-        violation_sent = "FACE_LOSS"
-    if body.get("mic_violation"):
-        session.mic_violation_count = (session.mic_violation_count or 0) + 1
-        violation_sent = "MIC_OFF"
+    # Buffer the latest answers; proctoring violations are written right away
+    violation_sent = live.record(body, now)
+    if violation_sent or not heartbeat_buffer.coalescing:
+        await heartbeat_buffer.write(db, live)
 
     # Emit real-time alert if a violation occurred
-    if violation_sent and item and item.batch_id:
+    if violation_sent and live.batch_id:
         background_tasks.add_task(
             emit_violation_alert, 
-            item.batch_id, 
+            live.batch_id, 
             {
                 "student_id": user.id,
                 "student_name": user.name,
                 "type": violation_sent,
-                "timestamp": datetime.utcnow().isoformat(),
-                "reference_id": session.reference_id,
-                "reference_type": session.reference_type
+                "timestamp": now.isoformat(),
+                "reference_id": live.reference_id,
+                "reference_type": live.reference_type
             }
         )
 
-
-    # Inactivity check (10-minute rule)
-    # If the student resume a session after being 'gone' for > 10 mins
-    # This is checked here and in get_questions
-    if session.updated_at:
-        inactive_seconds = (datetime.utcnow() - session.updated_at.replace(tzinfo=None)).total_seconds()
-        if inactive_seconds > 600: # 10 minutes
-            session.is_completed = True
-            session.auto_submitted = True
-            session.end_time = datetime.utcnow()
-            await db.flush()
-            return {"status": "cancelled", "reason": "inactivity_timeout"}
-
-    await db.flush()
+    from app.utils.assessment_timer import auto_submit, cancel_inactive
+    if inactive:
+        await cancel_inactive(db, live.id, now)
+        return {"status": "cancelled", "reason": "inactivity_timeout"}
 
     # Hard cut-off: auto-submit on excessive tab switches (optional, kept for backward compatibility)
-    if remaining_seconds <= 0 or (session.tab_switch_count or 0) >= 10: # Increased limit since we have 30s grace
+    if remaining_seconds <= 0 or live.count("tab_switch_count") >= MAX_TAB_SWITCHES: # Increased limit since we have 30s grace
         reason = "time_expired" if remaining_seconds <= 0 else "excessive_violations"
-        session.is_completed = True
-        session.auto_submitted = True
-        session.end_time = datetime.utcnow()
-        session.completion_time_seconds = int(elapsed)
-        await db.flush()
+        # Scored on the answers saved so far; the client's follow-up submit finds it completed
+        await auto_submit(db, live.id)
         return {"status": "auto_submitted", "reason": reason}
 
     return {
         "status": "saved",
         "remaining_seconds": remaining_seconds,
-        "tab_switch_count": session.tab_switch_count,
-        "fullscreen_exit_count": session.fullscreen_exit_count,
-        "face_violation_count": session.face_violation_count,
+        "tab_switch_count": live.count("tab_switch_count"),
+        "fullscreen_exit_count": live.count("fullscreen_exit_count"),
+        "face_violation_count": live.count("face_violation_count"),
     }
 
 
@@ -2296,12 +2194,10 @@ async def session_heartbeat(
 async def submit_assessment(
     session_id: str,
     body: dict,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     from app.models.project import AssessmentSession
-    import json as json_lib
 
     session = await db.get(AssessmentSession, session_id)
     if not session or session.student_id != user.id:
@@ -2309,226 +2205,42 @@ async def submit_assessment(
     if session.is_completed:
         return {"status": "already_completed", "score": session.score}
 
-    if session.reference_type == "TASK":
-        item = await db.get(Task, session.reference_id)
-    else:
-        item = await db.get(Assignment, session.reference_id)
-
-    student_answers = body.get("answers", {})  # {question_index: selected_option_index}
-    
-    # NEW: If student_answers has a 'content' key that looks like JSON, parse it.
-    # This handles the frontend's current behavior of stringifying mcqAnswers into 'content'.
-    if isinstance(student_answers, dict) and "content" in student_answers:
-        content_val = student_answers["content"]
-        if isinstance(content_val, str) and content_val.strip().startswith('{'):
-            try:
-                student_answers = json_lib.loads(content_val)
-            except:
-                pass
-    score = 0.0
-    results = []
-
-    # Grade MCQ answers if structured content available
-    # CRITICAL: Prefer session snapshot questions to maintain order stability
-    questions_source = None
-    if session.responses and session.responses.strip().startswith('{'):
-        try:
-            sess_content = json_lib.loads(session.responses)
-            if "questions" in sess_content:
-                questions_source = sess_content["questions"]
-        except Exception:
-            pass
-            
-    # Fallback to original structured content only if session snapshot is missing
-    if questions_source is None and item and item.structured_content:
-        try:
-            item_content = json_lib.loads(item.structured_content)
-            questions_source = item_content.get("questions", [])
-        except Exception:
-            pass
+    # Counters and answers this worker buffered from heartbeats go in before the submit
+    from app.utils.heartbeats import heartbeat_buffer
+    await heartbeat_buffer.settle(db, session_id)
 
-    # Determine task type upfront so MCQ grader can skip coding answers
-    is_pure_coding = False
-    if questions_source:
-        first_q = questions_source[0] if questions_source else {}
-        if not first_q.get("options"):  # coding questions have no options
-            is_pure_coding = True
-    elif student_answers:  # no questions source at all = pure coding fallback
-        is_pure_coding = True
+    # The server-side timer may be auto-submitting the same session right now
+    from app.utils.assessment_timer import claim_session
+    if not await claim_session(db, session_id):
+        await db.refresh(session)
+        return {"status": "already_completed", "score": session.score}
 
-    if questions_source and not is_pure_coding:
-        try:
-            questions = questions_source
-            total = len(questions)
-            if total > 0:
-                correct_count = 0
-                for i, q in enumerate(questions):
-                    selected_raw = student_answers.get(str(i)) or student_answers.get(i)
-                    correct = q.get("answer", -1)
-                    try:
-                        correct = int(correct)
-                    except (ValueError, TypeError):
-                        correct = -1
-                    # Only grade if selected is a number (MCQ selection), not code string
-                    try:
-                        selected_int = int(selected_raw) if selected_raw is not None else None
-                    except (ValueError, TypeError):
-                        selected_int = None
-                    is_correct = selected_int is not None and selected_int == correct
-                    if is_correct:
-                        correct_count += 1
-                    results.append({
-                        "index": i,
-                        "question": q.get("question", ""),
-                        "options": q.get("options", []),
-                        "selected": selected_raw,
-                        "correct": correct,
-                        "is_correct": is_correct,
-                        "explanation": q.get("explanation", ""),
-                        "topic": q.get("topic", ""),
-                    })
-                score = round((correct_count / total) * 100, 1)
-        except Exception as e:
-            print(f"Grading error: {e}")
-
-    # ── Save submission immediately (do NOT wait for AI grading) ──
-    # This ensures the response is returned within Render's 30s timeout.
-    elapsed = int((datetime.utcnow() - session.start_time).total_seconds())
-    session.score = score
-    session.is_completed = True
-    session.end_time = datetime.utcnow()
-    session.completion_time_seconds = elapsed
-    # Store results in session.responses
-    # NEW: Merge results into existing session.responses (which may hold randomized questions)
-    existing_responses = {}
-    if session.responses and session.responses.strip().startswith('{'):
-        try:
-            existing_responses = json_lib.loads(session.responses)
-        except:
-            pass
-            
-    existing_responses.update({
-        "answers": student_answers,
-        "results": results,
-        "final_score": score,
-        "total_questions": len(questions_source) if questions_source else 0,
-        "ai_grading": "pending" if is_pure_coding else "n/a"
-    })
-    session.responses = json_lib.dumps(existing_responses)
-    
-    # ── Map to AssignmentSubmission for UI compatibility ──
-    if session.reference_type == "ASSIGNMENT":
-        from app.models.project import AssignmentSubmission
-        res_sub = await db.execute(select(AssignmentSubmission).where(
-            AssignmentSubmission.assignment_id == session.reference_id,
-            AssignmentSubmission.student_id == user.id
-        ))
-        existing_sub = res_sub.scalars().first()
-        if existing_sub:
-            existing_sub.marks = score
-            if not is_pure_coding:
-                existing_sub.feedback = f"Automatically graded: {score}%"
-        else:
-            raw_content = ""
-            if is_pure_coding and student_answers:
-                # Merge student's coding answers into a single readable string for the legacy view
-                raw_content = "\n\n".join([str(v) for v in student_answers.values() if str(v).strip()])
-            
-            new_sub = AssignmentSubmission(
-                id=str(uuid.uuid4()),
-                assignment_id=session.reference_id,
-                student_id=user.id,
-                content=raw_content or "Submitted via Proctored Session",
-                marks=score,
-                feedback="AI Grading Pending..." if is_pure_coding else f"Automatically graded: {score}%"
-            )
-            db.add(new_sub)
+    # MCQ answers are graded now, coding answers are queued for the AI grader
+    from app.utils.assessment_grading import submit_session
+    outcome = await submit_session(db, session, body.get("answers", {}))
+    return {"status": "submitted", **outcome}
 
-    await db.flush()
 
-    # ── Kick off AI grading as a fire-and-forget background task ──
-    if is_pure_coding and student_answers:
-        import asyncio
-        from app.utils.ai_grader import evaluate_submission
-
-        async def _grade_in_background():
-            try:
-                student_code_block = ""
-                code_count = 0
-                for idx, code in student_answers.items():
-                    # Only include string answers that look like actual code (not MCQ option '0', '1', etc)
-                    # For multi-question tasks, the keys '0', '1', '2' hold code if it's a pure coding task.
-                    if isinstance(code, str) and len(code.strip()) > 1:
-                        # Exclude single digit strings which are likely unintentional MCQ selections
-                        if code.strip().isdigit() and len(code.strip()) == 1:
-                            continue
-                            
-                        student_code_block += f"### PROBLEM {int(idx)+1}:\n{code}\n\n"
-                        code_count += 1
-                        
-                if not student_code_block:
-                    print(f"[AI Grading] ⚠️ No valid code found to grade for session {session_id}")
-                    return
-
-                print(f"[AI Grading] 🚀 Sending {code_count} problems ({len(student_code_block)} chars) to Groq for session {session_id}...")
-
-                task_context = f"Title: {item.title}\nDescription: {item.description or ''}\n"
-                if item.structured_content:
-                    task_context += f"Detailed Requirements: {item.structured_content}"
-
-                try:
-                    eval_res = await asyncio.wait_for(
-                        asyncio.to_thread(evaluate_submission, task_context, student_code_block),
-                        timeout=60.0 # Increased timeout for larger multi-question tasks
-                    )
-                except asyncio.TimeoutError:
-                    eval_res = {"score": 0, "feedback": "AI grading timed out. Your trainer will review this submission manually."}
-
-                ai_score = float(eval_res.get("score", 0))
-                ai_feedback = eval_res.get("feedback", "No feedback.")
-
-                # Open a fresh DB session to update the score
-                from app.database import AsyncSessionLocal
-                async with AsyncSessionLocal() as bg_db:
-                    from app.models.project import AssessmentSession as AS
-                    bg_session = await bg_db.get(AS, session_id)
-                    if bg_session:
-                        import json as jl
-                        resp = jl.loads(bg_session.responses or "{}")
-                        
-                        # Store feedback and update the score
-                        feedback_entry = {
-                            "type": "coding_feedback",
-                            "score": ai_score,
-                            "feedback": ai_feedback
-                        }
-                        
-                        current_results = resp.get("results", [])
-                        # Ensure we don't duplicate feedback
-                        filtered_results = [r for r in current_results if r.get("type") != "coding_feedback"]
-                        filtered_results.append(feedback_entry)
-                        
-                        resp["results"] = filtered_results
-                        resp["ai_grading"] = "done"
-                        bg_session.score = ai_score
-                        bg_session.responses = jl.dumps(resp)
-                        
-                        await bg_db.commit()
-                        print(f"[AI Grading] ✅ Session {session_id} successfully graded: {ai_score}%")
-            except Exception as bg_err:
-                print(f"[AI Grading Background] ❌ EXCEPTION: {bg_err}")
-                import traceback
-                traceback.print_exc()
-
-        background_tasks.add_task(_grade_in_background)
+@router.post("/assessments/{session_id}/regrade")
+async def regrade_assessment(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    _user: User = Depends(require_roles(Role.SUPER_ADMIN, Role.ADMIN, Role.TRAINER)),
+):
+    from app.models.project import AssessmentSession
+    from app.utils.assessment_grading import grading_queue
 
-    return {
-        "status": "submitted",
-        "score": score,
-        "completion_time_seconds": elapsed,
-        "results": results,
-        "ai_grading": "pending" if is_pure_coding else "n/a",
-    }
+    session = await db.get(AssessmentSession, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not session.is_completed:
+        raise HTTPException(status_code=400, detail="Session has not been submitted yet")
+    # A re-grade asks the AI again instead of returning the cached grade
+    resp = grading_data(session)
+    resp["ai_grading_fresh"] = True
+    set_grading_data(session, resp)
+    queued = await grading_queue.enqueue(db, session_id)
+    return {"status": "queued" if queued else "already_queued"}
 
 
 @router.get("/assessments/{ref_id}/ranking")
@@ -2537,45 +2249,9 @@ async def get_assessment_ranking(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    from app.models.project import AssessmentSession
-
-    # Get all completed sessions for this assessment, sorted by score DESC then completion time ASC
-    result = await db.execute(
-        select(AssessmentSession, User.name)
-        .join(User, AssessmentSession.student_id == User.id)
-        .where(AssessmentSession.reference_id == ref_id, AssessmentSession.is_completed == True)
-        .order_by(AssessmentSession.score.desc(), AssessmentSession.completion_time_seconds.asc())
-        .limit(10)
-    )
-    rows = result.all()
-
-    ranking = []
-    current_rank = None
-    for i, (s, name) in enumerate(rows):
-        entry = {
-            "rank": i + 1, "name": name,
-            "score": s.score,
-            "completion_time_seconds": s.completion_time_seconds,
-            "auto_submitted": s.auto_submitted,
-        }
-        ranking.append(entry)
-        if s.student_id == user.id:
-            current_rank = i + 1
-
-    # Find current user's rank if not in top 10
-    if current_rank is None:
-        all_result = await db.execute(
-            select(AssessmentSession)
-            .where(AssessmentSession.reference_id == ref_id, AssessmentSession.is_completed == True)
-            .order_by(AssessmentSession.score.desc(), AssessmentSession.completion_time_seconds.asc())
-        )
-        all_sessions = all_result.scalars().all()
-        for i, s in enumerate(all_sessions):
-            if s.student_id == user.id:
-                current_rank = i + 1
-                break
-
-    return {"ranking": ranking, "my_rank": current_rank}
+    # Sorted by score DESC then completion time ASC, kept up to date as sessions are graded
+    from app.utils.leaderboards import leaderboards
+    return await leaderboards.ranking(db, ref_id, user.id)
 
 
 @router.post("/run-code")
@@ -2583,7 +2259,9 @@ async def run_code(
     body: dict,
     _user: User = Depends(get_current_user),
 ):
-    """Secure code execution proxy to Piston API."""
+    """Run student code on the configured execution backends (local sandbox first by default)."""
+    from app.utils.code_runner import code_executor, RunnerBusy, RunnerUnavailable
+
     language = body.get("language", "python")
     code = body.get("code", "")
     stdin = body.get("stdin", "")
@@ -2593,111 +2271,28 @@ async def run_code(
         return {"stdout": "", "stderr": "No code provided.", "code": 1}
 
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(
-                "https://emkc.org/api/v2/piston/execute",
-                json={
-                    "language": language,
-                    "version": version,
-                    "files": [{"content": code}],
-                    "stdin": stdin
-                }
-            )
-        if not resp.is_success:
-            err_txt = resp.text
-            raise Exception("piston_unavailable")
-        data = resp.json()
-        run_result = data.get("run", {})
-        compile_result = data.get("compile", {})
-        return {
-            "stdout": run_result.get("stdout", ""),
-            "stderr": run_result.get("stderr", "") or compile_result.get("stderr", ""),
-            "code": run_result.get("code", 0),
-            "signal": run_result.get("signal"),
-            "language": data.get("language"),
-            "version": data.get("version"),
-        }
-    except Exception as e:
-        # Fallback to Compiler Explorer (Godbolt) API
-        lang_str = body.get("language", language).lower()
-        gb_compiler = "python311"
-        if "java" in lang_str and "javascript" not in lang_str:
-            gb_compiler = "java2100"
-        elif "c++" in lang_str or "cpp" in lang_str:
-            gb_compiler = "g141"
-        elif "javascript" in lang_str or "node" in lang_str:
-            gb_compiler = "v8113"
-
-        try:
-            # `code` was already extracted at top of function from body["code"]
-            # Do NOT re-read from body["files"] - frontend sends plain {code, language, stdin}
-            source_code = code  # already set from body.get("code", "") above
-            stdin_data = body.get("stdin", stdin)
-
-            # Godbolt always saves Java files as "example.java"
-            # So rename the public class to "example" to avoid compile error
-            if "java" in lang_str and "javascript" not in lang_str:
-                import re
-                source_code = re.sub(
-                    r'public\s+class\s+\w+',
-                    'public class example',
-                    source_code
-                )
-
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                res = await client.post(
-                    f"https://godbolt.org/api/compiler/{gb_compiler}/compile",
-                    json={
-                        "source": source_code,
-                        "options": {
-                            "userArguments": "",
-                            "executeParameters": {"args": [], "stdin": stdin_data},
-                            "compilerOptions": {"executorRequest": True}
-                        },
-                        "filters": {"execute": True}
-                    },
-                    headers={"Accept": "application/json"}
-                )
-
-                if not res.is_success:
-                    raise Exception(f"Godbolt execution failed: {res.status_code}")
-
-                data = res.json()
-
-                # Godbolt returns stdout/stderr as list of {"text": "..."} dicts
-                out_arr = data.get("stdout", [])
-                err_arr = data.get("stderr", [])
-                build_err_arr = data.get("buildResult", {}).get("stderr", [])
-
-                stdout_str = "\n".join(x.get("text", "") for x in out_arr)
-                stderr_str = "\n".join(x.get("text", "") for x in err_arr + build_err_arr)
-
-                return {
-                    "stdout": stdout_str,
-                    "stderr": stderr_str,
-                    "code": data.get("code", 0),
-                    "signal": None,
-                    "language": lang_str,
-                    "version": gb_compiler,
-                }
-
-        except httpx.TimeoutException:
-            return {"stdout": "", "stderr": "Execution timed out (15s limit).", "code": 1}
-        except Exception as ex:
-            raise HTTPException(status_code=502, detail=f"Code runner unavailable: Both primary and cloud compilers failed. Details: {str(ex)}")
+        return await code_executor.run(language, code, stdin, version)
+    except RunnerBusy:
+        raise HTTPException(status_code=429, detail="Code runner is busy. Please try again in a few seconds.",
+                            headers={"Retry-After": "5"})
+    except RunnerUnavailable as ex:
+        raise HTTPException(status_code=502, detail=f"Code runner unavailable: all configured runners failed. Details: {ex}")
 
 
 @router.get("/piston/runtimes")
-async def get_runtimes(_user: User = Depends(get_current_user)):
-    """Fetch available Piston language runtimes."""
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get("https://emkc.org/api/v2/piston/runtimes")
-        if resp.is_success:
-            return resp.json()
-        return []
-    except Exception:
-        return []
+async def get_runtimes(request: Request, _user: User = Depends(get_current_user)):
+    """Available language runtimes (Piston format), served from the in-memory runtime catalogue."""
+    from fastapi.responses import JSONResponse
+    from app.config import settings
+    from app.utils.runtime_catalogue import runtime_catalogue
+
+    runtimes = await runtime_catalogue.get()
+    headers = {"ETag": runtime_catalogue.etag,
+               "Cache-Control": f"private, max-age={settings.RUNTIMES_MAX_AGE_SECONDS}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if runtime_catalogue.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(runtimes, headers=headers)
 
 
 class ChatMessage(PydanticBaseModel):
@@ -2800,20 +2395,13 @@ INSTRUCTIONS: Use this data to provide personalized mentorship. If attendance is
     messages.append({"role": "user", "content": body.message})
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "llama-3.1-8b-instant",
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 512
-                }
-            )
+        # No 429 retries: the student is waiting, so say the AI is busy instead of backing off for seconds
+        resp = await groq_client.chat({
+            "model": "llama-3.1-8b-instant",
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 512
+        }, timeout=30.0, max_retries=0)
         if resp.status_code == 429:
             raise HTTPException(status_code=429, detail="AI is a bit busy. Please try again in a moment.")
         if not resp.is_success:
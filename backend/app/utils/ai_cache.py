@@ -0,0 +1,135 @@
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.ai_cache import AIResultCache
+from app.utils.pg_listener import pg_listener
+
+AI_CACHE_CHANNEL = "lms_ai_cache_cleared"
+
+
+class AICache:
+    """
+    Cache of Groq results keyed by a SHA-256 of the whole request payload (model,
+    messages, temperature, max_tokens, ...), so a change to the prompt or to any
+    parameter is a different key and entries never need invalidating.
+
+    A per-worker LRU sits in front of the shared `ai_result_cache` table. Entries
+    expire after `ttl_hours`; the table is trimmed to the `max_entries` most
+    recently used rows. Callers store successful results only, and pass
+    bypass=True to skip the lookup (the fresh result then replaces the entry).
+    """
+
+    def __init__(self, enabled: bool, ttl_hours: int, max_entries: int, memory_entries: int):
+        self.enabled = enabled
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: OrderedDict[str, tuple[datetime, str]] = OrderedDict()  # key -> (expires_at, JSON)
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+    def forget(self) -> None:
+        self._memory.clear()
+
+    def _remember(self, key: str, expires_at: datetime, raw: str) -> None:
+        self._memory[key] = (expires_at, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, payload: dict, bypass: bool = False):
+        """The cached result for this request payload, or None."""
+        if not self.enabled:
+            return None
+        if bypass:
+            self.counters["bypassed"] += 1
+            return None
+        key = self.key(payload)
+        now = datetime.utcnow()
+        entry = self._memory.get(key)
+        if entry and entry[0] > now:
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return json.loads(entry[1])
+
+        try:
+            async with AsyncSessionLocal() as db:
+                row = await db.get(AIResultCache, key)
+                if row is None or row.expires_at <= now:
+                    self.counters["misses"] += 1
+                    return None
+                row.hits += 1
+                row.last_used_at = now
+                await db.commit()
+        except Exception as e:
+            print(f"[AI Cache] Lookup failed: {e}")
+            self.counters["misses"] += 1
+            return None
+        self._remember(key, row.expires_at, row.value)
+        self.counters["db_hits"] += 1
+        return json.loads(row.value)
+
+    async def put(self, payload: dict, kind: str, value) -> None:
+        """Store a successful result for this request payload."""
+        if not self.enabled:
+            return
+        key, raw = self.key(payload), json.dumps(value)
+        now = datetime.utcnow()
+        self._remember(key, now + self.ttl, raw)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(AIResultCache(key=key, kind=kind, value=raw, hits=0,
+                                             expires_at=now + self.ttl, last_used_at=now))
+                await db.commit()
+                await self._trim(db)
+            self.counters["stores"] += 1
+        except IntegrityError:
+            pass  # another worker stored the same result first
+        except Exception as e:
+            print(f"[AI Cache] Store failed: {e}")
+
+    async def _trim(self, db: AsyncSession) -> None:
+        result = await db.execute(delete(AIResultCache).where(AIResultCache.expires_at <= datetime.utcnow()))
+        evicted = result.rowcount
+        total = (await db.execute(select(func.count()).select_from(AIResultCache))).scalar()
+        if total > self.max_entries:
+            least_recent = select(AIResultCache.key).order_by(AIResultCache.last_used_at).limit(total - self.max_entries)
+            result = await db.execute(delete(AIResultCache).where(AIResultCache.key.in_(least_recent)))
+            evicted += result.rowcount
+        await db.commit()
+        self.counters["evictions"] += evicted
+
+    async def clear(self, db: AsyncSession) -> None:
+        await db.execute(delete(AIResultCache))
+        await pg_listener.notify(db, AI_CACHE_CHANNEL, "")
+        self.forget()
+
+    async def stats(self, db: AsyncSession) -> dict:
+        hits = self.counters["memory_hits"] + self.counters["db_hits"]
+        lookups = hits + self.counters["misses"]
+        stored = (await db.execute(select(func.count()).select_from(AIResultCache))).scalar()
+        return {
+            "enabled": self.enabled,
+            **self.counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "memory_entries": len(self._memory),
+            "stored_entries": stored,
+            "max_entries": self.max_entries,
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+        }
+
+
+ai_cache = AICache(settings.AI_CACHE_ENABLED, settings.AI_CACHE_TTL_HOURS,
+                   settings.AI_CACHE_MAX_ENTRIES, settings.AI_CACHE_MEMORY_ENTRIES)
+pg_listener.subscribe(AI_CACHE_CHANNEL, lambda _payload: ai_cache.forget())
@@ -2,7 +2,9 @@ import os
 import io
 import json
 import PyPDF2
-import httpx
+
+from app.utils.ai_cache import ai_cache
+from app.utils.groq_client import groq_client
 
 # Groq API Key — must be set via GROQ_API_KEY environment variable in Render
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
@@ -13,6 +15,10 @@ if not GROQ_API_KEY:
 MODEL_NAME = "llama-3.3-70b-versatile"
 
 
+class AIGradingError(Exception):
+    """The AI could not grade a submission (raised instead of the fallback result when asked to)."""
+
+
 def extract_text_from_pdf(pdf_bytes: bytes) -> str:
     """Extracts raw text from a PDF byte array."""
     try:
@@ -28,34 +34,36 @@ def extract_text_from_pdf(pdf_bytes: bytes) -> str:
         return ""
 
 
-def generate_assignment_instructions(topic: str) -> str:
+async def generate_assignment_instructions(topic: str, bypass_cache: bool = False) -> str:
     """
     Generates structured assignment instructions based on a topic string using Groq.
+    Results are cached per prompt; pass bypass_cache=True to force a new generation.
     """
     if not GROQ_API_KEY:
         return "AI not configured. Please contact admin."
         
     try:
         prompt = f"Create an assignment purely based on this topic/command: {topic}"
-        
-        with httpx.Client(timeout=40.0) as client:
-            resp = client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"},
-                json={
-                    "model": MODEL_NAME,
-                    "messages": [
-                        {"role": "system", "content": "You are a senior tech lead designing a challenging, real-world assignment for trainees. Output ONLY clean markdown format. Include Prerequisites, Objective, Constraints, and Grading Criteria. Keep it under 500 words."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.5,
-                    "max_tokens": 1024
-                }
-            )
+        payload = {
+            "model": MODEL_NAME,
+            "messages": [
+                {"role": "system", "content": "You are a senior tech lead designing a challenging, real-world assignment for trainees. Output ONLY clean markdown format. Include Prerequisites, Objective, Constraints, and Grading Criteria. Keep it under 500 words."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.5,
+            "max_tokens": 1024
+        }
+        cached = await ai_cache.get(payload, bypass=bypass_cache)
+        if cached is not None:
+            return cached
+
+        resp = await groq_client.chat(payload)
             
         if resp.is_success:
             data = resp.json()
-            return data["choices"][0]["message"]["content"].strip()
+            instructions = data["choices"][0]["message"]["content"].strip()
+            await ai_cache.put(payload, "instructions", instructions)
+            return instructions
         else:
             print(f"[AI Grader] Groq generation error: {resp.status_code}")
             return "Failed to generate instructions via Groq. Please try again."
@@ -65,43 +73,49 @@ def generate_assignment_instructions(topic: str) -> str:
         return "Failed to generate instructions. Please try manually uploading a PDF."
 
 
-def evaluate_submission(assignment_instructions: str, student_content: str, max_marks: int = 100) -> dict:
+async def evaluate_submission(assignment_instructions: str, student_content: str, max_marks: int = 100,
+                              bypass_cache: bool = False, raise_errors: bool = False) -> dict:
     """
     Evaluates a student's submission text/code against the assignment requirements using Groq.
-    Returns a dict with `score` (integer) and `feedback` (str).
+    Returns a dict with `score` (integer) and `feedback` (str). Identical submissions against
+    identical instructions reuse the cached grade unless bypass_cache=True.
+    When the AI cannot grade, interactive callers get score 0 with a "grade manually"
+    message; background jobs pass raise_errors=True to get AIGradingError and retry.
     """
     if not GROQ_API_KEY:
+        if raise_errors:
+            raise AIGradingError("GROQ_API_KEY not set")
         return {"score": 0, "feedback": "AI Not Configured."}
         
     try:
         prompt = f"### ASSIGNMENT INSTRUCTIONS:\n{assignment_instructions}\n\n### STUDENT SUBMISSION:\n{student_content}\n\nEvaluate the student submission."
         
-        with httpx.Client(timeout=40.0) as client:
-            resp = client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"},
-                json={
-                    "model": MODEL_NAME,
-                    "messages": [
-                        {
-                            "role": "system", 
-                            "content": (
-                                f"You are an encouraging yet accurate coding instructor grading a submission. "
-                                f"The submission may contain MULTIPLE problems (marked as PROBLEM 1, PROBLEM 2, etc.). "
-                                f"You MUST evaluate ALL problems provided and provide a single holistic score (out of {max_marks}) considering the overall quality and completion of all tasks. "
-                                f"If multiple problems are solved, summarize the feedback for each. "
-                                f"IMPORTANT: You MUST award partial credit (e.g., 33, 50, 66) if some problems are solved correctly but others are missing, incomplete, or incorrect. Do not give a 0 unless NO problems were solved correctly. "
-                                f"Return ONLY a strictly valid JSON object with EXACTLY two keys: 'score' (an integer) and 'feedback' (a string). "
-                                f"Return no other text."
-                            )
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1024,
-                    "response_format": {"type": "json_object"}
-                }
-            )
+        payload = {
+            "model": MODEL_NAME,
+            "messages": [
+                {
+                    "role": "system", 
+                    "content": (
+                        f"You are an encouraging yet accurate coding instructor grading a submission. "
+                        f"The submission may contain MULTIPLE problems (marked as PROBLEM 1, PROBLEM 2, etc.). "
+                        f"You MUST evaluate ALL problems provided and provide a single holistic score (out of {max_marks}) considering the overall quality and completion of all tasks. "
+                        f"If multiple problems are solved, summarize the feedback for each. "
+                        f"IMPORTANT: You MUST award partial credit (e.g., 33, 50, 66) if some problems are solved correctly but others are missing, incomplete, or incorrect. Do not give a 0 unless NO problems were solved correctly. "
+                        f"Return ONLY a strictly valid JSON object with EXACTLY two keys: 'score' (an integer) and 'feedback' (a string). "
+                        f"Return no other text."
+                    )
+                },
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 1024,
+            "response_format": {"type": "json_object"}
+        }
+        cached = await ai_cache.get(payload, bypass=bypass_cache)
+        if cached is not None:
+            return cached
+
+        resp = await groq_client.chat(payload)
             
         if resp.is_success:
             data = resp.json()
@@ -115,16 +129,24 @@ def evaluate_submission(assignment_instructions: str, student_content: str, max_
             except (ValueError, TypeError):
                 score_val = 0
                 
-            return {
+            result = {
                 "score": score_val,
                 "feedback": result_json.get("feedback", "No feedback provided by AI.")
             }
+            await ai_cache.put(payload, "grading", result)
+            return result
         else:
             print(f"[AI Grader] Groq grading error: {resp.status_code}")
+            if raise_errors:
+                raise AIGradingError(f"Groq grading error: {resp.status_code}")
             return {"score": 0, "feedback": f"AI Evaluation failed (Status {resp.status_code})."}
-            
+
+    except AIGradingError:
+        raise
     except Exception as e:
         print(f"[AI Grader] Error grading submission: {e}")
+        if raise_errors:
+            raise AIGradingError(f"Error grading submission: {e!r}") from e
         return {
             "score": 0,
             "feedback": "AI Evaluation failed. Please grade manually."
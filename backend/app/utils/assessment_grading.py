@@ -0,0 +1,330 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, or_, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.job import BackgroundJob
+from app.models.project import AssessmentSession, AssignmentSubmission, Task, Assignment
+from app.utils.assessment_store import (
+    grading_data, load_answers, load_questions, migrate, normalize_answers, save_answers, set_grading_data,
+)
+from app.utils.job_queue import JobQueue
+from app.utils.leaderboards import leaderboards
+
+GRADING_TIMEOUT_SECONDS = 60.0  # larger multi-question tasks take a while
+# Completed sessions older than this are not swept back into the queue at startup
+RECOVERY_WINDOW_DAYS = 7
+
+
+def _set_feedback(resp: dict, score: float, feedback: str) -> None:
+    feedback_entry = {"type": "coding_feedback", "score": score, "feedback": feedback}
+    # Ensure we don't duplicate feedback when a session is re-graded
+    results = [r for r in resp.get("results", []) if r.get("type") != "coding_feedback"]
+    results.append(feedback_entry)
+    resp["results"] = results
+
+
+def _set_test_results(resp: dict, entries: list[dict]) -> None:
+    results = [r for r in resp.get("results", []) if r.get("type") != "test_results"]
+    resp["results"] = results + entries
+
+
+def _is_code(answer) -> bool:
+    # Only string answers that look like actual code (not MCQ option '0', '1', etc)
+    return isinstance(answer, str) and len(answer.strip()) > 1
+
+
+async def _session_questions(db: AsyncSession, session: AssessmentSession, item) -> list:
+    """The session's question snapshot, falling back to the item's structured_content."""
+    snapshot = await load_questions(db, session)
+    if snapshot:
+        return snapshot
+    if item and item.structured_content:
+        try:
+            content = json.loads(item.structured_content)
+        except ValueError:
+            return []
+        if isinstance(content, dict) and isinstance(content.get("questions"), list):
+            return content["questions"]
+    return []
+
+
+async def _run_question_tests(session_id: str, questions: list, student_answers: dict) -> dict[int, dict]:
+    """Run every question that has test cases against the student's answer; {index: test_results entry}."""
+    from app.utils.code_runner import RunnerUnavailable
+    from app.utils.code_tests import question_cases, run_cases
+
+    entries = {}
+    for i, q in enumerate(questions):
+        cases = question_cases(q) if isinstance(q, dict) else []
+        if not cases:
+            continue
+        code = student_answers.get(str(i))
+        if _is_code(code):
+            try:
+                outcome = await run_cases(q.get("language") or "python", code, cases)
+            except RunnerUnavailable as e:
+                # Leave this question to the AI grader
+                print(f"[Code Tests] ⚠️ Could not run tests for session {session_id}, problem {i + 1}: {e}")
+                continue
+        else:
+            outcome = {"passed": 0, "total": len(cases), "cases": []}
+        entries[i] = {"type": "test_results", "index": i, "question": q.get("question", ""), **outcome}
+    return entries
+
+
+async def submit_session(db: AsyncSession, session: AssessmentSession, answers=None,
+                         auto_submitted: bool = False) -> dict:
+    """
+    Score and close a session. MCQ answers are graded on the spot, coding answers
+    are queued for the AI grader. `answers` are the final answers sent with a
+    submit; without them the stored answers are graded (auto-submit).
+    Returns the score, results, ai_grading state and completion time.
+    """
+    model = Task if session.reference_type == "TASK" else Assignment
+    item = await db.get(model, session.reference_id)
+
+    # {question_index: selected_option_index}
+    student_answers = normalize_answers(answers) if answers is not None else await load_answers(db, session)
+    score = 0.0
+    results = []
+
+    # CRITICAL: Prefer session snapshot questions to maintain order stability
+    questions_source = await _session_questions(db, session, item)
+
+    # Determine task type upfront so MCQ grader can skip coding answers
+    is_pure_coding = False
+    if questions_source:
+        first_q = questions_source[0] if questions_source else {}
+        if not first_q.get("options"):  # coding questions have no options
+            is_pure_coding = True
+    elif student_answers:  # no questions source at all = pure coding fallback
+        is_pure_coding = True
+
+    if questions_source and not is_pure_coding:
+        try:
+            questions = questions_source
+            total = len(questions)
+            if total > 0:
+                correct_count = 0
+                for i, q in enumerate(questions):
+                    selected_raw = student_answers.get(str(i)) or student_answers.get(i)
+                    correct = q.get("answer", -1)
+                    try:
+                        correct = int(correct)
+                    except (ValueError, TypeError):
+                        correct = -1
+                    # Only grade if selected is a number (MCQ selection), not code string
+                    try:
+                        selected_int = int(selected_raw) if selected_raw is not None else None
+                    except (ValueError, TypeError):
+                        selected_int = None
+                    is_correct = selected_int is not None and selected_int == correct
+                    if is_correct:
+                        correct_count += 1
+                    results.append({
+                        "index": i,
+                        "question": q.get("question", ""),
+                        "options": q.get("options", []),
+                        "selected": selected_raw,
+                        "correct": correct,
+                        "is_correct": is_correct,
+                        "explanation": q.get("explanation", ""),
+                        "topic": q.get("topic", ""),
+                    })
+                score = round((correct_count / total) * 100, 1)
+        except Exception as e:
+            print(f"Grading error: {e}")
+
+    # ── Save submission immediately (do NOT wait for AI grading) ──
+    # This ensures the response is returned within Render's 30s timeout.
+    elapsed = int((datetime.utcnow() - session.start_time).total_seconds())
+    session.score = score
+    session.is_completed = True
+    session.end_time = datetime.utcnow()
+    session.completion_time_seconds = elapsed
+    if auto_submitted:
+        session.auto_submitted = True
+    # Final answers go to the answer table, results and grading state to session.responses
+    if answers is not None:
+        await save_answers(db, session, student_answers)
+    existing_responses = grading_data(session)
+    existing_responses.update({
+        "results": results,
+        "final_score": score,
+        "total_questions": len(questions_source) if questions_source else 0,
+        "ai_grading": "pending" if is_pure_coding else "n/a"
+    })
+    set_grading_data(session, existing_responses)
+
+    # ── Map to AssignmentSubmission for UI compatibility ──
+    if session.reference_type == "ASSIGNMENT":
+        res_sub = await db.execute(select(AssignmentSubmission).where(
+            AssignmentSubmission.assignment_id == session.reference_id,
+            AssignmentSubmission.student_id == session.student_id
+        ))
+        existing_sub = res_sub.scalars().first()
+        if existing_sub:
+            existing_sub.marks = score
+            if not is_pure_coding:
+                existing_sub.feedback = f"Automatically graded: {score}%"
+        else:
+            raw_content = ""
+            if is_pure_coding and student_answers:
+                # Merge student's coding answers into a single readable string for the legacy view
+                raw_content = "\n\n".join([str(v) for v in student_answers.values() if str(v).strip()])
+
+            new_sub = AssignmentSubmission(
+                id=str(uuid.uuid4()),
+                assignment_id=session.reference_id,
+                student_id=session.student_id,
+                content=raw_content or "Submitted via Proctored Session",
+                marks=score,
+                feedback="AI Grading Pending..." if is_pure_coding else f"Automatically graded: {score}%"
+            )
+            db.add(new_sub)
+
+    await db.flush()
+    await leaderboards.record(db, session)
+
+    # ── Queue AI grading; the job row commits with the submission ──
+    if is_pure_coding and student_answers:
+        await grading_queue.enqueue(db, session.id)
+
+    return {
+        "score": score,
+        "completion_time_seconds": elapsed,
+        "results": results,
+        "ai_grading": "pending" if is_pure_coding else "n/a",
+    }
+
+
+async def grade_coding_session(db: AsyncSession, session_id: str) -> None:
+    """
+    Grade the coding answers of a submitted assessment.
+
+    Questions with test_cases are scored by running the answer against them
+    (pass ratio per question) before the AI grader is asked for feedback. The AI
+    score counts only for questions without test cases, and the AI is skipped
+    when every question has them and ASSESSMENT_AI_FEEDBACK is off. Nothing is
+    written until the end: test and AI results commit together with the job.
+
+    An AI failure raises so the queue retries the job and finally marks it
+    failed, unless test cases already decide the whole score: then the session is
+    graded on them with a note that the feedback is unavailable.
+    """
+    from app.utils.ai_grader import AIGradingError, evaluate_submission
+
+    session = await db.get(AssessmentSession, session_id)
+    if not session or not session.is_completed:
+        return
+    await migrate(db, session)
+    student_answers = await load_answers(db, session)
+    resp = grading_data(session)
+    # Set by the re-grade endpoint: skip the AI result cache once
+    fresh = resp.pop("ai_grading_fresh", False)
+    set_grading_data(session, resp)
+
+    student_code_block = ""
+    code_count = 0
+    for idx, code in student_answers.items():
+        # For multi-question tasks, the keys '0', '1', '2' hold code if it's a pure coding task.
+        if _is_code(code):
+            student_code_block += f"### PROBLEM {int(idx)+1}:\n{code}\n\n"
+            code_count += 1
+
+    if not student_code_block:
+        print(f"[AI Grading] ⚠️ No valid code found to grade for session {session_id}")
+        return
+
+    model = Task if session.reference_type == "TASK" else Assignment
+    item = await db.get(model, session.reference_id)
+    questions = await _session_questions(db, session, item)
+    question_count = len(questions) or code_count
+
+    tests = await _run_question_tests(session_id, questions, student_answers)
+    tested_total = sum(e["passed"] / e["total"] * 100 for e in tests.values())
+    if tests:
+        _set_test_results(resp, list(tests.values()))
+        if len(tests) == question_count and not settings.ASSESSMENT_AI_FEEDBACK:
+            session.score = round(tested_total / question_count, 1)
+            set_grading_data(session, resp)
+            await leaderboards.record(db, session)
+            print(f"[Code Tests] ✅ Session {session_id} scored {session.score}% on test cases")
+            return
+
+    task_context = ""
+    if item:
+        task_context = f"Title: {item.title}\nDescription: {item.description or ''}\n"
+        if item.structured_content:
+            task_context += f"Detailed Requirements: {item.structured_content}"
+    if tests:
+        task_context += "\nTest case results: " + ", ".join(
+            f"problem {i + 1}: {e['passed']}/{e['total']} passed" for i, e in sorted(tests.items()))
+
+    print(f"[AI Grading] 🚀 Sending {code_count} problems ({len(student_code_block)} chars) to Groq for session {session_id}...")
+    untested = question_count - len(tests)
+    try:
+        # Failures and timeouts propagate so the queue retries the job
+        eval_res = await asyncio.wait_for(
+            evaluate_submission(task_context, student_code_block, bypass_cache=fresh, raise_errors=True),
+            timeout=GRADING_TIMEOUT_SECONDS,
+        )
+    except (AIGradingError, asyncio.TimeoutError) as e:
+        if untested:
+            raise
+        print(f"[AI Grading] ⚠️ No AI feedback for session {session_id} ({e!r}); graded on test cases")
+        eval_res = {"score": round(tested_total / question_count, 1),
+                    "feedback": "AI feedback is unavailable; this score comes from the test cases."}
+    ai_score = float(eval_res.get("score", 0))
+
+    _set_feedback(resp, ai_score, eval_res.get("feedback", "No feedback."))
+    # Test cases decide the score of the questions that have them
+    session.score = round((tested_total + ai_score * untested) / question_count, 1) if tests else ai_score
+    set_grading_data(session, resp)
+    await leaderboards.record(db, session)
+    print(f"[AI Grading] ✅ Session {session_id} successfully graded: {session.score}%")
+
+
+async def set_grading_state(db: AsyncSession, session_id: str, state: str) -> None:
+    """Mirror the job state onto responses["ai_grading"] for the student's result page."""
+    session = await db.get(AssessmentSession, session_id)
+    if not session:
+        return
+    resp = grading_data(session)
+    resp["ai_grading"] = state
+    if state == "failed":
+        _set_feedback(resp, session.score or 0, "AI grading failed. Your trainer will review this submission manually.")
+    set_grading_data(session, resp)
+
+
+async def recover_ungraded_sessions(db: AsyncSession, queue: JobQueue) -> int:
+    """Re-enqueue recent submissions still waiting for AI grading that have no job row."""
+    since = datetime.utcnow() - timedelta(days=RECOVERY_WINDOW_DAYS)
+    result = await db.execute(
+        select(AssessmentSession.id).where(
+            AssessmentSession.is_completed == True,
+            AssessmentSession.end_time >= since,
+            or_(AssessmentSession.responses.like('%"ai_grading": "pending"%'),
+                AssessmentSession.responses.like('%"ai_grading": "running"%')),
+            ~exists().where(BackgroundJob.queue == queue.name, BackgroundJob.ref_id == AssessmentSession.id),
+        )
+    )
+    session_ids = result.scalars().all()
+    for session_id in session_ids:
+        await queue.enqueue(db, session_id)
+    return len(session_ids)
+
+
+grading_queue = JobQueue(
+    "assessment_grading",
+    grade_coding_session,
+    concurrency=settings.GRADING_CONCURRENCY,
+    max_attempts=settings.GRADING_MAX_ATTEMPTS,
+    on_state=set_grading_state,
+    recover=recover_ungraded_sessions,
+)
@@ -0,0 +1,224 @@
+"""
+Structured storage for assessment sessions.
+
+A session's questions are frozen into `assessment_questions` once, when it
+starts, and the student's answers are kept one row per question in
+`assessment_answers`, so a heartbeat writes only the answers that changed.
+`AssessmentSession.responses` keeps the grading data only (results,
+final_score, ai_grading, ...).
+
+Sessions written before this (storage_version 0) hold everything in the
+`responses` blob. Reads understand both formats; the first write to an old
+session moves its questions and answers into the tables.
+
+Sessions started since storage_version 2 have no assessment_questions rows:
+they point at a shared question set and keep only their order (see
+app/utils/question_sets.py).
+"""
+import json
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.project import AssessmentSession, AssessmentQuestion, AssessmentAnswer
+from app.utils.queries import rows_grouped_by
+from app.utils.question_sets import QuestionSnapshot, apply_order, dump_order, load_order, question_sets
+
+STRUCTURED = 1
+SHARED_SET = 2
+# Keys of the old responses blob that now live in the tables
+_MOVED_KEYS = ("questions", "answers", "saved_answers")
+MAX_KEY_LENGTH = 50
+
+
+def _is_structured(session: AssessmentSession) -> bool:
+    return (session.storage_version or 0) >= STRUCTURED
+
+
+def _is_shared(session: AssessmentSession) -> bool:
+    return (session.storage_version or 0) >= SHARED_SET
+
+
+def _key_order(key: str):
+    return (0, int(key), "") if key.isdigit() else (1, 0, key)
+
+
+def normalize_answers(answers) -> dict:
+    """{question key: answer}, unwrapping the frontend's {"content": "<JSON map>"} form."""
+    if not isinstance(answers, dict):
+        return {}
+    content = answers.get("content")
+    if isinstance(content, str) and content.strip().startswith("{"):
+        try:
+            parsed = json.loads(content)
+        except ValueError:
+            return answers
+        if isinstance(parsed, dict):
+            return parsed
+    return answers
+
+
+def grading_data(session: AssessmentSession) -> dict:
+    """The `responses` blob as a dict (results, ai_grading, ... and, for old sessions, everything)."""
+    try:
+        data = json.loads(session.responses or "{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def set_grading_data(session: AssessmentSession, data: dict) -> None:
+    session.responses = json.dumps(data)
+
+
+def freeze_questions(db: AsyncSession, session: AssessmentSession, questions: list) -> None:
+    """Store the question snapshot of a new session (flush the session first)."""
+    db.add_all(AssessmentQuestion(session_id=session.id, position=i, content=json.dumps(q))
+               for i, q in enumerate(questions))
+    session.storage_version = STRUCTURED
+
+
+def assign_questions(session: AssessmentSession, snapshot: QuestionSnapshot, order: dict | None) -> None:
+    """Point a new session at its shared question set, in the given order (None: as written)."""
+    session.question_set_id = snapshot.set_id
+    session.question_order = dump_order(order)
+    session.storage_version = SHARED_SET
+
+
+async def migrate(db: AsyncSession, session: AssessmentSession) -> None:
+    """Move an old session's questions and answers out of the `responses` blob."""
+    if _is_structured(session):
+        return
+    # Claim the session so two requests do not both copy it
+    claimed = await db.execute(
+        update(AssessmentSession)
+        .where(AssessmentSession.id == session.id, func.coalesce(AssessmentSession.storage_version, 0) < STRUCTURED)
+        .values(storage_version=STRUCTURED)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount == 0:
+        await db.refresh(session)
+        return
+    data = grading_data(session)
+    questions = data.get("questions")
+    if isinstance(questions, list):
+        freeze_questions(db, session, questions)
+    answers = data.get("answers") if "answers" in data else data.get("saved_answers")
+    for key, value in normalize_answers(answers).items():
+        if len(str(key)) <= MAX_KEY_LENGTH:
+            db.add(AssessmentAnswer(session_id=session.id, question_key=str(key), value=json.dumps(value)))
+    for key in _MOVED_KEYS:
+        data.pop(key, None)
+    session.responses = json.dumps(data) if data else None
+    session.storage_version = STRUCTURED
+    await db.flush()
+
+
+async def load_questions(db: AsyncSession, session: AssessmentSession) -> list | None:
+    """The frozen question snapshot, or None if the session has none."""
+    if not _is_structured(session):
+        questions = grading_data(session).get("questions")
+        return questions if isinstance(questions, list) else None
+    if _is_shared(session):
+        questions = await question_sets.questions(db, session.question_set_id) if session.question_set_id else None
+        return apply_order(questions, load_order(session.question_order)) if questions else None
+    result = await db.execute(
+        select(AssessmentQuestion.content)
+        .where(AssessmentQuestion.session_id == session.id)
+        .order_by(AssessmentQuestion.position)
+    )
+    return [json.loads(content) for content in result.scalars().all()] or None
+
+
+def _answers_from_rows(rows) -> dict:
+    return {row.question_key: json.loads(row.value) if row.value is not None else None
+            for row in sorted(rows, key=lambda r: _key_order(r.question_key))}
+
+
+async def load_answers(db: AsyncSession, session: AssessmentSession) -> dict:
+    """{question key: answer} as last saved by a heartbeat or the submit."""
+    if not _is_structured(session):
+        data = grading_data(session)
+        return normalize_answers(data.get("answers") if "answers" in data else data.get("saved_answers"))
+    result = await db.execute(select(AssessmentAnswer).where(AssessmentAnswer.session_id == session.id))
+    return _answers_from_rows(result.scalars().all())
+
+
+async def save_answers(db: AsyncSession, session: AssessmentSession, answers,
+                       as_of: datetime | None = None) -> int:
+    """
+    Write the answers that differ from the stored ones; returns the number of rows
+    written. With `as_of` (when the answers were received), rows written after
+    that time are left alone, so a late flush cannot undo a newer answer.
+    """
+    return await save_answers_many(db, [(session, answers, as_of)])
+
+
+def _upsert_answers(db: AsyncSession):
+    """INSERT ... ON CONFLICT for assessment_answers; the newer write of a key wins."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = AssessmentAnswer.__table__
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.session_id, table.c.question_key],
+        set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+        where=table.c.updated_at <= stmt.excluded.updated_at,
+    )
+
+
+async def save_answers_many(db: AsyncSession, batch: list[tuple[AssessmentSession, object, datetime | None]]) -> int:
+    """`save_answers` for several sessions: one read of the stored answers, one upsert."""
+    for session, _, _ in batch:
+        await migrate(db, session)
+    result = await db.execute(
+        select(AssessmentAnswer.session_id, AssessmentAnswer.question_key, AssessmentAnswer.value)
+        .where(AssessmentAnswer.session_id.in_({session.id for session, _, _ in batch}))
+    )
+    stored = {(sid, key): value for sid, key, value in result.all()}
+    rows = []
+    for session, answers, as_of in batch:
+        written_at = as_of or datetime.utcnow()
+        for key, answer in normalize_answers(answers).items():
+            key, value = str(key), json.dumps(answer)
+            if len(key) <= MAX_KEY_LENGTH and stored.get((session.id, key)) != value:
+                rows.append({"session_id": session.id, "question_key": key, "value": value, "updated_at": written_at})
+    if rows:
+        # Two writers may both find a key missing, or a flush may arrive after a newer answer
+        await db.execute(_upsert_answers(db), rows)
+    return len(rows)
+
+
+async def session_views(db: AsyncSession, sessions: Iterable[AssessmentSession]) -> dict[str, dict]:
+    """
+    {session id: the old `responses` shape} for API consumers: questions,
+    saved_answers (in progress) or answers (submitted), plus the grading data.
+    At most three queries whatever the number of sessions.
+    """
+    sessions = list(sessions)
+    structured_ids = [s.id for s in sessions if _is_structured(s)]
+    row_ids = [s.id for s in sessions if _is_structured(s) and not _is_shared(s)]
+    questions = await rows_grouped_by(db, AssessmentQuestion, AssessmentQuestion.session_id, row_ids,
+                                      AssessmentQuestion.position)
+    sets = await question_sets.questions_many(db, (s.question_set_id for s in sessions if _is_shared(s)))
+    answers = await rows_grouped_by(db, AssessmentAnswer, AssessmentAnswer.session_id, structured_ids)
+    views = {}
+    for session in sessions:
+        view = grading_data(session)
+        if _is_structured(session):
+            if _is_shared(session) and session.question_set_id in sets:
+                view["questions"] = apply_order(sets[session.question_set_id], load_order(session.question_order))
+            elif session.id in questions:
+                view["questions"] = [json.loads(q.content) for q in questions[session.id]]
+            if session.id in answers:
+                view["answers" if session.is_completed else "saved_answers"] = _answers_from_rows(answers[session.id])
+        views[session.id] = view
+    return views
+
+
+async def session_view(db: AsyncSession, session: AssessmentSession) -> dict:
+    return (await session_views(db, [session]))[session.id]
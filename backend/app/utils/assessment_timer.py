@@ -0,0 +1,246 @@
+"""
+Server-side deadlines for open assessment sessions.
+
+Time-limit expiry and the 10-minute inactivity rule used to be checked only
+when the student's browser called heartbeat or questions, so an abandoned
+session stayed open for good. Each worker keeps a min-heap of the deadlines of
+the open sessions and an APScheduler date job armed for the earliest one:
+
+  * time limit: start + time_limit + ASSESSMENT_EXPIRY_GRACE_SECONDS (the
+    browser submits at 0:00 with its final answers; the grace lets that land
+    first). The session is auto-submitted and scored on its stored answers.
+  * inactivity: last activity + INACTIVITY_SECONDS. The last activity is read
+    again when the deadline comes up: a session still in use is pushed back,
+    an abandoned one is cancelled, as the heartbeat check does.
+
+Due sessions are closed in batches. Each one is claimed with a conditional
+UPDATE, so the Passenger workers, which all track every open session, close it
+once. The heap is rebuilt from the open AssessmentSession rows at startup and
+every RESYNC_MINUTES, which also picks up sessions started on another worker
+and time limits changed by a trainer.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.project import AssessmentSession, Assignment, Task
+from app.utils.assessment_grading import submit_session
+from app.utils.heartbeats import INACTIVITY_SECONDS, heartbeat_buffer
+from app.utils.leaderboards import leaderboards
+
+RESYNC_MINUTES = 5
+BATCH_SIZE = 50
+RETRY_SECONDS = 30  # a batch that failed is tried again after this
+JOB_ID = "assessment_expiry"
+RESYNC_JOB_ID = "assessment_expiry_resync"
+
+
+async def claim_session(db: AsyncSession, session_id: str, **values) -> bool:
+    """Mark an open session completed; False if someone else closed it first."""
+    result = await db.execute(
+        update(AssessmentSession)
+        .where(AssessmentSession.id == session_id, AssessmentSession.is_completed == False)  # noqa: E712
+        .values(is_completed=True, **values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def auto_submit(db: AsyncSession, session_id: str) -> bool:
+    """Close an open session and score it on its saved answers; False if it was already closed."""
+    # Answers this worker still holds from heartbeats count
+    await heartbeat_buffer.settle(db, session_id)
+    session = await db.get(AssessmentSession, session_id)
+    if session is None or not await claim_session(db, session_id):
+        return False
+    await submit_session(db, session, auto_submitted=True)
+    return True
+
+
+async def cancel_inactive(db: AsyncSession, session_id: str, now: datetime) -> bool:
+    """Close a session whose student is gone, without scoring it (the 10-minute rule)."""
+    await heartbeat_buffer.settle(db, session_id)
+    if not await claim_session(db, session_id, auto_submitted=True, end_time=now):
+        return False
+    # A cancelled session ranks last on the leaderboard
+    session = await db.get(AssessmentSession, session_id)
+    await db.refresh(session)
+    await leaderboards.record(db, session)
+    return True
+
+
+@dataclass(slots=True)
+class _Deadline:
+    due: datetime  # when to look at the session next
+    time_due: datetime | None  # start + time limit + grace; None without a time limit
+
+
+class AssessmentTimer:
+    def __init__(self, grace_seconds: int):
+        self.grace_seconds = grace_seconds
+        self._heap: list[tuple[datetime, str]] = []
+        self._deadlines: dict[str, _Deadline] = {}
+        self._scheduler = None
+        self._armed_for: datetime | None = None
+        self.counters = {"submitted": 0, "cancelled": 0, "extended": 0, "failed_batches": 0, "resyncs": 0}
+
+    # ─── Deadlines ───────────────────────────────────────
+    def _deadline(self, start_time: datetime, time_limit: int, last_active: datetime | None) -> _Deadline:
+        time_due = start_time + timedelta(minutes=time_limit, seconds=self.grace_seconds) if time_limit > 0 else None
+        inactive_due = (last_active or start_time) + timedelta(seconds=INACTIVITY_SECONDS)
+        return _Deadline(min(time_due, inactive_due) if time_due else inactive_due, time_due)
+
+    def _push(self, session_id: str, deadline: _Deadline) -> None:
+        self._deadlines[session_id] = deadline
+        heapq.heappush(self._heap, (deadline.due, session_id))
+
+    def track(self, session_id: str, start_time: datetime, time_limit: int,
+              last_active: datetime | None = None) -> None:
+        """Start watching a session (called when it starts)."""
+        self._push(session_id, self._deadline(start_time, time_limit or 0, last_active))
+        self._arm()
+
+    def forget(self, session_id: str) -> None:
+        # Its heap entry is skipped when it comes up
+        self._deadlines.pop(session_id, None)
+
+    def _is_current(self, entry: tuple[datetime, str]) -> bool:
+        deadline = self._deadlines.get(entry[1])
+        return deadline is not None and deadline.due == entry[0]
+
+    def _arm(self) -> None:
+        """Point the scheduler job at the earliest deadline."""
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+        if self._scheduler is None or not self._heap:
+            return
+        due = self._heap[0][0]
+        if self._armed_for is not None and self._armed_for <= due:
+            return  # the job fires first and re-arms
+        self._scheduler.add_job(self.run_due, "date", run_date=due.replace(tzinfo=timezone.utc), id=JOB_ID,
+                                replace_existing=True, misfire_grace_time=None)
+        self._armed_for = due
+
+    # ─── Expiry ──────────────────────────────────────────
+    async def run_due(self) -> int:
+        """Close every session whose deadline has passed; returns how many were closed."""
+        self._armed_for = None
+        now = datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_current(entry):
+                due.append((entry[1], self._deadlines[entry[1]]))
+        closed = 0
+        for start in range(0, len(due), BATCH_SIZE):
+            batch = due[start:start + BATCH_SIZE]
+            try:
+                closed += await self._close_batch(batch, now)
+            except Exception as e:
+                self.counters["failed_batches"] += 1
+                print(f"[Assessment Timer] Batch of {len(batch)} session(s) failed, retrying: {e}")
+                for session_id, deadline in batch:
+                    if self._deadlines.get(session_id) is deadline:
+                        deadline.due = now + timedelta(seconds=RETRY_SECONDS)
+                        heapq.heappush(self._heap, (deadline.due, session_id))
+        self._arm()
+        return closed
+
+    async def _close_batch(self, batch: list[tuple[str, _Deadline]], now: datetime) -> int:
+        submitted, cancelled, extended, closed = [], [], [], []
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AssessmentSession).where(AssessmentSession.id.in_([session_id for session_id, _ in batch]))
+            )
+            sessions = {s.id: s for s in result.scalars().all()}
+            for session_id, deadline in batch:
+                session = sessions.get(session_id)
+                if session is None or session.is_completed:
+                    closed.append(session_id)
+                elif deadline.time_due and deadline.time_due <= now:
+                    if await auto_submit(db, session_id):
+                        submitted.append(session_id)
+                    else:
+                        closed.append(session_id)
+                else:
+                    last_active = heartbeat_buffer.last_active(session) or session.start_time
+                    if (now - last_active).total_seconds() < INACTIVITY_SECONDS:
+                        extended.append((session_id, self._deadline(session.start_time, 0, last_active), deadline))
+                    elif await cancel_inactive(db, session_id, now):
+                        cancelled.append(session_id)
+                    else:
+                        closed.append(session_id)
+            await db.commit()
+        # Only once committed: if the batch fails, run_due retries every session in it
+        for session_id in submitted + cancelled + closed:
+            self.forget(session_id)
+        for session_id, inactive, deadline in extended:
+            # Still in use: look again when it could next be inactive or out of time
+            deadline.due = min(inactive.due, deadline.time_due) if deadline.time_due else inactive.due
+            self._push(session_id, deadline)
+        self.counters["submitted"] += len(submitted)
+        self.counters["cancelled"] += len(cancelled)
+        self.counters["extended"] += len(extended)
+        if submitted or cancelled:
+            print(f"[Assessment Timer] {len(submitted)} session(s) auto-submitted, "
+                  f"{len(cancelled)} cancelled for inactivity.")
+        return len(submitted) + len(cancelled)
+
+    # ─── Lifecycle ───────────────────────────────────────
+    async def rebuild(self) -> int:
+        """Reload the deadlines of every open session; returns how many are tracked."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AssessmentSession.id, AssessmentSession.reference_id, AssessmentSession.reference_type,
+                       AssessmentSession.start_time, AssessmentSession.last_heartbeat, AssessmentSession.updated_at)
+                .where(AssessmentSession.is_completed == False)  # noqa: E712
+            )
+            rows = result.all()
+            limits = {}
+            for model, ref_type in ((Task, "TASK"), (Assignment, "ASSIGNMENT")):
+                ids = {r.reference_id for r in rows if (r.reference_type == "TASK") == (ref_type == "TASK")}
+                if ids:
+                    found = await db.execute(select(model.id, model.time_limit).where(model.id.in_(ids)))
+                    limits.update({(ref_type, ref_id): limit for ref_id, limit in found.all()})
+        now = datetime.utcnow()
+        self._heap, self._deadlines = [], {}
+        for r in rows:
+            ref_type = "TASK" if r.reference_type == "TASK" else "ASSIGNMENT"
+            start_time = r.start_time or now
+            self._deadlines[r.id] = self._deadline(start_time, limits.get((ref_type, r.reference_id)) or 0,
+                                                   heartbeat_buffer.last_active(r))
+        self._heap = [(deadline.due, session_id) for session_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._armed_for = None
+        self.counters["resyncs"] += 1
+        self._arm()
+        return len(self._deadlines)
+
+    async def _resync(self) -> None:
+        try:
+            await self.rebuild()
+        except Exception as e:
+            print(f"[Assessment Timer] Resync failed: {e}")
+
+    async def start(self, scheduler) -> None:
+        """Load the open sessions now and resync every RESYNC_MINUTES."""
+        self._scheduler = scheduler
+        try:
+            tracked = await self.rebuild()
+            print(f"[Assessment Timer] Tracking {tracked} open session(s).")
+        except Exception as e:
+            print(f"[Assessment Timer] Could not load open sessions: {e}")
+        scheduler.add_job(self._resync, "interval", minutes=RESYNC_MINUTES, id=RESYNC_JOB_ID,
+                          replace_existing=True, coalesce=True, max_instances=1)
+
+    def stats(self) -> dict:
+        return {**self.counters, "tracked": len(self._deadlines),
+                "next_due": self._heap[0][0].isoformat() if self._heap else None}
+
+
+assessment_timer = AssessmentTimer(settings.ASSESSMENT_EXPIRY_GRACE_SECONDS)
@@ -0,0 +1,1168 @@
+import asyncio
+import json
+import os
+import platform
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+import httpx
+
+from app.config import settings
+
+try:
+    import resource
+except ImportError:  # Windows dev machines: no rlimits, local runner disabled
+    resource = None
+
+# Cap on captured stdout/stderr per run; the process is killed once it is exceeded
+OUTPUT_LIMIT_BYTES = 64 * 1024
+# Compilers get longer than the program itself
+COMPILE_TIMEOUT_SECONDS = 20
+# How long a request may wait for a free slot before it is turned away
+QUEUE_WAIT_SECONDS = 15
+# Wall-clock budget for all the runs of one run_batch call; later inputs are not run
+BATCH_TIMEOUT_SECONDS = 30
+REMOTE_TIMEOUT = 15.0
+# Per input when a remote backend runs a batch in one request (PYTHON_BATCH_HARNESS)
+REMOTE_CASE_TIMEOUT_SECONDS = 5
+# Requests in flight at once for inputs a remote backend runs one by one
+REMOTE_BATCH_CONCURRENCY = 4
+
+PISTON_URL = "https://emkc.org/api/v2/piston"
+GODBOLT_URL = "https://godbolt.org/api/compiler"
+
+# Untrusted programs get an empty environment apart from PATH
+SANDBOX_ENV = {"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8", "HOME": "/tmp"}
+# Host directories a sandboxed program sees, read-only; nothing else of the host is mounted
+SANDBOX_MOUNTS = ("/usr", "/bin", "/sbin", "/lib", "/lib32", "/lib64", "/etc")
+# The backend's own directory (code, .env, uploads) is covered even if it sits under one of them
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PYTHON = os.path.realpath(sys.executable)
+# uid/gid programs run as inside their sandbox; outside it they are the worker's own uid
+SANDBOX_UID = 1000
+# ... or this one (nobody) when the worker runs as root
+SANDBOX_ROOT_WORKER_UID = 65534
+# Size of each run's private /tmp and /work
+SANDBOX_TMPFS_MB = 64
+
+# Sets up the sandbox inside fresh mount, pid, network, IPC and UTS namespaces
+# (see _sandboxed) and execs the fork server in it: a tmpfs root holding the
+# read-only host mounts, /proc for the new pid namespace, and empty /tmp and
+# /work that every run mounts its own over. The host root is detached. Any
+# worker uid can do this in a user namespace of its own, where it is root; a
+# root worker does it in the host's and hands the sandbox to `uid`.
+# Arguments: scratch dir, uid (empty: keep the worker's), mounts, hidden dirs
+# (both ":"-separated), program...
+SANDBOX_INIT = """\
+set -eu
+path=$PATH
+export PATH=/usr/sbin:/usr/bin:/sbin:/bin
+setpriv=$(command -v setpriv || true)
+scratch=$1 uid=$2 mounts=$3 hidden=$4
+shift 4
+root=$scratch/root
+mount -t tmpfs -o size=1m,mode=755,nosuid,nodev sandbox "$root"
+IFS=:
+for dir in $mounts; do
+  [ -e "$dir" ] || continue
+  mkdir -p "$root$(dirname "$dir")"
+  if [ -L "$dir" ]; then
+    cp -P "$dir" "$root$dir"
+  else
+    mkdir -p "$root$dir"
+    mount --rbind "$dir" "$root$dir"
+    mount -o remount,bind,ro,nosuid,nodev "$root$dir"
+  fi
+done
+for dir in $hidden; do
+  if [ -d "$root$dir" ]; then mount -t tmpfs -o size=4k,mode=000 hidden "$root$dir"; fi
+done
+unset IFS
+mkdir -p "$root/dev" "$root/proc" "$root/tmp" "$root/work" "$root/oldroot"
+for dev in null zero full random urandom; do
+  touch "$root/dev/$dev"
+  mount --bind "/dev/$dev" "$root/dev/$dev"
+done
+ln -s /proc/self/fd "$root/dev/fd"
+ln -s /proc/self/fd/0 "$root/dev/stdin"
+ln -s /proc/self/fd/1 "$root/dev/stdout"
+ln -s /proc/self/fd/2 "$root/dev/stderr"
+mount -t proc -o nosuid,nodev,noexec proc "$root/proc"
+cd "$root"
+pivot_root . oldroot
+umount -l /oldroot
+rmdir /oldroot
+mount -o remount,bind,ro,nosuid,nodev /
+cd /
+unset OLDPWD PWD
+export PATH=$path
+if [ -n "$uid" ]; then
+  exec "$setpriv" --reuid "$uid" --regid "$uid" --clear-groups --no-new-privs --inh-caps=-all --bounding-set=-all -- "$@"
+fi
+exec "$@"
+"""
+
+# Runs main.py from the working directory as __main__, hiding this wrapper's frame
+# from tracebacks so errors point at the student's lines only.
+PYTHON_RUN_MAIN = """\
+def _run_main():
+    import sys, traceback
+    sys.argv = ["main.py"]
+    with open("main.py", encoding="utf-8", errors="replace") as f:
+        src = f.read()
+    try:
+        exec(compile(src, "main.py", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    return 0
+"""
+
+# Fork server, started once per worker inside the sandbox (SANDBOX_INIT) with a
+# warm interpreter. It keeps a pool of pre-forked members per language, each
+# already isolated: own user, mount, pid, network and IPC namespaces, a fresh
+# tmpfs /tmp and /work, SANDBOX_UID with no capabilities and no_new_privs. A
+# member takes one job: the worker sends the job's control socket (plus the
+# program's stdin/stdout/stderr for a single run) over a SEQPACKET socket and
+# the job itself on the control socket; the member writes the source, compiles
+# it and runs it once per input, killing everything in its pid namespace after
+# each run, and reports JSON lines back. Python runs fork the member's
+# interpreter instead of exec'ing a new one. argv: socket fd ("-" probes the
+# host once and exits), JSON config.
+PYTHON_FORK_SERVER = PYTHON_RUN_MAIN + r'''
+import collections, ctypes, json, os, resource, select, signal, socket, subprocess, sys, time, traceback
+import bisect, functools, heapq, itertools, math, random, re, string  # warm for children
+
+MS_NOSUID, MS_NODEV, MS_NOEXEC = 2, 4, 8
+PR_SET_PDEATHSIG, PR_CAPBSET_DROP, PR_SET_NO_NEW_PRIVS = 1, 24, 38
+MAX_FD = os.sysconf("SC_OPEN_MAX")
+libc = ctypes.CDLL(None, use_errno=True)
+config = json.loads(sys.argv[2])
+
+
+def check(ret, what):
+    if ret != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def mount(source, target, fstype, flags, data=""):
+    check(libc.mount(source.encode(), target.encode(), fstype.encode(), flags, data.encode()), f"mount {target}")
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def isolate():
+    """Continue as pid 1 of a new pid namespace, isolated and unprivileged."""
+    check(libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0), "prctl")
+    # The user namespace comes first and owns the others, so the fork server needs no privileges; it is
+    # also what makes RLIMIT_NPROC count this run's processes alone
+    uid, gid = os.getuid(), os.getgid()
+    os.unshare(os.CLONE_NEWUSER | os.CLONE_NEWNS | os.CLONE_NEWNET | os.CLONE_NEWIPC | os.CLONE_NEWPID)
+    write("/proc/self/uid_map", f"{config['uid']} {uid} 1")
+    write("/proc/self/setgroups", "deny")
+    write("/proc/self/gid_map", f"{config['uid']} {gid} 1")
+    pid = os.fork()
+    if pid:
+        # Stays outside: killing this process (see "kill") takes pid 1 and so the namespace down
+        os.closerange(3, MAX_FD)
+        _, status = os.waitpid(pid, 0)
+        os._exit(1 if os.WIFSIGNALED(status) else os.WEXITSTATUS(status))
+    check(libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0), "prctl")
+    tmpfs = f"size={config['tmpfs_mb']}m"
+    mount("tmp", "/tmp", "tmpfs", MS_NOSUID | MS_NODEV, tmpfs + ",mode=1777")
+    mount("work", "/work", "tmpfs", MS_NOSUID | MS_NODEV, tmpfs + ",mode=755")
+    mount("proc", "/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "prctl")
+    cap = 0
+    while libc.prctl(PR_CAPBSET_DROP, cap, 0, 0, 0) == 0:
+        cap += 1
+    check(libc.capset((ctypes.c_uint32 * 2)(0x20080522, 0), (ctypes.c_uint32 * 6)()), "capset")
+    os.chdir("/work")
+
+
+def set_limits(limits):
+    for name, soft, hard in limits:
+        resource.setrlimit(getattr(resource, name), (soft, hard))
+
+
+def wait(pid, timeout):
+    """Exit status of `pid`, or None when it is still running after `timeout` seconds (SIGCHLD is blocked)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return status
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        signal.sigtimedwait([signal.SIGCHLD], remaining)
+
+
+def run_once(job, stdin, stdout, stderr):
+    """Run the program on these fds; every process it started is killed when it exits or times out."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            for target, fd in enumerate((stdin, stdout, stderr)):
+                os.dup2(fd, target)
+            os.closerange(3, MAX_FD)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+            set_limits(job["limits"])
+            if job["run"] is None:
+                code = _run_main()
+                try:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                except Exception:
+                    pass
+                os._exit(code)
+            signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+            os.execvp(job["run"][0], job["run"])
+        except OSError as e:
+            os.write(2, f"{e}\n".encode())
+        finally:
+            os._exit(127)
+    status = wait(pid, job["timeout"])
+    try:
+        os.kill(-1, signal.SIGKILL)  # everything in the namespace but pid 1
+    except ProcessLookupError:
+        pass
+    timed_out = status is None
+    if timed_out:
+        _, status = os.waitpid(pid, 0)
+    while True:
+        try:
+            os.waitpid(-1, 0)
+        except ChildProcessError:
+            break
+    return {"exit": os.waitstatus_to_exitcode(status), "timed_out": timed_out}
+
+
+def captured(data):
+    text = data[:config["output_limit"]].decode("utf-8", "replace")
+    return text + "\n[output truncated]" if len(data) > config["output_limit"] else text
+
+
+def run_captured(job, stdin):
+    fds = [os.open("/tmp", os.O_TMPFILE | os.O_RDWR, 0o600) for _ in range(3)]
+    try:
+        os.write(fds[0], stdin.encode())
+        os.lseek(fds[0], 0, os.SEEK_SET)
+        result = run_once(job, *fds)
+        for name, fd in zip(("stdout", "stderr"), fds[1:]):
+            os.lseek(fd, 0, os.SEEK_SET)
+            result[name] = captured(os.read(fd, config["output_limit"] + 1))
+        return result
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def serve(fds):
+    """A member's one job: fds are the control socket, then stdin/stdout/stderr for a single run."""
+    ctl = socket.socket(fileno=fds[0])
+    data = bytearray()
+    while chunk := ctl.recv(65536):
+        data += chunk
+    job = json.loads(data)
+
+    def report(event):
+        ctl.sendall(json.dumps(event).encode() + b"\n")
+
+    with open(job["filename"], "w", encoding="utf-8") as f:
+        f.write(job["code"])
+    if job["compile"]:
+        try:
+            out = subprocess.run(job["compile"], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT, timeout=job["compile_timeout"],
+                                 preexec_fn=lambda: set_limits(job["compile_limits"]))
+        except subprocess.TimeoutExpired:
+            report({"compile_error": "Compilation timed out.", "code": 1})
+            return
+        if out.returncode != 0:
+            report({"compile_error": captured(out.stdout), "code": out.returncode if out.returncode > 0 else 1})
+            return
+    report({"compiled": True})
+    if len(fds) > 1:
+        report(run_once(job, *fds[1:]))
+        return
+    deadline = time.monotonic() + job["batch_timeout"]
+    for stdin in job["inputs"]:
+        report({"not_run": True} if time.monotonic() >= deadline else run_captured(job, stdin))
+
+
+def member(sock):
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+    os.closerange(3, sock.fileno())
+    os.closerange(sock.fileno() + 1, MAX_FD)
+    isolate()
+    msg, fds, _flags, _addr = socket.recv_fds(sock, 4096, 4)
+    sock.close()
+    if msg:
+        serve(fds)
+
+
+def fork(target, *args):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            target(*args)
+            os._exit(0)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(1)
+    return pid
+
+
+if sys.argv[1] == "-":
+    _, status = os.waitpid(fork(isolate), 0)
+    sys.exit(os.waitstatus_to_exitcode(status))
+
+sock = socket.socket(fileno=int(sys.argv[1]))
+wake_r, wake_w = os.pipe()
+os.set_blocking(wake_w, False)
+signal.set_wakeup_fd(wake_w)
+signal.signal(signal.SIGCHLD, lambda *_: None)
+pools = {language: collections.deque() for language in config["languages"]}  # idle (pid, socket)
+running = {}  # job id -> member pid
+jobs = {}  # member pid -> job id
+
+
+def prepare():
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    pid = fork(lambda: (ours.close(), member(theirs)))
+    theirs.close()
+    return pid, ours
+
+
+def fill():
+    for idle in pools.values():
+        while len(idle) < config["pool_size"]:
+            idle.append(prepare())
+
+
+def dispatch(request, fds):
+    idle = pools.setdefault(request["language"], collections.deque())
+    for _attempt in range(3):
+        pid, member_sock = idle.popleft() if idle else prepare()
+        try:
+            socket.send_fds(member_sock, [b"job"], fds)
+        except OSError:
+            continue  # died while idle
+        finally:
+            member_sock.close()
+        running[request["id"]] = pid
+        jobs[pid] = request["id"]
+        break
+    for fd in fds:
+        os.close(fd)
+
+
+def reap():
+    while True:
+        try:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if not pid:
+            return
+        running.pop(jobs.pop(pid, None), None)
+
+
+fill()
+while True:
+    ready = select.select([sock, wake_r], [], [])[0]
+    if wake_r in ready:
+        os.read(wake_r, 512)
+        reap()
+    if sock in ready:
+        msg, fds, _flags, _addr = socket.recv_fds(sock, 4096, 4)
+        if not msg:
+            os._exit(0)
+        request = json.loads(msg)
+        if "kill" in request:
+            if request["kill"] in running:
+                os.kill(running[request["kill"]], signal.SIGKILL)
+            continue
+        dispatch(request, fds)
+        fill()
+'''
+
+# Runs a Python program once per stdin as a single remote request: each input
+# gets a forked child with its own stdin/stdout/stderr files, process group and
+# wall-clock limit, and one JSON line per input is printed. Inputs without a line
+# (output cut by the service, harness killed) are sent again one request each.
+# _RemoteBackend.run_batch puts CODE, INPUTS and the limits in front of it.
+PYTHON_BATCH_HARNESS = PYTHON_RUN_MAIN + """\
+import json, os, signal, sys, tempfile, time
+
+
+def _case(stdin):
+    files = [tempfile.TemporaryFile() for _ in range(3)]
+    files[0].write(stdin.encode())
+    files[0].seek(0)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        os.setpgid(0, 0)
+        for fd, f in enumerate(files):
+            os.dup2(f.fileno(), fd)
+        code = _run_main()
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+    deadline = time.monotonic() + CASE_SECONDS
+    timed_out = False
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() > deadline:
+            timed_out = True
+            os.killpg(pid, signal.SIGKILL)
+            _, status = os.waitpid(pid, 0)
+            break
+        time.sleep(0.005)
+    try:
+        os.killpg(pid, signal.SIGKILL)  # anything it left running
+    except OSError:
+        pass
+    out, err = [f.seek(0) or f.read(OUTPUT_LIMIT).decode("utf-8", "replace") for f in files[1:]]
+    code = os.waitstatus_to_exitcode(status)
+    return {"stdout": out, "stderr": err, "code": code if code >= 0 else 1,
+            "signal": signal.Signals(-code).name if code < 0 else None, "timed_out": timed_out}
+
+
+os.chdir(tempfile.mkdtemp())
+with open("main.py", "w", encoding="utf-8") as f:
+    f.write(CODE)
+for i, stdin in enumerate(INPUTS):
+    print(json.dumps({"case": i, **_case(stdin)}), flush=True)
+"""
+
+# Longest a job's report line may be: stdout and stderr at OUTPUT_LIMIT_BYTES each, JSON-escaped
+EVENT_LIMIT = 16 * OUTPUT_LIMIT_BYTES
+
+
+class RunnerUnavailable(Exception):
+    """This backend cannot run the request; the next backend is tried."""
+
+
+class RunnerBusy(Exception):
+    """The local runner's queue is full; the client should retry later."""
+
+
+def _result(stdout="", stderr="", code=0, signal_name=None, language=None, version=None) -> dict:
+    return {"stdout": stdout, "stderr": stderr, "code": code, "signal": signal_name,
+            "language": language, "version": version}
+
+
+# ─── Local sandboxed runner ──────────────────────────────────────────────────
+
+@dataclass
+class _Language:
+    name: str
+    version: str
+    filename: str | None = None  # source file for compiled / file-based languages
+    compile: list[str] | None = None
+    run: list[str] | None = None
+    memory_limit: bool = True  # RLIMIT_AS; off for VMs that reserve large address space
+    forked: bool = False  # runs in the fork server's own interpreter instead of exec'ing `run`
+
+
+def _tool_version(cmd: list[str]) -> str:
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        text = (out.stdout or out.stderr).strip().splitlines()
+        match = re.search(r"\d+(\.\d+)+", text[0] if text else "")
+        return match.group(0) if match else "unknown"
+    except Exception:
+        return "unknown"
+
+
+def _sandbox_mounts() -> list[str]:
+    """SANDBOX_MOUNTS plus this interpreter's installation when it lives elsewhere (pyenv, conda)."""
+    mounts = list(SANDBOX_MOUNTS)
+    for path in (os.path.realpath(sys.base_prefix), os.path.dirname(PYTHON)):
+        if not any(path == m or path.startswith(m + "/") for m in mounts):
+            mounts.append(path)
+    return mounts
+
+
+def _sandboxed(cmd: list[str], scratch: str) -> list[str]:
+    """`cmd` wrapped to run inside the sandbox, mounted on `scratch`/root."""
+    if os.geteuid() == 0:
+        # Root needs no user namespace to set up, but programs must not act as root on the host's files
+        user, uid = [], str(SANDBOX_ROOT_WORKER_UID)
+    else:
+        user, uid = ["--user", "--map-root-user"], ""
+    return ["unshare", *user, "--mount", "--net", "--pid", "--ipc", "--uts", "--fork", "--kill-child",
+            "--propagation", "private", "--", "/bin/sh", "-c", SANDBOX_INIT, "sandbox",
+            scratch, uid, ":".join(_sandbox_mounts()), APP_DIR, *cmd]
+
+
+def _scratch_dir() -> str:
+    """The fork server's host directory: just root/ to mount the sandbox on."""
+    scratch = tempfile.mkdtemp(prefix="sandbox-")
+    os.mkdir(os.path.join(scratch, "root"))
+    return scratch
+
+
+def _fork_server_config(languages: list[str], pool_size: int) -> dict:
+    return {"languages": languages, "pool_size": pool_size, "uid": SANDBOX_UID, "tmpfs_mb": SANDBOX_TMPFS_MB,
+            "output_limit": OUTPUT_LIMIT_BYTES}
+
+
+def _sandbox_problem() -> str | None:
+    """Why programs cannot be sandboxed on this host, or None when they can."""
+    if resource is None or not sys.platform.startswith("linux") or not hasattr(os, "unshare"):
+        return "the sandbox needs Linux namespaces and Python 3.12+"
+    tools = ("unshare", "mount", "pivot_root") + (("setpriv",) if os.geteuid() == 0 else ())
+    missing = [tool for tool in tools if not shutil.which(tool, path="/usr/sbin:/usr/bin:/sbin:/bin")]
+    if missing:
+        return f"{', '.join(missing)} not installed"
+    scratch = _scratch_dir()
+    probe = [PYTHON, "-I", "-c", PYTHON_FORK_SERVER, "-", json.dumps(_fork_server_config([], 0))]
+    try:
+        out = subprocess.run(_sandboxed(probe, scratch), capture_output=True, text=True, timeout=10,
+                             env=SANDBOX_ENV, cwd=scratch)
+    except (OSError, subprocess.SubprocessError) as e:
+        return str(e)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if out.returncode != 0:
+        return (out.stderr.strip().splitlines() or [f"exit code {out.returncode}"])[-1]
+    return None
+
+
+def _discover_languages() -> dict[str, _Language]:
+    """Languages whose toolchain is installed on this server; none when the sandbox is unavailable."""
+    problem = _sandbox_problem()
+    if problem:
+        print(f"[Code Runner] Local runner disabled: {problem}")
+        return {}
+    found = {"python": _Language("python", platform.python_version(), "main.py", forked=True)}
+    if shutil.which("node"):
+        found["javascript"] = _Language("javascript", _tool_version(["node", "--version"]), "main.js",
+                                        run=["node", "--max-old-space-size=128", "main.js"], memory_limit=False)
+    if shutil.which("g++"):
+        found["c++"] = _Language("c++", _tool_version(["g++", "--version"]), "main.cpp",
+                                 compile=["g++", "-O2", "-o", "main", "main.cpp"], run=["./main"])
+    if shutil.which("gcc"):
+        found["c"] = _Language("c", _tool_version(["gcc", "--version"]), "main.c",
+                               compile=["gcc", "-O2", "-o", "main", "main.c", "-lm"], run=["./main"])
+    if shutil.which("javac") and shutil.which("java"):
+        found["java"] = _Language("java", _tool_version(["java", "-version"]), "Main.java",
+                                  compile=["javac", "Main.java"], run=["java", "-Xmx256m", "-cp", ".", "Main"],
+                                  memory_limit=False)
+    return found
+
+
+LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python",
+    "js": "javascript", "node": "javascript", "nodejs": "javascript",
+    "cpp": "c++", "cxx": "c++", "g++": "c++",
+    "gcc": "c",
+}
+
+
+def normalize_language(language: str) -> str:
+    language = (language or "python").strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+def _rlimits(cpu_seconds: int, memory_mb: int | None, max_procs: int) -> list[tuple[str, int, int]]:
+    limits = [("RLIMIT_CPU", cpu_seconds, cpu_seconds + 1),
+              ("RLIMIT_FSIZE", 1024 * 1024, 1024 * 1024),
+              ("RLIMIT_NOFILE", 64, 64),
+              ("RLIMIT_NPROC", max_procs, max_procs),  # per run: each has a user namespace of its own
+              ("RLIMIT_CORE", 0, 0)]
+    if memory_mb:
+        limits.append(("RLIMIT_AS", memory_mb * 1024 * 1024, memory_mb * 1024 * 1024))
+    return limits
+
+
+class _ForkServer:
+    """Client side of PYTHON_FORK_SERVER; restarted on the next run if it dies."""
+
+    def __init__(self, languages: list[str], pool_size: int):
+        self.config = _fork_server_config(languages, pool_size)
+        self._proc: asyncio.subprocess.Process | None = None
+        self._sock: socket.socket | None = None
+        self._scratch: str | None = None
+        self._next_job = 0
+        self.starts = 0
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    async def start(self) -> None:
+        self._scratch = _scratch_dir()
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                *_sandboxed([PYTHON, "-I", "-c", PYTHON_FORK_SERVER, str(child.fileno()), json.dumps(self.config)],
+                            self._scratch),
+                pass_fds=(child.fileno(),), env=SANDBOX_ENV, cwd=self._scratch,
+                stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, start_new_session=True,
+            )
+        finally:
+            child.close()
+        self._sock = parent
+        self.starts += 1
+
+    def _stop(self) -> None:
+        if self._sock is not None:
+            self._sock.close()  # the server exits on EOF, taking every member and run with it
+            self._sock = None
+        if self.alive:
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        if self._scratch:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+            self._scratch = None
+
+    async def submit(self, language: str, fds: list[int]) -> tuple[int, socket.socket]:
+        """Hand a job to a pool member; returns the job id and the job's control socket."""
+        if self._sock is None or not self.alive:
+            self._stop()
+            await self.start()
+        self._next_job += 1
+        job = self._next_job
+        ours, theirs = socket.socketpair()
+        try:
+            socket.send_fds(self._sock, [json.dumps({"id": job, "language": language}).encode()],
+                            [theirs.fileno(), *fds])
+        except OSError as e:
+            ours.close()
+            self._stop()
+            raise RunnerUnavailable(f"fork server: {e}")
+        finally:
+            theirs.close()
+        return job, ours
+
+    def kill(self, job: int) -> None:
+        """Kill a job's whole sandbox."""
+        if self._sock is not None:
+            try:
+                self._sock.send(json.dumps({"kill": job}).encode())
+            except OSError:
+                pass
+
+    async def close(self) -> None:
+        proc = self._proc
+        self._stop()
+        if proc is not None:
+            await proc.wait()
+            self._proc = None
+
+
+class LocalRunner:
+    """
+    Runs code on this server, every job in a sandbox of its own.
+
+    A fork server (PYTHON_FORK_SERVER) runs inside a user namespace where the
+    worker is root (SANDBOX_INIT) and keeps `pool_size` pre-forked members per
+    language, each isolated in fresh mount, pid, network, IPC and user
+    namespaces, so a run starts in milliseconds. The program sees read-only
+    system directories and a private /tmp and /work: not the app, its .env or
+    other runs' files. It has no network, runs as SANDBOX_UID without
+    capabilities in an empty environment, and is held to rlimits on CPU time,
+    address space, processes, file size and open files. Everything in the
+    sandbox is killed when the program exits, times out or its output passes
+    OUTPUT_LIMIT_BYTES.
+
+    This needs unprivileged user namespaces and util-linux (unshare); the first
+    use checks it, and when it fails the runner reports no languages and says
+    why, so every request falls through to the next backend.
+    At most `max_concurrency` programs run at a time per worker and at most
+    `max_queue` requests wait for a slot; beyond that `run` raises RunnerBusy.
+    """
+
+    name = "local"
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: int, memory_mb: int, max_procs: int,
+                 pool_size: int):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 2
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_procs = max_procs
+        self.pool_size = pool_size
+        self._languages: dict[str, _Language] | None = None
+        self._server: _ForkServer | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._loop = None
+        self._waiting = 0
+        self.counters = {"runs": 0, "batches": 0, "timeouts": 0, "rejected": 0, "peak_waiting": 0}
+
+    @property
+    def languages(self) -> dict[str, _Language]:
+        if self._languages is None:
+            self._languages = _discover_languages()
+        return self._languages
+
+    @property
+    def isolated(self) -> bool:
+        # Languages are only reported once the sandbox check passed
+        return bool(self.languages)
+
+    def runtimes(self) -> list[dict]:
+        """Installed languages in the Piston /runtimes format."""
+        aliases = {}
+        for alias, name in LANGUAGE_ALIASES.items():
+            aliases.setdefault(name, []).append(alias)
+        return [{"language": lang.name, "version": lang.version, "aliases": aliases.get(lang.name, []),
+                 "runtime": "local"} for lang in self.languages.values()]
+
+    async def list_runtimes(self) -> list[dict]:
+        if self._languages is None:
+            self._languages = await asyncio.to_thread(_discover_languages)
+        return self.runtimes()
+
+    def _ensure_loop(self) -> None:
+        # The semaphore and the fork server's pipes belong to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._server = _ForkServer(list(self.languages), self.pool_size)
+            self._loop = loop
+
+    async def warm_up(self) -> None:
+        """Check the sandbox, detect toolchains and fill the pools ahead of the first run."""
+        if self._languages is None:
+            self._languages = await asyncio.to_thread(_discover_languages)
+        self._ensure_loop()
+        if self._languages and not self._server.alive:
+            await self._server.start()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            await self._server.close()
+
+    # ─── Running ──────────────────────────────────────
+    def _job(self, lang: _Language, code: str) -> tuple[_Language, dict]:
+        """The job sent to a fork server member, and the language as adjusted for this source."""
+        if lang.name == "java":
+            # javac wants the file named after the public class
+            match = re.search(r"public\s+class\s+(\w+)", code)
+            if match:
+                filename = f"{match.group(1)}.java"
+                lang = _Language(**{**lang.__dict__, "filename": filename,
+                                    "compile": ["javac", filename], "run": lang.run[:-1] + [match.group(1)]})
+        memory_mb = self.memory_mb if lang.memory_limit else None
+        return lang, {
+            "filename": lang.filename, "code": code, "compile": lang.compile,
+            "run": None if lang.forked else lang.run,
+            "compile_timeout": COMPILE_TIMEOUT_SECONDS,
+            "compile_limits": _rlimits(COMPILE_TIMEOUT_SECONDS + 1, None, self.max_procs),
+            "timeout": self.timeout, "limits": _rlimits(self.timeout + 1, memory_mb, self.max_procs),
+        }
+
+    @asynccontextmanager
+    async def _started(self, lang: _Language, job: dict, fds: list[int]):
+        """Start a job, handing it `fds` (closed here); yields its id and the reader for its JSON-lines report."""
+        try:
+            job_id, ctl = await self._server.submit(lang.name, fds)
+        finally:
+            for fd in fds:
+                os.close(fd)
+        reader, writer = await asyncio.open_unix_connection(sock=ctl, limit=EVENT_LIMIT)
+        try:
+            writer.write(json.dumps(job).encode())
+            writer.write_eof()
+            yield job_id, reader
+        finally:
+            writer.close()
+
+    async def _compiled(self, lang: _Language, job_id: int, events: asyncio.StreamReader) -> dict | None:
+        """Wait for the compile step; returns the compile error, if any."""
+        try:
+            line = await asyncio.wait_for(events.readline(), COMPILE_TIMEOUT_SECONDS + 5)
+        except asyncio.TimeoutError:
+            line = b""
+        if not line:
+            self._server.kill(job_id)
+            raise RunnerUnavailable("local sandbox failed to start the job")
+        event = json.loads(line)
+        if "compile_error" in event:
+            return _result(stderr=event["compile_error"], code=event["code"], language=lang.name,
+                           version=lang.version)
+        return None
+
+    def _outcome(self, lang: _Language, event: dict, stdout: str, stderr: str) -> dict:
+        if event.get("not_run"):
+            return _result(stderr="Not run: the time budget for this batch ran out.", code=1,
+                           signal_name="SIGKILL", language=lang.name, version=lang.version)
+        if event["timed_out"]:
+            self.counters["timeouts"] += 1
+            return _result(stdout, f"Execution timed out ({self.timeout}s limit).", 1, "SIGKILL",
+                           lang.name, lang.version)
+        returncode = event["exit"]
+        signal_name = signal.Signals(-returncode).name if returncode < 0 else None
+        return _result(stdout, stderr, returncode if returncode >= 0 else 1, signal_name, lang.name, lang.version)
+
+    async def _execute(self, lang: _Language, code: str, stdin: str) -> dict:
+        lang, job = self._job(lang, code)
+        loop = asyncio.get_running_loop()
+        in_r, in_w = os.pipe()
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        stdout, stderr = asyncio.StreamReader(), asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdout), open(out_r, "rb", 0))
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stderr), open(err_r, "rb", 0))
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, open(in_w, "wb", 0))
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+        out, err = bytearray(), bytearray()
+
+        async def feed():
+            try:
+                writer.write(stdin.encode())
+                await writer.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                writer.close()
+
+        async def pump(stream, buf):
+            while chunk := await stream.read(8192):
+                room = OUTPUT_LIMIT_BYTES - len(buf)
+                buf.extend(chunk[:room])
+                if len(chunk) > room:
+                    buf.extend(b"\n[output truncated]")
+                    self._server.kill(job_id)
+                    return
+
+        try:
+            async with self._started(lang, job, [in_r, out_w, err_w]) as (job_id, events):
+                error = await self._compiled(lang, job_id, events)
+                if error:
+                    return error
+
+                async def finished():
+                    line = await events.readline()
+                    return json.loads(line) if line else {"exit": -signal.SIGKILL, "timed_out": False}
+
+                try:
+                    # The member enforces the timeout; this only covers a member that stopped answering
+                    _, _, _, event = await asyncio.wait_for(
+                        asyncio.gather(feed(), pump(stdout, out), pump(stderr, err), finished()), self.timeout + 5
+                    )
+                except asyncio.TimeoutError:
+                    self._server.kill(job_id)
+                    event = {"exit": -signal.SIGKILL, "timed_out": True}
+        finally:
+            writer.close()
+        return self._outcome(lang, event, out.decode("utf-8", "replace"), err.decode("utf-8", "replace"))
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the runner's slots, or raise RunnerBusy when the queue is full."""
+        self._ensure_loop()
+        if self._waiting >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise RunnerBusy()
+        self._waiting += 1
+        self.counters["peak_waiting"] = max(self.counters["peak_waiting"], self._waiting)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), QUEUE_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            self.counters["rejected"] += 1
+            raise RunnerBusy()
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _language(self, language: str) -> _Language:
+        lang = self.languages.get(normalize_language(language))
+        if lang is None:
+            raise RunnerUnavailable(f"{language} is not installed locally")
+        return lang
+
+    async def run(self, language: str, code: str, stdin: str = "", version: str = "*") -> dict:
+        lang = self._language(language)
+        async with self._slot():
+            self.counters["runs"] += 1
+            return await self._execute(lang, code, stdin)
+
+    async def run_batch(self, language: str, code: str, inputs: list[str]) -> list[dict]:
+        """
+        Run one program once per stdin in `inputs` (test cases) as a single job
+        in one slot: the source is written and compiled once and every input
+        gets a fresh process in the same sandbox. A compile error is returned for
+        every input; inputs left when BATCH_TIMEOUT_SECONDS is used up are not run.
+        """
+        lang = self._language(language)
+        async with self._slot():
+            self.counters["batches"] += 1
+            lang, job = self._job(lang, code)
+            reports = []
+            async with self._started(lang, {**job, "inputs": inputs, "batch_timeout": BATCH_TIMEOUT_SECONDS},
+                                     []) as (job_id, events):
+                error = await self._compiled(lang, job_id, events)
+                if error:
+                    return [dict(error) for _ in inputs]
+
+                async def collect():
+                    while len(reports) < len(inputs) and (line := await events.readline()):
+                        reports.append(json.loads(line))
+
+                try:
+                    await asyncio.wait_for(collect(), BATCH_TIMEOUT_SECONDS + self.timeout + 5)
+                except asyncio.TimeoutError:
+                    self._server.kill(job_id)
+            results = []
+            for event in reports + [{"not_run": True}] * (len(inputs) - len(reports)):
+                if not event.get("not_run"):
+                    self.counters["runs"] += 1
+                results.append(self._outcome(lang, event, event.get("stdout", ""), event.get("stderr", "")))
+            return results
+
+
+# ─── Remote adapters ─────────────────────────────────────────────────────────
+
+class _RemoteBackend:
+    isolated = True  # programs run on someone else's machine
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self._loop = None
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(timeout=REMOTE_TIMEOUT)
+            self._loop = loop
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def run_batch(self, language: str, code: str, inputs: list[str]) -> list[dict]:
+        """
+        Run one program once per stdin in `inputs`. Python goes out as a single
+        request running PYTHON_BATCH_HARNESS over every input; inputs it did not
+        report, and other languages, are sent one request each, a few at a time.
+        """
+        results: list[dict | None] = [None] * len(inputs)
+        if normalize_language(language) == "python" and len(inputs) > 1:
+            harness = (f"CODE = {json.dumps(code)}\nINPUTS = {json.dumps(inputs)}\n"
+                       f"CASE_SECONDS = {REMOTE_CASE_TIMEOUT_SECONDS}\nOUTPUT_LIMIT = {OUTPUT_LIMIT_BYTES}\n"
+                       + PYTHON_BATCH_HARNESS)
+            batch = await self.run(language, harness)
+            for line in (batch["stdout"] or "").splitlines():
+                try:
+                    case = json.loads(line)
+                    i = case["case"]
+                    if not 0 <= i < len(inputs) or results[i] is not None:
+                        continue
+                    if case["timed_out"]:
+                        results[i] = _result(case["stdout"], f"Execution timed out ({REMOTE_CASE_TIMEOUT_SECONDS}s limit).",
+                                             1, "SIGKILL", batch["language"], batch["version"])
+                    else:
+                        results[i] = _result(case["stdout"], case["stderr"], case["code"], case["signal"],
+                                             batch["language"], batch["version"])
+                except (ValueError, TypeError, KeyError):
+                    continue
+
+        slots = asyncio.Semaphore(REMOTE_BATCH_CONCURRENCY)
+
+        async def one(i: int) -> None:
+            async with slots:
+                results[i] = await self.run(language, code, inputs[i])
+
+        outcomes = await asyncio.gather(*(one(i) for i, r in enumerate(results) if r is None), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return results
+
+
+class PistonBackend(_RemoteBackend):
+    """The public Piston API (emkc.org)."""
+
+    name = "piston"
+
+    async def list_runtimes(self) -> list[dict]:
+        """Piston's GET /runtimes."""
+        try:
+            resp = await self._http().get(f"{PISTON_URL}/runtimes")
+        except httpx.HTTPError as e:
+            raise RunnerUnavailable(f"Piston: {e}")
+        if not resp.is_success:
+            raise RunnerUnavailable(f"Piston: {resp.status_code}")
+        try:
+            runtimes = resp.json()
+        except ValueError:
+            raise RunnerUnavailable("Piston: invalid /runtimes response")
+        if not isinstance(runtimes, list):
+            raise RunnerUnavailable("Piston: invalid /runtimes response")
+        return runtimes
+
+    async def run(self, language: str, code: str, stdin: str = "", version: str = "*") -> dict:
+        try:
+            resp = await self._http().post(f"{PISTON_URL}/execute", json={
+                "language": language,
+                "version": version,
+                "files": [{"content": code}],
+                "stdin": stdin
+            })
+        except httpx.HTTPError as e:
+            raise RunnerUnavailable(f"Piston: {e}")
+        if not resp.is_success:
+            raise RunnerUnavailable(f"Piston: {resp.status_code}")
+        data = resp.json()
+        run_result = data.get("run", {})
+        compile_result = data.get("compile", {})
+        return _result(run_result.get("stdout", ""),
+                       run_result.get("stderr", "") or compile_result.get("stderr", ""),
+                       run_result.get("code", 0), run_result.get("signal"),
+                       data.get("language"), data.get("version"))
+
+
+class GodboltBackend(_RemoteBackend):
+    """Compiler Explorer (godbolt.org) execution API."""
+
+    name = "godbolt"
+
+    async def run(self, language: str, code: str, stdin: str = "", version: str = "*") -> dict:
+        lang_str = language.lower()
+        gb_compiler = "python311"
+        if "java" in lang_str and "javascript" not in lang_str:
+            gb_compiler = "java2100"
+            # Godbolt always saves Java files as "example.java"
+            # So rename the public class to "example" to avoid compile error
+            code = re.sub(r'public\s+class\s+\w+', 'public class example', code)
+        elif "c++" in lang_str or "cpp" in lang_str:
+            gb_compiler = "g141"
+        elif "javascript" in lang_str or "node" in lang_str:
+            gb_compiler = "v8113"
+
+        try:
+            res = await self._http().post(
+                f"{GODBOLT_URL}/{gb_compiler}/compile",
+                json={
+                    "source": code,
+                    "options": {
+                        "userArguments": "",
+                        "executeParameters": {"args": [], "stdin": stdin},
+                        "compilerOptions": {"executorRequest": True}
+                    },
+                    "filters": {"execute": True}
+                },
+                headers={"Accept": "application/json"}
+            )
+        except httpx.TimeoutException:
+            # Reported like a killed run, so callers do not memoise it (code_tests.run_cases)
+            return _result(stderr=f"Execution timed out ({REMOTE_TIMEOUT:.0f}s limit).", code=1, signal_name="SIGKILL")
+        except httpx.HTTPError as e:
+            raise RunnerUnavailable(f"Godbolt: {e}")
+        if not res.is_success:
+            raise RunnerUnavailable(f"Godbolt execution failed: {res.status_code}")
+
+        data = res.json()
+        # Godbolt returns stdout/stderr as list of {"text": "..."} dicts
+        out_arr = data.get("stdout", [])
+        err_arr = data.get("stderr", [])
+        build_err_arr = data.get("buildResult", {}).get("stderr", [])
+        return _result("\n".join(x.get("text", "") for x in out_arr),
+                       "\n".join(x.get("text", "") for x in err_arr + build_err_arr),
+                       data.get("code", 0), None, lang_str, gb_compiler)
+
+
+# ─── Dispatcher ──────────────────────────────────────────────────────────────
+
+class CodeExecutor:
+    """Tries the configured backends in order (CODE_RUNNER_BACKENDS)."""
+
+    def __init__(self, backends: list):
+        self.backends = backends
+
+    def backend(self, name: str):
+        return next((b for b in self.backends if b.name == name), None)
+
+    async def run(self, language: str, code: str, stdin: str = "", version: str = "*") -> dict:
+        """
+        Run on the first backend able to. RunnerBusy from the local runner is
+        raised as-is (backpressure); RunnerUnavailable once every backend failed.
+        """
+        errors = []
+        for backend in self.backends:
+            try:
+                return await backend.run(language, code, stdin, version)
+            except RunnerUnavailable as e:
+                errors.append(str(e))
+        raise RunnerUnavailable("; ".join(errors) or "no code runner configured")
+
+    async def run_batch(self, language: str, code: str, inputs: list[str], isolated_only: bool = False) -> list[dict]:
+        """
+        Run one program against several stdins, as one batched execution where
+        the backend can: one sandbox job on the local runner, one request for
+        Python on remote backends. With `isolated_only`, backends that do not
+        declare `isolated` are skipped.
+        """
+        errors = []
+        for backend in self.backends:
+            if isolated_only and not getattr(backend, "isolated", False):
+                errors.append(f"{backend.name}: not isolated")
+                continue
+            try:
+                return await backend.run_batch(language, code, inputs)
+            except RunnerUnavailable as e:
+                errors.append(str(e))
+        raise RunnerUnavailable("; ".join(errors) or "no code runner configured")
+
+    async def start(self) -> None:
+        local = self.backend("local")
+        if local:
+            await local.warm_up()
+
+    async def close(self) -> None:
+        for backend in self.backends:
+            await backend.close()
+
+
+def _build_executor() -> CodeExecutor:
+    available = {
+        "local": lambda: LocalRunner(settings.CODE_RUNNER_MAX_CONCURRENCY, settings.CODE_RUNNER_MAX_QUEUE,
+                                     settings.CODE_RUNNER_TIMEOUT_SECONDS, settings.CODE_RUNNER_MEMORY_MB,
+                                     settings.CODE_RUNNER_MAX_PROCS, settings.CODE_RUNNER_POOL_SIZE),
+        "piston": PistonBackend,
+        "godbolt": GodboltBackend,
+    }
+    names = [n.strip().lower() for n in settings.CODE_RUNNER_BACKENDS.split(",") if n.strip()]
+    return CodeExecutor([available[n]() for n in names if n in available])
+
+
+code_executor = _build_executor()
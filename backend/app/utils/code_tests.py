@@ -0,0 +1,79 @@
+import hashlib
+import json
+
+from app.utils.ai_cache import ai_cache
+from app.utils.code_runner import code_executor, normalize_language
+
+# Cases per question beyond this are ignored
+MAX_CASES = 25
+# Cut-offs for what is stored per case in responses["results"]
+SHOWN_OUTPUT_CHARS = 2000
+SHOWN_ERROR_CHARS = 1000
+
+
+def question_cases(question: dict) -> list[dict]:
+    """
+    The question's test cases as [{"input", "output", "hidden"}], or [] if it
+    has none. Cases are stored on the question in structured_content:
+        "test_cases": [{"input": "3\\n", "output": "6", "hidden": false}]
+    ("stdin" / "expected_output" are accepted as key names too).
+    """
+    cases = []
+    for case in question.get("test_cases") or []:
+        if not isinstance(case, dict):
+            continue
+        expected = case.get("output", case.get("expected_output"))
+        if expected is None:
+            continue
+        cases.append({
+            "input": str(case.get("input", case.get("stdin")) or ""),
+            "output": str(expected),
+            "hidden": bool(case.get("hidden", False)),
+        })
+    return cases[:MAX_CASES]
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def suite_hash(cases: list[dict]) -> str:
+    return _sha(json.dumps([[c["input"], c["output"], c["hidden"]] for c in cases], separators=(",", ":")))
+
+
+def _normalize(output: str) -> str:
+    """Outputs are compared ignoring trailing spaces on each line and trailing blank lines."""
+    return "\n".join(line.rstrip() for line in output.replace("\r\n", "\n").rstrip().split("\n"))
+
+
+async def run_cases(language: str, code: str, cases: list[dict]) -> dict:
+    """
+    Run `code` against `cases` in one batched execution and return
+    {"passed", "total", "cases": [...]}. A case passes when the program exits 0
+    and its stdout matches the expected output; hidden cases only report
+    pass/fail. Results are memoised on (language, code hash, suite hash) in the
+    result cache, so identical code is not run twice; runs cut short by a
+    timeout or kill are not memoised. Only isolated backends (the sandboxed
+    local runner, remote services) are used; RunnerUnavailable when none can.
+    """
+    payload = {"kind": "code_tests", "language": normalize_language(language),
+               "code": _sha(code), "suite": suite_hash(cases)}
+    cached = await ai_cache.get(payload)
+    if cached is not None:
+        return cached
+
+    runs = await code_executor.run_batch(language, code, [c["input"] for c in cases], isolated_only=True)
+    case_results = []
+    for case, run in zip(cases, runs):
+        passed = run["code"] == 0 and _normalize(run["stdout"] or "") == _normalize(case["output"])
+        entry = {"passed": passed, "hidden": case["hidden"]}
+        if not case["hidden"]:
+            entry.update(input=case["input"], expected=case["output"],
+                         actual=(run["stdout"] or "")[:SHOWN_OUTPUT_CHARS])
+        if not passed and run["stderr"]:
+            entry["error"] = run["stderr"][-SHOWN_ERROR_CHARS:]
+        case_results.append(entry)
+    result = {"passed": sum(1 for c in case_results if c["passed"]), "total": len(cases), "cases": case_results}
+    if not any(run.get("signal") for run in runs):
+        await ai_cache.put(payload, "code_tests", result)
+    return result
@@ -0,0 +1,51 @@
+"""
+Streaming CSV exports.
+
+Report endpoints hand `csv_response` an async generator of rows. Rows are
+formatted incrementally and flushed to the client in ~64KB chunks, and DB reads go
+through `stream_query`, which pages results with a server-side cursor. Peak memory
+is bounded by the chunk size and the cursor page, not by the report's date range.
+
+The request's `db` session is closed before a StreamingResponse body is sent, so
+anything read while streaming must use `stream_query` (its own session).
+"""
+import csv
+import io
+from typing import AsyncIterator, Iterable
+
+from fastapi.responses import StreamingResponse
+
+from app.database import AsyncSessionLocal
+
+CHUNK_SIZE = 64 * 1024
+CURSOR_PAGE_SIZE = 1000
+
+
+async def stream_query(stmt, page_size: int = CURSOR_PAGE_SIZE) -> AsyncIterator:
+    """Yield result rows from a server-side cursor, `page_size` rows at a time."""
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=page_size))
+        async for row in result:
+            yield row
+
+
+async def stream_csv(rows: AsyncIterator[Iterable]) -> AsyncIterator[str]:
+    """Format rows as CSV, yielding a chunk whenever the buffer reaches CHUNK_SIZE."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def csv_response(rows: AsyncIterator[Iterable], filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_csv(rows),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
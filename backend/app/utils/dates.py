@@ -0,0 +1,23 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_
+
+
+def day_start(day: date) -> datetime:
+    """Midnight of `day` as a naive datetime (the DB stores naive timestamps)."""
+    return datetime.combine(day, time.min)
+
+
+def on_day(column, day: date):
+    """
+    `column` falls on `day`, as a half-open range [day 00:00, next day 00:00).
+
+    Use this instead of `func.date(column) == day`: wrapping the column in a
+    function stops SQLite and PostgreSQL from using an index on it.
+    """
+    return between_days(column, day, day)
+
+
+def between_days(column, start: date, end: date):
+    """`column` falls on any day from `start` to `end` inclusive (half-open range)."""
+    return and_(column >= day_start(start), column < day_start(end) + timedelta(days=1))
@@ -1,116 +1,120 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+"""
+Email templates, compiled once at import.
+
+A template is a subject, a plain-text body and an HTML body placed in the
+shared layout. `render(name, to_email, context)` fills them in, HTML-escaping
+every value except those whose key ends in `_html`, and returns the message.
+Handlers queue mail with `app.utils.mailer.mailer.enqueue`; the mailer renders
+and sends it.
+"""
+from email.message import EmailMessage
+from html import escape
+from string import Template
+
 from app.config import settings
-import logging
-
-logger = logging.getLogger(__name__)
-
-def send_verification_email(to_email: str, code: str):
-    """Send verification code via SMTP."""
-    subject = "Verify your Apptech Careers LMS account"
-    
-    html_content = f"""
-    <html>
-      <body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #1a1a2e; padding: 20px; background-color: #f4f7f6;">
-        <div style="background: #ffffff; padding: 40px; border-radius: 24px; border: 1px solid #e2e8f0; max-width: 500px; margin: 0 auto; box-shadow: 0 10px 25px rgba(0,0,0,0.05);">
-            <div style="text-align: center; margin-bottom: 30px;">
-                <h2 style="color: #0066ff; margin: 0; font-size: 28px; font-weight: 800;">Apptech Careers</h2>
-                <p style="color: #64748b; margin-top: 5px; font-size: 16px;">Learning Management System</p>
-            </div>
-            
-            <div style="border-top: 2px solid #f1f5f9; padding-top: 30px;">
-                <p style="font-size: 16px; line-height: 1.6; color: #334155;">Hello,</p>
-                <p style="font-size: 16px; line-height: 1.6; color: #334155;">Thank you for registering. Please use the following verification code to complete your account setup:</p>
-                
-                <div style="font-size: 36px; font-weight: 900; letter-spacing: 6px; color: #0066ff; padding: 30px 0; text-align: center; background: #f8fafc; border-radius: 16px; margin: 25px 0;">
-                    {code}
-                </div>
-                
-                <p style="color: #64748b; font-size: 14px; text-align: center; margin-top: 20px;">
-                    This code will expire in 24 hours.<br>
-                    If you didn't request this, please ignore this email.
-                </p>
-            </div>
-            
-            <div style="margin-top: 40px; padding-top: 20px; border-top: 1px solid #f1f5f9; text-align: center;">
-                <p style="color: #94a3b8; font-size: 12px; margin: 0;">© 2026 Apptech Careers Software. All rights reserved.</p>
-            </div>
+
+_LAYOUT_HEAD = """\
+<html>
+  <body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #1a1a2e; padding: 20px; background-color: #f4f7f6;">
+    <div style="background: #ffffff; padding: 40px; border-radius: 24px; border: 1px solid #e2e8f0; max-width: 500px; margin: 0 auto; box-shadow: 0 10px 25px rgba(0,0,0,0.05);">
+"""
+_LAYOUT_TAIL = """\
+        <div style="margin-top: 40px; padding-top: 20px; border-top: 1px solid #f1f5f9; text-align: center;">
+            <p style="color: #94a3b8; font-size: 12px; margin: 0;">© 2026 Apptech Careers Software. All rights reserved.</p>
         </div>
-      </body>
-    </html>
-    """
-    
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
-    msg["From"] = settings.SMTP_SENDER
-    msg["To"] = to_email
-    
-    msg.attach(MIMEText(f"Your verification code is: {code}", "plain"))
-    msg.attach(MIMEText(html_content, "html"))
-    
-    try:
-        print(f"DEBUG: Attempting to send email to {to_email} via {settings.SMTP_HOST}:{settings.SMTP_PORT}")
-        print(f"DEBUG: Using sender: {settings.SMTP_SENDER}")
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            server.set_debuglevel(1)  # Enable debug output in logs
-            server.starttls()
-            print(f"DEBUG: Logging in as {settings.SMTP_USER}")
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.sendmail(settings.SMTP_USER, to_email, msg.as_string())
-        print(f"DEBUG: Email sent successfully to {to_email}")
-        return True
-    except Exception as e:
-        print(f"DEBUG: Failed to send email to {to_email}: {str(e)}")
-        logger.error(f"Failed to send email to {to_email}: {e}")
-        return False
-def send_leave_status_email(to_email: str, status: str, leave_details: dict, rejection_reason: str = None):
-    """Notify student about leave approval/rejection."""
-    subject = f"Leave Request {status.capitalize()}"
-    
-    status_color = "#10b981" if status == "APPROVED" else "#ef4444"
-    
-    html_content = f"""
-    <html>
-      <body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #1a1a2e; padding: 20px; background-color: #f4f7f6;">
-        <div style="background: #ffffff; padding: 40px; border-radius: 24px; border: 1px solid #e2e8f0; max-width: 500px; margin: 0 auto; box-shadow: 0 10px 25px rgba(0,0,0,0.05);">
-            <div style="text-align: center; margin-bottom: 30px;">
-                <h2 style="color: #0066ff; margin: 0; font-size: 28px; font-weight: 800;">Apptech Careers</h2>
-            </div>
-            
-            <div style="border-top: 2px solid #f1f5f9; padding-top: 30px;">
-                <p style="font-size: 16px; line-height: 1.6; color: #334155;">Hello,</p>
-                <p style="font-size: 16px; line-height: 1.6; color: #334155;">Your leave request for <b>{leave_details.get('start_date')}</b> to <b>{leave_details.get('end_date')}</b> has been <span style="color: {status_color}; font-weight: bold;">{status}</span>.</p>
-                
-                {f'<p style="background: #fff5f5; border-left: 4px solid #fecaca; padding: 12px; color: #b91c1c; margin-top: 15px;"><b>Reason for rejection:</b> {rejection_reason}</p>' if rejection_reason else ''}
-
-                <p style="color: #64748b; font-size: 14px; margin-top: 20px;">
-                    Log in to the LMS dashboard for more details.
-                </p>
-            </div>
-            
-            <div style="margin-top: 40px; padding-top: 20px; border-top: 1px solid #f1f5f9; text-align: center;">
-                <p style="color: #94a3b8; font-size: 12px; margin: 0;">© 2026 Apptech Careers Software. All rights reserved.</p>
+    </div>
+  </body>
+</html>
+"""
+
+
+class EmailTemplate:
+    def __init__(self, subject: str, text: str, html: str):
+        self.subject = Template(subject)
+        self.text = Template(text)
+        self.html = Template(_LAYOUT_HEAD + html + _LAYOUT_TAIL)
+
+    def render(self, context: dict) -> tuple[str, str, str]:
+        """(subject, text, html)."""
+        plain = {k: str(v) for k, v in context.items()}
+        html = {k: v if k.endswith("_html") else escape(v) for k, v in plain.items()}
+        return self.subject.substitute(plain), self.text.substitute(plain), self.html.substitute(html)
+
+
+TEMPLATES = {
+    "verification": EmailTemplate(
+        subject="Verify your Apptech Careers LMS account",
+        text="Your verification code is: $code",
+        html="""\
+        <div style="text-align: center; margin-bottom: 30px;">
+            <h2 style="color: #0066ff; margin: 0; font-size: 28px; font-weight: 800;">Apptech Careers</h2>
+            <p style="color: #64748b; margin-top: 5px; font-size: 16px;">Learning Management System</p>
+        </div>
+
+        <div style="border-top: 2px solid #f1f5f9; padding-top: 30px;">
+            <p style="font-size: 16px; line-height: 1.6; color: #334155;">Hello,</p>
+            <p style="font-size: 16px; line-height: 1.6; color: #334155;">Thank you for registering. Please use the following verification code to complete your account setup:</p>
+
+            <div style="font-size: 36px; font-weight: 900; letter-spacing: 6px; color: #0066ff; padding: 30px 0; text-align: center; background: #f8fafc; border-radius: 16px; margin: 25px 0;">
+                $code
             </div>
+
+            <p style="color: #64748b; font-size: 14px; text-align: center; margin-top: 20px;">
+                This code will expire in $expires.<br>
+                If you didn't request this, please ignore this email.
+            </p>
+        </div>
+""",
+    ),
+    "leave_status": EmailTemplate(
+        subject="Leave Request $status_title",
+        text="Your leave request has been $status.",
+        html="""\
+        <div style="text-align: center; margin-bottom: 30px;">
+            <h2 style="color: #0066ff; margin: 0; font-size: 28px; font-weight: 800;">Apptech Careers</h2>
+        </div>
+
+        <div style="border-top: 2px solid #f1f5f9; padding-top: 30px;">
+            <p style="font-size: 16px; line-height: 1.6; color: #334155;">Hello,</p>
+            <p style="font-size: 16px; line-height: 1.6; color: #334155;">Your leave request for <b>$start_date</b> to <b>$end_date</b> has been <span style="color: $status_color; font-weight: bold;">$status</span>.</p>
+
+            $reason_html
+
+            <p style="color: #64748b; font-size: 14px; margin-top: 20px;">
+                Log in to the LMS dashboard for more details.
+            </p>
         </div>
-      </body>
-    </html>
-    """
-    
-    msg = MIMEMultipart("alternative")
+""",
+    ),
+}
+
+_REJECTION_REASON = Template(
+    '<p style="background: #fff5f5; border-left: 4px solid #fecaca; padding: 12px; color: #b91c1c; '
+    'margin-top: 15px;"><b>Reason for rejection:</b> $reason</p>'
+)
+
+
+def verification_context(code: str, expires: str = "24 hours") -> dict:
+    return {"code": code, "expires": expires}
+
+
+def leave_status_context(status: str, leave_details: dict, rejection_reason: str | None = None) -> dict:
+    return {
+        "status": status,
+        "status_title": status.capitalize(),
+        "status_color": "#10b981" if status == "APPROVED" else "#ef4444",
+        "start_date": leave_details.get("start_date"),
+        "end_date": leave_details.get("end_date"),
+        "reason_html": _REJECTION_REASON.substitute(reason=escape(rejection_reason)) if rejection_reason else "",
+    }
+
+
+def render(template: str, to_email: str, context: dict) -> EmailMessage:
+    subject, text, html = TEMPLATES[template].render(context)
+    msg = EmailMessage()
     msg["Subject"] = subject
     msg["From"] = settings.SMTP_SENDER
     msg["To"] = to_email
-    
-    msg.attach(MIMEText(f"Your leave request has been {status}.", "plain"))
-    msg.attach(MIMEText(html_content, "html"))
-    
-    try:
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.sendmail(settings.SMTP_USER, to_email, msg.as_string())
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send leave email to {to_email}: {e}")
-        return False
+    msg.set_content(text)
+    msg.add_alternative(html, subtype="html")
+    return msg
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import random
+
+import httpx
+
+from app.config import settings
+
+DEFAULT_TIMEOUT = 40.0
+# Backoff after a 429: base * 2**attempt, with full jitter, capped; a Retry-After
+# header from Groq takes precedence when it is present.
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 20.0
+
+
+class GroqClient:
+    """
+    Async client for the Groq chat-completions API, shared by every AI feature.
+
+    One pooled httpx.AsyncClient per worker keeps TLS connections to Groq warm,
+    and a semaphore bounds how many requests a worker has in flight so a burst of
+    submissions queues here instead of tripping Groq's rate limit. 429 responses
+    are retried with jittered exponential backoff, except for callers that pass
+    `max_retries=0` because someone is waiting on the answer (the chatbot).
+    """
+
+    def __init__(self, url: str, max_concurrency: int, max_retries: int):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop = None
+
+    @property
+    def api_key(self) -> str | None:
+        return os.environ.get("GROQ_API_KEY")
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        # The client and semaphore belong to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    def _backoff(self, attempt: int, resp: httpx.Response) -> float:
+        retry_after = resp.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    async def chat(self, payload: dict, timeout: float | None = None,
+                   max_retries: int | None = None) -> httpx.Response:
+        """
+        POST a chat-completions payload and return the final response.
+        `max_retries` overrides the client's 429 retry budget for this call.
+        Network errors and timeouts propagate as httpx exceptions.
+        """
+        retries = max_retries if max_retries is not None else self.max_retries
+        client = self._ensure_client()
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                resp = await client.post(self.url, headers=headers, json=payload,
+                                         timeout=timeout if timeout is not None else DEFAULT_TIMEOUT)
+            if resp.status_code != 429 or attempt >= retries:
+                return resp
+            delay = self._backoff(attempt, resp)
+            attempt += 1
+            print(f"[Groq] 429 rate limited, retry {attempt}/{retries} in {delay:.1f}s")
+            # Sleep outside the semaphore so other requests can use the slot
+            await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+groq_client = GroqClient(settings.GROQ_API_URL, settings.GROQ_MAX_CONCURRENCY, settings.GROQ_MAX_RETRIES)
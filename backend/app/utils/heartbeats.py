@@ -0,0 +1,320 @@
+"""
+Write-coalescing heartbeat ingestion for assessment sessions.
+
+Every student in a proctored assessment sends a heartbeat every few seconds
+(their latest answers, plus any proctoring event). Instead of loading the
+session and its Task/Assignment and writing the row on every call, each worker
+keeps the live state of the sessions it serves in memory:
+
+  * start time and time limit, so the remaining time needs no query,
+  * violation counters, plus increments not yet written,
+  * the latest answer map and the time of the last heartbeat.
+
+Buffered state is written every HEARTBEAT_FLUSH_SECONDS in one transaction for
+all sessions, and right away on a state transition (a violation, an auto-submit
+or inactivity cancel, a submit). Counters are written as increments and answers
+only where nothing newer is stored, so several Passenger workers can serve the
+same session. Shutdown flushes everything; a worker that dies loses at most one
+interval of answers (violations are never held back).
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.project import AssessmentSession, Assignment, Task
+from app.utils.assessment_store import normalize_answers, save_answers_many
+
+# Heartbeat flag -> (session counter column, violation type)
+COUNTERS = {
+    "tab_switched": ("tab_switch_count", "TAB_SWITCHING"),
+    "fullscreen_exited": ("fullscreen_exit_count", "FULLSCREEN_EXIT"),
+    "face_violation": ("face_violation_count", "FACE_LOSS"),
+    "mic_violation": ("mic_violation_count", "MIC_OFF"),
+}
+INACTIVITY_SECONDS = 600  # a student gone this long has their session cancelled
+MAX_TAB_SWITCHES = 10  # auto-submit threshold
+# Re-read the session and time limit this often (a trainer may extend the time)
+RELOAD_AFTER_SECONDS = 300
+# last_heartbeat only backs the 10-minute rule: write it at most this often
+TOUCH_SECONDS = 60
+# Forget sessions with nothing buffered and no heartbeat for this long
+IDLE_EVICT_SECONDS = 900
+MAX_BATCH_SIZE = 200
+
+
+def last_activity(session: AssessmentSession) -> datetime | None:
+    """Latest of the last written heartbeat and the last change to the row."""
+    times = [t.replace(tzinfo=None) for t in (session.last_heartbeat, session.updated_at) if t]
+    return max(times) if times else None
+
+
+@dataclass(slots=True)
+class _Pending:
+    deltas: dict[str, int]
+    answers: dict | None
+    answers_at: datetime | None
+    seen_at: datetime | None
+
+
+@dataclass(slots=True)
+class LiveSession:
+    id: str
+    student_id: str
+    reference_id: str
+    reference_type: str
+    batch_id: str | None
+    start_time: datetime
+    time_limit: int  # minutes, 0 = none
+    last_active: datetime | None
+    touched_at: datetime | None  # last_heartbeat as last written
+    counts: dict[str, int]  # as last read from the DB
+    loaded_at: float
+    completed: bool = False
+    score: float | None = None
+    deltas: dict[str, int] = field(default_factory=dict)
+    answers: dict | None = None
+    answers_at: datetime | None = None
+    seen_at: datetime | None = None
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.deltas) or self.answers is not None or self.seen_at is not None
+
+    def elapsed(self, now: datetime) -> float:
+        return (now - self.start_time).total_seconds()
+
+    def remaining_seconds(self, now: datetime) -> int:
+        if self.time_limit <= 0:
+            return 9999
+        return max(0, self.time_limit * 60 - int(self.elapsed(now)))
+
+    def count(self, column: str) -> int:
+        return self.counts.get(column, 0) + self.deltas.get(column, 0)
+
+    def record(self, body: dict, now: datetime) -> str | None:
+        """Buffer one heartbeat; returns the violation type it reports, if any."""
+        if "answers" in body:
+            self.answers = normalize_answers(body["answers"])
+            self.answers_at = now
+        violation = None
+        for flag, (column, kind) in COUNTERS.items():
+            if body.get(flag):
+                self.deltas[column] = self.deltas.get(column, 0) + 1
+                violation = kind
+        self.last_active = now
+        if self.touched_at is None or (now - self.touched_at).total_seconds() >= TOUCH_SECONDS:
+            self.seen_at = now
+        return violation
+
+    def take(self) -> _Pending:
+        pending = _Pending(self.deltas, self.answers, self.answers_at, self.seen_at)
+        self.deltas, self.answers, self.answers_at, self.seen_at = {}, None, None, None
+        return pending
+
+    def restore(self, pending: _Pending) -> None:
+        """Put back state whose write failed, under anything newer."""
+        for column, n in pending.deltas.items():
+            self.deltas[column] = self.deltas.get(column, 0) + n
+        if self.answers is None:
+            self.answers, self.answers_at = pending.answers, pending.answers_at
+        if self.seen_at is None:
+            self.seen_at = pending.seen_at
+
+
+class HeartbeatBuffer:
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._live: dict[str, LiveSession] = {}
+        self._task: asyncio.Task | None = None
+        self.counters = {"heartbeats": 0, "loads": 0, "flushes": 0, "sessions_written": 0,
+                         "closed_elsewhere": 0, "flush_failures": 0}
+
+    @property
+    def coalescing(self) -> bool:
+        """False when HEARTBEAT_FLUSH_SECONDS is 0: every heartbeat is written through."""
+        return self.flush_seconds > 0
+
+    # ─── Live state ──────────────────────────────────────
+    async def _load(self, db: AsyncSession, session_id: str) -> LiveSession | None:
+        session = await db.get(AssessmentSession, session_id)
+        if not session:
+            return None
+        model = Task if session.reference_type == "TASK" else Assignment
+        item = await db.get(model, session.reference_id)
+        self.counters["loads"] += 1
+        return LiveSession(
+            id=session.id,
+            student_id=session.student_id,
+            reference_id=session.reference_id,
+            reference_type=session.reference_type,
+            batch_id=getattr(item, "batch_id", None),
+            start_time=session.start_time,
+            time_limit=(getattr(item, "time_limit", 0) or 0) if item else 0,
+            last_active=last_activity(session),
+            touched_at=session.last_heartbeat,
+            counts={column: getattr(session, column) or 0 for column, _ in COUNTERS.values()},
+            loaded_at=time.monotonic(),
+            completed=bool(session.is_completed),
+            score=session.score,
+        )
+
+    async def get(self, db: AsyncSession, session_id: str) -> LiveSession | None:
+        """The session's live state, loaded on first use and re-read every RELOAD_AFTER_SECONDS."""
+        self.counters["heartbeats"] += 1
+        live = self._live.get(session_id)
+        if live is not None and time.monotonic() - live.loaded_at < RELOAD_AFTER_SECONDS:
+            return live
+        fresh = await self._load(db, session_id)
+        # Another request may have buffered into the old entry while this one loaded
+        current = self._live.get(session_id)
+        if fresh is None or fresh.completed:
+            self._live.pop(session_id, None)
+            return fresh
+        if current is not None:
+            fresh.restore(current.take())
+            if current.last_active and (fresh.last_active is None or current.last_active > fresh.last_active):
+                fresh.last_active = current.last_active
+        self._live[session_id] = fresh
+        return fresh
+
+    def forget(self, session_id: str) -> None:
+        self._live.pop(session_id, None)
+
+    def last_active(self, session: AssessmentSession) -> datetime | None:
+        """Last activity of a session, including heartbeats this worker has not written yet."""
+        live = self._live.get(session.id)
+        times = [t for t in (last_activity(session), live.last_active if live else None) if t]
+        return max(times) if times else None
+
+    async def inactive_seconds(self, db: AsyncSession, live: LiveSession, now: datetime) -> float:
+        """Seconds since the last heartbeat, checked against the DB before it counts as inactive."""
+        if live.last_active is None:
+            return 0
+        idle = (now - live.last_active).total_seconds()
+        if idle <= INACTIVITY_SECONDS:
+            return idle
+        # The recent heartbeats may have gone to another worker
+        row = (await db.execute(
+            select(AssessmentSession.last_heartbeat, AssessmentSession.updated_at)
+            .where(AssessmentSession.id == live.id)
+        )).one_or_none()
+        stored = max((t.replace(tzinfo=None) for t in row if t), default=None) if row else None
+        if stored and stored > live.last_active:
+            live.last_active = stored
+        return (now - live.last_active).total_seconds()
+
+    # ─── Writes ──────────────────────────────────────────
+    async def _apply(self, db: AsyncSession, batch: list[tuple[LiveSession, _Pending]]) -> None:
+        result = await db.execute(
+            select(AssessmentSession).where(AssessmentSession.id.in_([live.id for live, _ in batch]))
+        )
+        sessions = {s.id: s for s in result.scalars().all()}
+        seen, answers = [], []
+        for live, pending in batch:
+            session = sessions.get(live.id)
+            if session is None or session.is_completed:
+                # Submitted or closed through another worker: what was buffered is stale
+                live.completed, live.score = True, session.score if session else None
+                self._live.pop(live.id, None)
+                self.counters["closed_elsewhere"] += 1
+                continue
+            if pending.deltas:
+                values = {column: func.coalesce(getattr(AssessmentSession, column), 0) + n
+                          for column, n in pending.deltas.items()}
+                if pending.seen_at:
+                    values["last_heartbeat"] = pending.seen_at
+                await db.execute(
+                    update(AssessmentSession).where(AssessmentSession.id == live.id).values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                # Other workers' increments are included from here on
+                counts = (await db.execute(
+                    select(*(getattr(AssessmentSession, column) for column, _ in COUNTERS.values()))
+                    .where(AssessmentSession.id == live.id)
+                )).one()
+                live.counts = {column: n or 0 for (column, _), n in zip(COUNTERS.values(), counts)}
+            elif pending.seen_at:
+                seen.append({"id": live.id, "last_heartbeat": pending.seen_at})
+            if pending.seen_at:
+                live.touched_at = pending.seen_at
+            if pending.answers is not None:
+                answers.append((session, pending.answers, pending.answers_at))
+        if seen:
+            await db.execute(update(AssessmentSession), seen)
+        if answers:
+            await save_answers_many(db, answers)
+        self.counters["sessions_written"] += len(batch)
+
+    async def write(self, db: AsyncSession, live: LiveSession) -> None:
+        """Write one session's buffered state in the caller's transaction."""
+        if not live.dirty:
+            return
+        pending = live.take()
+        try:
+            await self._apply(db, [(live, pending)])
+        except Exception:
+            live.restore(pending)
+            raise
+
+    async def settle(self, db: AsyncSession, session_id: str) -> None:
+        """Write and drop a session's buffered state before it is submitted."""
+        live = self._live.pop(session_id, None)
+        if live is not None:
+            await self.write(db, live)
+
+    async def flush(self) -> int:
+        """Write every session's buffered state; returns the number of sessions written."""
+        dirty = [live for live in self._live.values() if live.dirty]
+        for start in range(0, len(dirty), MAX_BATCH_SIZE):
+            batch = [(live, live.take()) for live in dirty[start:start + MAX_BATCH_SIZE]]
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self._apply(db, batch)
+                    await db.commit()
+            except Exception as e:
+                self.counters["flush_failures"] += 1
+                print(f"[Heartbeats] Flush of {len(batch)} session(s) failed, retrying next interval: {e}")
+                for live, pending in batch:
+                    live.restore(pending)
+        self.counters["flushes"] += 1
+        now = datetime.utcnow()
+        for live in list(self._live.values()):
+            if not live.dirty and (now - (live.last_active or live.start_time)).total_seconds() > IDLE_EVICT_SECONDS:
+                self._live.pop(live.id, None)
+        return len(dirty)
+
+    # ─── Lifecycle ───────────────────────────────────────
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[Heartbeats] Flush loop error: {e}")
+
+    def start(self) -> None:
+        if self.coalescing and self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Stop the flush loop and write everything still buffered (called on shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        written = await self.flush()
+        if written:
+            print(f"[Heartbeats] Flushed {written} session(s) on shutdown.")
+
+    def stats(self) -> dict:
+        return {**self.counters, "live_sessions": len(self._live),
+                "buffered": sum(1 for live in self._live.values() if live.dirty),
+                "flush_seconds": self.flush_seconds}
+
+
+heartbeat_buffer = HeartbeatBuffer(settings.HEARTBEAT_FLUSH_SECONDS)
@@ -0,0 +1,284 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models.job import BackgroundJob
+
+# Idle workers re-scan the table this often, which also picks up jobs enqueued by
+# another Passenger worker and retries whose backoff has elapsed
+POLL_INTERVAL_SECONDS = 15
+# A job still "running" after this long belongs to a worker that died mid-job
+STALE_AFTER_SECONDS = 600
+# How often the dispatch loop looks for such jobs (also done once at startup)
+STALE_SWEEP_SECONDS = 60
+# Delay before attempt 2, 3, ...
+RETRY_DELAYS_SECONDS = (30, 120, 300)
+# Samples kept for the latency metrics
+METRIC_WINDOW = 500
+
+# Every queue by name, for the metrics endpoint
+queues: dict[str, "JobQueue"] = {}
+
+
+def _summary(samples) -> dict:
+    if not samples:
+        return {"count": 0, "avg": None, "p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)  # noqa: E731
+    return {"count": len(ordered), "avg": round(sum(ordered) / len(ordered), 3),
+            "p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1], 3)}
+
+
+class JobQueue:
+    """
+    Durable job queue on the `background_jobs` table with a pool of async workers.
+
+    `enqueue` writes the job in the caller's transaction, so the work survives a
+    worker restart as soon as the request commits. Workers claim a job with a
+    conditional UPDATE (pending -> running), so several Passenger processes can
+    share one queue without running a job twice. The job is marked done in the
+    same transaction as the handler's writes; failures retry with a backoff and
+    end as "failed" after `max_attempts`.
+
+    handler(db, ref_id)           does the work; its session is committed on success
+    on_state(db, ref_id, state)   optional, mirrors pending/running/done/failed onto
+                                  the subject row inside the job's transactions
+    recover(db, queue) -> int     optional startup sweep re-enqueueing subjects that
+                                  were left waiting without a job row
+
+    Jobs left "running" by a worker that died are handed back to "pending" once
+    they are STALE_AFTER_SECONDS old, at startup and every STALE_SWEEP_SECONDS.
+    """
+
+    def __init__(self, name: str, handler, concurrency: int, max_attempts: int = 3,
+                 on_state=None, recover=None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.on_state = on_state
+        self.recover = recover
+        self._tasks: list[asyncio.Task] = []
+        self._wake: asyncio.Event | None = None
+        self._pending: asyncio.Queue | None = None
+        self._queued: set[str] = set()
+        self._in_flight = 0
+        self._last_sweep = 0.0
+        self.counters = {"enqueued": 0, "started": 0, "done": 0, "failed": 0, "retried": 0, "stale_reset": 0}
+        self._wait_times = deque(maxlen=METRIC_WINDOW)  # enqueue -> start
+        self._run_times = deque(maxlen=METRIC_WINDOW)  # start -> finish
+        self._latencies = deque(maxlen=METRIC_WINDOW)  # enqueue -> done
+        self._finished_at = deque(maxlen=METRIC_WINDOW)
+        queues[name] = self
+
+    # ─── Producers ────────────────────────────────────
+    async def enqueue(self, db: AsyncSession, ref_id: str) -> bool:
+        """
+        Queue work for `ref_id` in the caller's transaction. Idempotent: a job that
+        is already pending or running is left alone, a finished one is reset so the
+        subject is processed again. Returns False when nothing was queued.
+        """
+        job = (await db.execute(
+            select(BackgroundJob).where(BackgroundJob.queue == self.name, BackgroundJob.ref_id == ref_id)
+        )).scalars().first()
+        now = datetime.utcnow()
+        if job is None:
+            db.add(BackgroundJob(queue=self.name, ref_id=ref_id, status="pending", attempts=0,
+                                 available_at=now, enqueued_at=now))
+        elif job.status in ("done", "failed"):
+            job.status, job.attempts, job.last_error = "pending", 0, None
+            job.available_at = job.enqueued_at = now
+            job.started_at = job.finished_at = None
+        else:
+            return False
+        if self.on_state:
+            await self.on_state(db, ref_id, "pending")
+        self.counters["enqueued"] += 1
+        event.listen(db.sync_session, "after_commit", lambda _s: self._wake_up(), once=True)
+        return True
+
+    def _wake_up(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    # ─── Lifecycle ────────────────────────────────────
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._pending = asyncio.Queue()
+        self._queued.clear()
+        try:
+            await self._recover()
+        except Exception as e:
+            print(f"[Jobs:{self.name}] Recovery sweep failed: {e}")
+        self._wake.set()  # first scan right away
+        self._tasks = [asyncio.create_task(self._dispatch_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        print(f"[Jobs:{self.name}] {self.concurrency} worker(s) started.")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _reset_stale(self, db: AsyncSession) -> int:
+        """Hand jobs stuck in "running" past STALE_AFTER_SECONDS back to "pending"."""
+        stale = datetime.utcnow() - timedelta(seconds=STALE_AFTER_SECONDS)
+        result = await db.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.queue == self.name, BackgroundJob.status == "running",
+                   BackgroundJob.started_at < stale)
+            .values(status="pending", available_at=datetime.utcnow())
+        )
+        self._last_sweep = time.monotonic()
+        self.counters["stale_reset"] += result.rowcount
+        return result.rowcount
+
+    async def _recover(self) -> None:
+        async with AsyncSessionLocal() as db:
+            reset = await self._reset_stale(db)
+            orphans = await self.recover(db, self) if self.recover else 0
+            await db.commit()
+        if reset or orphans:
+            print(f"[Jobs:{self.name}] Recovery sweep: {reset} stale job(s) reset, {orphans} orphan(s) re-enqueued.")
+
+    # ─── Workers ──────────────────────────────────────
+    async def _dispatch_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                async with AsyncSessionLocal() as db:
+                    if time.monotonic() - self._last_sweep >= STALE_SWEEP_SECONDS:
+                        reset = await self._reset_stale(db)
+                        await db.commit()
+                        if reset:
+                            print(f"[Jobs:{self.name}] Reset {reset} stale running job(s).")
+                    result = await db.execute(
+                        select(BackgroundJob.id)
+                        .where(BackgroundJob.queue == self.name, BackgroundJob.status == "pending",
+                               BackgroundJob.available_at <= datetime.utcnow())
+                        .order_by(BackgroundJob.available_at)
+                        .limit(self.concurrency * 4)
+                    )
+                    job_ids = result.scalars().all()
+                for job_id in job_ids:
+                    if job_id not in self._queued:
+                        self._queued.add(job_id)
+                        self._pending.put_nowait(job_id)
+            except Exception as e:
+                print(f"[Jobs:{self.name}] Dispatch scan failed: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._pending.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Jobs:{self.name}] Job {job_id} bookkeeping failed: {e}")
+            finally:
+                self._queued.discard(job_id)
+
+    async def _claim(self, job_id: str) -> BackgroundJob | None:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.status == "pending",
+                       BackgroundJob.available_at <= now)
+                .values(status="running", attempts=BackgroundJob.attempts + 1, started_at=now)
+            )
+            if result.rowcount != 1:
+                return None  # another worker got it first
+            job = await db.get(BackgroundJob, job_id)
+            if self.on_state:
+                await self.on_state(db, job.ref_id, "running")
+            await db.commit()
+            return job
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._claim(job_id)
+        if job is None:
+            return
+        self.counters["started"] += 1
+        self._wait_times.append((job.started_at - job.enqueued_at).total_seconds())
+        self._in_flight += 1
+        started = time.monotonic()
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.handler(db, job.ref_id)
+                await self._set_status(db, job, "done")
+                await db.commit()
+            self.counters["done"] += 1
+            self._latencies.append((datetime.utcnow() - job.enqueued_at).total_seconds())
+            self._finished_at.append(time.monotonic())
+        except asyncio.CancelledError:
+            # Shutting down mid-job: hand it back for the next worker
+            await self._release(job)
+            raise
+        except Exception as e:
+            print(f"[Jobs:{self.name}] Job for {job.ref_id} failed (attempt {job.attempts}): {e}")
+            traceback.print_exc()
+            await self._fail(job, e)
+        finally:
+            self._in_flight -= 1
+            self._run_times.append(time.monotonic() - started)
+
+    async def _set_status(self, db: AsyncSession, job: BackgroundJob, status: str, **values) -> None:
+        if status in ("done", "failed"):
+            values["finished_at"] = datetime.utcnow()
+        await db.execute(update(BackgroundJob).where(BackgroundJob.id == job.id).values(status=status, **values))
+        if self.on_state:
+            await self.on_state(db, job.ref_id, status)
+
+    async def _fail(self, job: BackgroundJob, error: Exception) -> None:
+        async with AsyncSessionLocal() as db:
+            if job.attempts >= self.max_attempts:
+                await self._set_status(db, job, "failed", last_error=str(error)[:2000])
+                self.counters["failed"] += 1
+            else:
+                delay = RETRY_DELAYS_SECONDS[min(job.attempts, len(RETRY_DELAYS_SECONDS)) - 1]
+                await self._set_status(db, job, "pending", last_error=str(error)[:2000],
+                                       available_at=datetime.utcnow() + timedelta(seconds=delay))
+                self.counters["retried"] += 1
+            await db.commit()
+
+    async def _release(self, job: BackgroundJob) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._set_status(db, job, "pending", attempts=BackgroundJob.attempts - 1,
+                                       available_at=datetime.utcnow())
+                await db.commit()
+        except Exception as e:
+            print(f"[Jobs:{self.name}] Could not release job for {job.ref_id}: {e}")
+
+    # ─── Metrics ──────────────────────────────────────
+    def metrics(self) -> dict:
+        """This worker process's view of the queue (counts since it started)."""
+        now = time.monotonic()
+        done_last_5m = sum(1 for t in self._finished_at if now - t <= 300)
+        return {
+            "queue": self.name,
+            "running": bool(self._tasks),
+            "concurrency": self.concurrency,
+            "in_flight": self._in_flight,
+            "locally_queued": self._pending.qsize() if self._pending else 0,
+            **self.counters,
+            "throughput_per_min": round(done_last_5m / 5, 2),
+            "wait_seconds": _summary(self._wait_times),
+            "run_seconds": _summary(self._run_times),
+            "latency_seconds": _summary(self._latencies),
+        }
@@ -0,0 +1,171 @@
+"""
+Assessment leaderboards kept in memory, one per reference_id.
+
+The ranking endpoint used to load every completed session of the assessment
+to find the caller's rank. Each worker now keeps, per assessment, the
+completed sessions as a sorted list of (-score, completion time, session id)
+keys: top-N is a slice and a rank is a bisect. A board is loaded with one
+query the first time it is asked for and then updated in place: code that
+changes a session's score or completes it calls `record`, which applies the
+entry in this worker when the transaction commits and sends it to the other
+workers with a Postgres NOTIFY. Boards are reloaded after CACHE_TTL_SECONDS
+as a safety net (SQLite, a dropped listener, renamed students).
+"""
+import json
+import math
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.project import AssessmentSession
+from app.models.user import User
+from app.utils.pg_listener import pg_listener
+from app.utils.queries import users_by_id
+
+# Postgres NOTIFY channel; the payload is one changed entry as JSON
+LEADERBOARD_CHANNEL = "lms_leaderboard_changed"
+
+CACHE_TTL_SECONDS = 300
+MAX_BOARDS = 500
+
+
+@dataclass(slots=True)
+class _Entry:
+    session_id: str
+    student_id: str
+    score: float
+    completion_time_seconds: int | None
+    auto_submitted: bool
+
+    @property
+    def key(self) -> tuple:
+        # Score descending, then the fastest; cancelled sessions have no time and go last
+        time_taken = self.completion_time_seconds if self.completion_time_seconds is not None else math.inf
+        return (-self.score, time_taken, self.session_id)
+
+    @classmethod
+    def of(cls, session) -> "_Entry":
+        return cls(session.id, session.student_id, session.score or 0.0, session.completion_time_seconds,
+                   bool(session.auto_submitted))
+
+
+class _Board:
+    def __init__(self, entries: list[_Entry], names: dict[str, str]):
+        self.entries = {e.session_id: e for e in entries}
+        self.keys = sorted(e.key for e in entries)
+        self.by_student: dict[str, set[str]] = {}
+        for e in entries:
+            self.by_student.setdefault(e.student_id, set()).add(e.session_id)
+        self.names = names
+        self.loaded_at = time.monotonic()
+
+    def put(self, entry: _Entry) -> None:
+        old = self.entries.get(entry.session_id)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, old.key)]
+        self.entries[entry.session_id] = entry
+        insort(self.keys, entry.key)
+        self.by_student.setdefault(entry.student_id, set()).add(entry.session_id)
+
+    def top(self, n: int) -> list[_Entry]:
+        return [self.entries[key[2]] for key in self.keys[:n]]
+
+    def rank_of(self, student_id: str) -> int | None:
+        """1-based rank of the student's best session, or None if they have none."""
+        sessions = self.by_student.get(student_id)
+        if not sessions:
+            return None
+        return bisect_left(self.keys, min(self.entries[s].key for s in sessions)) + 1
+
+
+class Leaderboards:
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_boards: int = MAX_BOARDS):
+        self.ttl = ttl
+        self.max_boards = max_boards
+        self._boards: OrderedDict[str, _Board] = OrderedDict()
+        # Bumped on every change so a load that raced with it isn't stored
+        self._generation = 0
+        self.counters = {"hits": 0, "loads": 0, "updates": 0}
+
+    def forget(self, reference_id: str | None = None) -> None:
+        self._generation += 1
+        if reference_id:
+            self._boards.pop(reference_id, None)
+        else:
+            self._boards.clear()
+
+    def apply(self, reference_id: str, entry: _Entry) -> None:
+        """Put a changed entry on this worker's board, if it holds one."""
+        self._generation += 1
+        board = self._boards.get(reference_id)
+        if board is not None:
+            board.put(entry)
+            self.counters["updates"] += 1
+
+    def _on_notify(self, payload: str) -> None:
+        data = json.loads(payload)
+        self.apply(data.pop("reference_id"), _Entry(**data))
+
+    async def _load(self, db: AsyncSession, reference_id: str) -> _Board:
+        generation = self._generation
+        result = await db.execute(
+            select(AssessmentSession.id, AssessmentSession.student_id, AssessmentSession.score,
+                   AssessmentSession.completion_time_seconds, AssessmentSession.auto_submitted, User.name)
+            .join(User, AssessmentSession.student_id == User.id)
+            .where(AssessmentSession.reference_id == reference_id, AssessmentSession.is_completed == True)  # noqa: E712
+        )
+        rows = result.all()
+        board = _Board([_Entry(r.id, r.student_id, r.score or 0.0, r.completion_time_seconds, bool(r.auto_submitted))
+                        for r in rows], {r.student_id: r.name for r in rows})
+        self.counters["loads"] += 1
+        if generation == self._generation:
+            self._boards[reference_id] = board
+            self._boards.move_to_end(reference_id)
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+        return board
+
+    async def board(self, db: AsyncSession, reference_id: str) -> _Board:
+        board = self._boards.get(reference_id)
+        if board is None or time.monotonic() - board.loaded_at >= self.ttl:
+            return await self._load(db, reference_id)
+        self._boards.move_to_end(reference_id)
+        self.counters["hits"] += 1
+        return board
+
+    async def ranking(self, db: AsyncSession, reference_id: str, student_id: str, n: int = 10) -> dict:
+        """{"ranking": the top n, "my_rank": the student's rank or None}."""
+        board = await self.board(db, reference_id)
+        top = board.top(n)
+        missing = {e.student_id for e in top} - board.names.keys()
+        if missing:
+            board.names.update({uid: u.name for uid, u in (await users_by_id(db, missing)).items()})
+        return {
+            "ranking": [{
+                "rank": i + 1, "name": board.names.get(e.student_id),
+                "score": e.score,
+                "completion_time_seconds": e.completion_time_seconds,
+                "auto_submitted": e.auto_submitted,
+            } for i, e in enumerate(top)],
+            "my_rank": board.rank_of(student_id),
+        }
+
+    async def record(self, db: AsyncSession, session: AssessmentSession) -> None:
+        """A completed session's score or time changed: update every worker's board when `db` commits."""
+        entry = _Entry.of(session)
+        reference_id = session.reference_id
+        payload = {"reference_id": reference_id, **{f: getattr(entry, f) for f in _Entry.__slots__}}
+        await pg_listener.notify(db, LEADERBOARD_CHANNEL, json.dumps(payload))
+        event.listen(db.sync_session, "after_commit", lambda _s: self.apply(reference_id, entry), once=True)
+
+    def stats(self) -> dict:
+        return {**self.counters, "boards": len(self._boards),
+                "entries": sum(len(b.entries) for b in self._boards.values())}
+
+
+leaderboards = Leaderboards()
+pg_listener.subscribe(LEADERBOARD_CHANNEL, leaderboards._on_notify)
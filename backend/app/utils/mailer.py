@@ -0,0 +1,299 @@
+"""
+Outgoing email: an outbox table and one background sender per worker.
+
+`mailer.enqueue(db, to, template, context)` adds a row to `email_outbox` in
+the caller's transaction and wakes the sender once it commits, so handlers
+never wait on the SMTP server. The sender:
+
+  * claims up to MAIL_BATCH_SIZE due rows with a conditional UPDATE
+    (pending -> sending), so several Passenger workers share the outbox;
+  * renders and sends them over one SMTP connection that stays open between
+    batches (closed after MAIL_IDLE_SECONDS without mail, reopened when the
+    server drops it). smtplib blocks, so it runs on one dedicated thread;
+  * spaces messages to stay under MAIL_RATE_PER_MINUTE;
+  * retries temporary failures with a backoff and marks a message failed
+    after MAIL_MAX_ATTEMPTS or a permanent (5xx) refusal. Rows left
+    "sending" by a worker that died are claimed again after a while.
+
+For dev and tests, app/utils/smtp_sink.py is a local SMTP server to point
+SMTP_HOST/SMTP_PORT at.
+"""
+import asyncio
+import json
+import smtplib
+import ssl
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.outbox import OutboxEmail
+from app.utils.email import render
+
+# Idle senders re-scan the outbox this often: retries whose backoff has elapsed,
+# mail queued by another Passenger worker
+POLL_INTERVAL_SECONDS = 15
+# A message still "sending" after this long belongs to a sender that died
+STALE_AFTER_SECONDS = 300
+# Delay before attempt 2, 3, ...
+RETRY_DELAYS_SECONDS = (30, 120, 600, 1800)
+# Sent messages are kept this long, then deleted
+KEEP_SENT_DAYS = 7
+SMTP_TIMEOUT_SECONDS = 30
+
+
+class PermanentFailure(Exception):
+    """The server refused the message for good (5xx): no retry."""
+
+
+class SMTPConnection:
+    """One SMTP session, opened on first use and reused until it drops. Used from the sender thread only."""
+
+    def __init__(self):
+        self._server: smtplib.SMTP | None = None
+        self.last_used = 0.0
+        self.counters = {"connections": 0, "reconnects": 0}
+
+    @property
+    def is_open(self) -> bool:
+        return self._server is not None
+
+    def _open(self) -> None:
+        if settings.SMTP_PORT == 465:
+            server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS,
+                                      context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+        if settings.SMTP_USER and server.has_extn("auth"):
+            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        self._server = server
+        self.counters["connections"] += 1
+
+    def send(self, message, recipient: str) -> None:
+        sender = settings.SMTP_USER or message["From"]
+        for attempt in (1, 2):
+            if self._server is None:
+                self._open()
+            try:
+                self._server.send_message(message, from_addr=sender, to_addrs=[recipient])
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server closed an idle connection: reconnect once
+                self._server = None
+                self.counters["reconnects"] += 1
+                if attempt == 2:
+                    raise
+            except smtplib.SMTPRecipientsRefused as e:
+                code = next(iter(e.recipients.values()))[0]
+                if code >= 500:
+                    raise PermanentFailure(f"{code} {e.recipients}")
+                raise
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    self.reset()
+                    raise PermanentFailure(f"{e.smtp_code} {e.smtp_error!r}")
+                self.reset()
+                raise
+
+    def reset(self) -> None:
+        try:
+            if self._server is not None:
+                self._server.rset()
+        except smtplib.SMTPException:
+            self.close()
+
+    def close(self) -> None:
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+
+class Mailer:
+    def __init__(self):
+        self.connection = SMTPConnection()
+        self._executor: ThreadPoolExecutor | None = None
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+        self._next_send = 0.0
+        self._purged_at: datetime | None = None
+        self.counters = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "batches": 0}
+
+    # ─── Producers ────────────────────────────────────
+    async def enqueue(self, db: AsyncSession, to_email: str, template: str, context: dict) -> OutboxEmail:
+        """Queue an email in the caller's transaction; it is sent after the commit."""
+        email = OutboxEmail(to_email=to_email, template=template, context=json.dumps(context),
+                            status="pending", attempts=0, available_at=datetime.utcnow())
+        db.add(email)
+        self.counters["enqueued"] += 1
+        event.listen(db.sync_session, "after_commit", lambda _s: self._wake_up(), once=True)
+        return email
+
+    def _wake_up(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    # ─── Lifecycle ────────────────────────────────────
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mailer")
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._wake.set()  # mail left from before the restart
+        self._task = asyncio.create_task(self._run())
+        print("[Mailer] Sender started.")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # Let the batch in flight finish and record its results: cancelling it
+        # would leave sent messages "sending", to be sent again once stale
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=SMTP_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.connection.close)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                # A full batch means more may be due
+                while await self._send_batch() >= settings.MAIL_BATCH_SIZE and not self._stopping:
+                    pass
+                await self._close_if_idle()
+                await self._purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Mailer] ⚠️ Send loop error: {e}")
+
+    # ─── Sending ──────────────────────────────────────
+    async def _claim(self) -> list[OutboxEmail]:
+        now = datetime.utcnow()
+        due = or_(
+            and_(OutboxEmail.status == "pending", OutboxEmail.available_at <= now),
+            and_(OutboxEmail.status == "sending",
+                 OutboxEmail.claimed_at < now - timedelta(seconds=STALE_AFTER_SECONDS)),
+        )
+        claim = str(uuid.uuid4())
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(
+                select(OutboxEmail.id).where(due).order_by(OutboxEmail.available_at).limit(settings.MAIL_BATCH_SIZE)
+            )).scalars().all()
+            if not ids:
+                return []
+            # Another worker may claim some of the same rows: only the ones still due are taken
+            await db.execute(
+                update(OutboxEmail).where(OutboxEmail.id.in_(ids), due)
+                .values(status="sending", claim=claim, claimed_at=now, attempts=OutboxEmail.attempts + 1)
+            )
+            await db.commit()
+            return (await db.execute(
+                select(OutboxEmail).where(OutboxEmail.claim == claim).order_by(OutboxEmail.available_at)
+            )).scalars().all()
+
+    def _deliver(self, batch: list[tuple[str, str, str, str]]) -> dict[str, str | None]:
+        """Send (id, to, template, context) on the sender thread; {id: None when sent, else the error}."""
+        results = {}
+        broken = None
+        for email_id, to_email, template, context in batch:
+            if broken:
+                # The server is unreachable: the rest of the batch waits for the retry
+                results[email_id] = broken
+                continue
+            # Rate limit: messages at least 60/MAIL_RATE_PER_MINUTE seconds apart
+            wait = self._next_send - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._next_send = time.monotonic() + 60 / max(1, settings.MAIL_RATE_PER_MINUTE)
+            try:
+                self.connection.send(render(template, to_email, json.loads(context or "{}")), to_email)
+                results[email_id] = None
+            except PermanentFailure as e:
+                results[email_id] = f"permanent: {e}"
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                results[email_id] = f"{type(e).__name__}: {e}"
+            except Exception as e:
+                # Connection, TLS or login failure
+                results[email_id] = broken = f"{type(e).__name__}: {e}"
+                self.connection.close()
+        return results
+
+    async def _send_batch(self) -> int:
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+        self.counters["batches"] += 1
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._deliver, [(e.id, e.to_email, e.template, e.context) for e in claimed])
+
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            sent = [email_id for email_id, error in results.items() if error is None]
+            if sent:
+                await db.execute(update(OutboxEmail).where(OutboxEmail.id.in_(sent))
+                                 .values(status="sent", sent_at=now, context=None, last_error=None, claim=None))
+            for email in claimed:
+                error = results.get(email.id)
+                if email.id in sent:
+                    continue
+                if error.startswith("permanent:") or email.attempts >= settings.MAIL_MAX_ATTEMPTS:
+                    values = {"status": "failed"}
+                    self.counters["failed"] += 1
+                    print(f"[Mailer] ❌ Giving up on {email.template} email to {email.to_email}: {error}")
+                else:
+                    delay = RETRY_DELAYS_SECONDS[min(email.attempts, len(RETRY_DELAYS_SECONDS)) - 1]
+                    values = {"status": "pending", "available_at": now + timedelta(seconds=delay)}
+                    self.counters["retried"] += 1
+                await db.execute(update(OutboxEmail).where(OutboxEmail.id == email.id)
+                                 .values(last_error=error[:1000], claim=None, **values))
+            await db.commit()
+        self.counters["sent"] += len(sent)
+        return len(claimed)
+
+    async def _close_if_idle(self) -> None:
+        if self.connection.is_open and time.monotonic() - self.connection.last_used > settings.MAIL_IDLE_SECONDS:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.connection.close)
+
+    async def _purge(self) -> None:
+        now = datetime.utcnow()
+        if self._purged_at and now - self._purged_at < timedelta(hours=1):
+            return
+        self._purged_at = now
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(OutboxEmail).where(OutboxEmail.status == "sent",
+                                                       OutboxEmail.sent_at < now - timedelta(days=KEEP_SENT_DAYS)))
+            await db.commit()
+
+    async def stats(self, db: AsyncSession) -> dict:
+        rows = (await db.execute(select(OutboxEmail.status, func.count()).group_by(OutboxEmail.status))).all()
+        return {**self.counters, **self.connection.counters, "connected": self.connection.is_open,
+                "outbox": dict(rows)}
+
+
+mailer = Mailer()
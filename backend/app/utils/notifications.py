@@ -0,0 +1,238 @@
+"""
+In-app notifications: fan-out, broadcasts and per-user read state.
+
+Three kinds of rows make up a user's feed:
+
+  * personal notifications (`notifications`, one row per recipient): leave
+    decisions, tasks and assignments. Batch-wide ones are written by
+    `fan_out` with a single INSERT ... SELECT, so the recipient list never
+    leaves the database;
+  * admin broadcasts to everyone or to one role (`notification_broadcasts`),
+    stored once however many users they reach. A user sees those sent since
+    their account was created;
+  * a read watermark per user (`notification_cursors`): everything created up
+    to it counts as read. "Mark all read" moves the watermark, one row,
+    instead of updating every notification the user has.
+
+Unread counts are index range scans past the watermark, capped at
+UNREAD_COUNT_CAP, so they cost the same however long the history is.
+Broadcasts stored as per-user copies by older versions are folded into single
+rows at startup by `migrate_broadcast_copies`.
+"""
+import hashlib
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Select, String, and_, delete, func, insert, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models.notification import BroadcastNotification, Notification, NotificationCursor
+from app.models.user import User
+
+# The feed's length, and the largest unread count reported ("99+")
+FEED_LIMIT = 50
+UNREAD_COUNT_CAP = 99
+# Legacy copies of one text further apart than this are separate sends (migrate_broadcast_copies)
+LEGACY_SEND_GAP_SECONDS = 60
+
+
+def _dialect_insert(db: AsyncSession, model):
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model)
+
+
+# ─── Writing ──────────────────────────────────────────
+async def fan_out(
+    db: AsyncSession,
+    recipients: Select,
+    *,
+    title: str,
+    message: str,
+    type: str | None = None,
+    reference_id: str | None = None,
+    link: str | None = None,
+) -> int:
+    """
+    Add one notification per user id selected by `recipients` (a one-column
+    SELECT) in the caller's transaction; returns how many were added.
+        await fan_out(db, select(BatchStudent.student_id).where(BatchStudent.batch_id == batch_id),
+                      title="New Task", message="...", type="TASK", reference_id=task.id)
+    """
+    recipients = recipients.distinct().subquery()
+    user_id = list(recipients.c)[0]
+    # The database has no portable UUID function: ids are one UUID for the send plus the user id
+    send_id = f"{uuid.uuid4()}:"
+    rows = select(
+        literal(send_id, String) + user_id,
+        user_id,
+        literal(title, String),
+        literal(message, String),
+        literal(False, Boolean),
+        literal(type, String),
+        literal(reference_id, String),
+        literal(link, String),
+        literal(datetime.utcnow(), DateTime),
+    )
+    result = await db.execute(
+        insert(Notification).from_select(
+            ["id", "user_id", "title", "message", "read", "type", "reference_id", "link", "created_at"], rows
+        )
+    )
+    return result.rowcount
+
+
+def broadcast(db: AsyncSession, *, title: str, message: str, role: str | None = None,
+              sent_by: str | None = None) -> BroadcastNotification:
+    """Notify every user (or every user with `role`) with one row, in the caller's transaction."""
+    row = BroadcastNotification(title=title, message=message, audience="ROLE" if role else "ALL", role=role,
+                                type="SYSTEM", sent_by=sent_by, created_at=datetime.utcnow())
+    db.add(row)
+    return row
+
+
+# ─── Reading ──────────────────────────────────────────
+def _broadcasts_for(user: User):
+    """Conditions on BroadcastNotification for the broadcasts `user` receives."""
+    audience = or_(BroadcastNotification.audience == "ALL",
+                   and_(BroadcastNotification.audience == "ROLE", BroadcastNotification.role == user.role.value))
+    if user.created_at is None:
+        return audience
+    return and_(audience, BroadcastNotification.created_at >= user.created_at)
+
+
+async def read_watermark(db: AsyncSession, user_id: str) -> datetime | None:
+    return await db.scalar(select(NotificationCursor.read_at).where(NotificationCursor.user_id == user_id))
+
+
+async def feed(db: AsyncSession, user: User, limit: int = FEED_LIMIT) -> list[dict]:
+    """The user's newest notifications and broadcasts, merged, with their read state."""
+    watermark = await read_watermark(db, user.id)
+    personal = (await db.execute(
+        select(Notification).where(Notification.user_id == user.id)
+        .order_by(Notification.created_at.desc()).limit(limit)
+    )).scalars().all()
+    broadcasts = (await db.execute(
+        select(BroadcastNotification).where(_broadcasts_for(user))
+        .order_by(BroadcastNotification.created_at.desc()).limit(limit)
+    )).scalars().all()
+
+    def seen(created_at: datetime | None) -> bool:
+        return watermark is not None and created_at is not None and created_at <= watermark
+
+    items = [
+        {
+            "id": n.id, "title": n.title, "message": n.message,
+            "read": bool(n.read) or seen(n.created_at), "type": n.type, "reference_id": n.reference_id,
+            "link": n.link, "created_at": n.created_at,
+        }
+        for n in personal
+    ] + [
+        {
+            "id": b.id, "title": b.title, "message": b.message,
+            "read": seen(b.created_at), "type": b.type, "reference_id": "admin_broadcast",
+            "link": None, "created_at": b.created_at,
+        }
+        for b in broadcasts
+    ]
+    items.sort(key=lambda item: item["created_at"] or datetime.min, reverse=True)
+    for item in items:
+        item["created_at"] = item["created_at"].isoformat() if item["created_at"] else None
+    return items[:limit]
+
+
+async def unread_count(db: AsyncSession, user: User) -> int:
+    """Notifications and broadcasts past the user's watermark, at most UNREAD_COUNT_CAP."""
+    watermark = await read_watermark(db, user.id)
+    personal = select(Notification.id).where(Notification.user_id == user.id, Notification.read == False)  # noqa: E712
+    broadcasts = select(BroadcastNotification.id).where(_broadcasts_for(user))
+    if watermark is not None:
+        personal = personal.where(Notification.created_at > watermark)
+        broadcasts = broadcasts.where(BroadcastNotification.created_at > watermark)
+    # LIMIT bounds each scan: a user who never opens the bell costs the same as one who does
+    counts = select(
+        select(func.count()).select_from(personal.limit(UNREAD_COUNT_CAP).subquery()).scalar_subquery(),
+        select(func.count()).select_from(broadcasts.limit(UNREAD_COUNT_CAP).subquery()).scalar_subquery(),
+    )
+    mine, theirs = (await db.execute(counts)).one()
+    return min(mine + theirs, UNREAD_COUNT_CAP)
+
+
+async def mark_all_read(db: AsyncSession, user_id: str) -> datetime:
+    """Move the user's watermark to now: one row, however many notifications they have."""
+    now = datetime.utcnow()
+    stmt = _dialect_insert(db, NotificationCursor).values(user_id=user_id, read_at=now)
+    await db.execute(stmt.on_conflict_do_update(index_elements=[NotificationCursor.user_id],
+                                                set_={"read_at": stmt.excluded.read_at}))
+    return now
+
+
+# ─── Migration ────────────────────────────────────────
+async def migrate_broadcast_copies() -> int:
+    """
+    Fold the per-user copies of admin broadcasts written by older versions
+    (reference_id "admin_broadcast") into one BroadcastNotification per send,
+    and turn their read flags into watermarks. Copies of one send share their
+    title, message and (within LEGACY_SEND_GAP_SECONDS) created_at; the same
+    text sent twice stays two broadcasts. Idempotent, so every worker may run
+    it; returns how many broadcasts were created.
+    """
+    started = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        copies = Notification.reference_id == "admin_broadcast"
+        stamps = (await db.execute(
+            select(Notification.title, Notification.message, Notification.created_at, User.role)
+            .join(User, User.id == Notification.user_id)
+            .where(copies)
+            .group_by(Notification.title, Notification.message, Notification.created_at, User.role)
+            .order_by(Notification.title, Notification.message, Notification.created_at)
+        )).all()
+        if not stamps:
+            return 0
+        # One send's copies were written in one go, a few seconds apart at most
+        groups = []
+        for title, message, created_at, role in stamps:
+            last = groups[-1] if groups else None
+            if (last is None or (last["title"], last["message"]) != (title, message)
+                    or created_at is None or last["until"] is None
+                    or (created_at - last["until"]).total_seconds() > LEGACY_SEND_GAP_SECONDS):
+                last = {"title": title, "message": message, "created_at": created_at, "until": created_at,
+                        "roles": set()}
+                groups.append(last)
+            last["until"] = created_at
+            last["roles"].add(role)
+
+        # Read state first: read-all marked everything, so a user's newest read row is their watermark
+        watermarks = (
+            select(Notification.user_id, func.max(Notification.created_at))
+            .where(Notification.read == True)  # noqa: E712
+            .group_by(Notification.user_id)
+        )
+        await db.execute(
+            _dialect_insert(db, NotificationCursor)
+            .from_select(["user_id", "read_at"], watermarks)
+            .on_conflict_do_nothing(index_elements=[NotificationCursor.user_id])
+        )
+
+        created = 0
+        for group in groups:
+            # The old send endpoint did not record its target: copies that all went to one role were a ROLE send
+            created_at = group["created_at"] or started
+            key = hashlib.sha256(f"{group['title']}\0{group['message']}\0{created_at.isoformat()}".encode()).hexdigest()[:32]
+            role = next(iter(group["roles"])) if len(group["roles"]) == 1 else None
+            result = await db.execute(
+                _dialect_insert(db, BroadcastNotification).values(
+                    id=f"legacy-{key}", title=group["title"], message=group["message"],
+                    audience="ROLE" if role else "ALL", role=role.value if role else None,
+                    type="SYSTEM", created_at=created_at,
+                ).on_conflict_do_nothing(index_elements=[BroadcastNotification.id])
+            )
+            created += result.rowcount
+        removed = (await db.execute(delete(Notification).where(copies))).rowcount
+        await db.commit()
+    print(f"[Notifications] Folded {removed} broadcast copies into {created} broadcast(s) in "
+          f"{(datetime.utcnow() - started).total_seconds():.1f}s.")
+    return created
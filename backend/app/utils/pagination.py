@@ -0,0 +1,152 @@
+"""
+Keyset pagination for list endpoints.
+
+A list endpoint takes `page: PageParams = Depends(page_params)` and hands its
+filtered (unordered) query to `paginate`. Rows are ordered by a timestamp column
+plus `id` as a tie-breaker, and the cursor is the (timestamp, id) of the last row
+served, so fetching page N costs the same as page 1 and rows inserted meanwhile
+don't shift later pages.
+
+On SQLite the timestamp is text, compared and sorted as stored: SQLAlchemy
+writes "YYYY-MM-DD HH:MM:SS.ffffff" but CURRENT_TIMESTAMP defaults have no
+fractional part. The cursor there holds the last key exactly as stored and is
+compared against the raw column, so the (key, id) index serves the range.
+
+The timestamp may be NULL (rows from before a column had a default). NULLs sort
+as the largest value on every database, as PostgreSQL does by default: first
+when newest-first, last when oldest-first. That is also the order a plain
+(key, id) index is scanned in on PostgreSQL.
+
+Clients that send neither `limit` nor `cursor` get the old response, a bare list
+of every row. Clients that send either get an envelope:
+    {"items": [...], "next_cursor": "..." | null, "total": int | null}
+`total` is only computed when asked for with `include_total=true`.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import String, and_, func, literal, or_, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+@dataclass
+class PageParams:
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    include_total: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit is not None or self.cursor is not None
+
+    @property
+    def size(self) -> int:
+        return min(self.limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (max {MAX_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_total: bool = Query(False, description="Also count every matching row"),
+) -> PageParams:
+    return PageParams(limit=limit, cursor=cursor, include_total=include_total)
+
+
+@dataclass
+class Page:
+    params: PageParams
+    rows: list
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+    def response(self, items: list):
+        """The bare list for legacy callers, otherwise the pagination envelope."""
+        if not self.params.enabled:
+            return items
+        return {"items": items, "next_cursor": self.next_cursor, "total": self.total}
+
+
+def empty_page(params: PageParams) -> Page:
+    return Page(params, [], total=0 if params.include_total else None)
+
+
+def encode_cursor(value: datetime | str | None, row_id: str) -> str:
+    """`value` is the key as a datetime, or as the text SQLite stored."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[str], str]:
+    """(key as an ISO timestamp string or None, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        if value is not None:
+            datetime.fromisoformat(value)
+        return value, str(row_id)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(db: AsyncSession, query, params: PageParams, key=None, descending: bool = True) -> Page:
+    """
+    Run `query` ordered by (`key`, id), one page at a time when `params` asks for it.
+    `key` defaults to the model's `created_at`, a timestamp column that may hold NULLs.
+    """
+    model = query.column_descriptions[0]["entity"]
+    key = key if key is not None else model.created_at
+    if descending:
+        order = (key.desc().nulls_first(), model.id.desc())
+    else:
+        order = (key.asc().nulls_last(), model.id.asc())
+
+    if not params.enabled:
+        result = await db.execute(query.order_by(*order))
+        return Page(params, list(result.scalars().all()))
+
+    total = None
+    if params.include_total:
+        total = (await db.execute(select(func.count()).select_from(query.order_by(None).subquery()))).scalar_one()
+
+    is_sqlite = db.get_bind().dialect.name == "sqlite"
+    page_query = query
+    if params.cursor:
+        value, row_id = decode_cursor(params.cursor)
+        if value is None:
+            # Inside the NULL run: newest-first goes on to the non-null keys after it,
+            # oldest-first has nothing after it
+            after = model.id < row_id if descending else model.id > row_id
+            rest = [key.is_not(None)] if descending else []
+            page_query = page_query.where(or_(and_(key.is_(None), after), *rest))
+        else:
+            # The stored text on SQLite (see the module docstring), an instant elsewhere
+            value = literal(value, String) if is_sqlite else datetime.fromisoformat(value)
+            # Bounded on the key alone first, so the index is range-scanned; a NULL key fails
+            # both: already served newest-first, still to come oldest-first
+            if descending:
+                page_query = page_query.where(and_(key <= value, or_(key < value, model.id < row_id)))
+            else:
+                page_query = page_query.where(or_(and_(key >= value, or_(key > value, model.id > row_id)),
+                                                  key.is_(None)))
+    if is_sqlite:
+        page_query = page_query.add_columns(type_coerce(key, String).label("page_key"))
+
+    size = params.size
+    result = await db.execute(page_query.order_by(*order).limit(size + 1))
+    found = result.all() if is_sqlite else [(row,) for row in result.scalars().all()]
+    rows = [r[0] for r in found]
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = found[size - 1]
+        next_cursor = encode_cursor(last[1] if is_sqlite else getattr(last[0], key.key), last[0].id)
+    return Page(params, rows, next_cursor, total)
@@ -0,0 +1,72 @@
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+class PgListener:
+    """
+    One dedicated asyncpg connection per worker that LISTENs on every channel
+    registered with `subscribe`. Used by the in-process caches to tell the other
+    Passenger workers that their copy is stale.
+
+    Payloads are prefixed with the sender's PID so a worker ignores its own
+    notifications (it has already updated its local state).
+    """
+
+    def __init__(self):
+        self._callbacks: dict[str, callable] = {}
+        self._conn = None
+
+    def subscribe(self, channel: str, callback) -> None:
+        """Register `callback(payload: str)` for a channel. Call at import time."""
+        self._callbacks[channel] = callback
+
+    async def notify(self, db: AsyncSession, channel: str, payload: str = "") -> None:
+        """Queue a NOTIFY in the caller's transaction; delivered only on commit."""
+        if db.bind.dialect.name != "postgresql":
+            return
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": channel, "payload": f"{os.getpid()}:{payload}"},
+        )
+
+    async def start(self, engine) -> None:
+        if engine.dialect.name != "postgresql" or self._conn is not None:
+            return
+        import asyncpg
+        from app.database import connect_args
+
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        try:
+            self._conn = await asyncpg.connect(dsn, **connect_args)
+            for channel in self._callbacks:
+                await self._conn.add_listener(channel, self._dispatch)
+            print(f"Listening for cross-worker invalidation on {len(self._callbacks)} channel(s).")
+        except Exception as e:
+            self._conn = None
+            logger.warning(f"Cross-worker listener unavailable, caches rely on TTL: {e}")
+
+    async def stop(self) -> None:
+        if self._conn is not None:
+            try:
+                await self._conn.close()
+            finally:
+                self._conn = None
+
+    def _dispatch(self, _conn, _pid, channel, payload) -> None:
+        sender, _, body = payload.partition(":")
+        if sender == str(os.getpid()):
+            return
+        callback = self._callbacks.get(channel)
+        if callback:
+            try:
+                callback(body)
+            except Exception as e:
+                logger.warning(f"Invalidation callback for {channel} failed: {e}")
+
+
+pg_listener = PgListener()
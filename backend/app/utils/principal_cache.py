@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.models.user import AdminPermission, User
+from app.utils.pg_listener import pg_listener
+
+# Postgres NOTIFY channel; the payload is the user id whose entry is stale
+PRINCIPAL_CHANNEL = "lms_principal_changed"
+
+# Without a NOTIFY listener (SQLite, dropped connection) other workers may serve a
+# changed user for at most this long
+CACHE_TTL_SECONDS = 30
+MAX_ENTRIES = 5000
+
+PERMISSION_FIELDS = ("manage_users", "manage_batches", "manage_courses", "manage_leaves")
+
+
+@dataclass(frozen=True)
+class _Principal:
+    columns: dict
+    permissions: dict | None
+    loaded_at: float
+
+
+class PrincipalCache:
+    """
+    Authenticated-principal cache: the User row plus its AdminPermission flags,
+    keyed by user id, so the auth dependencies don't query the DB on every request.
+
+    Each request gets its own User instance, merged into its session without a
+    SELECT, so handlers can still modify and flush it. Code that changes a user's
+    status, password, role or permissions must call `invalidate` so every worker
+    drops the entry once the change commits.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, _Principal] = OrderedDict()
+        # Bumped on every invalidation so a load that raced with it isn't stored
+        self._generation = 0
+
+    def forget(self, user_id: str | None = None) -> None:
+        """Drop one user's entry (or everything) in this worker only."""
+        self._generation += 1
+        if user_id:
+            self._entries.pop(user_id, None)
+        else:
+            self._entries.clear()
+
+    def _fresh(self, user_id: str) -> _Principal | None:
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry.loaded_at >= self.ttl:
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    async def _load(self, db: AsyncSession, user_id: str) -> tuple[_Principal, User] | tuple[None, None]:
+        generation = self._generation
+        result = await db.execute(
+            select(User, AdminPermission)
+            .outerjoin(AdminPermission, AdminPermission.user_id == User.id)
+            .where(User.id == user_id)
+        )
+        row = result.first()
+        if row is None:
+            return None, None
+        user, perm = row
+        entry = _Principal(
+            columns={attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs},
+            permissions={f: bool(getattr(perm, f)) for f in PERMISSION_FIELDS} if perm else None,
+            loaded_at=time.monotonic(),
+        )
+        if generation == self._generation:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry, user
+
+    async def get_user(self, db: AsyncSession, user_id: str) -> User | None:
+        """The user as a persistent instance in `db`; no query when cached."""
+        entry = self._fresh(user_id)
+        if entry is None:
+            _entry, user = await self._load(db, user_id)
+            return user
+        user = User(**entry.columns)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    async def get_permissions(self, db: AsyncSession, user_id: str) -> dict | None:
+        """{"manage_users": bool, ...} or None when the user has no AdminPermission row."""
+        entry = self._fresh(user_id) or (await self._load(db, user_id))[0]
+        return entry.permissions if entry else None
+
+    async def invalidate(self, db: AsyncSession, user_id: str) -> None:
+        """Drop `user_id` now and again when `db` commits, in every worker."""
+        await pg_listener.notify(db, PRINCIPAL_CHANNEL, user_id)
+        self.forget(user_id)
+        event.listen(db.sync_session, "after_commit", lambda _s: self.forget(user_id), once=True)
+
+
+principal_cache = PrincipalCache()
+pg_listener.subscribe(PRINCIPAL_CHANNEL, lambda user_id: principal_cache.forget(user_id or None))
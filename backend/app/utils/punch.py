@@ -0,0 +1,285 @@
+"""
+High-throughput QR punch pipeline.
+
+The whole institute scans the global QR within a few minutes each morning. Instead
+of a `SELECT ... FOR UPDATE` plus commit per scan, each worker keeps:
+
+  * a compact index of every user's session state for the current IST day,
+  * a keyed asyncio lock so scans for the same user are serialised in-process,
+  * a group-commit writer that flushes TimeTracking inserts/updates in micro-batches.
+
+A scan only returns once its batch is committed, so nothing acknowledged to the
+user can be lost. Other workers are told to drop their index entries for the
+users in a batch via Postgres NOTIFY.
+
+The index can still be stale (a NOTIFY not yet delivered, or SQLite, which has
+none), so the database has the last word: a partial unique index allows one
+open session per user and day, punch-ins skip a conflicting row
+(ON CONFLICT DO NOTHING) and punch-outs only close a session that is still
+open. A scan whose write was refused reloads the user's state and decides again.
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models.attendance import TimeTracking
+from app.utils.dates import day_start, on_day
+from app.utils.pg_listener import pg_listener
+
+PUNCH_CHANNEL = "lms_punch_changed"
+
+# Reject a scan if the user's last punch (in or out) was this recent
+COOLDOWN_SECONDS = 30
+
+# How long the writer waits for more scans to join a batch, and the batch cap.
+# The cap keeps the NOTIFY payload (comma separated user ids) under 8000 bytes.
+FLUSH_WINDOW_SECONDS = 0.02
+MAX_BATCH_SIZE = 100
+
+
+def ist_now() -> datetime:
+    """Current IST time as a naive datetime (the DB stores naive timestamps)."""
+    return datetime.utcnow() + timedelta(hours=5, minutes=30)
+
+
+@dataclass(slots=True)
+class _DayState:
+    session_count: int
+    open_id: str | None
+    open_login: datetime | None
+    last_event: datetime | None
+
+
+@dataclass
+class PunchResult:
+    punch_type: str  # "IN" or "OUT"
+    session_number: int
+    login_time: datetime
+    logout_time: datetime | None = None
+    total_minutes: int | None = None
+
+
+class PunchCooldown(Exception):
+    def __init__(self, punched_in: bool):
+        self.punched_in = punched_in
+        super().__init__("Punch cooldown")
+
+
+class _StaleState(Exception):
+    """The write was refused because another worker changed the user's sessions first."""
+
+
+def _dialect_insert(db: AsyncSession, model):
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model)
+
+
+class PunchPipeline:
+    def __init__(self):
+        self._day: date | None = None
+        self._index: dict[str, _DayState] = {}
+        self._locks: dict[str, list] = {}  # user_id -> [lock, holders]
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._writer: asyncio.Task | None = None
+
+    # ─── Keyed lock ──────────────────────────────────────
+    @asynccontextmanager
+    async def _user_lock(self, user_id: str):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(user_id, None)
+
+    # ─── Day index ───────────────────────────────────────
+    def _roll_day(self, today: date) -> None:
+        if self._day != today:
+            self._index.clear()
+            self._day = today
+
+    async def _load(self, db: AsyncSession, user_id: str, today: date) -> _DayState:
+        result = await db.execute(
+            select(TimeTracking.id, TimeTracking.login_time, TimeTracking.logout_time)
+            .where(TimeTracking.user_id == user_id, on_day(TimeTracking.date, today))
+            .order_by(TimeTracking.login_time.desc())
+        )
+        rows = result.all()
+        if not rows:
+            return _DayState(0, None, None, None)
+        latest = rows[0]
+        is_open = latest.logout_time is None
+        return _DayState(
+            session_count=len(rows),
+            open_id=latest.id if is_open else None,
+            open_login=latest.login_time if is_open else None,
+            last_event=latest.logout_time or latest.login_time,
+        )
+
+    def forget(self, user_id: str) -> None:
+        self._index.pop(user_id, None)
+
+    async def invalidate(self, db: AsyncSession, user_id: str) -> None:
+        """Call after editing a user's TimeTracking rows outside the pipeline."""
+        self.forget(user_id)
+        await pg_listener.notify(db, PUNCH_CHANNEL, user_id)
+        event.listen(db.sync_session, "after_commit", lambda _s: self.forget(user_id), once=True)
+
+    def _on_notify(self, payload: str) -> None:
+        for user_id in payload.split(","):
+            self._index.pop(user_id, None)
+
+    # ─── Scan ────────────────────────────────────────────
+    async def scan(self, db: AsyncSession, user_id: str, now: datetime) -> PunchResult:
+        """
+        Toggle the user's punch state. `db` is only used to load the user's
+        sessions (first scan of the day, or after a refused write); writes go
+        through the batch writer.
+        """
+        today = now.date()
+        async with self._user_lock(user_id):
+            self._roll_day(today)
+            try:
+                return await self._toggle(db, user_id, now, today)
+            except _StaleState:
+                # Another worker punched this user first: decide again on what the DB holds
+                self._index.pop(user_id, None)
+                return await self._toggle(db, user_id, now, today)
+
+    async def _toggle(self, db: AsyncSession, user_id: str, now: datetime, today: date) -> PunchResult:
+        state = self._index.get(user_id)
+        if state is None:
+            state = await self._load(db, user_id, today)
+            self._index[user_id] = state
+
+        if state.last_event and (now - state.last_event).total_seconds() < COOLDOWN_SECONDS:
+            raise PunchCooldown(punched_in=state.open_id is not None)
+
+        if state.open_id is None:
+            record_id = str(uuid.uuid4())
+            write = {
+                "op": "insert",
+                "id": record_id,
+                "user_id": user_id,
+                "date": day_start(today),
+                "login_time": now,
+            }
+            result = PunchResult("IN", state.session_count + 1, now)
+        else:
+            total_minutes = int((now - state.open_login).total_seconds() / 60)
+            write = {
+                "op": "update",
+                "id": state.open_id,
+                "user_id": user_id,
+                "logout_time": now,
+                "total_minutes": total_minutes,
+            }
+            result = PunchResult("OUT", state.session_count, state.open_login, now, total_minutes)
+
+        try:
+            await self._submit(write)
+        except Exception:
+            # The DB may or may not have the row; reload on the next scan
+            self._index.pop(user_id, None)
+            raise
+
+        if result.punch_type == "IN":
+            state.session_count += 1
+            state.open_id = write["id"]
+            state.open_login = now
+        else:
+            state.open_id = None
+            state.open_login = None
+        state.last_event = now
+        return result
+
+    # ─── Batch writer ────────────────────────────────────
+    async def _submit(self, write: dict) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((write, future))
+        if self._writer is None or self._writer.done():
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_loop())
+        self._wakeup.set()
+        await future
+
+    async def _write_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Give concurrent scans a moment to join this batch
+            await asyncio.sleep(FLUSH_WINDOW_SECONDS)
+            while self._pending:
+                batch = self._pending[:MAX_BATCH_SIZE]
+                del self._pending[:MAX_BATCH_SIZE]
+                await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        inserts = [
+            {k: w[k] for k in ("id", "user_id", "date", "login_time")}
+            for w, _ in batch if w["op"] == "insert"
+        ]
+        updates = [w for w, _ in batch if w["op"] == "update"]
+        refused = set()
+        try:
+            async with AsyncSessionLocal() as session:
+                if inserts:
+                    # A user who already has an open session today (opened by another worker) is skipped
+                    stmt = _dialect_insert(session, TimeTracking).values(inserts).on_conflict_do_nothing(
+                        index_elements=[TimeTracking.user_id, TimeTracking.date],
+                        index_where=TimeTracking.logout_time.is_(None),
+                    ).returning(TimeTracking.id)
+                    inserted = set((await session.execute(stmt)).scalars())
+                    refused.update(w["id"] for w in inserts if w["id"] not in inserted)
+                for w in updates:
+                    # Only close a session that is still open
+                    result = await session.execute(
+                        update(TimeTracking)
+                        .where(TimeTracking.id == w["id"], TimeTracking.logout_time.is_(None))
+                        .values(logout_time=w["logout_time"], total_minutes=w["total_minutes"])
+                    )
+                    if result.rowcount != 1:
+                        refused.add(w["id"])
+                await pg_listener.notify(session, PUNCH_CHANNEL, ",".join({w["user_id"] for w, _ in batch}))
+                await session.commit()
+        except Exception as e:
+            print(f"[Punch] Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for write, future in batch:
+            if future.done():
+                continue
+            if write["id"] in refused:
+                future.set_exception(_StaleState())
+            else:
+                future.set_result(None)
+
+    async def close(self) -> None:
+        """Flush anything still queued and stop the writer (called on shutdown)."""
+        if self._pending:
+            batch, self._pending = self._pending, []
+            await self._flush(batch)
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+
+
+punch_pipeline = PunchPipeline()
+pg_listener.subscribe(PUNCH_CHANNEL, punch_pipeline._on_notify)
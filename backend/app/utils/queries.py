@@ -0,0 +1,63 @@
+"""
+Batch lookups for list endpoints.
+
+List pages used to call `db.get(User, ...)` or run a COUNT per row. These helpers
+fetch everything a page needs with one query per related table, so an endpoint
+runs a constant number of queries regardless of how many rows it returns.
+"""
+from typing import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user import User
+
+
+async def rows_by_id(db: AsyncSession, model, ids: Iterable[str | None]) -> dict:
+    """{id: row} for every non-null id, in a single IN query."""
+    wanted = {i for i in ids if i}
+    if not wanted:
+        return {}
+    result = await db.execute(select(model).where(model.id.in_(wanted)))
+    return {row.id: row for row in result.scalars().all()}
+
+
+async def users_by_id(db: AsyncSession, ids: Iterable[str | None]) -> dict[str, User]:
+    """Enrich rows with user names / roles: {user_id: User} in one query."""
+    return await rows_by_id(db, User, ids)
+
+
+async def count_by(db: AsyncSession, column, keys: Iterable[str] | None = None, *where) -> dict[str, int]:
+    """
+    Grouped COUNT(*) keyed by `column`, e.g. students per batch:
+        count_by(db, BatchStudent.batch_id, batch_ids)
+    Keys with no rows are absent from the result; use `.get(key, 0)`.
+    """
+    query = select(column, func.count()).group_by(column)
+    if keys is not None:
+        keys = set(keys)
+        if not keys:
+            return {}
+        query = query.where(column.in_(keys))
+    if where:
+        query = query.where(*where)
+    result = await db.execute(query)
+    return {key: count for key, count in result.all()}
+
+
+async def rows_grouped_by(db: AsyncSession, model, column, keys: Iterable[str], *order_by, where=()) -> dict[str, list]:
+    """
+    One-to-many loader: {key: [rows...]} for every key, in a single IN query.
+    Rows keep the given `order_by` within each group.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    query = select(model).where(column.in_(keys), *where)
+    if order_by:
+        query = query.order_by(*order_by)
+    result = await db.execute(query)
+    grouped: dict[str, list] = {}
+    for row in result.scalars().all():
+        grouped.setdefault(getattr(row, column.key), []).append(row)
+    return grouped
@@ -0,0 +1,195 @@
+"""
+Question lists of assessments, parsed once and shared by their sessions.
+
+Starting a session used to load the Task/Assignment, json.loads its
+structured_content, shuffle a copy and write every question and option into
+the session's own assessment_questions rows. Now:
+
+  * each worker keeps the parsed question list per (ref_type, ref_id,
+    updated_at), so a burst of students starting the same exam parses it once;
+  * the list is stored once in `assessment_question_sets`, keyed by a SHA-256
+    of its content: a trainer's later edit is a new set, and the sessions
+    already started keep theirs;
+  * a session stores the set id and, when randomized, its order as index
+    arrays (`shuffled_order`): {"q": question order, "o": option order per
+    question shown}. `apply_order` rebuilds the student's view from the two.
+
+Views without an order are the cached list itself: callers must not modify
+the questions they get.
+"""
+import asyncio
+import hashlib
+import json
+import random
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models.project import AssessmentQuestionSet
+
+MAX_ITEMS = 256
+MAX_SETS = 512
+
+
+@dataclass(frozen=True)
+class QuestionSnapshot:
+    set_id: str | None  # None when the item has no questions
+    questions: list
+    source: str  # the structured_content it was parsed from
+    responses_json: str  # {"questions": [...]} as sent to a student without shuffling
+
+
+def _parse(structured_content: str | None) -> list:
+    if not structured_content:
+        return []
+    try:
+        content = json.loads(structured_content)
+    except ValueError:
+        return []
+    questions = content.get("questions") if isinstance(content, dict) else None
+    return questions if isinstance(questions, list) else []
+
+
+def set_id_of(questions: list) -> str:
+    return hashlib.sha256(json.dumps(questions, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def shuffled_order(questions: list, seed: str) -> dict:
+    """A random order of the questions and of each question's options, reproducible from `seed`."""
+    rng = random.Random(seed)
+    question_order = list(range(len(questions)))
+    rng.shuffle(question_order)
+    option_orders = []
+    for i in question_order:
+        options = questions[i].get("options") if isinstance(questions[i], dict) else None
+        if isinstance(options, list) and options:
+            order = list(range(len(options)))
+            rng.shuffle(order)
+            option_orders.append(order)
+        else:
+            option_orders.append(None)
+    return {"q": question_order, "o": option_orders}
+
+
+def apply_order(questions: list, order: dict | None) -> list:
+    """The questions as one student sees them, with each MCQ answer moved to its shuffled option."""
+    if not order:
+        return questions
+    view = []
+    for i, option_order in zip(order["q"], order["o"]):
+        q = questions[i]
+        if option_order is not None:
+            q = dict(q)
+            q["options"] = [q["options"][j] for j in option_order]
+            try:
+                answer = int(q.get("answer", 0))
+            except (ValueError, TypeError):
+                answer = 0
+            if answer in option_order:
+                q["answer"] = option_order.index(answer)
+        view.append(q)
+    return view
+
+
+def dump_order(order: dict | None) -> str | None:
+    return json.dumps(order, separators=(",", ":")) if order else None
+
+
+def load_order(raw: str | None) -> dict | None:
+    return json.loads(raw) if raw else None
+
+
+class QuestionSets:
+    def __init__(self, max_items: int = MAX_ITEMS, max_sets: int = MAX_SETS):
+        self.max_items = max_items
+        self.max_sets = max_sets
+        self._by_item: OrderedDict[tuple, QuestionSnapshot] = OrderedDict()
+        self._by_id: OrderedDict[str, list] = OrderedDict()
+        self._building: dict[tuple, asyncio.Future] = {}
+        self.counters = {"hits": 0, "parses": 0, "set_loads": 0}
+
+    def forget(self) -> None:
+        self._by_item.clear()
+        self._by_id.clear()
+
+    def _remember_set(self, set_id: str, questions: list) -> None:
+        self._by_id[set_id] = questions
+        self._by_id.move_to_end(set_id)
+        while len(self._by_id) > self.max_sets:
+            self._by_id.popitem(last=False)
+
+    async def _store(self, set_id: str, reference_id: str, questions: list) -> None:
+        """Insert the set in its own transaction, so a cached id always exists in the DB."""
+        async with AsyncSessionLocal() as db:
+            if await db.get(AssessmentQuestionSet, set_id) is None:
+                db.add(AssessmentQuestionSet(id=set_id, reference_id=reference_id, content=json.dumps(questions),
+                                             created_at=datetime.utcnow()))
+                try:
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    # Another worker stored the same set first
+                    if await db.get(AssessmentQuestionSet, set_id) is None:
+                        raise
+
+    async def _build(self, key: tuple, reference_id: str, source: str) -> QuestionSnapshot:
+        questions = _parse(source)
+        self.counters["parses"] += 1
+        set_id = set_id_of(questions) if questions else None
+        if set_id:
+            await self._store(set_id, reference_id, questions)
+            self._remember_set(set_id, questions)
+        snapshot = QuestionSnapshot(set_id, questions, source, json.dumps({"questions": questions}))
+        self._by_item[key] = snapshot
+        self._by_item.move_to_end(key)
+        while len(self._by_item) > self.max_items:
+            self._by_item.popitem(last=False)
+        return snapshot
+
+    async def for_item(self, ref_type: str, item) -> QuestionSnapshot:
+        """The item's current questions, parsed and stored once per version."""
+        key = (ref_type, item.id, item.updated_at)
+        source = item.structured_content or ""
+        snapshot = self._by_item.get(key)
+        # updated_at has one-second resolution on some databases: compare the content too
+        if snapshot is not None and snapshot.source == source:
+            self._by_item.move_to_end(key)
+            self.counters["hits"] += 1
+            return snapshot
+        # Students starting together wait for one parse
+        building = self._building.get(key)
+        if building is None:
+            building = asyncio.ensure_future(self._build(key, item.id, source))
+            self._building[key] = building
+            building.add_done_callback(lambda _f: self._building.pop(key, None))
+        snapshot = await asyncio.shield(building)
+        if snapshot.source != source:
+            snapshot = await self._build(key, item.id, source)
+        return snapshot
+
+    async def questions_many(self, db: AsyncSession, set_ids) -> dict[str, list]:
+        """{set id: questions}; one query for the sets this worker has not seen."""
+        wanted = {i for i in set_ids if i}
+        found = {i: self._by_id[i] for i in wanted if i in self._by_id}
+        missing = wanted - found.keys()
+        if missing:
+            result = await db.execute(select(AssessmentQuestionSet.id, AssessmentQuestionSet.content)
+                                      .where(AssessmentQuestionSet.id.in_(missing)))
+            for set_id, content in result.all():
+                found[set_id] = json.loads(content)
+                self._remember_set(set_id, found[set_id])
+            self.counters["set_loads"] += len(missing)
+        return found
+
+    async def questions(self, db: AsyncSession, set_id: str) -> list | None:
+        return (await self.questions_many(db, [set_id])).get(set_id)
+
+    def stats(self) -> dict:
+        return {**self.counters, "items": len(self._by_item), "sets": len(self._by_id)}
+
+
+question_sets = QuestionSets()
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from app.config import settings
+from app.utils.code_runner import CodeExecutor, RunnerUnavailable, code_executor
+
+# Per-backend cap on one /runtimes fetch
+FETCH_TIMEOUT_SECONDS = 20
+REFRESH_JOB_ID = "runtime_catalogue_refresh"
+
+
+class RuntimeCatalogue:
+    """
+    Language runtimes offered by the code editor, in the Piston /runtimes format.
+
+    Built from every configured code runner backend that can list its runtimes
+    (a language is listed once, by the first backend that has it), held in
+    memory and refreshed on an APScheduler interval. A backend that fails a
+    refresh keeps its last good list. Every refresh that got anything is written
+    to `snapshot_path`, which a worker loads at startup before its first fetch,
+    so the editor keeps its languages while a backend is down.
+    """
+
+    def __init__(self, executor: CodeExecutor, snapshot_path: str, refresh_minutes: int):
+        self.executor = executor
+        self.snapshot_path = snapshot_path
+        self.refresh_minutes = refresh_minutes
+        self._by_backend: dict[str, list[dict]] = {}
+        self._lock: asyncio.Lock | None = None
+        self._loop = None
+        self.runtimes: list[dict] = []
+        self.etag = self._etag([])
+        self.refreshed_at: datetime | None = None
+        self.counters = {"refreshes": 0, "failures": 0}
+
+    @staticmethod
+    def _etag(runtimes: list[dict]) -> str:
+        digest = hashlib.sha256(json.dumps(runtimes, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._by_backend)
+
+    def _publish(self) -> None:
+        seen, merged = set(), []
+        for backend in self.executor.backends:
+            entries = [e for e in self._by_backend.get(backend.name, []) if e.get("language") not in seen]
+            merged.extend(entries)
+            seen.update(e.get("language") for e in entries)
+        self.runtimes = merged
+        self.etag = self._etag(merged)
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        backends = data.get("backends") if isinstance(data, dict) else None
+        if not isinstance(backends, dict):
+            return False
+        self._by_backend = {name: entries for name, entries in backends.items() if isinstance(entries, list)}
+        self._publish()
+        print(f"[Runtimes] Loaded {len(self.runtimes)} runtimes from {self.snapshot_path}")
+        return True
+
+    def _save_snapshot(self) -> None:
+        # Several workers may write at once: write aside, then rename over
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": datetime.utcnow().isoformat(), "backends": self._by_backend}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"[Runtimes] Could not write the snapshot: {e}")
+
+    async def refresh(self) -> bool:
+        """Fetch every backend's runtimes; returns False if any backend failed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        async with self._lock:
+            ok, fetched = True, False
+            for backend in self.executor.backends:
+                list_runtimes = getattr(backend, "list_runtimes", None)
+                if list_runtimes is None:
+                    continue
+                try:
+                    self._by_backend[backend.name] = await asyncio.wait_for(list_runtimes(), FETCH_TIMEOUT_SECONDS)
+                    fetched = True
+                except (RunnerUnavailable, asyncio.TimeoutError) as e:
+                    ok = False
+                    print(f"[Runtimes] {backend.name} runtimes unavailable, keeping the last good list: {e}")
+            self._publish()
+            self.refreshed_at = datetime.utcnow()
+            self.counters["refreshes" if ok else "failures"] += 1
+            if fetched:
+                self._save_snapshot()
+            return ok
+
+    async def get(self) -> list[dict]:
+        """The catalogue; fetched on the spot only when nothing has been loaded yet."""
+        if not self.loaded:
+            await self.refresh()
+        return self.runtimes
+
+    def start(self, scheduler) -> None:
+        """Serve the disk snapshot right away and refresh now and every `refresh_minutes`."""
+        self.load_snapshot()
+        scheduler.add_job(self.refresh, "interval", minutes=self.refresh_minutes, next_run_time=datetime.now(),
+                          id=REFRESH_JOB_ID, replace_existing=True, coalesce=True, max_instances=1)
+
+
+runtime_catalogue = RuntimeCatalogue(code_executor, settings.RUNTIMES_SNAPSHOT_PATH, settings.RUNTIMES_REFRESH_MINUTES)
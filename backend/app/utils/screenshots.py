@@ -0,0 +1,121 @@
+"""
+Suggestion screenshots, kept in the file store rather than on the row.
+
+The suggestion box sends a compressed screenshot as a data URL. It is decoded
+and stored through `file_store` under lms/suggestions together with a small
+JPEG thumbnail; the row keeps only the two URLs. The admin list shows the
+thumbnail and fetches the full image on demand.
+
+Rows written before this hold the data URL in screenshot_base64:
+`migrate_screenshots` moves them out in batches at startup. Thumbnails need
+Pillow; without it only the full image is stored.
+"""
+import base64
+import binascii
+import io
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models.notification import Suggestion
+from app.utils.storage import file_store
+
+try:
+    from PIL import Image
+except ImportError:  # screenshots are stored without a thumbnail
+    Image = None
+
+FOLDER = "lms/suggestions"
+THUMBNAIL_SIZE = (320, 320)
+MIGRATION_BATCH = 20
+_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp", "image/gif": ".gif"}
+
+
+def decode_data_url(value: str) -> tuple[bytes, str]:
+    """(bytes, content type) of a data URL or bare base64 image; ValueError if it is neither."""
+    content_type = "image/png"
+    if value.startswith("data:"):
+        header, _, value = value.partition(",")
+        content_type = header[5:].split(";")[0] or content_type
+    if not content_type.startswith("image/"):
+        raise ValueError(f"not an image: {content_type}")
+    try:
+        data = base64.b64decode(value)
+    except binascii.Error as e:
+        raise ValueError(str(e))
+    if not data:
+        raise ValueError("empty image")
+    return data, content_type
+
+
+def make_thumbnail(data: bytes) -> bytes | None:
+    """A JPEG of at most THUMBNAIL_SIZE, or None without Pillow or for an unreadable image."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            out = io.BytesIO()
+            image.convert("RGB").save(out, "JPEG", quality=75, optimize=True)
+            return out.getvalue()
+    except Exception as e:
+        print(f"[Screenshots] ⚠️ Could not make a thumbnail: {e}")
+        return None
+
+
+def _prepare(value: str) -> tuple[bytes, str, bytes | None]:
+    data, content_type = decode_data_url(value)
+    return data, content_type, make_thumbnail(data)
+
+
+async def store_screenshot(db: AsyncSession, value: str) -> tuple[str, str | None]:
+    """Store a data-URL screenshot; (image URL, thumbnail URL or None)."""
+    # Decoding and resizing run in the upload pool, off the event loop
+    data, content_type, thumbnail = await file_store.run(_prepare, value)
+    stored = await file_store.save_bytes(db, data, "screenshot" + _EXTENSIONS.get(content_type, ""),
+                                         content_type, FOLDER)
+    thumbnail_url = None
+    if thumbnail:
+        thumbnail_url = (await file_store.save_bytes(db, thumbnail, "thumbnail.jpg", "image/jpeg",
+                                                     f"{FOLDER}/thumbnails")).url
+    return stored.url, thumbnail_url
+
+
+async def migrate_screenshots(batch: int = MIGRATION_BATCH) -> int:
+    """Move screenshots still stored inline into the file store; returns how many moved."""
+    moved = 0
+    failed: set[str] = set()
+    started = datetime.utcnow()
+    while True:
+        async with AsyncSessionLocal() as db:
+            query = select(Suggestion.id, Suggestion.screenshot_base64).where(
+                Suggestion.screenshot_base64.isnot(None))
+            if failed:
+                query = query.where(Suggestion.id.notin_(failed))
+            rows = (await db.execute(query.limit(batch))).all()
+        if not rows:
+            break
+        for suggestion_id, value in rows:
+            # One short transaction per screenshot: requests keep writing meanwhile
+            async with AsyncSessionLocal() as db:
+                try:
+                    url, thumbnail_url = await store_screenshot(db, value)
+                except Exception as e:
+                    # Left in place; the admin endpoint still serves it
+                    print(f"[Screenshots] ⚠️ Could not move the screenshot of suggestion {suggestion_id}: {e}")
+                    failed.add(suggestion_id)
+                    continue
+                # Another worker may be moving it too: the file store deduplicates, the row is cleared once
+                result = await db.execute(
+                    update(Suggestion)
+                    .where(Suggestion.id == suggestion_id, Suggestion.screenshot_base64.isnot(None))
+                    .values(screenshot_url=url, thumbnail_url=thumbnail_url, screenshot_base64=None)
+                )
+                await db.commit()
+                moved += result.rowcount
+    if moved or failed:
+        print(f"[Screenshots] Moved {moved} screenshot(s) to the file store in "
+              f"{(datetime.utcnow() - started).total_seconds():.1f}s, {len(failed)} left inline.")
+    return moved
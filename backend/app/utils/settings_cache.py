@@ -0,0 +1,114 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.setting import SystemSetting
+from app.utils.pg_listener import pg_listener
+
+# Postgres NOTIFY channel used to tell every worker process to drop its copy
+SETTINGS_CHANNEL = "lms_settings_changed"
+
+# Safety net: even without a NOTIFY listener (SQLite, dropped connection)
+# a worker never serves settings older than this.
+CACHE_TTL_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class PunchSettings:
+    """Typed view over the settings used by the QR punch and time-tracking endpoints."""
+    office_latitude: float | None
+    office_longitude: float | None
+    office_radius_meters: float
+    late_threshold_time: str
+    active_qr_secret: str | None
+
+    @property
+    def has_geofence(self) -> bool:
+        return bool(self.office_latitude) and bool(self.office_longitude)
+
+    @property
+    def late_threshold(self) -> tuple[int, int]:
+        """(hour, minute) of the late threshold, falling back to 10:00 on bad data."""
+        try:
+            parts = self.late_threshold_time.split(":")
+            return int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+        except (ValueError, AttributeError):
+            return 10, 0
+
+
+def _to_float(value: str | None) -> float | None:
+    if value in (None, "", "0.0"):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class SettingsCache:
+    """
+    Loads every SystemSetting row once per worker and serves reads from memory.
+
+    Writes must go through `set_many` so the local copy is dropped on commit and
+    the other Passenger workers are told to drop theirs via Postgres NOTIFY.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._values: dict[str, str] | None = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._values = None
+
+    def _is_fresh(self) -> bool:
+        return self._values is not None and (time.monotonic() - self._loaded_at) < self.ttl
+
+    async def get_all(self, db: AsyncSession) -> dict[str, str]:
+        if self._is_fresh():
+            return self._values
+        async with self._lock:
+            if not self._is_fresh():
+                result = await db.execute(select(SystemSetting.key, SystemSetting.value))
+                self._values = {k: v for k, v in result.all()}
+                self._loaded_at = time.monotonic()
+            return self._values
+
+    async def get(self, db: AsyncSession, key: str, default: str | None = None) -> str | None:
+        values = await self.get_all(db)
+        return values.get(key, default)
+
+    async def punch_settings(self, db: AsyncSession) -> PunchSettings:
+        values = await self.get_all(db)
+        return PunchSettings(
+            office_latitude=_to_float(values.get("office_latitude")),
+            office_longitude=_to_float(values.get("office_longitude")),
+            office_radius_meters=_to_float(values.get("office_radius_meters")) or 200.0,
+            late_threshold_time=values.get("late_threshold_time") or "10:00",
+            active_qr_secret=values.get("active_qr_secret"),
+        )
+
+    async def set_many(self, db: AsyncSession, updates: dict[str, str]) -> None:
+        """Upsert settings in the caller's transaction and invalidate every worker on commit."""
+        result = await db.execute(select(SystemSetting).where(SystemSetting.key.in_(list(updates))))
+        existing = {s.key: s for s in result.scalars().all()}
+        for key, value in updates.items():
+            if key in existing:
+                existing[key].value = value
+            else:
+                db.add(SystemSetting(key=key, value=value))
+        await db.flush()
+
+        # NOTIFY is transactional in Postgres: other workers only hear it once we commit
+        await pg_listener.notify(db, SETTINGS_CHANNEL)
+
+        self.invalidate()
+        event.listen(db.sync_session, "after_commit", lambda _s: self.invalidate(), once=True)
+
+
+settings_cache = SettingsCache()
+pg_listener.subscribe(SETTINGS_CHANNEL, lambda _payload: settings_cache.invalidate())
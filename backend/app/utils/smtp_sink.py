@@ -0,0 +1,136 @@
+"""
+A local SMTP stand-in for dev and tests: accepts every message and keeps it.
+
+    python -m app.utils.smtp_sink --port 1025
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 uvicorn app.main:app
+
+Speaks what smtplib needs: EHLO/HELO, AUTH PLAIN/LOGIN (any credentials),
+MAIL, RCPT, DATA, RSET, NOOP and QUIT. No STARTTLS, so the mailer sends in
+the clear. Tests can delay every reply (`latency`), refuse recipients
+(`refuse`), fail the next messages with a 451 (`fail_next`) and drop the open
+connections (`disconnect_all`).
+"""
+import argparse
+import asyncio
+from email import message_from_bytes, policy
+
+
+class SMTPSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.messages: list = []  # email.message.EmailMessage, with .envelope_to
+        self.refuse: set[str] = set()  # recipients answered with 550
+        self.fail_next = 0  # messages answered with 451 after DATA
+        self.counters = {"connections": 0, "logins": 0}
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        self.disconnect_all()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def disconnect_all(self) -> None:
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _reply(self, writer: asyncio.StreamWriter, line: str) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.counters["connections"] += 1
+        self._writers.add(writer)
+        recipients = []
+        try:
+            await self._reply(writer, "220 smtp-sink ready")
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    return
+                line = raw.decode(errors="replace").rstrip("\r\n")
+                verb, _, arg = line.partition(" ")
+                verb = verb.upper()
+                if verb == "EHLO":
+                    await self._reply(writer, "250-smtp-sink\r\n250-8BITMIME\r\n250-AUTH PLAIN LOGIN\r\n250 SMTPUTF8")
+                elif verb == "HELO":
+                    await self._reply(writer, "250 smtp-sink")
+                elif verb == "AUTH":
+                    mechanism, _, initial = arg.partition(" ")
+                    if mechanism.upper() == "LOGIN":
+                        await self._reply(writer, "334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await self._reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    elif not initial:
+                        await self._reply(writer, "334 ")
+                        await reader.readline()
+                    self.counters["logins"] += 1
+                    await self._reply(writer, "235 Authentication successful")
+                elif verb == "MAIL":
+                    recipients = []
+                    await self._reply(writer, "250 OK")
+                elif verb == "RCPT":
+                    recipient = arg.split(":", 1)[1].strip().strip("<>")
+                    if recipient in self.refuse:
+                        await self._reply(writer, "550 No such user")
+                    else:
+                        recipients.append(recipient)
+                        await self._reply(writer, "250 OK")
+                elif verb == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    if self.fail_next > 0:
+                        self.fail_next -= 1
+                        await self._reply(writer, "451 Try again later")
+                        continue
+                    message = message_from_bytes(b"".join(lines), policy=policy.default)
+                    message.envelope_to = list(recipients)
+                    self.messages.append(message)
+                    await self._reply(writer, "250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    if verb == "RSET":
+                        recipients = []
+                    await self._reply(writer, "250 OK")
+                elif verb == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    return
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+async def _serve(host: str, port: int) -> None:
+    sink = SMTPSink(host, port)
+    await sink.start()
+    print(f"[SMTP Sink] Listening on {host}:{sink.port}; messages are printed, not delivered.")
+    seen = 0
+    while True:
+        await asyncio.sleep(0.5)
+        for message in sink.messages[seen:]:
+            print(f"[SMTP Sink] To {', '.join(message.envelope_to)}: {message['Subject']}")
+        seen = len(sink.messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
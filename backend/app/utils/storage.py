@@ -0,0 +1,219 @@
+"""
+File uploads, stored once per content and never on the event loop.
+
+Handlers take multipart UploadFiles. Starlette spools each part to a temporary
+file once it passes 1 MB, so an upload is never decoded into memory as a
+whole. `file_store.save` then:
+
+  * hashes and measures the spooled file in the upload thread pool;
+  * looks the SHA-256 up in `stored_files`: content already stored in that
+    folder, by whichever backend, returns its URL without being uploaded
+    again, and counts the upload on its row;
+  * otherwise hands the file to the storage backend in the same pool
+    (UPLOAD_WORKERS threads per worker), so a slow Cloudinary upload holds a
+    pool thread instead of every request on the worker.
+
+Backends: Cloudinary in production and a local directory (UPLOAD_DIR, served
+at /uploads) for dev and tests. The local backend also takes the file when a
+Cloudinary upload fails.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.upload import StoredFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    url: str
+    sha256: str
+    size: int
+    deduplicated: bool  # the content was already stored
+
+
+def _digest(fileobj, max_bytes: int) -> tuple[str, int]:
+    """(sha256, size) of a file, read in chunks; rewinds it for the upload."""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := fileobj.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge()
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def _extension(filename: str | None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext[1:].isalnum() and len(ext) <= 10 else ""
+
+
+def _record(db: AsyncSession, **values):
+    """INSERT ... ON CONFLICT counting one more upload: another request may store the same content."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(StoredFile).values(uploads=1, **values).on_conflict_do_update(
+        index_elements=[StoredFile.key], set_={"uploads": StoredFile.uploads + 1})
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str, base_url: str = "/uploads"):
+        self.root = root
+        self.base_url = base_url
+
+    def put(self, fileobj, folder: str, name: str) -> str:
+        directory = os.path.join(self.root, *folder.split("/"))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            # Written aside and renamed, so a reader never sees half a file
+            partial = f"{path}.{uuid.uuid4().hex}.part"
+            with open(partial, "wb") as out:
+                shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+            os.replace(partial, path)
+        return f"{self.base_url}/{folder}/{name}"
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def __init__(self):
+        import cloudinary
+        cloudinary.config(
+            cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+            api_key=settings.CLOUDINARY_API_KEY,
+            api_secret=settings.CLOUDINARY_API_SECRET,
+            secure=True,
+        )
+
+    def put(self, fileobj, folder: str, name: str) -> str:
+        import cloudinary.uploader
+        stem, ext = os.path.splitext(name)
+        if ext == ".pdf":
+            # Cloudinary ignores 'format' for raw files: the public_id must end in .pdf
+            upload_args = {"resource_type": "raw", "public_id": name}
+        else:
+            upload_args = {"resource_type": "auto", "public_id": stem}
+        # The public_id is the content hash: an existing upload is kept as it is
+        result = cloudinary.uploader.upload(fileobj, folder=folder, overwrite=False, **upload_args)
+        return result["secure_url"]
+
+
+class FileStore:
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: ThreadPoolExecutor | None = None
+        self._backend = None
+        self._local = LocalStorage(settings.UPLOAD_DIR)
+        self._storing: dict[str, asyncio.Future] = {}
+        self.counters = {"uploads": 0, "deduplicated": 0, "stored": 0, "bytes_stored": 0, "fallbacks": 0}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            name = settings.STORAGE_BACKEND or ("cloudinary" if settings.CLOUDINARY_CLOUD_NAME else "local")
+            self._backend = CloudinaryStorage() if name == "cloudinary" else self._local
+        return self._backend
+
+    def use(self, backend) -> None:
+        self._backend = backend
+
+    async def run(self, fn, *args):
+        """Run a blocking call in the upload pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _store(self, fileobj, folder: str, name: str, size: int) -> tuple[str, str]:
+        """Upload to the backend, or locally if Cloudinary fails; returns (backend name, URL)."""
+        backend = self.backend
+        try:
+            url = await self.run(backend.put, fileobj, folder, name)
+        except Exception as e:
+            if backend is self._local:
+                raise
+            print(f"[Storage] ⚠️ {backend.name} upload of {folder}/{name} failed, storing locally: {e}")
+            self.counters["fallbacks"] += 1
+            fileobj.seek(0)
+            backend = self._local
+            url = await self.run(backend.put, fileobj, folder, name)
+        self.counters["stored"] += 1
+        self.counters["bytes_stored"] += size
+        return backend.name, url
+
+    async def save(self, db: AsyncSession, upload: UploadFile, folder: str) -> StoredUpload:
+        """Store an uploaded file under `folder`; identical content is stored once."""
+        return await self._save(db, upload.file, upload.filename, upload.content_type, folder)
+
+    async def save_bytes(self, db: AsyncSession, data: bytes, filename: str, content_type: str | None,
+                         folder: str) -> StoredUpload:
+        """`save` for content already in memory."""
+        return await self._save(db, io.BytesIO(data), filename, content_type, folder)
+
+    async def _save(self, db: AsyncSession, fileobj, filename: str | None, content_type: str | None,
+                    folder: str) -> StoredUpload:
+        self.counters["uploads"] += 1
+        try:
+            sha256, size = await self.run(_digest, fileobj, settings.UPLOAD_MAX_MB * 1024 * 1024)
+        except UploadTooLarge:
+            raise HTTPException(status_code=413, detail=f"File is larger than {settings.UPLOAD_MAX_MB} MB")
+        name = sha256 + _extension(filename)
+        path = f"{folder}/{name}"
+
+        # Whichever backend stored it: content that fell back to local storage is found too
+        found = (await db.execute(
+            select(StoredFile.backend, StoredFile.url)
+            .where(StoredFile.sha256 == sha256, StoredFile.key.endswith(f":{path}", autoescape=True))
+            .order_by(StoredFile.backend != self.backend.name)
+        )).first()
+        if found is not None:
+            self.counters["deduplicated"] += 1
+            await db.execute(_record(db, key=f"{found.backend}:{path}", backend=found.backend, sha256=sha256,
+                                     size=size, content_type=content_type, url=found.url))
+            return StoredUpload(found.url, sha256, size, True)
+
+        # The same file sent twice at once on this worker is uploaded once
+        storing = self._storing.get(path)
+        deduplicated = storing is not None
+        if storing is None:
+            storing = asyncio.ensure_future(self._store(fileobj, folder, name, size))
+            self._storing[path] = storing
+            storing.add_done_callback(lambda _f: self._storing.pop(path, None))
+        else:
+            self.counters["deduplicated"] += 1
+        backend, url = await asyncio.shield(storing)
+        # Commits with the request; a file whose request failed is uploaded again next time (the backend keeps it)
+        await db.execute(_record(db, key=f"{backend}:{path}", backend=backend, sha256=sha256, size=size,
+                                 content_type=content_type, url=url, created_at=datetime.utcnow()))
+        return StoredUpload(url, sha256, size, deduplicated)
+
+    def stats(self) -> dict:
+        return {**self.counters, "backend": self.backend.name, "workers": self.workers,
+                "in_flight": len(self._storing)}
+
+
+file_store = FileStore(settings.UPLOAD_WORKERS)
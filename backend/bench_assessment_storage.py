@@ -0,0 +1,204 @@
+"""
+Benchmark and checks for structured assessment storage.
+
+For a 50-question test, replays a student's heartbeats (every 15s the client
+sends the full answer map; one more question is answered each time) against:
+  - the old layout: the whole responses blob (question snapshot + answers)
+    is loaded, re-serialised and written back on every heartbeat;
+  - the new layout: only changed answers are written to assessment_answers.
+Reports bytes written per heartbeat (SQL parameters of INSERT/UPDATE) and
+latency, then checks that an old-format session is migrated on its first
+write and that start/resume, questions, submit and reports still work.
+New sessions share one question set row (see bench_question_sets.py).
+
+Usage (from backend/):
+    python bench_assessment_storage.py
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, select, func  # noqa: E402
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.project import Assignment, AssessmentAnswer, AssessmentQuestion, AssessmentSession  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.assessment_store import save_answers  # noqa: E402
+from app.utils.heartbeats import heartbeat_buffer  # noqa: E402
+
+QUESTIONS = 50
+STUDENT_ID = "bench-student"
+REPLAY_STUDENT_ID = "bench-replay"  # owns the replayed sessions, so /start makes a new one
+ASSIGNMENT_ID = "bench-assignment"
+
+QUESTION_LIST = [{
+    "question": f"Question {i}: which of these statements about Python's data model is correct? " + "x" * 200,
+    "options": [f"Option {c} for question {i}, " + "y" * 60 for c in "ABCD"],
+    "answer": i % 4,
+    "explanation": "Because of the way the interpreter resolves attributes. " + "z" * 120,
+    "topic": "data model",
+} for i in range(QUESTIONS)]
+
+written = {"bytes": 0, "statements": 0}
+
+
+def _size(params) -> int:
+    if isinstance(params, dict):
+        params = params.values()
+    if isinstance(params, (list, tuple)) or hasattr(params, "__iter__") and not isinstance(params, str):
+        return sum(_size(p) for p in params)
+    return len(str(params)) if params is not None else 0
+
+
+def count_writes(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+        written["bytes"] += _size(parameters)
+        written["statements"] += 1
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=STUDENT_ID, email="st@bench.local", password="x", name="Student", role=Role.STUDENT))
+        db.add(User(id=REPLAY_STUDENT_ID, email="rp@bench.local", password="x", name="Replay", role=Role.STUDENT))
+        db.add(Assignment(id=ASSIGNMENT_ID, title="Data model quiz", student_id=STUDENT_ID, is_randomized=False,
+                          structured_content=json.dumps({"questions": QUESTION_LIST})))
+        await db.commit()
+
+
+async def legacy_session(session_id: str, saved_answers=None, student_id=STUDENT_ID):
+    blob = {"questions": QUESTION_LIST}
+    if saved_answers is not None:
+        blob["saved_answers"] = saved_answers
+    async with AsyncSessionLocal() as db:
+        db.add(AssessmentSession(id=session_id, student_id=student_id, reference_id=ASSIGNMENT_ID,
+                                 reference_type="ASSIGNMENT", start_time=datetime.utcnow(),
+                                 responses=json.dumps(blob)))
+        await db.commit()
+
+
+async def legacy_heartbeat(session_id: str, answers: dict):
+    """What the heartbeat did before: rewrite the whole blob."""
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        resp_data = json.loads(session.responses or "{}")
+        resp_data["saved_answers"] = answers
+        session.responses = json.dumps(resp_data)
+        await db.commit()
+
+
+async def structured_heartbeat(session_id: str, answers: dict):
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        await save_answers(db, session, answers)
+        await db.commit()
+
+
+async def load_rows(session_id):
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        questions = (await db.execute(select(func.count()).select_from(AssessmentQuestion)
+                                      .where(AssessmentQuestion.session_id == session_id))).scalar()
+        answers = (await db.execute(select(func.count()).select_from(AssessmentAnswer)
+                                    .where(AssessmentAnswer.session_id == session_id))).scalar()
+        return session, questions, answers
+
+
+def replay(run, heartbeat, session_id) -> dict:
+    per_beat_bytes, latencies = [], []
+    answers = {}
+    for i in range(QUESTIONS):
+        answers[str(i)] = str(i % 4)
+        before = written["bytes"]
+        started = time.perf_counter()
+        run(heartbeat, session_id, dict(answers))
+        latencies.append((time.perf_counter() - started) * 1000)
+        per_beat_bytes.append(written["bytes"] - before)
+    latencies.sort()
+    return {"bytes": statistics.mean(per_beat_bytes), "total": sum(per_beat_bytes),
+            "p50": latencies[len(latencies) // 2], "p95": latencies[int(len(latencies) * 0.95)]}
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_writes)
+    student = {"Authorization": "Bearer " + create_access_token({"sub": STUDENT_ID, "role": "STUDENT"})}
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+
+        # Heartbeat write cost
+        run(legacy_session, "legacy-bench", None, REPLAY_STUDENT_ID)
+        old = replay(run, legacy_heartbeat, "legacy-bench")
+        run(legacy_session, "structured-bench", None, REPLAY_STUDENT_ID)
+        run(structured_heartbeat, "structured-bench", {})  # migrate before measuring
+        new = replay(run, structured_heartbeat, "structured-bench")
+        print(f"{QUESTIONS}-question test, {QUESTIONS} heartbeats:")
+        for label, r in (("blob rewrite (old)", old), ("changed answers only", new)):
+            print(f"  {label:<22} {r['bytes']:>9,.0f} bytes/heartbeat  {r['total']:>11,} total  "
+                  f"p50 {r['p50']:.2f}ms  p95 {r['p95']:.2f}ms")
+        check("heartbeats write far fewer bytes", new["bytes"] * 20 < old["bytes"])
+        check("heartbeats are no slower", new["p50"] <= old["p50"] * 1.5)
+
+        # End to end through the API
+        r = client.post(f"/api/training/assessments/ASSIGNMENT/{ASSIGNMENT_ID}/start", headers=student).json()
+        sid = r["session_id"]
+        session, question_rows, _ = run(load_rows, sid)
+        check("start points the session at the shared question set", question_rows == 0
+              and session.question_set_id and json.loads(r["responses"])["questions"] == QUESTION_LIST)
+        wrapped = {"content": json.dumps({"0": "1", "1": "2"})}
+        client.post(f"/api/training/assessments/{sid}/heartbeat", headers=student, json={"answers": wrapped})
+        run(heartbeat_buffer.flush)
+        session, _, answer_rows = run(load_rows, sid)
+        check("heartbeat stores one row per answer", answer_rows == 2 and session.responses is None)
+        resumed = client.post(f"/api/training/assessments/ASSIGNMENT/{ASSIGNMENT_ID}/start", headers=student).json()
+        check("resume returns the saved answers", json.loads(resumed["responses"])["saved_answers"] == {"0": "1", "1": "2"})
+        questions = client.get(f"/api/training/assessments/{sid}/questions", headers=student)
+        check("questions come from the snapshot",
+              [q["question"] for q in questions.json()["questions"]] == [q["question"] for q in QUESTION_LIST])
+        submitted = client.post(f"/api/training/assessments/{sid}/submit", headers=student,
+                                json={"answers": {str(i): str(i % 4) for i in range(QUESTIONS)}}).json()
+        check("submit grades from the snapshot", submitted["score"] == 100.0)
+        session, _, answer_rows = run(load_rows, sid)
+        blob = json.loads(session.responses)
+        check("responses keeps only grading data",
+              answer_rows == QUESTIONS and "questions" not in blob and blob["final_score"] == 100.0)
+        report = next(a for a in client.get("/api/training/assignments", headers=student).json()
+                      if a["id"] == ASSIGNMENT_ID)
+        view = json.loads(report["my_submission"]["session_responses"])
+        check("report view has questions, answers and results",
+              len(view["questions"]) == QUESTIONS and len(view["answers"]) == QUESTIONS
+              and len(view["results"]) == QUESTIONS)
+
+        # Old-format session: migrated on its first heartbeat
+        run(legacy_session, "legacy-api", {"content": json.dumps({"3": "0"})})
+        client.post("/api/training/assessments/legacy-api/heartbeat", headers=student,
+                    json={"answers": {"3": "0", "4": "1"}})
+        run(heartbeat_buffer.flush)
+        session, question_rows, answer_rows = run(load_rows, "legacy-api")
+        check("old blob is migrated on first write", session.storage_version == 1 and question_rows == QUESTIONS
+              and answer_rows == 2 and session.responses is None)
+        questions = client.get("/api/training/assessments/legacy-api/questions", headers=student).json()
+        check("migrated session serves the same questions", len(questions["questions"]) == QUESTIONS)
+
+    print("Assessment storage OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
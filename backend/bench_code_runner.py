@@ -0,0 +1,141 @@
+"""
+Load benchmark for POST /api/training/run-code.
+
+Fires N concurrent Python runs (default 60, one coding test's worth of
+students pressing "Run" together) at the endpoint and reports latency
+percentiles, throughput and correctness for:
+  - the sandboxed local runner (runs taken from the warm pool of pre-isolated
+    fork server members, see code_runner.py);
+  - the local runner with a short queue, to show backpressure (429 + Retry-After);
+  - optionally the public Piston API, with --piston (needs network).
+
+Usage (from backend/):
+    python bench_code_runner.py
+    python bench_code_runner.py --runs 120 --piston
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["CODE_RUNNER_BACKENDS"] = "local"  # the sandboxed local runner only
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.code_runner import code_executor, PistonBackend  # noqa: E402
+
+STUDENT_ID = "bench-student"
+
+# A typical exercise: read n, print the primes below it
+PROGRAM = """
+n = int(input())
+sieve = [True] * n
+primes = []
+for i in range(2, n):
+    if sieve[i]:
+        primes.append(i)
+        for j in range(i * i, n, i):
+            sieve[j] = False
+print(len(primes), primes[-1])
+"""
+
+
+def expected_output(n: int) -> str:
+    primes = [p for p in range(2, n) if all(p % d for d in range(2, int(p ** 0.5) + 1))]
+    return f"{len(primes)} {primes[-1]}\n"
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=STUDENT_ID, email="st@bench.local", password="x", name="Student", role=Role.STUDENT))
+        await db.commit()
+
+
+async def burst(runs: int) -> dict:
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": STUDENT_ID, "role": "STUDENT"})}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one(i):
+            n = 1000 + i
+            started = time.perf_counter()
+            r = await client.post("/api/training/run-code", headers=headers,
+                                  json={"language": "python", "code": PROGRAM, "stdin": f"{n}\n"})
+            elapsed = time.perf_counter() - started
+            ok = r.status_code == 200 and r.json()["stdout"] == expected_output(n)
+            return r.status_code, ok, elapsed, r.headers.get("retry-after")
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*[one(i) for i in range(runs)])
+        wall = time.perf_counter() - started
+    latencies = sorted(e for status, _, e, _ in results if status == 200)
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0  # noqa: E731
+    return {
+        "ok": sum(1 for _, ok, _, _ in results if ok),
+        "rejected": sum(1 for status, _, _, retry in results if status == 429 and retry),
+        "errors": sum(1 for status, _, _, _ in results if status not in (200, 429)),
+        "wall": wall,
+        "p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0),
+        "mean": statistics.mean(latencies) * 1000 if latencies else 0,
+    }
+
+
+def report(label: str, runs: int, r: dict) -> None:
+    print(f"{label:<28} {r['ok']:>3}/{runs} correct  {r['rejected']:>3} x 429  {r['errors']:>2} errors  "
+          f"wall {r['wall']:.2f}s  ({r['ok'] / r['wall']:.1f} runs/s)  "
+          f"p50 {r['p50']:.0f}ms  p95 {r['p95']:.0f}ms  max {r['max']:.0f}ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=60)
+    parser.add_argument("--piston", action="store_true", help="also benchmark the public Piston API")
+    args = parser.parse_args()
+
+    local = code_executor.backend("local")
+    if local is None or not local.languages:
+        print("The local runner is not enabled (CODE_RUNNER_BACKENDS) or cannot sandbox on this host.")
+        return 1
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        print(f"Local runner: {local.max_concurrency} slot(s), queue {local.max_queue}, "
+              f"{os.cpu_count()} CPU(s)")
+
+        run(burst, 4)  # warm-up
+        sandboxed = run(burst, args.runs)
+        report("local, sandboxed", args.runs, sandboxed)
+
+        max_queue = local.max_queue
+        local.max_queue = args.runs // 3
+        limited = run(burst, args.runs)
+        report(f"local, queue capped at {local.max_queue}", args.runs, limited)
+        local.max_queue = max_queue
+        print(f"Runner counters: {local.counters}")
+
+        if args.piston:
+            code_executor.backends.insert(0, PistonBackend())
+            report("remote Piston", args.runs, run(burst, args.runs))
+            del code_executor.backends[0]
+
+    checks = [
+        ("every run is correct", sandboxed["ok"] == args.runs),
+        ("a full queue answers 429 with Retry-After", limited["rejected"] > 0 and limited["errors"] == 0),
+    ]
+    for name, ok in checks:
+        print(f"[{'OK' if ok else 'FAIL'}] {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Memory / throughput benchmark for the streaming CSV exports.
+
+Seeds a synthetic year of data (users punching in most days, one batch with daily
+attendance) into a throwaway SQLite DB, then drives both export endpoints through
+the ASGI app with a `send` that discards the body. Reports time to first byte,
+total time, bytes, MB/s and peak Python heap (tracemalloc) per export.
+
+Usage (from backend/):
+    python bench_csv_export.py                    # 300 users, 365 days
+    python bench_csv_export.py --users 600 --days 90
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import date, datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import engine, Base  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.attendance import Attendance, TimeTracking  # noqa: E402
+from app.models.course import Batch, BatchStudent, Course  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+
+
+async def seed(users: int, days: int, start: date) -> str:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+        roles = [Role.ADMIN] * 5 + [Role.TRAINER] * 10 + [Role.MARKETER] * 5
+        roles += [Role.STUDENT] * max(0, users - len(roles))
+        user_rows = [
+            {"id": str(uuid.uuid4()), "email": f"u{i}@bench.local", "password": "x",
+             "name": f"User {i}", "role": role, "student_id": f"APC-{i:05d}" if role == Role.STUDENT else None}
+            for i, role in enumerate(roles)
+        ]
+        admin_id = str(uuid.uuid4())
+        user_rows.append({"id": admin_id, "email": "admin@bench.local", "password": "x",
+                          "name": "Bench Admin", "role": Role.SUPER_ADMIN, "student_id": None})
+        await conn.execute(insert(User), user_rows)
+
+        await conn.execute(insert(Course), [{"id": "bench-course", "name": "Bench"}])
+        batch_rows = [{"id": f"bench-batch-{b}", "course_id": "bench-course", "name": f"Batch {b}",
+                       "start_date": datetime.combine(start, datetime.min.time()),
+                       "end_date": datetime.combine(start + timedelta(days=days), datetime.min.time())}
+                      for b in range(5)]
+        await conn.execute(insert(Batch), batch_rows)
+        students = [u for u in user_rows if u["role"] == Role.STUDENT]
+        await conn.execute(insert(BatchStudent), [
+            {"id": str(uuid.uuid4()), "batch_id": f"bench-batch-{i % 5}", "student_id": u["id"]}
+            for i, u in enumerate(students)
+        ])
+
+        rng = random.Random(42)
+        for d in range(days):
+            day = datetime.combine(start + timedelta(days=d), datetime.min.time())
+            punches, marks = [], []
+            for u in user_rows[:-1]:
+                if rng.random() < 0.1:
+                    continue
+                login = day + timedelta(hours=9, minutes=rng.randint(0, 90))
+                minutes = rng.randint(240, 540)
+                punches.append({"id": str(uuid.uuid4()), "user_id": u["id"], "date": day, "login_time": login,
+                                "logout_time": login + timedelta(minutes=minutes), "total_minutes": minutes})
+            for i, u in enumerate(students):
+                if i % 5 == 0:
+                    marks.append({"id": str(uuid.uuid4()), "student_id": u["id"], "batch_id": "bench-batch-0",
+                                  "date": day, "status": "PRESENT"})
+            await conn.execute(insert(TimeTracking), punches)
+            if marks:
+                await conn.execute(insert(Attendance), marks)
+    return admin_id
+
+
+async def fetch(path: str, token: str) -> dict:
+    stats = {"bytes": 0, "first_byte": None, "status": None}
+    raw_path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": raw_path, "raw_path": raw_path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"authorization", f"Bearer {token}".encode()), (b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if request_sent:
+            # Client never disconnects; Starlette cancels this once the body is sent
+            await asyncio.Event().wait()
+        request_sent = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    started = time.perf_counter()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            stats["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if stats["first_byte"] is None:
+                stats["first_byte"] = time.perf_counter() - started
+            stats["bytes"] += len(message["body"])
+
+    tracemalloc.start()
+    await app(scope, receive, send)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats["elapsed"] = time.perf_counter() - started
+    stats["peak"] = peak
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    start = date(2025, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+    t0 = time.perf_counter()
+    admin_id = await seed(args.users, args.days, start)
+    print(f"Seeded {args.users} users x {args.days} days in {time.perf_counter() - t0:.1f}s")
+
+    token = create_access_token({"sub": admin_id, "role": "SUPER_ADMIN"})
+    span = f"start_date={start}&end_date={end}"
+    exports = [
+        ("time-tracking, 1 month", f"/api/training/time-tracking/export?start_date={start}&end_date={start + timedelta(days=29)}"),
+        ("time-tracking, full range", f"/api/training/time-tracking/export?{span}"),
+        ("attendance, 1 month", f"/api/training/attendance/export?batch_id=bench-batch-0&start_date={start}&end_date={start + timedelta(days=29)}"),
+        ("attendance, full range", f"/api/training/attendance/export?batch_id=bench-batch-0&{span}"),
+    ]
+    # Warm-up so one-off import/compile costs don't land on the first measurement
+    await fetch(f"/api/training/attendance/export?batch_id=bench-batch-0&start_date={start}&end_date={start}", token)
+
+    for name, path in exports:
+        s = await fetch(path, token)
+        mb = s["bytes"] / 1e6
+        print(
+            f"{name:>26}: HTTP {s['status']} {mb:7.2f} MB in {s['elapsed']:6.2f}s ({mb / s['elapsed']:5.2f} MB/s), "
+            f"first byte {s['first_byte'] * 1000:6.0f}ms, peak heap {s['peak'] / 1e6:6.2f} MB"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,259 @@
+"""
+Load test and checks for buffered assessment heartbeats.
+
+STUDENTS students in one proctored assignment each send BEATS heartbeats
+(the code answer edited on every beat, an MCQ answered every MCQ_EVERY
+beats, VIOLATIONS tab switches at random beats), concurrently, through the
+ASGI app:
+  - write-through: HEARTBEAT_FLUSH_SECONDS = 0, every heartbeat is written;
+  - coalesced: state buffered in memory, written every FLUSH_SECONDS.
+Reports heartbeat latency (p50, p99, and p99 apart for plain heartbeats and
+for those carrying a violation, which are written at once) and DB writes per second (INSERT/UPDATE
+statements and rows), then checks that violations are written at once, the
+buffered answers reach the DB, a session closed by another worker is dropped,
+a late flush cannot overwrite a newer answer, inactivity and time expiry still
+close the session, submit takes the buffered state, and shutdown flushes.
+
+Heartbeats come every BEAT_SECONDS here instead of the browser's 5-30s, with
+the flush interval scaled to match.
+
+Usage (from backend/):
+    python bench_heartbeats.py
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, update  # noqa: E402
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.project import Assignment, AssessmentSession  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.assessment_store import load_answers, save_answers  # noqa: E402
+from app.utils.heartbeats import heartbeat_buffer  # noqa: E402
+
+STUDENTS = 100
+BEATS = 15
+BEAT_SECONDS = 2.0
+FLUSH_SECONDS = 6.0  # the browser's 5s heartbeat against the default 15s flush
+VIOLATIONS = 2
+MCQ_EVERY = 4
+QUESTIONS = [{"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": i % 4} for i in range(20)]
+
+writes = {"statements": 0, "rows": 0, "queries": 0}
+
+
+def count_writes(conn, cursor, statement, parameters, context, executemany):
+    writes["queries"] += 1
+    if statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+        writes["statements"] += 1
+        writes["rows"] += max(cursor.rowcount, 0)
+
+
+def token(user_id):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": "STUDENT"})}
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        for i in range(STUDENTS):
+            db.add(User(id=f"student-{i}", email=f"s{i}@bench.local", password="x", name=f"Student {i}",
+                        role=Role.STUDENT))
+        for ref in ("exam-a", "exam-b"):
+            db.add(Assignment(id=ref, title="Proctored exam", time_limit=60, is_randomized=False,
+                              structured_content=json.dumps({"questions": QUESTIONS})))
+        db.add(Assignment(id="short", title="Short quiz", time_limit=1, is_randomized=False,
+                          structured_content=json.dumps({"questions": QUESTIONS})))
+        await db.commit()
+
+
+async def read(session_id):
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        return session, await load_answers(db, session)
+
+
+async def set_session(session_id, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(AssessmentSession).where(AssessmentSession.id == session_id).values(**values))
+        await db.commit()
+
+
+async def newer_answer(session_id, key, value):
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        await save_answers(db, session, {key: value})
+        await db.commit()
+
+
+async def load_phase(sessions: dict) -> dict:
+    """Every student heartbeats BEATS times; returns latencies and the answers last sent."""
+    latencies, violation_latencies, last_sent, statuses = [], [], {}, {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def student(i, sid):
+            headers = token(f"student-{i}")
+            answers = {}
+            violation_beats = set(random.sample(range(BEATS), VIOLATIONS))
+            await asyncio.sleep(random.random() * BEAT_SECONDS)
+            for beat in range(BEATS):
+                answers["code"] = f"def solve():\n    return {i * BEATS + beat}\n"
+                if beat % MCQ_EVERY == 0:
+                    answers[str(beat // MCQ_EVERY)] = str((i + beat) % 4)
+                body = {"answers": dict(answers)}
+                if beat in violation_beats:
+                    body["tab_switched"] = True
+                started = time.perf_counter()
+                r = await client.post(f"/api/training/assessments/{sid}/heartbeat", headers=headers, json=body)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                (violation_latencies if beat in violation_beats else latencies).append(elapsed_ms)
+                statuses[r.json().get("status")] = statuses.get(r.json().get("status"), 0) + 1
+                await asyncio.sleep(BEAT_SECONDS)
+            last_sent[sid] = answers
+
+        before = dict(writes)
+        started = time.perf_counter()
+        await asyncio.gather(*(student(i, sid) for i, sid in sessions.items()))
+        await heartbeat_buffer.flush()
+        duration = time.perf_counter() - started
+    violation_latencies.sort()
+    everything = sorted(latencies + violation_latencies)
+    return {
+        "p50": everything[len(everything) // 2], "p99": everything[int(len(everything) * 0.99)],
+        "plain_p99": sorted(latencies)[int(len(latencies) * 0.99)],
+        "violation_p99": violation_latencies[int(len(violation_latencies) * 0.99)],
+        "requests": len(everything), "duration": duration, "statuses": statuses, "last_sent": last_sent,
+        **{k: writes[k] - before[k] for k in writes},
+    }
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    event.listen(engine.sync_engine, "after_cursor_execute", count_writes)
+    heartbeat_buffer.flush_seconds = FLUSH_SECONDS
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+
+        def start(ref, i):
+            return client.post(f"/api/training/assessments/ASSIGNMENT/{ref}/start",
+                               headers=token(f"student-{i}")).json()["session_id"]
+
+        def start_all(ref):
+            return {i: start(ref, i) for i in range(STUDENTS)}
+
+        # Load test: same students, one exam each way
+        async def write_through():
+            heartbeat_buffer.flush_seconds = 0
+            await heartbeat_buffer.close()
+        run(write_through)
+        through = run(load_phase, start_all("exam-a"))
+
+        def coalesce():
+            heartbeat_buffer.flush_seconds = FLUSH_SECONDS
+            heartbeat_buffer.start()
+        run(coalesce)
+        coalesced = run(load_phase, start_all("exam-b"))
+
+        print(f"{STUDENTS} students x {BEATS} heartbeats, one every {BEAT_SECONDS:g}s "
+              f"({VIOLATIONS} tab switches each):")
+        for label, r in (("write-through", through), (f"coalesced ({FLUSH_SECONDS:g}s)", coalesced)):
+            print(f"  {label:<16} p50 {r['p50']:6.2f}ms  p99 {r['p99']:6.1f}ms (plain {r['plain_p99']:6.1f}ms, "
+                  f"violation {r['violation_p99']:6.1f}ms)  "
+                  f"{r['statements'] / r['duration']:6.1f} write stmts/s  {r['rows'] / r['duration']:6.1f} rows/s  "
+                  f"{r['rows'] / r['requests']:.2f} rows/heartbeat  {r['queries'] / r['requests']:.1f} queries/heartbeat")
+        check("heartbeats all saved", coalesced["statuses"] == {"saved": STUDENTS * BEATS}, coalesced["statuses"])
+        check("fewer DB writes when coalesced", coalesced["statements"] * 3 < through["statements"]
+              and coalesced["rows"] < through["rows"])
+        check("lower p50 and plain-heartbeat p99 when coalesced",
+              coalesced["p50"] < through["p50"] and coalesced["plain_p99"] < through["plain_p99"])
+
+        final = {sid: run(read, sid) for sid in coalesced["last_sent"]}
+        check("buffered answers reached the DB",
+              all(final[sid][1] == sent for sid, sent in coalesced["last_sent"].items()))
+        check("violation counters are exact",
+              all(s.tab_switch_count == VIOLATIONS and s.last_heartbeat for s, _ in final.values()))
+
+        # Transitions
+        sid = start("exam-b", 0)  # resumes student-0's session
+        headers = token("student-0")
+        beat = lambda body: client.post(f"/api/training/assessments/{sid}/heartbeat", headers=headers,  # noqa: E731
+                                        json=body).json()
+        r = beat({"fullscreen_exited": True})
+        check("a violation is written at once", run(read, sid)[0].fullscreen_exit_count == 1
+              and r["fullscreen_exit_count"] == 1)
+
+        beat({"answers": {"0": "3"}})
+        run(newer_answer, sid, "0", "2")  # another worker saves a newer answer first
+        run(heartbeat_buffer.flush)
+        check("a late flush keeps the newer answer", run(read, sid)[1]["0"] == "2")
+
+        run(lambda: set_session(sid, is_completed=True, score=42.0))  # submitted through another worker
+        beat({"answers": {"1": "1"}})
+        run(heartbeat_buffer.flush)
+        check("a session closed elsewhere is dropped", beat({"answers": {}})
+              == {"status": "already_completed", "score": 42.0} and run(read, sid)[1].get("1") != "1")
+
+        sid = start("exam-b", 1)
+        headers = token("student-1")
+        gone = datetime.utcnow() - timedelta(minutes=11)
+        run(lambda: set_session(sid, last_heartbeat=gone, updated_at=gone))
+        heartbeat_buffer.forget(sid)
+        r = client.post(f"/api/training/assessments/{sid}/heartbeat", headers=headers, json={}).json()
+        check("inactivity still cancels", r == {"status": "cancelled", "reason": "inactivity_timeout"}
+              and run(read, sid)[0].is_completed)
+
+        sid = start("exam-b", 2)
+        headers = token("student-2")
+        client.post(f"/api/training/assessments/{sid}/heartbeat", headers=headers, json={})
+        heartbeat_buffer._live[sid].last_active -= timedelta(minutes=11)  # this worker missed recent beats
+        r = client.post(f"/api/training/assessments/{sid}/heartbeat", headers=headers, json={}).json()
+        check("another worker's heartbeats count as activity", r["status"] == "saved", r)
+
+        r = client.post("/api/training/assessments/ASSIGNMENT/short/start", headers=headers).json()
+        run(lambda: set_session(r["session_id"], start_time=datetime.utcnow() - timedelta(minutes=2)))
+        r2 = client.post(f"/api/training/assessments/{r['session_id']}/heartbeat", headers=headers, json={}).json()
+        session, _ = run(read, r["session_id"])
+        check("time expiry auto-submits", r2 == {"status": "auto_submitted", "reason": "time_expired"}
+              and session.is_completed and session.completion_time_seconds >= 120)
+
+        sid = start("exam-b", 3)
+        headers = token("student-3")
+        client.post(f"/api/training/assessments/{sid}/heartbeat", headers=headers, json={"answers": {"5": "1"}})
+        r = client.post(f"/api/training/assessments/{sid}/submit", headers=headers,
+                        json={"answers": {str(i): str(i % 4) for i in range(len(QUESTIONS))}}).json()
+        session, answers = run(read, sid)
+        check("submit takes the buffered state", r["score"] == 100.0 and sid not in heartbeat_buffer._live
+              and answers["5"] == "1")
+
+        sid = start("exam-b", 4)
+        client.post(f"/api/training/assessments/{sid}/heartbeat", headers=token("student-4"),
+                    json={"answers": {"7": "3"}})
+        print(f"Buffer: {heartbeat_buffer.stats()}")
+
+    check("shutdown flushes buffered answers", asyncio.run(read(sid))[1].get("7") == "3")
+
+    print("Heartbeats OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Benchmark and checks for the in-memory assessment leaderboards.
+
+Seeds one assessment with SESSIONS completed sessions (scores and times with
+plenty of ties), then compares GET /assessments/{id}/ranking for students
+outside the top 10 against the old implementation (top-10 query, then every
+completed session loaded to find the caller). Checks that the rankings match
+a reference sort, that a warm board answers without querying, and that a
+submit, a re-grade and an inactivity cancel move students on the board
+without reloading it.
+
+Usage (from backend/):
+    python bench_leaderboards.py
+"""
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, select  # noqa: E402
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.project import Assignment, AssessmentSession  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.assessment_store import freeze_questions, save_answers  # noqa: E402
+from app.utils.assessment_timer import cancel_inactive  # noqa: E402
+from app.utils.leaderboards import leaderboards  # noqa: E402
+
+SESSIONS = 5000
+REQUESTS = 200
+REF = "exam"
+QUESTIONS = [{"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": i % 4} for i in range(10)]
+
+queries = {"count": 0}
+
+
+def count_queries(*_args):
+    queries["count"] += 1
+
+
+def token(user_id):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": "STUDENT"})}
+
+
+async def seed():
+    rng = random.Random(7)
+    async with AsyncSessionLocal() as db:
+        db.add(Assignment(id=REF, title="Exam", time_limit=60, is_randomized=False,
+                          structured_content=json.dumps({"questions": QUESTIONS})))
+        now = datetime.utcnow()
+        for i in range(SESSIONS + 3):
+            db.add(User(id=f"student-{i}", email=f"s{i}@bench.local", password="x", name=f"Student {i}",
+                        role=Role.STUDENT))
+        for i in range(SESSIONS):
+            cancelled = i % 50 == 0
+            db.add(AssessmentSession(
+                id=str(uuid.UUID(int=rng.getrandbits(128))), student_id=f"student-{i}", reference_id=REF,
+                reference_type="ASSIGNMENT", start_time=now - timedelta(hours=1), end_time=now, is_completed=True,
+                score=0.0 if cancelled else float(rng.randrange(0, 11) * 10),
+                completion_time_seconds=None if cancelled else rng.randrange(600, 620),
+                auto_submitted=cancelled,
+            ))
+        await db.commit()
+
+
+async def reference_ranking(student_id):
+    """Every completed session sorted as the board sorts it."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(AssessmentSession).where(AssessmentSession.reference_id == REF,
+                                                                 AssessmentSession.is_completed == True))  # noqa: E712
+                ).scalars().all()
+    rows.sort(key=lambda s: (-(s.score or 0), s.completion_time_seconds if s.completion_time_seconds is not None
+                             else math.inf, s.id))
+    mine = next((i + 1 for i, s in enumerate(rows) if s.student_id == student_id), None)
+    return [(s.score, s.completion_time_seconds) for s in rows[:10]], mine
+
+
+async def old_ranking(student_id):
+    """What the endpoint did before."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(AssessmentSession, User.name)
+            .join(User, AssessmentSession.student_id == User.id)
+            .where(AssessmentSession.reference_id == REF, AssessmentSession.is_completed == True)  # noqa: E712
+            .order_by(AssessmentSession.score.desc(), AssessmentSession.completion_time_seconds.asc())
+            .limit(10)
+        )
+        rows = result.all()
+        ranking = [{"rank": i + 1, "name": name, "score": s.score} for i, (s, name) in enumerate(rows)]
+        current_rank = next((i + 1 for i, (s, _) in enumerate(rows) if s.student_id == student_id), None)
+        if current_rank is None:
+            all_result = await db.execute(
+                select(AssessmentSession)
+                .where(AssessmentSession.reference_id == REF, AssessmentSession.is_completed == True)  # noqa: E712
+                .order_by(AssessmentSession.score.desc(), AssessmentSession.completion_time_seconds.asc())
+            )
+            for i, s in enumerate(all_result.scalars().all()):
+                if s.student_id == student_id:
+                    current_rank = i + 1
+                    break
+        return {"ranking": ranking, "my_rank": current_rank}
+
+
+async def open_session(sid, student, correct):
+    async with AsyncSessionLocal() as db:
+        session = AssessmentSession(id=sid, student_id=student, reference_id=REF, reference_type="ASSIGNMENT",
+                                    start_time=datetime.utcnow() - timedelta(minutes=5))
+        db.add(session)
+        await db.flush()
+        freeze_questions(db, session, QUESTIONS)
+        await save_answers(db, session, {str(i): str(i % 4 if i < correct else (i + 1) % 4)
+                                         for i in range(len(QUESTIONS))})
+        await db.commit()
+
+
+async def regrade(sid, score):
+    """What the AI grader does when it finishes."""
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, sid)
+        session.score = score
+        await leaderboards.record(db, session)
+        await db.commit()
+
+
+async def cancel(sid):
+    async with AsyncSessionLocal() as db:
+        await cancel_inactive(db, sid, datetime.utcnow())
+        await db.commit()
+
+
+def timed(fn, n):
+    latencies = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_queries)
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        ranking = lambda student: client.get(f"/api/training/assessments/{REF}/ranking",  # noqa: E731
+                                             headers=token(student)).json()
+        students = [f"student-{(i * 37) % SESSIONS}" for i in range(REQUESTS)]
+
+        old = timed(lambda i: run(old_ranking, students[i]), REQUESTS)
+        for student in students:  # load the board; the auth cache gets each student too
+            ranking(student)
+        before = queries["count"]
+        new = timed(lambda i: ranking(students[i]), REQUESTS)
+        per_request = (queries["count"] - before) / REQUESTS
+        print(f"{SESSIONS} completed sessions, {REQUESTS} ranking requests:")
+        print(f"  old (scan)      p50 {old[0]:7.2f}ms  p99 {old[1]:7.2f}ms")
+        print(f"  leaderboard     p50 {new[0]:7.2f}ms  p99 {new[1]:7.2f}ms  {per_request:.2f} queries/request")
+        check("ranking is faster", new[0] * 5 < old[0])
+        # The engine-wide count also sees the background jobs' polling
+        check("a warm board needs no query", per_request < 0.05, per_request)
+
+        def matches(student):
+            r = ranking(student)
+            top, mine = run(reference_ranking, student)
+            return [(e["score"], e["completion_time_seconds"]) for e in r["ranking"]] == top and r["my_rank"] == mine
+        check("rankings match a full sort", all(matches(s) for s in students[:20] + ["student-0", f"student-{SESSIONS + 2}"]))
+
+        loads = leaderboards.counters["loads"]
+        run(lambda: open_session("new-1", f"student-{SESSIONS}", 10))
+        r = client.post("/api/training/assessments/new-1/submit", headers=token(f"student-{SESSIONS}"),
+                        json={"answers": {str(i): str(i % 4) for i in range(len(QUESTIONS))}}).json()
+        check("a submit moves the student onto the board", r["score"] == 100.0 and matches(f"student-{SESSIONS}")
+              and leaderboards.counters["loads"] == loads, ranking(f"student-{SESSIONS}")["my_rank"])
+
+        run(lambda: regrade("new-1", 5.0))
+        check("a re-grade moves it", matches(f"student-{SESSIONS}") and leaderboards.counters["loads"] == loads)
+
+        run(lambda: open_session("new-2", f"student-{SESSIONS + 1}", 0))
+        run(lambda: cancel("new-2"))
+        check("a cancel puts the session on the board",
+              matches(f"student-{SESSIONS + 1}") and leaderboards.counters["loads"] == loads)
+
+        leaderboards.forget(REF)
+        check("rebuilt from the DB", matches(f"student-{SESSIONS}") and leaderboards.counters["loads"] == loads + 1)
+        print(f"Leaderboards: {leaderboards.stats()}")
+
+    print("Leaderboards OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Latency / query-count benchmark for the training list endpoints.
+
+Seeds a throwaway SQLite DB with 1,000 assignments spread over batches of 60
+students each (plus submissions, assessment sessions, tasks, projects with
+milestones, violations and feedback), then calls every list endpoint as an admin
+and as a student. Reports rows returned, SQL statements executed and the median
+latency over a few runs.
+
+Usage (from backend/):
+    python bench_list_endpoints.py
+    python bench_list_endpoints.py --assignments 2000 --batch-size 60 --batches 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from app.database import engine, Base  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.course import Batch, BatchStudent, Course  # noqa: E402
+from app.models.notification import Feedback  # noqa: E402
+from app.models.project import (  # noqa: E402
+    AssessmentSession, Assignment, AssignmentSubmission, Project, ProjectMilestone, Task, Violation, ViolationType,
+)
+from app.models.user import Role, User  # noqa: E402
+
+ADMIN_ID = "bench-super-admin"
+
+ENDPOINTS = [
+    ("assignments", "/api/training/assignments"),
+    ("tasks", "/api/training/tasks"),
+    ("projects", "/api/training/projects"),
+    ("violations", "/api/training/violations"),
+    ("feedback", "/api/training/feedback"),
+]
+
+
+def _uid() -> str:
+    return str(uuid.uuid4())
+
+
+async def seed(assignments: int, batches: int, batch_size: int) -> str:
+    """Returns the id of a student enrolled in batch 0."""
+    rng = random.Random(42)
+    now = datetime(2026, 3, 1)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+        trainers = [{"id": _uid(), "email": f"t{b}@bench.local", "password": "x", "name": f"Trainer {b}",
+                     "role": Role.TRAINER} for b in range(batches)]
+        students = [{"id": _uid(), "email": f"s{i}@bench.local", "password": "x", "name": f"Student {i}",
+                     "role": Role.STUDENT, "student_id": f"APC-{i:05d}"} for i in range(batches * batch_size)]
+        admin = {"id": ADMIN_ID, "email": "admin@bench.local", "password": "x", "name": "Bench Admin",
+                 "role": Role.SUPER_ADMIN}
+        await conn.execute(insert(User), [admin, *trainers, *students])
+
+        await conn.execute(insert(Course), [{"id": "bench-course", "name": "Bench"}])
+        batch_ids = [f"bench-batch-{b}" for b in range(batches)]
+        await conn.execute(insert(Batch), [
+            {"id": bid, "course_id": "bench-course", "name": f"Batch {b}", "trainer_id": trainers[b]["id"],
+             "start_date": now, "end_date": now + timedelta(days=90)}
+            for b, bid in enumerate(batch_ids)
+        ])
+        members = {bid: students[b * batch_size:(b + 1) * batch_size] for b, bid in enumerate(batch_ids)}
+        await conn.execute(insert(BatchStudent), [
+            {"id": _uid(), "batch_id": bid, "student_id": s["id"]} for bid, group in members.items() for s in group
+        ])
+
+        assignment_rows, submissions, sessions = [], [], []
+        for a in range(assignments):
+            b = a % batches
+            aid = _uid()
+            assignment_rows.append({"id": aid, "title": f"Assignment {a}", "batch_id": batch_ids[b],
+                                    "assigned_by": trainers[b]["id"], "created_at": now + timedelta(minutes=a)})
+            for s in members[batch_ids[b]]:
+                if rng.random() < 0.5:
+                    submissions.append({"id": _uid(), "assignment_id": aid, "student_id": s["id"],
+                                        "marks": rng.randint(0, 100)})
+                if rng.random() < 0.3:
+                    sessions.append({"id": _uid(), "student_id": s["id"], "reference_id": aid,
+                                     "reference_type": "ASSIGNMENT"})
+        await conn.execute(insert(Assignment), assignment_rows)
+        await conn.execute(insert(AssignmentSubmission), submissions)
+        await conn.execute(insert(AssessmentSession), sessions)
+
+        task_rows = [{"id": _uid(), "title": f"Task {t}", "batch_id": batch_ids[t % batches],
+                      "assigned_by": trainers[t % batches]["id"]} for t in range(assignments // 2)]
+        await conn.execute(insert(Task), task_rows)
+
+        projects = [{"id": _uid(), "title": f"Project {p}", "batch_id": batch_ids[p % batches],
+                     "trainer_id": trainers[p % batches]["id"]} for p in range(batches * 5)]
+        await conn.execute(insert(Project), projects)
+        await conn.execute(insert(ProjectMilestone), [
+            {"id": _uid(), "project_id": p["id"], "title": f"M{i}", "order": i} for p in projects for i in range(4)
+        ])
+
+        await conn.execute(insert(Violation), [
+            {"id": _uid(), "student_id": rng.choice(students)["id"], "type": ViolationType.LATE_SUBMISSION,
+             "title": "Late", "resolved_by_id": rng.choice(trainers)["id"]} for _ in range(len(students))
+        ])
+        await conn.execute(insert(Feedback), [
+            {"id": _uid(), "student_id": s["id"], "batch_id": bid, "week": 1, "rating": rng.randint(1, 5)}
+            for bid, group in members.items() for s in group
+        ])
+    return members[batch_ids[0]][0]["id"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assignments", type=int, default=1000)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=60)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    student_id = asyncio.run(seed(args.assignments, args.batches, args.batch_size))
+    print(f"Seeded {args.assignments} assignments, {args.batches} batches x {args.batch_size} students "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    tokens = {
+        "admin": create_access_token({"sub": ADMIN_ID, "role": "SUPER_ADMIN"}),
+        "student": create_access_token({"sub": student_id, "role": "STUDENT"}),
+    }
+    counter = {"n": 0}
+
+    def count(*_args):
+        counter["n"] += 1
+
+    with TestClient(app) as client:
+        for caller, token in tokens.items():
+            headers = {"Authorization": f"Bearer {token}"}
+            for name, path in ENDPOINTS:
+                client.get(path, headers=headers)  # warm-up
+                timings = []
+                for _ in range(args.runs):
+                    counter["n"] = 0
+                    event.listen(engine.sync_engine, "before_cursor_execute", count)
+                    started = time.perf_counter()
+                    r = client.get(path, headers=headers)
+                    timings.append(time.perf_counter() - started)
+                    event.remove(engine.sync_engine, "before_cursor_execute", count)
+                rows = len(r.json()) if r.status_code == 200 else 0
+                print(f"{caller:>7} {name:>12}: HTTP {r.status_code} {rows:5d} rows, {counter['n']:3d} queries, "
+                      f"median {statistics.median(timings) * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
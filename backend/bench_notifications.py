@@ -0,0 +1,303 @@
+"""
+Benchmark and checks for notifications (app/utils/notifications.py).
+
+Seeds USERS active students in one batch (plus a few inactive users and
+trainers), then compares an admin broadcast to everyone the old way (load
+every user, add one Notification each) with POST /api/admin/notifications/send,
+which now stores the broadcast once. Also compares "mark all read" for a user
+with HISTORY notifications (update every row vs. move the read watermark),
+times the feed and unread count, checks the recipients of ROLE broadcasts and
+of batch tasks and assignments (one row per student, INSERT ... SELECT), and
+checks that broadcasts stored as per-user copies are folded into single rows
+with the same feed and read state, and that deleting a user clears their read
+watermark and the broadcasts they sent.
+
+Usage (from backend/):
+    python bench_notifications.py
+    python bench_notifications.py --users 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete, func, insert, select, update  # noqa: E402
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.course import Batch, BatchStudent, Course  # noqa: E402
+from app.models.notification import BroadcastNotification, Notification, NotificationCursor  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.notifications import migrate_broadcast_copies  # noqa: E402
+
+ROUNDS = 5
+HISTORY = 2000
+
+
+def token(user_id, role):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": role})}
+
+
+async def seed(users: int) -> None:
+    joined = datetime.utcnow() - timedelta(days=30)
+    async with engine.begin() as conn:
+        rows = [{"id": f"student-{i}", "email": f"s{i}@bench.local", "password": "x", "name": f"Student {i}",
+                 "role": Role.STUDENT, "is_active": True, "created_at": joined} for i in range(users)]
+        rows += [{"id": f"inactive-{i}", "email": f"x{i}@bench.local", "password": "x", "name": f"Gone {i}",
+                  "role": Role.STUDENT, "is_active": False, "created_at": joined} for i in range(10)]
+        rows += [{"id": f"trainer-{i}", "email": f"t{i}@bench.local", "password": "x", "name": f"Trainer {i}",
+                  "role": Role.TRAINER, "is_active": True, "created_at": joined} for i in range(3)]
+        rows.append({"id": "admin", "email": "admin@bench.local", "password": "x", "name": "Admin",
+                     "role": Role.SUPER_ADMIN, "is_active": True, "created_at": joined})
+        await conn.execute(insert(User), rows)
+        await conn.execute(insert(Course), [{"id": "course", "name": "Bench"}])
+        await conn.execute(insert(Batch), [{"id": "batch", "course_id": "course", "name": "Batch",
+                                            "start_date": datetime(2026, 1, 1), "end_date": datetime(2026, 12, 31),
+                                            "trainer_id": "trainer-0"}])
+        await conn.execute(insert(BatchStudent), [{"id": str(uuid.uuid4()), "batch_id": "batch",
+                                                   "student_id": f"student-{i}"} for i in range(users)])
+
+
+async def seed_history(user_id: str, count: int) -> None:
+    """A long-time student: `count` personal notifications, unread."""
+    start = datetime.utcnow() - timedelta(days=20)
+    async with engine.begin() as conn:
+        await conn.execute(insert(Notification), [
+            {"id": str(uuid.uuid4()), "user_id": user_id, "title": f"Task {i}", "message": "-", "read": False,
+             "type": "TASK", "created_at": start + timedelta(minutes=i)} for i in range(count)])
+
+
+async def old_broadcast(title: str, message: str) -> int:
+    """send_notification(target="ALL") before broadcasts were stored once."""
+    async with AsyncSessionLocal() as db:
+        users = (await db.execute(select(User).where(User.is_active == True))).scalars().all()  # noqa: E712
+        for u in users:
+            db.add(Notification(user_id=u.id, title=title, message=message, type="SYSTEM",
+                                reference_id="admin_broadcast"))
+        await db.commit()
+        return len(users)
+
+
+async def old_mark_read(user_id: str) -> None:
+    """mark_notifications_read before the read watermark."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Notification).where(Notification.user_id == user_id).values(read=True))
+        await db.commit()
+
+
+async def reset_read(user_id: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Notification).where(Notification.user_id == user_id).values(read=False))
+        await db.execute(delete(NotificationCursor).where(NotificationCursor.user_id == user_id))
+        await db.commit()
+
+
+async def clear() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Notification).where(Notification.reference_id == "admin_broadcast"))
+        await db.execute(delete(BroadcastNotification))
+        await db.commit()
+
+
+async def count(model, *where) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(model).where(*where))
+
+
+async def legacy_copies() -> None:
+    """Broadcasts as older versions stored them: one row per recipient, some read; one text sent twice."""
+    sent = datetime.utcnow() - timedelta(days=2)
+    async with AsyncSessionLocal() as db:
+        users = (await db.execute(select(User.id, User.role).where(User.is_active == True))).all()  # noqa: E712
+        rows = []
+        for user_id, role in users:
+            rows.append({"id": str(uuid.uuid4()), "user_id": user_id, "title": "Holiday", "message": "Closed Friday",
+                         "type": "SYSTEM", "reference_id": "admin_broadcast", "read": user_id == "student-3",
+                         "created_at": sent})
+            rows.append({"id": str(uuid.uuid4()), "user_id": user_id, "title": "Holiday", "message": "Closed Friday",
+                         "type": "SYSTEM", "reference_id": "admin_broadcast", "read": False,
+                         "created_at": sent + timedelta(days=1)})
+            if role == Role.TRAINER:
+                rows.append({"id": str(uuid.uuid4()), "user_id": user_id, "title": "Trainers", "message": "Sync",
+                             "type": "SYSTEM", "reference_id": "admin_broadcast", "read": False,
+                             "created_at": sent + timedelta(hours=1)})
+        await db.execute(insert(Notification), rows)
+        await db.commit()
+
+
+def timed(fn, rounds=ROUNDS, setup=None) -> float:
+    samples = []
+    for _ in range(rounds):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+    active = args.users + 3 + 1
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed, args.users)
+        admin = token("admin", "SUPER_ADMIN")
+        student = token("student-7", "STUDENT")
+
+        # ─── Broadcast ────────────────────────────────
+        old_ms = timed(lambda: run(old_broadcast, "Old", "Hello everyone"), setup=lambda: run(clear))
+        responses = []
+        new_ms = timed(lambda: responses.append(client.post(
+            "/api/admin/notifications/send", headers=admin,
+            json={"title": "New", "message": "Hello everyone", "target": "ALL"})), setup=lambda: run(clear))
+        r = responses[-1]
+        print(f"Broadcast to {active} active users, median of {ROUNDS}: per-user copies {old_ms:.0f}ms, "
+              f"one broadcast row {new_ms:.1f}ms ({old_ms / new_ms:.0f}x)")
+        check("broadcast is faster", new_ms * 10 < old_ms, (old_ms, new_ms))
+        check("broadcast is stored once", r.status_code == 201 and r.json()["count"] == active
+              and run(count, BroadcastNotification) == 1 and run(count, Notification) == 0, r.text)
+        feed = client.get("/api/auth/notifications", headers=student).json()
+        check("it shows, unread, in a student's feed", feed and feed[0]["title"] == "New"
+              and feed[0]["read"] is False and feed[0]["type"] == "SYSTEM", feed[:1])
+        unread = client.get("/api/auth/notifications/unread-count", headers=student).json()
+        check("and counts as unread", unread == {"unread": 1, "capped": False}, unread)
+
+        r = client.post("/api/admin/notifications/send", headers=admin,
+                        json={"title": "Trainers", "message": "Staff meeting", "target": "ROLE", "role": "TRAINER"})
+        trainer_feed = client.get("/api/auth/notifications", headers=token("trainer-1", "TRAINER")).json()
+        student_feed = client.get("/api/auth/notifications", headers=student).json()
+        check("ROLE broadcast reaches only that role", r.status_code == 201 and r.json()["count"] == 3
+              and [n["title"] for n in trainer_feed] == ["Trainers", "New"]
+              and [n["title"] for n in student_feed] == ["New"], r.text)
+        r = client.post("/api/admin/notifications/send", headers=admin,
+                        json={"title": "Nobody", "message": "-", "target": "ROLE", "role": "MARKETER"})
+        check("ROLE with no users is a 404 and stores nothing", r.status_code == 404
+              and run(count, BroadcastNotification, BroadcastNotification.title == "Nobody") == 0, r.text)
+
+        run(lambda: _add_user("late", datetime.utcnow() + timedelta(seconds=1)))
+        late_feed = client.get("/api/auth/notifications", headers=token("late", "STUDENT")).json()
+        check("users created later don't get older broadcasts", late_feed == [], late_feed)
+
+        listing = client.get("/api/admin/notifications", headers=admin).json()
+        check("admin list has one entry per broadcast", [(n["title"], n["target"]) for n in listing]
+              == [("Trainers", "TRAINER"), ("New", "ALL")], listing)
+        r = client.delete(f"/api/admin/notifications/{listing[0]['id']}", headers=admin)
+        trainer_feed = client.get("/api/auth/notifications", headers=token("trainer-1", "TRAINER")).json()
+        check("deleting a broadcast removes it from every feed", r.status_code == 200
+              and [n["title"] for n in trainer_feed] == ["New"], r.text)
+
+        # ─── Read state ───────────────────────────────
+        run(seed_history, "student-7", HISTORY)
+        old_ms = timed(lambda: run(old_mark_read, "student-7"), setup=lambda: run(reset_read, "student-7"))
+        new_ms = timed(lambda: client.post("/api/auth/notifications/read-all", headers=student),
+                       setup=lambda: run(reset_read, "student-7"))
+        print(f"Mark all read with {HISTORY} notifications: update every row {old_ms:.1f}ms ({HISTORY} rows written), "
+              f"move the watermark {new_ms:.1f}ms (1 row written)")
+        check("mark-all-read writes one row", run(count, Notification, Notification.read == True) == 0  # noqa: E712
+              and run(count, NotificationCursor) == 1)
+        unread = client.get("/api/auth/notifications/unread-count", headers=student).json()
+        feed = client.get("/api/auth/notifications", headers=student).json()
+        check("everything before the watermark is read", unread["unread"] == 0 and len(feed) == 50
+              and not any(not n["read"] for n in feed), unread)
+
+        run(reset_read, "student-7")
+        unread = client.get("/api/auth/notifications/unread-count", headers=student).json()
+        check("unread count is capped", unread == {"unread": 99, "capped": True}, unread)
+        feed_ms = timed(lambda: client.get("/api/auth/notifications", headers=student))
+        count_ms = timed(lambda: client.get("/api/auth/notifications/unread-count", headers=student))
+        print(f"Feed {feed_ms:.1f}ms, unread count {count_ms:.1f}ms (median of {ROUNDS}, {HISTORY} notifications)")
+
+        client.post("/api/auth/notifications/read-all", headers=student)
+        time.sleep(0.01)
+        client.post("/api/admin/notifications/send", headers=admin,
+                    json={"title": "After", "message": "-", "target": "ALL"})
+        client.post("/api/admin/notifications/send", headers=admin,
+                    json={"title": "Direct", "message": "-", "target": "USER", "user_id": "student-7"})
+        unread = client.get("/api/auth/notifications/unread-count", headers=student).json()
+        feed = client.get("/api/auth/notifications", headers=student).json()
+        check("new notifications after the watermark are unread", unread["unread"] == 2
+              and [(n["title"], n["read"]) for n in feed[:3]] == [("Direct", False), ("After", False), ("New", True)],
+              (unread, feed[:3]))
+
+        # ─── Batch fan-out ────────────────────────────
+        trainer = token("trainer-0", "TRAINER")
+        started = time.perf_counter()
+        r = client.post("/api/training/tasks", headers=trainer, json={"title": "Essay", "batch_id": "batch"})
+        task_ms = (time.perf_counter() - started) * 1000
+        task_id = r.json().get("id")
+        check(f"batch task notifies every student ({task_ms:.0f}ms)", r.status_code == 201
+              and run(count, Notification, Notification.reference_id == task_id, Notification.type == "TASK",
+                      Notification.link == f"/student/tasks?open={task_id}") == args.users, r.text)
+        r = client.post("/api/training/assignments", headers=trainer, json={"title": "Quiz", "batch_id": "batch"})
+        check("batch assignment notifies every student", r.status_code == 201
+              and run(count, Notification, Notification.reference_id == r.json().get("id"),
+                      Notification.type == "ASSIGNMENT") == args.users, r.text)
+
+        # ─── Migration ────────────────────────────────
+        run(clear)
+        client.post("/api/admin/notifications/send", headers=admin,
+                    json={"title": "Direct", "message": "-", "target": "USER", "user_id": "student-3"})
+        run(legacy_copies)
+        run(reset_read, "student-7")
+        before = {u: client.get("/api/auth/notifications", headers=token(u, role)).json()
+                  for u, role in (("student-3", "STUDENT"), ("student-4", "STUDENT"), ("trainer-2", "TRAINER"))}
+        started = time.perf_counter()
+        created = run(migrate_broadcast_copies)
+        migrate_ms = (time.perf_counter() - started) * 1000
+        after = {u: client.get("/api/auth/notifications", headers=token(u, role)).json()
+                 for u, role in (("student-3", "STUDENT"), ("student-4", "STUDENT"), ("trainer-2", "TRAINER"))}
+
+        def shape(items):
+            return [(n["title"], n["message"], n["read"], n["created_at"]) for n in items]
+
+        check(f"copies fold into one broadcast per send ({migrate_ms:.0f}ms)", created == 3
+              and run(count, Notification, Notification.reference_id == "admin_broadcast") == 0
+              and run(count, BroadcastNotification, BroadcastNotification.audience == "ROLE",
+                      BroadcastNotification.role == "TRAINER") == 1, created)
+        check("feeds and read state are unchanged", all(shape(before[u]) == shape(after[u]) for u in before),
+              {u: (shape(before[u]), shape(after[u])) for u in before if shape(before[u]) != shape(after[u])})
+        check("migration is idempotent", run(migrate_broadcast_copies) == 0 and run(count, BroadcastNotification) == 3)
+
+        # ─── Deleting users ───────────────────────────
+        run(_add_user, "sender", datetime.utcnow(), Role.ADMIN)
+        client.post("/api/admin/notifications/send", headers=token("sender", "ADMIN"),
+                    json={"title": "From sender", "message": "-", "target": "ALL"})
+        client.post("/api/auth/notifications/read-all", headers=student)
+        deleted = [client.delete(f"/api/admin/users/{u}", headers=admin) for u in ("student-7", "sender")]
+        check("deleting a user clears their watermark and sent broadcasts",
+              all(r.status_code == 200 and r.json().get("status") == "deleted" for r in deleted)
+              and run(count, NotificationCursor, NotificationCursor.user_id == "student-7") == 0
+              and run(count, BroadcastNotification, BroadcastNotification.title == "From sender",
+                      BroadcastNotification.sent_by.is_(None)) == 1, [r.text[:200] for r in deleted])
+
+    print("Notifications OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+async def _add_user(user_id: str, created_at: datetime, role: Role = Role.STUDENT) -> None:
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, email=f"{user_id}@bench.local", password="x", name=user_id, role=role,
+                    created_at=created_at))
+        await db.commit()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark for POST /api/auth/attendance/scan: burst pipeline vs row-locking path.
+
+Simulates the morning rush: N concurrent scanners, each punching in/out repeatedly
+(the 30s cooldown is disabled for the run). Runs the app in-process over ASGI, so
+the numbers measure the API + DB, not the network.
+
+Usage (from backend/):
+    python bench_punch_scan.py                      # throwaway SQLite DB
+    DATABASE_URL=postgresql://... python bench_punch_scan.py --scanners 500 --scans 4
+
+Point DATABASE_URL at a scratch database: the script creates users and punch rows.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import engine, Base, AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.user import User, Role  # noqa: E402
+import app.utils.punch as punch  # noqa: E402
+
+
+async def create_scanners(count: int) -> list[dict]:
+    run_id = uuid.uuid4().hex[:6]
+    headers = []
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            user = User(
+                id=str(uuid.uuid4()),
+                email=f"bench_{run_id}_{i}@example.com",
+                password="x",
+                name=f"Bench {i}",
+                role=Role.STUDENT,
+            )
+            db.add(user)
+            token = create_access_token({"sub": user.id, "role": "STUDENT"})
+            headers.append({"Authorization": f"Bearer {token}"})
+        await db.commit()
+    return headers
+
+
+async def run(mode: str, scanners: int, scans: int) -> None:
+    settings.PUNCH_BURST_MODE = mode == "burst"
+    headers = await create_scanners(scanners)
+    latencies, failures = [], 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def scanner(h):
+            nonlocal failures
+            for _ in range(scans):
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/api/auth/attendance/scan", json={"qr_token": "bench"}, headers=h)
+                    ok = r.status_code == 200
+                except Exception:
+                    ok = False
+                latencies.append(time.perf_counter() - t0)
+                failures += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(scanner(h) for h in headers))
+        elapsed = time.perf_counter() - started
+
+    await punch.punch_pipeline.close()
+    latencies.sort()
+    total = scanners * scans
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(
+        f"{mode:>6}: {total} scans in {elapsed:.2f}s -> {(total - failures) / elapsed:.0f} scans/sec ok, "
+        f"{failures} failed, p50 {p(0.5):.0f}ms p95 {p(0.95):.0f}ms p99 {p(0.99):.0f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scanners", type=int, default=500)
+    parser.add_argument("--scans", type=int, default=4, help="scans per scanner (alternating in/out)")
+    parser.add_argument("--mode", choices=["both", "burst", "locking"], default="both")
+    args = parser.parse_args()
+
+    punch.COOLDOWN_SECONDS = 0
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    print(f"DB: {engine.url.render_as_string(hide_password=True)}")
+    modes = ["locking", "burst"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        await run(mode, args.scanners, args.scans)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
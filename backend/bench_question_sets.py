@@ -0,0 +1,231 @@
+"""
+Benchmark and checks for shared question sets at assessment start.
+
+STUDENTS students start the same randomized QUESTIONS-question assignment at
+once, two ways:
+  - the old start: load the item, json.loads its structured_content, shuffle a
+    copy, write every question into the session's assessment_questions rows
+    and json.dumps the copy back;
+  - the new start: the parsed list comes from the per-worker cache, the
+    session stores the set id and its order as index arrays.
+Reports the event-loop CPU time per start during the burst (what holds up
+every other request on the worker), parses, bytes written per session (SQL
+parameters of INSERT/UPDATE) and the latency of one start on its own, then
+checks through the API that each student
+gets a consistent shuffled view (answers follow their options), resume and
+/questions return the same view, a perfect submit scores 100, unshuffled
+assessments are sent as written, and an edit after start leaves started
+sessions on their questions.
+
+The burst's wall time is not compared: SQLite serialises the 60 commits on its
+database lock, with busy-wait sleeps between them, so it measures SQLite.
+
+Usage (from backend/):
+    python bench_question_sets.py
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.project import Assignment, AssessmentSession  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.assessment_store import assign_questions, freeze_questions  # noqa: E402
+from app.utils.question_sets import apply_order, question_sets, shuffled_order  # noqa: E402
+
+STUDENTS = 60
+QUESTIONS = 50
+ROUNDS = 5
+
+QUESTION_LIST = [{
+    "question": f"Question {i}: which of these statements about Python's data model is correct? " + "x" * 200,
+    "options": [f"Option {c} for question {i}, " + "y" * 60 for c in "ABCD"],
+    "answer": i % 4,
+    "explanation": "Because of the way the interpreter resolves attributes. " + "z" * 120,
+    "topic": "data model",
+} for i in range(QUESTIONS)]
+
+written = {"bytes": 0}
+
+
+def _size(params) -> int:
+    if isinstance(params, dict):
+        params = params.values()
+    if isinstance(params, (list, tuple)):
+        return sum(_size(p) for p in params)
+    return len(str(params)) if params is not None else 0
+
+
+def count_writes(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+        written["bytes"] += _size(parameters)
+
+
+def token(user_id):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": "STUDENT"})}
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        for i in range(STUDENTS):
+            db.add(User(id=f"student-{i}", email=f"s{i}@bench.local", password="x", name=f"Student {i}",
+                        role=Role.STUDENT))
+        for ref, randomized in (("exam", True), ("plain", False)):
+            db.add(Assignment(id=ref, title=ref, time_limit=60, is_randomized=randomized,
+                              structured_content=json.dumps({"questions": QUESTION_LIST})))
+        for r in range(ROUNDS * 2):
+            db.add(Assignment(id=f"burst-{r}", title="burst", time_limit=60, is_randomized=True,
+                              structured_content=json.dumps({"questions": QUESTION_LIST})))
+        await db.commit()
+
+
+async def old_start(ref, student):
+    """What start_assessment_session did before."""
+    async with AsyncSessionLocal() as db:
+        item = await db.get(Assignment, ref)
+        questions = json.loads(item.structured_content)["questions"]
+        random.shuffle(questions)
+        for q in questions:
+            opts = list(enumerate(q["options"]))
+            random.shuffle(opts)
+            orig_answer = int(q.get("answer", 0))
+            for new_idx, (old_idx, _) in enumerate(opts):
+                if old_idx == orig_answer:
+                    q["answer"] = new_idx
+            q["options"] = [text for _, text in opts]
+        session = AssessmentSession(id=str(uuid.uuid4()), student_id=student, reference_id=ref,
+                                    reference_type="ASSIGNMENT", start_time=datetime.utcnow())
+        db.add(session)
+        await db.flush()
+        freeze_questions(db, session, questions)
+        await db.commit()
+        return json.dumps({"questions": questions})
+
+
+async def new_start(ref, student):
+    """The new start_assessment_session, without the HTTP layer."""
+    async with AsyncSessionLocal() as db:
+        item = await db.get(Assignment, ref)
+        snapshot = await question_sets.for_item("ASSIGNMENT", item)
+        session_id = str(uuid.uuid4())
+        order = shuffled_order(snapshot.questions, session_id)
+        session = AssessmentSession(id=session_id, student_id=student, reference_id=ref,
+                                    reference_type="ASSIGNMENT", start_time=datetime.utcnow())
+        assign_questions(session, snapshot, order)
+        db.add(session)
+        await db.commit()
+        return json.dumps({"questions": apply_order(snapshot.questions, order)})
+
+
+async def burst(start, round_no):
+    """STUDENTS students start one assessment together; (loop CPU ms per start, bytes written per session)."""
+    ref = f"burst-{round_no}"
+    before = written["bytes"]
+    cpu = time.thread_time()
+    await asyncio.gather(*(start(ref, f"student-{i}") for i in range(STUDENTS)))
+    return (time.thread_time() - cpu) * 1000 / STUDENTS, (written["bytes"] - before) / STUDENTS
+
+
+async def one_by_one(start, round_no):
+    """Median latency of a start with nothing else running."""
+    latencies = []
+    for i in range(STUDENTS):
+        started = time.perf_counter()
+        await start(f"burst-{round_no}", f"student-{i}")
+        latencies.append((time.perf_counter() - started) * 1000)
+    return sorted(latencies)[len(latencies) // 2]
+
+
+async def set_content(ref, questions):
+    async with AsyncSessionLocal() as db:
+        item = await db.get(Assignment, ref)
+        item.structured_content = json.dumps({"questions": questions})
+        await db.commit()
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_writes)
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+
+        old = [run(burst, old_start, r) for r in range(ROUNDS)]
+        parses = question_sets.counters["parses"]
+        new = [run(burst, new_start, ROUNDS + r) for r in range(ROUNDS)]
+        parsed = question_sets.counters["parses"] - parses
+        # The same assessments again, one start at a time
+        old_alone = run(one_by_one, old_start, 0)
+        new_alone = run(one_by_one, new_start, ROUNDS)
+        print(f"{STUDENTS} students starting a {QUESTIONS}-question randomized assessment at once "
+              f"(best of {ROUNDS}):")
+        for label, r, alone in (("old (parse + copy)", old, old_alone), ("shared set + order", new, new_alone)):
+            print(f"  {label:<20} {min(c for c, _ in r):6.2f}ms loop CPU/start  "
+                  f"{sum(b for _, b in r) / len(r):>9,.0f} bytes written/session  p50 alone {alone:6.2f}ms")
+        check("one parse per assessment", parsed == ROUNDS, parsed)
+        check("less CPU per start", min(c for c, _ in new) * 1.5 < min(c for c, _ in old))
+        check("a start on its own is faster", new_alone < old_alone)
+        check("sessions write far less", sum(b for _, b in new) * 20 < sum(b for _, b in old))
+
+        # Through the API
+        views = {}
+        for i in range(3):
+            headers = token(f"student-{i}")
+            r = client.post("/api/training/assessments/ASSIGNMENT/exam/start", headers=headers).json()
+            views[i] = (r["session_id"], json.loads(r["responses"])["questions"])
+        by_text = {q["question"]: q for q in QUESTION_LIST}
+        check("every view has all questions, answers follow their options", all(
+            sorted(q["question"] for q in view) == sorted(by_text)
+            and all(q["options"][q["answer"]] == by_text[q["question"]]["options"][by_text[q["question"]]["answer"]]
+                    for q in view)
+            for _, view in views.values()))
+        check("students get different orders", len({tuple(q["question"] for q in v) for _, v in views.values()}) == 3)
+
+        sid, view = views[0]
+        headers = token("student-0")
+        resumed = client.post("/api/training/assessments/ASSIGNMENT/exam/start", headers=headers).json()
+        served = client.get(f"/api/training/assessments/{sid}/questions", headers=headers).json()["questions"]
+        check("resume and /questions return the same view",
+              json.loads(resumed["responses"])["questions"] == view
+              and [(q["question"], q["options"]) for q in served] == [(q["question"], q["options"]) for q in view])
+        r = client.post(f"/api/training/assessments/{sid}/submit", headers=headers,
+                        json={"answers": {str(i): str(q["answer"]) for i, q in enumerate(view)}}).json()
+        check("a perfect submit on the shuffled view scores 100", r["score"] == 100.0, r.get("score"))
+
+        r = client.post("/api/training/assessments/ASSIGNMENT/plain/start", headers=token("student-0")).json()
+        check("unshuffled assessments are sent as written", json.loads(r["responses"])["questions"] == QUESTION_LIST)
+
+        sid, view = views[1]
+        run(set_content, "exam", [{"question": "Edited", "options": ["a", "b"], "answer": 0}])
+        served = client.get(f"/api/training/assessments/{sid}/questions", headers=token("student-1")).json()
+        r = client.post("/api/training/assessments/ASSIGNMENT/exam/start", headers=token("student-3")).json()
+        check("an edit leaves started sessions on their questions",
+              [q["question"] for q in served["questions"]] == [q["question"] for q in view]
+              and [q["question"] for q in json.loads(r["responses"])["questions"]] == ["Edited"])
+        print(f"Question sets: {question_sets.stats()}")
+
+    print("Question sets OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
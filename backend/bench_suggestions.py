@@ -0,0 +1,144 @@
+"""
+Benchmark and checks for suggestion screenshots in the file store.
+
+Seeds SUGGESTIONS suggestions, every other one with a ~270 KB inline
+screenshot as the suggestion box used to store it, then compares the admin
+list and the database export before and after `migrate_screenshots` moves the
+images out. Checks that a new screenshot is stored on submit, that the list
+carries only references, that the image is fetched by its own endpoint (also
+for rows not moved yet), that the migration is idempotent and that invalid
+screenshots are refused.
+
+Usage (from backend/):
+    python bench_suggestions.py
+"""
+import base64
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import undefer  # noqa: E402
+
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.notification import Suggestion  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.screenshots import migrate_screenshots  # noqa: E402
+
+SUGGESTIONS = 200
+ROUNDS = 20
+
+
+def screenshot(i: int) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(b"\xff\xd8\xff" + os.urandom(200_000) + bytes([i % 256])).decode()
+
+
+def token(user_id, role):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": role})}
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="admin", email="a@bench.local", password="x", name="Admin", role=Role.ADMIN))
+        db.add(User(id="root", email="r@bench.local", password="x", name="Root", role=Role.SUPER_ADMIN))
+        db.add(User(id="student", email="s@bench.local", password="x", name="Student", role=Role.STUDENT))
+        for i in range(SUGGESTIONS):
+            db.add(Suggestion(id=f"s-{i:04d}", student_id="student", message=f"Suggestion {i}", category="General",
+                              screenshot_base64=screenshot(i) if i % 2 == 0 else None))
+        await db.commit()
+
+
+async def old_list():
+    """What get_suggestions read before: every column of every suggestion."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Suggestion).options(undefer(Suggestion.screenshot_base64))
+                                  .order_by(Suggestion.created_at.desc()))
+        return len(result.scalars().all())
+
+
+async def inline_count():
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).where(Suggestion.screenshot_base64.isnot(None)))
+
+
+def timed(fn):
+    latencies = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return sorted(latencies)[len(latencies) // 2]
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        admin = token("admin", "ADMIN")
+        export = lambda: client.get("/api/admin/db-export", headers=token("root", "SUPER_ADMIN"))  # noqa: E731
+
+        before = timed(lambda: run(old_list))
+        export_before = len(export().content)
+        unmoved = client.get("/api/admin/suggestions/s-0000/screenshot", headers=admin).json()
+        check("rows not moved yet are served inline", unmoved["url"].startswith("data:image/jpeg;base64,"))
+
+        started = time.perf_counter()
+        moved = run(migrate_screenshots)
+        took = time.perf_counter() - started
+        check("migration moves every inline screenshot", moved == SUGGESTIONS // 2 and run(inline_count) == 0, moved)
+        check("migration is idempotent", run(migrate_screenshots) == 0)
+
+        listed = lambda: client.get("/api/admin/suggestions", headers=admin)  # noqa: E731
+        after = timed(listed)
+        r = listed()
+        export_after = len(export().content)
+        print(f"{SUGGESTIONS} suggestions, {SUGGESTIONS // 2} with a screenshot (moved in {took:.2f}s):")
+        print(f"  list   old SELECT * p50 {before:7.2f}ms  ->  endpoint p50 {after:7.2f}ms, {len(r.content):,} bytes")
+        print(f"  export {export_before:,} bytes  ->  {export_after:,} bytes")
+        check("list is faster", after < before, (before, after))
+        check("list carries references only", len(r.content) < 500 * SUGGESTIONS
+              and sum(s["has_screenshot"] for s in r.json()) == SUGGESTIONS // 2)
+        check("export no longer carries the images", export_after * 20 < export_before, (export_before, export_after))
+
+        shot = client.get("/api/admin/suggestions/s-0000/screenshot", headers=admin).json()
+        image = client.get(shot["url"])
+        check("image fetched from its own endpoint", shot["url"] == "/uploads/lms/suggestions/" + shot["url"].rsplit("/", 1)[1]
+              and image.content == base64.b64decode(unmoved["url"].split(",", 1)[1]), shot)
+        check("no screenshot is a 404",
+              client.get("/api/admin/suggestions/s-0001/screenshot", headers=admin).status_code == 404)
+
+        student = token("student", "STUDENT")
+        r = client.post("/api/auth/suggestions", headers=student,
+                        json={"message": "New one", "screenshot_base64": screenshot(7)})
+        new = next(s for s in listed().json() if s["message"] == "New one")
+        check("a new screenshot is stored on submit", r.status_code == 201 and new["has_screenshot"]
+              and run(inline_count) == 0, r.text)
+        r = client.post("/api/auth/suggestions", headers=student,
+                        json={"message": "Bad", "screenshot_base64": "data:text/html;base64,PGI+"})
+        check("non-image screenshots are refused", r.status_code == 400, r.status_code)
+        r = client.post("/api/auth/suggestions", headers=student,
+                        json={"message": "Bad", "screenshot_base64": "data:image/png;base64,***"})
+        check("undecodable screenshots are refused", r.status_code == 400, r.status_code)
+
+    print("Suggestion screenshots OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
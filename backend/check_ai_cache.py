@@ -0,0 +1,169 @@
+"""
+Checks the AI result cache in front of Groq.
+
+Against a throwaway SQLite DB, with groq_client.chat replaced by a stub that
+counts calls and takes STUB_DELAY seconds:
+  - repeated identical gradings / generations reach Groq once, served from the
+    worker's memory and, after a restart (memory cleared), from the table;
+  - any change to the prompt is a miss; bypass / no_cache forces a new call and
+    replaces the cached entry; failed calls are not cached;
+  - expired entries are misses and the table is trimmed to max_entries (LRU);
+  - GET /api/admin/ai-cache reports the counters.
+
+Usage (from backend/):
+    python check_ai_cache.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+os.environ.setdefault("GROQ_API_KEY", "stub-key")
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select, update, func  # noqa: E402
+
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.ai_cache import AIResultCache  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils import ai_grader  # noqa: E402
+from app.utils.ai_cache import ai_cache  # noqa: E402
+from app.utils.groq_client import groq_client  # noqa: E402
+
+ADMIN_ID = "check-super-admin"
+STUB_DELAY = 0.3
+
+stub = {"calls": 0, "status": 200, "n": 0}
+
+
+async def stub_chat(payload, timeout=None):
+    stub["calls"] += 1
+    stub["n"] += 1
+    await asyncio.sleep(STUB_DELAY)
+    if payload.get("response_format"):
+        content = json.dumps({"score": 80, "feedback": f"Reply {stub['n']}", "title": f"Task {stub['n']}",
+                              "questions": []})
+    else:
+        content = f"# Assignment {stub['n']}"
+    body = {"choices": [{"message": {"content": content}}]} if stub["status"] == 200 else {"error": "x"}
+    return httpx.Response(stub["status"], json=body)
+
+groq_client.chat = stub_chat
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=ADMIN_ID, email="sa@check.local", password="x", name="Super", role=Role.SUPER_ADMIN))
+        await db.commit()
+
+
+async def table_count():
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(AIResultCache))).scalar()
+
+
+async def expire_all():
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(AIResultCache).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}")
+
+    admin = {"Authorization": "Bearer " + create_access_token({"sub": ADMIN_ID, "role": "SUPER_ADMIN"})}
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+
+        def timed(fn, *args, **kwargs):
+            started = time.perf_counter()
+            result = run(lambda: fn(*args, **kwargs))
+            return result, (time.perf_counter() - started) * 1000
+
+        grade = ai_grader.evaluate_submission
+        first, cold_ms = timed(grade, "Reverse a string", "print('abc'[::-1])")
+        again, warm_ms = timed(grade, "Reverse a string", "print('abc'[::-1])")
+        print(f"evaluate_submission: {cold_ms:.0f}ms uncached, {warm_ms:.1f}ms cached")
+        check("identical grading reaches Groq once", stub["calls"] == 1 and again == first)
+
+        ai_cache.forget()  # as after a worker restart
+        again, db_ms = timed(grade, "Reverse a string", "print('abc'[::-1])")
+        check(f"served from the table after a restart ({db_ms:.1f}ms)", stub["calls"] == 1 and again == first)
+
+        run(lambda: grade("Reverse a string", "print('abd'[::-1])"))
+        check("different code is a miss", stub["calls"] == 2)
+        fresh = run(lambda: grade("Reverse a string", "print('abc'[::-1])", bypass_cache=True))
+        check("bypass calls Groq again", stub["calls"] == 3 and fresh != first)
+        ai_cache.forget()
+        check("bypass replaces the cached entry",
+              run(lambda: grade("Reverse a string", "print('abc'[::-1])")) == fresh and stub["calls"] == 3)
+
+        stub["status"] = 500
+        run(lambda: grade("Sort a list", "sorted(x)"))
+        stub["status"] = 200
+        run(lambda: grade("Sort a list", "sorted(x)"))
+        check("failed calls are not cached", stub["calls"] == 5)
+
+        # Routes
+        calls = stub["calls"]
+        task_body = {"topic": "Python lists", "task_type": "CODING", "difficulty": "Beginner", "question_count": 2}
+        t1 = client.post("/api/training/generate-task", json=task_body, headers=admin).json()
+        t2 = client.post("/api/training/generate-task", json=task_body, headers=admin).json()
+        check("/generate-task reuses the cached task", t1 == t2 and stub["calls"] == calls + 1)
+        t3 = client.post("/api/training/generate-task", json={**task_body, "no_cache": True}, headers=admin).json()
+        check("/generate-task no_cache generates again", t3 != t1 and stub["calls"] == calls + 2)
+        client.post("/api/training/generate-task", json={**task_body, "difficulty": "Advanced"}, headers=admin)
+        check("other parameters are a different key", stub["calls"] == calls + 3)
+
+        a1 = client.post("/api/training/assignments/ai-generate", data={"topic": "REST APIs"}, headers=admin).json()
+        a2 = client.post("/api/training/assignments/ai-generate", data={"topic": "REST APIs"}, headers=admin).json()
+        a3 = client.post("/api/training/assignments/ai-generate", data={"topic": "REST APIs", "no_cache": "true"},
+                         headers=admin).json()
+        check("/assignments/ai-generate is cached and bypassable",
+              a1 == a2 and a3 != a1 and stub["calls"] == calls + 5)
+
+        # Expiry and size cap
+        run(expire_all)
+        ai_cache.forget()
+        calls = stub["calls"]
+        run(lambda: grade("Reverse a string", "print('abc'[::-1])"))
+        check("expired entries are misses", stub["calls"] == calls + 1)
+
+        ai_cache.max_entries = 5
+        for i in range(8):
+            run(lambda: grade("Cap check", f"print({i})"))
+        ai_cache.forget()
+        calls = stub["calls"]
+        run(lambda: grade("Cap check", "print(7)"))
+        newest_cached = stub["calls"] == calls
+        run(lambda: grade("Cap check", "print(0)"))
+        check("table is trimmed to max_entries, least recently used first",
+              run(table_count) == 5 and newest_cached and stub["calls"] == calls + 1)
+
+        stats = client.get("/api/admin/ai-cache", headers=admin).json()
+        print(json.dumps(stats))
+        check("stats report hits and misses", stats["memory_hits"] > 0 and stats["db_hits"] > 0
+              and stats["misses"] > 0 and stats["bypassed"] == 3 and stats["stored_entries"] == 5)
+        client.delete("/api/admin/ai-cache", headers=admin)
+        check("clear empties the cache", run(table_count) == 0 and not ai_cache._memory)
+
+    print("AI cache OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Checks for the server-side assessment timer.
+
+Seeds open sessions straight into the DB (as a restart would find them) and
+checks that:
+  - the timer rebuilds its deadlines from the open rows;
+  - sessions past their time limit are auto-submitted and scored on their
+    stored answers, in batches, exactly once, even with two workers' timers
+    racing, and the student's late submit finds them completed;
+  - a batch whose commit fails is retried for every session in it;
+  - a session is closed within a second of its deadline;
+  - an abandoned session is cancelled, one still in use is pushed back;
+  - the heartbeat auto-submit scores what was saved, and /questions works on a
+    timed session.
+
+Usage (from backend/):
+    python check_assessment_timer.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select, func  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+import app.utils.assessment_timer as timer_module  # noqa: E402
+
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.project import Assignment, AssignmentSubmission, AssessmentSession  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.assessment_store import freeze_questions, save_answers  # noqa: E402
+from app.utils.assessment_timer import AssessmentTimer, assessment_timer  # noqa: E402
+from app.utils.heartbeats import INACTIVITY_SECONDS  # noqa: E402
+
+EXPIRED = 120  # more than two batches
+QUESTIONS = [{"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": i % 4} for i in range(10)]
+GRACE = assessment_timer.grace_seconds
+
+
+def token(user_id):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": "STUDENT"})}
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        for i in range(EXPIRED + 10):
+            db.add(User(id=f"student-{i}", email=f"s{i}@check.local", password="x", name=f"Student {i}",
+                        role=Role.STUDENT))
+        for ref, limit in (("timed", 1), ("timed-b", 1), ("untimed", 0), ("long", 60)):
+            db.add(Assignment(id=ref, title=ref, time_limit=limit, is_randomized=False,
+                              structured_content=json.dumps({"questions": QUESTIONS})))
+        await db.commit()
+
+
+async def open_session(sid, student, ref, started, correct=0, last_heartbeat=None):
+    """An open session with `correct` right answers saved, as left by heartbeats."""
+    async with AsyncSessionLocal() as db:
+        session = AssessmentSession(id=sid, student_id=student, reference_id=ref, reference_type="ASSIGNMENT",
+                                    start_time=started, last_heartbeat=last_heartbeat)
+        db.add(session)
+        await db.flush()
+        freeze_questions(db, session, QUESTIONS)
+        await save_answers(db, session, {str(i): str(i % 4 if i < correct else (i + 1) % 4)
+                                         for i in range(len(QUESTIONS))})
+        session.updated_at = last_heartbeat or started
+        await db.commit()
+
+
+async def read(sid):
+    async with AsyncSessionLocal() as db:
+        return await db.get(AssessmentSession, sid)
+
+
+async def submissions(ref):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(AssignmentSubmission)
+                                 .where(AssignmentSubmission.assignment_id == ref))).scalar()
+
+
+class LostConnection(AsyncSession):
+    """A session whose commit fails, as when the database drops the connection."""
+
+    async def commit(self):
+        await self.rollback()
+        raise ConnectionError("connection lost")
+
+
+def wait_for(condition, seconds=10.0):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    batches = []
+    close_batch = assessment_timer._close_batch
+
+    async def counting_close_batch(batch, now):
+        batches.append(len(batch))
+        return await close_batch(batch, now)
+    assessment_timer._close_batch = counting_close_batch
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        expired_at = datetime.utcnow() - timedelta(minutes=1, seconds=GRACE + 5)
+
+        # Restart with open sessions: expired ones, an abandoned one, one in use
+        for i in range(EXPIRED):
+            run(lambda: open_session(f"exp-{i}", f"student-{i}", "timed", expired_at, correct=i % 11))
+        gone = datetime.utcnow() - timedelta(seconds=INACTIVITY_SECONDS + 60)
+        run(lambda: open_session("abandoned", "student-120", "untimed", gone, last_heartbeat=gone))
+        almost = datetime.utcnow() - timedelta(seconds=INACTIVITY_SECONDS - 2)
+        run(lambda: open_session("active", "student-121", "untimed", almost, last_heartbeat=almost))
+        run(lambda: open_session("long", "student-122", "long", datetime.utcnow()))
+
+        tracked = run(assessment_timer.rebuild)
+        check("deadlines rebuilt from the open sessions", tracked == EXPIRED + 3, tracked)
+        client.post("/api/training/assessments/active/heartbeat", headers=token("student-121"),
+                    json={"answers": {"0": "0"}})  # the student is still there
+        check("expired sessions auto-submitted", wait_for(lambda: assessment_timer.counters["submitted"] >= EXPIRED),
+              assessment_timer.stats())
+        check("in batches", len(batches) >= 3 and max(batches) <= 50, batches)
+        sessions = [run(read, f"exp-{i}") for i in range(EXPIRED)]
+        check("scored on the stored answers",
+              all(s.is_completed and s.auto_submitted and s.score == float((i % 11) * 10)
+                  for i, s in enumerate(sessions)), [(s.id, s.score) for s in sessions[:12]])
+        check("one submission each", run(submissions, "timed") == EXPIRED, run(submissions, "timed"))
+        r = client.post("/api/training/assessments/exp-7/submit", headers=token("student-7"),
+                        json={"answers": {str(i): str(i % 4) for i in range(len(QUESTIONS))}}).json()
+        check("a late submit finds it completed", r == {"status": "already_completed", "score": 70.0}, r)
+
+        abandoned = run(read, "abandoned")
+        check("an abandoned session is cancelled, not scored", abandoned.is_completed and abandoned.auto_submitted
+              and not abandoned.score and run(submissions, "untimed") == 0)
+
+        check("a session in use is pushed back",
+              wait_for(lambda: assessment_timer.counters["extended"] >= 1) and not run(read, "active").is_completed
+              and assessment_timer._deadlines["active"].due > datetime.utcnow() + timedelta(minutes=9),
+              assessment_timer.stats())
+
+        questions = client.get("/api/training/assessments/long/questions", headers=token("student-122")).json()
+        check("questions of a timed session", len(questions["questions"]) == len(QUESTIONS)
+              and 3590 <= questions["remaining_seconds"] <= 3600, questions)
+
+        # Closed on time: due two seconds from now
+        due_in = datetime.utcnow() - timedelta(minutes=1, seconds=GRACE - 2)
+        run(lambda: open_session("on-time", "student-123", "timed-b", due_in, correct=5))
+        run(lambda: assessment_timer.track("on-time", due_in, 1))
+        due = due_in + timedelta(minutes=1, seconds=GRACE)
+        closed = wait_for(lambda: run(read, "on-time").is_completed, 6)
+        end = run(read, "on-time").end_time
+        check("closed within a second of its deadline", closed and timedelta(0) <= end - due < timedelta(seconds=1),
+              end and (end - due).total_seconds())
+
+        # Two workers' timers on the same expired sessions
+        for i in range(10):
+            run(lambda: open_session(f"race-{i}", f"student-{i}", "timed-b", expired_at, correct=3))
+        other = AssessmentTimer(GRACE)
+
+        async def race():
+            assessment_timer._scheduler = None  # run both by hand
+            await asyncio.gather(assessment_timer.rebuild(), other.rebuild())
+            return await asyncio.gather(assessment_timer.run_due(), other.run_due())
+        closed = run(race)
+        check("two timers submit each session once", sum(closed) == 10 and run(submissions, "timed-b") == 11,
+              (closed, run(submissions, "timed-b")))
+
+        # The batch's commit fails: nothing is closed, and the retry closes every session
+        for i in range(3):
+            run(lambda: open_session(f"retry-{i}", f"student-{i}", "timed-b", expired_at, correct=2))
+        retried = [f"retry-{i}" for i in range(3)]
+        run(assessment_timer.rebuild)
+        timer_module.AsyncSessionLocal = async_sessionmaker(engine, class_=LostConnection, expire_on_commit=False)
+        timer_module.RETRY_SECONDS = 0
+        try:
+            failed = run(assessment_timer.run_due)
+        finally:
+            timer_module.AsyncSessionLocal = AsyncSessionLocal
+        still_open = not any(run(read, sid).is_completed for sid in retried)
+        closed = run(assessment_timer.run_due)
+        timer_module.RETRY_SECONDS = 30
+        check("a failed batch is retried for every session", failed == 0 and still_open and closed == 3
+              and assessment_timer.counters["failed_batches"] >= 1 and all(run(read, sid).is_completed for sid in retried),
+              (failed, still_open, closed, assessment_timer.stats()))
+
+        # Heartbeat after the time limit scores what was saved
+        run(lambda: open_session("late-beat", "student-124", "timed-b", expired_at, correct=4))
+        r = client.post("/api/training/assessments/late-beat/heartbeat", headers=token("student-124"),
+                        json={"answers": {"9": "1"}}).json()
+        session = run(read, "late-beat")
+        check("heartbeat auto-submit is scored", r == {"status": "auto_submitted", "reason": "time_expired"}
+              and session.score == 50.0 and session.auto_submitted, (r, session.score))
+        print(f"Timer: {assessment_timer.stats()}")
+
+    print("Assessment timer OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
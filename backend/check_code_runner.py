@@ -0,0 +1,241 @@
+"""
+Checks the local code runner behind /api/training/run-code.
+
+Runs programs through the runner directly and checks:
+  - stdin/stdout, exit codes and tracebacks that point at the student's lines;
+  - CPU/wall timeout, memory limit, output cap and an empty environment;
+  - the sandbox: programs run as SANDBOX_UID, cannot read the app or its
+    .env, have no network (not even to the host's loopback), get a private
+    /tmp and /work, cannot signal processes outside their run, and a fork bomb
+    is held to CODE_RUNNER_MAX_PROCS and dies with the program;
+  - runs start from the warm pool, and the sandbox needs no privileges: a
+    worker that is not root and holds no capability runs code too;
+  - the runner disables itself when the sandbox cannot be set up, and the
+    default configuration runs code locally first;
+  - languages that are not installed fall through to the next backend, and
+    the endpoint answers 502 once every backend failed.
+
+Needs unprivileged user namespaces and util-linux (unshare), like the local
+runner itself.
+
+Usage (from backend/):
+    python check_code_runner.py
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import app.utils.code_runner as code_runner  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.utils.code_runner import (APP_DIR, SANDBOX_UID, CodeExecutor, LocalRunner, RunnerUnavailable,  # noqa: E402
+                                   _sandbox_problem)
+
+TIMEOUT = 2
+# A run in a worker that is not root and holds no capability, as the app user would
+UNPRIVILEGED = """\
+import asyncio
+from app.utils.code_runner import LocalRunner
+
+async def main():
+    runner = LocalRunner(0, 4, 2, 256, 64, 1)
+    print((await runner.run("python", "import os; print(os.getuid())"))["stdout"], end="")
+    await runner.close()
+
+asyncio.run(main())
+"""
+
+
+class FakeRemote:
+    name = "fake-remote"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    async def run(self, language, code, stdin="", version="*"):
+        self.calls += 1
+        if self.fail:
+            raise RunnerUnavailable("fake remote down")
+        return {"stdout": "remote\n", "stderr": "", "code": 0, "signal": None, "language": language, "version": "x"}
+
+    async def close(self):
+        pass
+
+
+async def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    def descendants(pid: int) -> int:
+        children = {}
+        for entry in filter(str.isdigit, os.listdir("/proc")):
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        count, todo = 0, [pid]
+        while todo:
+            found = children.get(todo.pop(), [])
+            count += len(found)
+            todo.extend(found)
+        return count
+
+    async def sandbox_processes(settle: float = 2.0) -> int:
+        """Processes in the sandbox besides the fork server and its idle pool, once a killed run had time to unwind."""
+        idle = 1 + 2 * runner.pool_size * len(runner.languages)  # each member is pid 1 and the process outside it
+        deadline = time.monotonic() + settle
+        while True:
+            left = descendants(runner._server._proc.pid) - idle
+            if left <= 0 or time.monotonic() > deadline:
+                return left
+            await asyncio.sleep(0.05)
+
+    check("the default configuration runs code locally first",
+          settings.CODE_RUNNER_BACKENDS.split(",")[0].strip() == "local")
+
+    runner = LocalRunner(0, 16, TIMEOUT, 256, settings.CODE_RUNNER_MAX_PROCS, settings.CODE_RUNNER_POOL_SIZE)
+    await runner.warm_up()
+    if not runner.languages:
+        check("sandbox available on this host", False, _sandbox_problem())
+        return 1
+    run = runner.run
+
+    started = time.monotonic()
+    for _ in range(20):
+        await run("python", "print(1)")
+    elapsed = (time.monotonic() - started) / 20
+    check("runs start from the warm pool", elapsed < 0.2, f"{elapsed * 1000:.0f}ms per run")
+
+    # uid 1000 in a user namespace: no capability on the host nor in there
+    out = subprocess.run(["unshare", "--user", "--map-user=1000", "--map-group=1000", "--",
+                          sys.executable, "-W", "ignore", "-c", UNPRIVILEGED],
+                         capture_output=True, text=True, cwd=APP_DIR, timeout=60)
+    check("a worker without root or capabilities runs code", out.stdout == f"{SANDBOX_UID}\n", out.stderr[-500:])
+
+    r = await run("python", "name = input()\nprint(f'hi {name}')\nimport sys; sys.exit(3)", "ada\n")
+    check("stdin, stdout and exit code", r["stdout"] == "hi ada\n" and r["code"] == 3, r)
+
+    r = await run("python", "x = 1\ny = x / 0\n")
+    check("traceback points at main.py", 'File "main.py", line 2' in r["stderr"] and "<string>" not in r["stderr"]
+          and r["code"] == 1, r["stderr"])
+
+    started = time.monotonic()
+    r = await run("python", "while True:\n    pass\n")
+    check("busy loop is stopped at the time limit",
+          "timed out" in r["stderr"] and time.monotonic() - started < TIMEOUT + 2, r)
+    r = await run("python", "import time\ntime.sleep(60)\n")
+    check("sleeping program is stopped at the time limit", "timed out" in r["stderr"], r)
+
+    r = await run("python", "data = bytearray(2 * 1024 ** 3)\n")
+    check("memory limit", "MemoryError" in r["stderr"], r)
+
+    r = await run("python", "while True:\n    print('x' * 1000)\n")
+    check("output is capped", len(r["stdout"]) < 70 * 1024 and "truncated" in r["stdout"], len(r["stdout"]))
+
+    r = await run("python", "import os\nprint(sorted(os.environ))\nprint(os.getcwd(), os.getuid(), os.getgid())\n")
+    check("empty environment, scratch directory and sandbox uid",
+          r["stdout"] == f"['HOME', 'LANG', 'PATH']\n/work {SANDBOX_UID} {SANDBOX_UID}\n", r["stdout"])
+
+    secrets = [os.path.join(APP_DIR, "app", "config.py"), os.path.join(APP_DIR, ".env"), "/etc/shadow"]
+    r = await run("python", "import os\n"
+                            f"for path in {secrets!r}:\n"
+                            "    try:\n"
+                            "        open(path).read()\n"
+                            "        print('read', path)\n"
+                            "    except OSError as e:\n"
+                            "        print(type(e).__name__)\n"
+                            "print(sorted(os.listdir('/')))\n")
+    check("the app, its .env and host secrets are out of reach", "read" not in r["stdout"]
+          and "package" not in r["stdout"] and "home" not in r["stdout"].split("\n")[-2], r)
+
+    listener = socket.create_server(("127.0.0.1", 0))
+    port = listener.getsockname()[1]
+    r = await run("python", "import socket\n"
+                            f"for address in [('127.0.0.1', {port}), ('1.1.1.1', 80)]:\n"
+                            "    try:\n"
+                            "        socket.create_connection(address, 1)\n"
+                            "        print('connected', address)\n"
+                            "    except OSError as e:\n"
+                            "        print(type(e).__name__)\n")
+    listener.close()
+    check("no network, not even the host's loopback", "connected" not in r["stdout"] and r["code"] == 0, r)
+
+    with open("/tmp/host-visible", "w") as f:
+        f.write("x")
+    r = await run("python", "import os\nprint(os.listdir('/tmp'))\nopen('/tmp/left-behind', 'w').write('x')\n"
+                            "open('/work/note', 'w').write('x')\n")
+    later = await run("python", "import os\nprint(os.listdir('/tmp'), os.listdir('/work'))")
+    os.remove("/tmp/host-visible")
+    check("private /tmp and /work per run", r["stdout"] == "[]\n" and later["stdout"] == "[] ['main.py']\n"
+          and not os.path.exists("/tmp/left-behind"), (r, later))
+
+    host = subprocess.Popen(["sleep", "30"])
+    r = await run("python", "import os, signal\n"
+                            f"for pid in ({host.pid}, {os.getpid()}, -1):\n"
+                            "    try:\n"
+                            "        os.kill(pid, signal.SIGKILL)\n"
+                            "    except OSError as e:\n"
+                            "        print(type(e).__name__)\n")
+    check("cannot signal processes outside the run", host.poll() is None, r)
+    host.kill()
+    host.wait()
+
+    started = time.monotonic()
+    r = await run("python", "import os\nforks = 0\nwhile True:\n    try:\n        os.fork()\n        forks += 1\n"
+                            "    except OSError:\n        print('refused after', forks, flush=True)\n        break\n"
+                            "import time\ntime.sleep(60)\n")
+    check("a fork bomb is held to CODE_RUNNER_MAX_PROCS", "refused after" in r["stdout"]
+          and time.monotonic() - started < TIMEOUT + 3, r["stdout"][:200])
+    left = await sandbox_processes()
+    check("every process of the run dies with it", left == 0, left)
+    r = await run("python", "print(6 * 7)")
+    check("the runner keeps working afterwards", r["stdout"] == "42\n", r)
+
+    await run("python", "import subprocess\nsubprocess.Popen(['sleep', '30'], start_new_session=True)\n"
+                        "import time\ntime.sleep(60)\n")
+    check("child processes are killed with the program, even in their own session", await sandbox_processes() == 0)
+
+    if "c" in runner.languages:
+        r = await run("c", "#include <stdio.h>\nint main(){int a;scanf(\"%d\",&a);printf(\"%d\\n\",a*2);return 0;}", "21")
+        check("compiled languages run", r["stdout"] == "42\n", r)
+        r = await run("c", "int main(){return 0")
+        check("compile errors are reported", r["code"] != 0 and "error" in r["stderr"], r)
+
+    remote = FakeRemote()
+    executor = CodeExecutor([runner, remote])
+    r = await executor.run("cobol", "DISPLAY 'HI'.")
+    check("languages not installed fall through to the next backend", r["stdout"] == "remote\n" and remote.calls == 1)
+    r = await executor.run("python", "print('local')")
+    check("installed languages stay local", r["stdout"] == "local\n" and remote.calls == 1)
+    try:
+        await CodeExecutor([runner, FakeRemote(fail=True)]).run("cobol", "x")
+        check("all backends failing raises RunnerUnavailable", False)
+    except RunnerUnavailable as e:
+        check("all backends failing raises RunnerUnavailable", "fake remote down" in str(e))
+
+    probe = code_runner._sandbox_problem
+    code_runner._sandbox_problem = lambda: "no user namespaces"
+    disabled = LocalRunner(0, 16, TIMEOUT, 256, 64, 1)
+    remote = FakeRemote()
+    r = await CodeExecutor([disabled, remote]).run("python", "print('x')")
+    code_runner._sandbox_problem = probe
+    check("without a sandbox every run goes to the next backend", not disabled.languages
+          and r["stdout"] == "remote\n" and remote.calls == 1)
+
+    await runner.close()
+    print("Code runner OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
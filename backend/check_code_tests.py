@@ -0,0 +1,330 @@
+"""
+Checks test-case grading of coding assessments.
+
+Against a throwaway SQLite DB, with the AI grader replaced by a stub that
+counts calls:
+  - run_batch compiles once and runs every input, and reports a compile error
+    for every input;
+  - run_cases memoises on (code, test suite): identical code is not run again,
+    a changed suite is;
+  - a submission whose questions all have test_cases is scored on them (the AI
+    score does not count), a question without tests is scored by the AI, and
+    the AI is skipped with ASSESSMENT_AI_FEEDBACK off;
+  - hidden cases only report pass/fail;
+  - only isolated backends run test cases;
+  - a remote run that timed out is not memoised;
+  - test results and the AI result are committed together: while the AI call
+    fails nothing of the grading is written, and the retry writes both; when
+    test cases decide the whole score, an AI failure only loses the feedback;
+  - a batch of BATCH students is graded through the queue and timed, on the
+    local runner and on a stand-in Piston (REMOTE_LATENCY per request) that
+    must get one request per program, not one per test case.
+
+Usage (from backend/):
+    python check_code_tests.py
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+os.environ["CODE_RUNNER_BACKENDS"] = "local"  # the sandboxed local runner only
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.job import BackgroundJob  # noqa: E402
+from app.models.project import AssessmentSession, Task  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils import ai_grader, job_queue  # noqa: E402
+from app.utils.code_runner import GodboltBackend, PistonBackend, RunnerUnavailable, code_executor  # noqa: E402
+from app.utils.code_tests import question_cases, run_cases  # noqa: E402
+
+STUDENT_ID = "check-student"
+BATCH = 60
+# Round trip added to every request the stand-in Piston gets
+REMOTE_LATENCY = 0.3
+
+job_queue.POLL_INTERVAL_SECONDS = 0.2
+job_queue.RETRY_DELAYS_SECONDS = (0.5, 0.5)
+
+SUM_CASES = [{"input": "1 2\n", "output": "3"}, {"input": "10 -4\n", "output": "6\n"},
+             {"input": "0 0\n", "output": "0"}, {"input": "1000000 1\n", "output": "1000001", "hidden": True}]
+MAX_CASES = [{"input": "3\n1 9 4\n", "output": "9"}, {"input": "1\n-5\n", "output": "-5"},
+             {"input": "4\n2 2 2 2\n", "output": "2"}]
+QUESTIONS = [
+    {"question": "Print the sum of two integers", "test_cases": SUM_CASES},
+    {"question": "Print the largest of n integers", "test_cases": MAX_CASES},
+]
+GOOD = ["a, b = map(int, input().split())\nprint(a + b)\n",
+        "input()\nprint(max(map(int, input().split())))\n"]
+# Fails the negative case and the hidden case
+BAD_SUM = "a, b = map(int, input().split())\nprint(a + abs(b) if a < 1000 else 0)\n"
+
+stub = {"calls": 0, "fail": False}
+
+
+class UnsandboxedRunner:
+    """A backend that does not declare itself isolated."""
+    name = "unsandboxed"
+
+    async def run_batch(self, language, code, inputs):
+        raise AssertionError("test cases ran on a backend that is not isolated")
+
+
+class FakePiston:
+    """Piston's /execute, answered by running the program in a local interpreter."""
+
+    def __init__(self):
+        self.requests = 0
+
+    def _execute(self, body):
+        with tempfile.TemporaryDirectory() as work:
+            with open(os.path.join(work, "main.py"), "w") as f:
+                f.write(body["files"][0]["content"])
+            proc = subprocess.run([sys.executable, "main.py"], cwd=work, input=body["stdin"],
+                                  capture_output=True, text=True, timeout=30)
+        return {"language": "python", "version": "3.x",
+                "run": {"stdout": proc.stdout, "stderr": proc.stderr, "code": proc.returncode, "signal": None}}
+
+    async def __call__(self, request):
+        self.requests += 1
+        await asyncio.sleep(REMOTE_LATENCY)
+        result = await asyncio.to_thread(self._execute, json.loads(request.content))
+        return httpx.Response(200, json=result)
+
+
+def timing_out_godbolt():
+    backend, requests = GodboltBackend(), []
+
+    def handler(request):
+        requests.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    backend._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    backend._loop = asyncio.get_running_loop()
+    return backend, requests
+
+
+def fake_piston():
+    backend, server = PistonBackend(), FakePiston()
+    backend._client = httpx.AsyncClient(transport=httpx.MockTransport(server))
+    backend._loop = asyncio.get_running_loop()
+    return backend, server
+
+
+async def stub_evaluate(task_context, code, **_kwargs):
+    stub["calls"] += 1
+    if stub["fail"]:
+        raise ai_grader.AIGradingError("Groq unavailable")
+    return {"score": 40, "feedback": "Stub feedback."}
+
+ai_grader.evaluate_submission = stub_evaluate
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=STUDENT_ID, email="st@check.local", password="x", name="Student", role=Role.STUDENT))
+        db.add(Task(id="tested", title="Warm-up", structured_content=json.dumps({"questions": QUESTIONS})))
+        db.add(Task(id="mixed", title="Warm-up", structured_content=json.dumps(
+            {"questions": [QUESTIONS[0], {"question": "Explain your approach in code comments"}]})))
+        await db.commit()
+
+
+async def new_session(session_id, task_id):
+    async with AsyncSessionLocal() as db:
+        content = json.loads((await db.get(Task, task_id)).structured_content)
+        db.add(AssessmentSession(id=session_id, student_id=STUDENT_ID, reference_id=task_id, reference_type="TASK",
+                                 start_time=datetime.utcnow(), responses=json.dumps(content)))
+        await db.commit()
+
+
+async def job_attempts(session_id):
+    async with AsyncSessionLocal() as db:
+        job = (await db.execute(BackgroundJob.__table__.select().where(BackgroundJob.ref_id == session_id))).first()
+        return job.attempts if job else 0
+
+
+async def load(session_id):
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        return session.score, json.loads(session.responses)
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    student = {"Authorization": "Bearer " + create_access_token({"sub": STUDENT_ID, "role": "STUDENT"})}
+    local = code_executor.backend("local")
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+
+        # Runner
+        runs = run(lambda: local.run_batch("python", GOOD[0], [c["input"] for c in SUM_CASES]))
+        check("run_batch runs every input", [r["stdout"] for r in runs] == ["3\n", "6\n", "0\n", "1000001\n"], runs)
+        if "c" in local.languages:
+            src = '#include <stdio.h>\nint main(){int a,b;scanf("%d %d",&a,&b);printf("%d\\n",a+b);return 0;}'
+            before = local.counters["runs"]
+            runs = run(lambda: local.run_batch("c", src, ["1 2", "3 4"]))
+            check("compiled once, run per input",
+                  [r["stdout"] for r in runs] == ["3\n", "7\n"] and local.counters["runs"] == before + 2, runs)
+            runs = run(lambda: local.run_batch("c", "int main(){", ["1", "2"]))
+            check("compile error reported for every input", all(r["code"] != 0 and "error" in r["stderr"]
+                                                                for r in runs))
+
+        # Memo
+        cases = question_cases(QUESTIONS[0])
+        batches = local.counters["batches"]
+        first = run(lambda: run_cases("python", BAD_SUM, cases))
+        again = run(lambda: run_cases("python", BAD_SUM, cases))
+        check("identical code and suite run once", again == first and local.counters["batches"] == batches + 1)
+        run(lambda: run_cases("python", BAD_SUM, cases[:3]))
+        check("a changed suite runs again", local.counters["batches"] == batches + 2)
+        check("failing cases are reported", first["passed"] == 2 and first["total"] == 4
+              and first["cases"][1]["actual"] == "14\n", first)
+        check("hidden cases only report pass/fail", set(first["cases"][3]) == {"passed", "hidden"})
+
+        backends = code_executor.backends
+        code_executor.backends = [UnsandboxedRunner()]
+        try:
+            run(lambda: run_cases("python", GOOD[0] + "# new\n", cases))
+            check("backends that are not isolated never run test cases", False)
+        except RunnerUnavailable as e:
+            check("backends that are not isolated never run test cases", "not isolated" in str(e), e)
+        finally:
+            code_executor.backends = backends
+
+        godbolt, requests = run(timing_out_godbolt)
+        code_executor.backends = [godbolt]
+        try:
+            timed_out = [run(lambda: run_cases("python", GOOD[0] + "# slow\n", cases[:1])) for _ in range(2)]
+        finally:
+            code_executor.backends = backends
+        check("a remote timeout is not memoised", len(requests) == 2 and not timed_out[1]["passed"]
+              and "timed out" in timed_out[1]["cases"][0]["error"], (len(requests), timed_out[1]))
+
+        def submit(session_id, task_id, answers):
+            run(new_session, session_id, task_id)
+            r = client.post(f"/api/training/assessments/{session_id}/submit", headers=student,
+                            json={"answers": {str(i): a for i, a in enumerate(answers)}})
+            assert r.status_code == 200, r.text
+
+        def wait_graded(ids, timeout=120.0):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if all(run(load, s)[1].get("ai_grading") == "done" for s in ids):
+                    return True
+                time.sleep(0.1)
+            return False
+
+        # Scoring
+        calls = stub["calls"]
+        submit("all-tested", "tested", [BAD_SUM, GOOD[1]])
+        wait_graded(["all-tested"])
+        score, resp = run(load, "all-tested")
+        tests = [r for r in resp["results"] if r.get("type") == "test_results"]
+        check("score comes from the test cases", score == 75.0 and [t["passed"] for t in tests] == [2, 3], score)
+        check("AI feedback is still added", stub["calls"] == calls + 1
+              and resp["results"][-1]["type"] == "coding_feedback")
+
+        stub["fail"] = True
+        submit("ai-down", "mixed", [BAD_SUM, "# I added the numbers\nprint(1)"])
+        deadline = time.monotonic() + 30
+        while run(job_attempts, "ai-down") < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        score, resp = run(load, "ai-down")
+        check("nothing is written while the AI call fails", score == 0.0 and not any(
+            r.get("type") == "test_results" for r in resp["results"]), (score, resp["results"]))
+        stub["fail"] = False
+        wait_graded(["ai-down"])
+        score, resp = run(load, "ai-down")
+        check("the retry writes test and AI results together", score == 45.0 and run(job_attempts, "ai-down") >= 2
+              and [r["type"] for r in resp["results"]][-2:] == ["test_results", "coding_feedback"],
+              (score, resp["results"]))
+
+        stub["fail"] = True
+        submit("feedback-down", "tested", [BAD_SUM, GOOD[1]])
+        wait_graded(["feedback-down"])
+        stub["fail"] = False
+        score, resp = run(load, "feedback-down")
+        check("fully tested sessions are graded without AI feedback", score == 75.0
+              and run(job_attempts, "feedback-down") == 1 and "unavailable" in resp["results"][-1]["feedback"],
+              (score, resp["results"][-1]))
+
+        submit("mixed", "mixed", [GOOD[0], "# I added the numbers\nprint(1)"])
+        wait_graded(["mixed"])
+        score, _ = run(load, "mixed")
+        check("untested questions take the AI score", score == 70.0, score)
+
+        submit("unanswered", "tested", [GOOD[0], ""])
+        wait_graded(["unanswered"])
+        check("an unanswered tested question scores 0", run(load, "unanswered")[0] == 50.0)
+
+        settings.ASSESSMENT_AI_FEEDBACK = False
+        calls = stub["calls"]
+        submit("no-ai", "tested", GOOD)
+        wait_graded(["no-ai"])
+        score, resp = run(load, "no-ai")
+        check("AI skipped when feedback is off", score == 100.0 and stub["calls"] == calls
+              and not any(r.get("type") == "coding_feedback" for r in resp["results"]))
+
+        # A class submitting at once: everyone's code differs, so nothing is memoised
+        ids = [f"batch-{i}" for i in range(BATCH)]
+        batches = local.counters["batches"]
+        started = time.monotonic()
+        for i, sid in enumerate(ids):
+            submit(sid, "tested", [f"# student {i}\n" + GOOD[0], f"# student {i}\n" + GOOD[1]])
+        graded = wait_graded(ids, timeout=600.0)  # every run starts a sandbox: slow on a one-CPU box
+        elapsed = time.monotonic() - started
+        print(f"{BATCH} submissions x {len(SUM_CASES) + len(MAX_CASES)} test cases graded in {elapsed:.2f}s "
+              f"({local.counters['batches'] - batches} batched executions)")
+        check("the batch is graded on test cases", graded and all(run(load, s)[0] == 100.0 for s in ids))
+
+        # The same class graded through a remote service
+        piston, server = run(fake_piston)
+        runs = run(lambda: piston.run_batch("python", BAD_SUM + "import sys; print('err', file=sys.stderr)\n",
+                                            [c["input"] for c in SUM_CASES]))
+        check("remote run_batch runs every input in one request", server.requests == 1
+              and [r["stdout"] for r in runs] == ["3\n", "14\n", "0\n", "0\n"]
+              and all(r["stderr"] == "err\n" and r["code"] == 0 for r in runs), runs)
+        backends = code_executor.backends
+        code_executor.backends = [piston]
+        server.requests = 0
+        ids = [f"remote-{i}" for i in range(BATCH)]
+        started = time.monotonic()
+        try:
+            for i, sid in enumerate(ids):
+                submit(sid, "tested", [f"# remote student {i}\n" + GOOD[0], f"# remote student {i}\n" + GOOD[1]])
+            graded = wait_graded(ids, timeout=600.0)
+        finally:
+            code_executor.backends = backends
+        elapsed = time.monotonic() - started
+        print(f"{BATCH} submissions x {len(SUM_CASES) + len(MAX_CASES)} test cases graded remotely in "
+              f"{elapsed:.2f}s ({server.requests} requests, {REMOTE_LATENCY}s latency each)")
+        check("one remote request per program", graded and server.requests == 2 * BATCH
+              and all(run(load, s)[0] == 100.0 for s in ids), server.requests)
+        settings.ASSESSMENT_AI_FEEDBACK = True
+
+    print("Code tests OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Regression check: the attendance / time-tracking CSV exports must not change.
+
+Seeds a deterministic dataset into a throwaway SQLite DB (every role, students in
+several batches including two batches sharing a name, a student whose batch row is
+gone, open sessions, days without punches), then compares each export endpoint's
+CSV byte for byte against a straightforward reference implementation of the
+original per-user / per-day report logic.
+
+Usage (from backend/):
+    python check_export_csv.py
+"""
+import asyncio
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.database import engine, Base, AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.attendance import Attendance, AttendanceStatus, TimeTracking  # noqa: E402
+from app.models.course import Batch, BatchStudent, Course  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.dates import between_days  # noqa: E402
+
+START = date(2026, 3, 1)
+DAYS = 12
+ADMIN_ID = "check-super-admin"
+
+
+async def seed():
+    rng = random.Random(7)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=ADMIN_ID, email="sa@check.local", password="x", name="Super", role=Role.SUPER_ADMIN))
+        users = []
+        for i, r in enumerate([Role.ADMIN] * 2 + [Role.TRAINER] * 2 + [Role.MARKETER] * 2 + [Role.STUDENT] * 9):
+            u = User(id=f"user-{i:03d}-check", email=f"u{i}@check.local", password="x", name=f"Name {i:03d}",
+                     role=r, student_id=f"APC-{i:04d}" if r == Role.STUDENT and i % 3 else None)
+            db.add(u)
+            users.append(u)
+        db.add(Course(id="course-1", name="Course"))
+        for bid, name in [("batch-1", "Alpha"), ("batch-2", "Beta"), ("batch-3", "Alpha")]:
+            db.add(Batch(id=bid, course_id="course-1", name=name,
+                         start_date=datetime(2026, 1, 1), end_date=datetime(2026, 12, 31)))
+        await db.flush()
+
+        students = [u for u in users if u.role == Role.STUDENT]
+        for k, u in enumerate(students[:7]):
+            bid = "batch-1" if k < 3 else "batch-2" if k < 5 else "batch-3" if k < 6 else "batch-deleted"
+            db.add(BatchStudent(batch_id=bid, student_id=u.id))
+
+        for d in range(DAYS):
+            day = datetime.combine(START + timedelta(days=d), datetime.min.time())
+            for u in users:
+                if rng.random() < 0.35:
+                    continue
+                sessions = rng.choice([1, 1, 2])
+                for n in range(sessions):
+                    login = day + timedelta(hours=rng.randint(8, 12) + 3 * n, minutes=rng.randint(0, 59))
+                    # Only the day's last session can still be open (ux_time_tracking_open_session)
+                    still_open = rng.random() < 0.2 and n == sessions - 1
+                    logout = None if still_open else login + timedelta(minutes=rng.randint(5, 300))
+                    db.add(TimeTracking(user_id=u.id, date=day, login_time=login, logout_time=logout,
+                                        total_minutes=int((logout - login).total_seconds() / 60) if logout else None))
+            for k, u in enumerate(students[:5]):
+                if rng.random() < 0.6:
+                    db.add(Attendance(student_id=u.id, batch_id="batch-1" if k < 3 else "batch-2", date=day,
+                                      status=rng.choice(list(AttendanceStatus)),
+                                      remarks=rng.choice([None, "bus late", "doctor"])))
+        await db.commit()
+
+
+# ─── Reference implementations (original report logic) ───
+def _csv(rows) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row in rows:
+        writer.writerow(row)
+    return out.getvalue()
+
+
+async def reference_time_tracking(s_date: date, e_date: date, role: str = "", user_id: str = "") -> str:
+    late_hour, late_minute = 10, 0
+    async with AsyncSessionLocal() as db:
+        query = select(TimeTracking).where(between_days(TimeTracking.date, s_date, e_date))
+        if user_id:
+            query = query.where(TimeTracking.user_id == user_id)
+        records = (await db.execute(query.order_by(TimeTracking.date, TimeTracking.login_time))).scalars().all()
+
+        user_records = {}
+        for r in records:
+            if r.user_id not in user_records:
+                u = await db.get(User, r.user_id)
+                if not u or (role and u.role.value != role):
+                    continue
+                batch_name = "N/A"
+                if u.role == Role.STUDENT:
+                    batch_id = (await db.execute(
+                        select(BatchStudent.batch_id).where(BatchStudent.student_id == u.id)
+                    )).scalars().first()
+                    if batch_id:
+                        batch = await db.get(Batch, batch_id)
+                        batch_name = batch.name if batch else "Unknown Batch"
+                user_records[r.user_id] = {"user": u, "role": u.role.value, "batch": batch_name, "logs": []}
+            if r.user_id not in user_records:
+                continue
+            status = "N/A"
+            if r.login_time:
+                on_time = r.login_time.hour < late_hour or (r.login_time.hour == late_hour and r.login_time.minute <= late_minute)
+                status = "On Time" if on_time else "Late"
+            mins = r.total_minutes or 0
+            user_records[r.user_id]["logs"].append([
+                r.date.strftime("%Y-%m-%d"),
+                r.login_time.strftime("%I:%M %p") if r.login_time else "-",
+                r.logout_time.strftime("%I:%M %p") if r.logout_time else "-",
+                f"{mins // 60}h {mins % 60}m" if mins >= 60 else f"{mins % 60}m",
+                status,
+            ])
+
+        rows = [[f"Attendance Report: {s_date} to {e_date}"], [f"Late Threshold: {late_hour:02d}:{late_minute:02d}"], []]
+
+        def section(title, group):
+            if not group:
+                return
+            rows.append([f"=== {title} ==="])
+            rows.append(["Name", "ID", "Date", "Punch In", "Punch Out", "Duration", "Status"])
+            for data in group:
+                u = data["user"]
+                for log in data["logs"]:
+                    rows.append([u.name, u.student_id or u.id[:8], *log])
+            rows.append([])
+
+        for title, r in [("ADMINS", "ADMIN"), ("TRAINERS", "TRAINER"), ("MARKETERS", "MARKETER")]:
+            section(title, [d for d in user_records.values() if d["role"] == r])
+        by_batch = {}
+        for d in user_records.values():
+            if d["role"] == "STUDENT":
+                by_batch.setdefault(d["batch"], []).append(d)
+        for batch_name, group in by_batch.items():
+            section(f"STUDENTS - {batch_name}", group)
+
+        absent_query = select(User).where(User.role != Role.SUPER_ADMIN)
+        if role:
+            absent_query = absent_query.where(User.role == role)
+        if user_id:
+            absent_query = absent_query.where(User.id == user_id)
+        all_users = (await db.execute(absent_query)).scalars().all()
+        absent = []
+        day = s_date
+        while day <= e_date:
+            punched = set((await db.execute(
+                select(TimeTracking.user_id).where(between_days(TimeTracking.date, day, day))
+            )).scalars().all())
+            absent += [[u.name, u.student_id or u.id[:8], u.role.value, day.strftime("%Y-%m-%d"), "Absent"]
+                       for u in all_users if u.id not in punched]
+            day += timedelta(days=1)
+        if absent:
+            rows += [["=== ABSENT (Did Not Punch In) ==="], ["Name", "ID", "Role", "Date", "Status"], *absent, []]
+    return _csv(rows)
+
+
+async def reference_attendance(batch_id: str, s_date: date, e_date: date) -> str:
+    async with AsyncSessionLocal() as db:
+        batch = await db.get(Batch, batch_id)
+        batch_name = batch.name if batch else batch_id
+        students = (await db.execute(
+            select(User).join(BatchStudent, User.id == BatchStudent.student_id)
+            .where(BatchStudent.batch_id == batch_id, User.role == Role.STUDENT).order_by(User.name)
+        )).scalars().all()
+        records = (await db.execute(
+            select(Attendance).where(Attendance.batch_id == batch_id, between_days(Attendance.date, s_date, e_date))
+        )).scalars().all()
+    lookup = {(r.student_id, r.date.strftime("%Y-%m-%d")): r for r in records}
+    rows = [["Batch", "Date", "Student ID", "Student Name", "Status", "Remarks"]]
+    day = s_date
+    while students and day <= e_date:
+        ds = day.strftime("%Y-%m-%d")
+        for s in students:
+            rec = lookup.get((s.id, ds))
+            rows.append([batch_name, ds, s.student_id or "", s.name or "",
+                         rec.status.value if rec else "ABSENT", (rec.remarks or "") if rec else ""])
+        day += timedelta(days=1)
+    return _csv(rows)
+
+
+def main() -> int:
+    asyncio.run(seed())
+    end = START + timedelta(days=DAYS - 1)
+    d = lambda n: START + timedelta(days=n)  # noqa: E731
+    cases = [
+        ("time-tracking, full range", dict(start_date=d(-2), end_date=d(DAYS + 1))),
+        ("time-tracking, role=STUDENT", dict(start_date=d(2), end_date=d(4), role="STUDENT")),
+        ("time-tracking, role=ADMIN", dict(start_date=d(2), end_date=d(4), role="ADMIN")),
+        ("time-tracking, one user", dict(start_date=START, end_date=end, user_id="user-008-check")),
+        ("time-tracking, user + role", dict(start_date=START, end_date=end, user_id="user-003-check", role="STUDENT")),
+    ]
+    att_cases = [("batch-1", d(-1), end), ("batch-2", d(1), d(3)), ("batch-3", d(1), d(3)), ("no-such-batch", d(1), d(3))]
+
+    failures = 0
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": ADMIN_ID, "role": "SUPER_ADMIN"})}
+    with TestClient(app) as client:
+        for name, params in cases:
+            got = client.get("/api/training/time-tracking/export", params=params, headers=headers).text
+            expected = asyncio.run(reference_time_tracking(
+                params["start_date"], params["end_date"], params.get("role", ""), params.get("user_id", "")))
+            ok = got == expected
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}")
+        for batch_id, s, e in att_cases:
+            got = client.get("/api/training/attendance/export", headers=headers,
+                             params=dict(batch_id=batch_id, start_date=s, end_date=e)).text
+            ok = got == asyncio.run(reference_attendance(batch_id, s, e))
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] attendance, {batch_id}")
+
+    print("CSV exports unchanged." if not failures else f"{failures} export(s) differ from the reference.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
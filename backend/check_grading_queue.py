@@ -0,0 +1,252 @@
+"""
+Checks the durable AI grading queue behind submit_assessment.
+
+Against a throwaway SQLite DB, with the AI grader replaced by a stub that takes
+STUB_DELAY seconds per call:
+  - submits a burst of coding assessments and checks every one is graded, each
+    going pending -> running -> done on responses["ai_grading"], with no more
+    gradings in flight than GRADING_CONCURRENCY;
+  - checks a grader error is retried and a grader that keeps failing ends "failed",
+    including the real evaluate_submission against a Groq answering 503 (which
+    still gives interactive callers their "grade manually" fallback);
+  - checks re-grading is idempotent (one job row, one feedback entry);
+  - stops the workers, leaves a submission with no job row and a job stuck
+    "running" from a dead worker, and checks the startup sweep picks both up;
+  - checks a job orphaned while the workers keep running is picked up by the
+    periodic stale sweep, without a restart;
+  - prints the per-queue metrics from GET /api/admin/queues.
+
+Usage (from backend/):
+    python check_grading_queue.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select, update  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.job import BackgroundJob  # noqa: E402
+from app.models.project import AssessmentSession, Task  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils import ai_grader, job_queue  # noqa: E402
+from app.utils.assessment_grading import grading_queue  # noqa: E402
+
+ADMIN_ID, STUDENT_ID, TASK_ID = "check-super-admin", "check-student", "check-task"
+SUBMISSIONS = 8
+STUB_DELAY = 0.2
+
+job_queue.POLL_INTERVAL_SECONDS = 0.2
+job_queue.RETRY_DELAYS_SECONDS = (0, 0, 0)
+job_queue.STALE_SWEEP_SECONDS = 0.5
+
+stub = {"in_flight": 0, "peak": 0, "calls": 0, "fail": set(), "fail_once": set()}
+states: dict[str, list[str]] = {}
+
+
+class GroqDown:
+    calls = 0
+
+    async def chat(self, payload, timeout=None):
+        GroqDown.calls += 1
+        return httpx.Response(503, request=httpx.Request("POST", "https://groq.invalid"))
+
+
+real_evaluate = ai_grader.evaluate_submission
+ai_grader.groq_client = GroqDown()
+ai_grader.GROQ_API_KEY = "check-key"
+
+
+async def stub_evaluate(task_context, code, **kwargs):
+    if "groq-down" in code:
+        return await real_evaluate(task_context, code, **kwargs)
+    stub["calls"] += 1
+    stub["in_flight"] += 1
+    stub["peak"] = max(stub["peak"], stub["in_flight"])
+    try:
+        await asyncio.sleep(STUB_DELAY)
+        marker = code.split("print('")[1].split("'")[0]
+        if marker in stub["fail"]:
+            raise RuntimeError("grader down")
+        if marker in stub["fail_once"]:
+            stub["fail_once"].discard(marker)
+            raise RuntimeError("transient grader error")
+        return {"score": 75, "feedback": "Looks good."}
+    finally:
+        stub["in_flight"] -= 1
+
+
+ai_grader.evaluate_submission = stub_evaluate
+_on_state = grading_queue.on_state
+
+
+async def recording_on_state(db, session_id, state):
+    states.setdefault(session_id, []).append(state)
+    await _on_state(db, session_id, state)
+
+grading_queue.on_state = recording_on_state
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            User(id=ADMIN_ID, email="sa@check.local", password="x", name="Super", role=Role.SUPER_ADMIN),
+            User(id=STUDENT_ID, email="st@check.local", password="x", name="Student", role=Role.STUDENT),
+            Task(id=TASK_ID, title="Reverse a string", description="Write reverse()",
+                 structured_content=json.dumps({"questions": [{"question": "Reverse a string"}]})),
+        ])
+        await db.commit()
+
+
+async def new_session(session_id, responses=None, completed=False):
+    async with AsyncSessionLocal() as db:
+        db.add(AssessmentSession(
+            id=session_id, student_id=STUDENT_ID, reference_id=TASK_ID, reference_type="TASK",
+            start_time=datetime.utcnow(), is_completed=completed,
+            end_time=datetime.utcnow() if completed else None,
+            responses=json.dumps(responses or {"questions": [{"question": "Reverse a string"}]}),
+        ))
+        await db.commit()
+
+
+async def load(session_id):
+    async with AsyncSessionLocal() as db:
+        session = await db.get(AssessmentSession, session_id)
+        jobs = (await db.execute(select(BackgroundJob).where(BackgroundJob.ref_id == session_id))).scalars().all()
+        return session, json.loads(session.responses or "{}"), jobs
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}")
+
+    admin = {"Authorization": "Bearer " + create_access_token({"sub": ADMIN_ID, "role": "SUPER_ADMIN"})}
+    student = {"Authorization": "Bearer " + create_access_token({"sub": STUDENT_ID, "role": "STUDENT"})}
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+
+        def submit(session_id):
+            run(new_session, session_id)
+            r = client.post(f"/api/training/assessments/{session_id}/submit", headers=student,
+                            json={"answers": {"0": f"print('{session_id}'[::-1])"}})
+            assert r.status_code == 200 and r.json()["ai_grading"] == "pending", r.text
+
+        def wait_until(predicate, timeout=15.0):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if predicate():
+                    return True
+                time.sleep(0.05)
+            return False
+
+        def grading_state(session_id):
+            return run(load, session_id)[1].get("ai_grading")
+
+        # Burst of submissions
+        ids = [f"burst-{i}" for i in range(SUBMISSIONS)]
+        started = time.monotonic()
+        for sid in ids:
+            submit(sid)
+        graded = wait_until(lambda: all(grading_state(s) == "done" for s in ids))
+        elapsed = time.monotonic() - started
+        print(f"{SUBMISSIONS} submissions graded in {elapsed:.2f}s, peak in-flight {stub['peak']} "
+              f"(GRADING_CONCURRENCY={settings.GRADING_CONCURRENCY})")
+        check("every submission is graded", graded)
+        check("each goes pending -> running -> done", all(states.get(s) == ["pending", "running", "done"] for s in ids))
+        check("scores and feedback are stored", all(
+            run(load, s)[0].score == 75 and run(load, s)[1]["results"][-1]["type"] == "coding_feedback" for s in ids))
+        check("gradings in flight are capped", stub["peak"] <= settings.GRADING_CONCURRENCY)
+
+        # Retry, then permanent failure
+        stub["fail_once"].add("flaky")
+        submit("flaky")
+        check("a transient error is retried", wait_until(lambda: grading_state("flaky") == "done")
+              and run(load, "flaky")[2][0].attempts == 2)
+        stub["fail"].add("broken")
+        submit("broken")
+        check("a grader that keeps failing ends failed", wait_until(lambda: grading_state("broken") == "failed"))
+        _, resp, jobs = run(load, "broken")
+        check("failed job records the error and attempts",
+              jobs[0].status == "failed" and jobs[0].attempts == settings.GRADING_MAX_ATTEMPTS and jobs[0].last_error)
+        check("student sees the manual-review note", "manual" in resp["results"][-1]["feedback"])
+
+        submit("groq-down")
+        ended = wait_until(lambda: grading_state("groq-down") == "failed")
+        session, resp, jobs = run(load, "groq-down")
+        check("a Groq error is retried, then the job fails", ended and GroqDown.calls == settings.GRADING_MAX_ATTEMPTS
+              and jobs[0].status == "failed" and "503" in jobs[0].last_error
+              and "manual" in resp["results"][-1]["feedback"])
+        fallback = run(lambda: real_evaluate("Reverse a string", "print('x')"))
+        check("interactive callers still get the fallback", fallback["score"] == 0 and "failed" in fallback["feedback"])
+
+        # Idempotent re-grade
+        stub["fail"].discard("broken")
+        r1 = client.post("/api/training/assessments/broken/regrade", headers=admin).json()
+        r2 = client.post("/api/training/assessments/broken/regrade", headers=admin).json()
+        check("re-grade is queued once", r1["status"] == "queued" and r2["status"] == "already_queued")
+        check("re-grade completes", wait_until(lambda: grading_state("broken") == "done"))
+        _, resp, jobs = run(load, "broken")
+        check("re-grade reuses the job row and replaces the feedback",
+              len(jobs) == 1 and sum(1 for r in resp["results"] if r.get("type") == "coding_feedback") == 1)
+        check("students cannot trigger a re-grade",
+              client.post("/api/training/assessments/broken/regrade", headers=student).status_code == 403)
+
+        # Restart recovery: an ungraded submission with no job row, and a job orphaned mid-run
+        run(grading_queue.stop)
+        run(new_session, "orphan", {"answers": {"0": "print('orphan'[::-1])"}, "results": [],
+                                    "ai_grading": "pending"}, True)
+        submit("stuck")
+
+        async def simulate_dead_worker(session_id="stuck"):
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(BackgroundJob).where(BackgroundJob.ref_id == session_id).values(
+                    status="running", attempts=1,
+                    started_at=datetime.utcnow() - timedelta(seconds=job_queue.STALE_AFTER_SECONDS + 60)))
+                await db.commit()
+
+        run(simulate_dead_worker)
+        check("nothing runs while the workers are stopped",
+              grading_state("orphan") == "pending" and run(load, "stuck")[2][0].status == "running")
+        run(grading_queue.start)
+        check("startup sweep grades the orphaned submission", wait_until(lambda: grading_state("orphan") == "done"))
+        check("startup sweep resumes the stale running job", wait_until(lambda: grading_state("stuck") == "done"))
+
+        # A worker dies mid-job while this one keeps running: the dispatch loop's sweep resets it
+        stub["fail"].add("stuck-live")
+        submit("stuck-live")
+        wait_until(lambda: grading_state("stuck-live") == "failed")
+        run(simulate_dead_worker, "stuck-live")
+        stub["fail"].discard("stuck-live")
+        resets = grading_queue.counters["stale_reset"]
+        check("periodic sweep resumes a job orphaned at runtime",
+              wait_until(lambda: grading_state("stuck-live") == "done") and grading_queue.counters["stale_reset"] > resets)
+
+        metrics = client.get("/api/admin/queues", headers=admin).json()
+        print(json.dumps(metrics, indent=2))
+        grading = next(m for m in metrics if m["queue"] == "assessment_grading")
+        check("metrics report depth and latency",
+              grading["depth"]["done"] == SUBMISSIONS + 5 and grading["depth"]["failed"] == 1 and grading["latency_seconds"]["count"] > 0)
+
+    print("Grading queue OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Checks that AI grading no longer blocks the event loop.
+
+Starts a stub Groq server on a background thread (every completion takes
+STUB_DELAY seconds, and the first attempt of every third request gets a 429),
+then grades a batch of submissions concurrently through ai_grader while a ticker
+coroutine measures event-loop lag. Reports:
+  - worst loop lag during grading (should be a few ms, not STUB_DELAY);
+  - peak in-flight requests at the stub (bounded by GROQ_MAX_CONCURRENCY);
+  - TCP connections opened (pooled, so no more than the concurrency limit);
+  - 429s retried;
+  - a call with max_retries=0 (the chatbot) returns the 429 at once.
+For comparison it also measures the loop lag of one call made the old way, with
+a synchronous httpx.Client inside a coroutine.
+
+Usage (from backend/):
+    python check_groq_client.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "stub-key")
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+
+from app.utils import ai_grader  # noqa: E402
+from app.utils.ai_cache import ai_cache  # noqa: E402
+from app.utils.groq_client import groq_client  # noqa: E402
+
+# Every grading must reach the stub; the result cache has its own check
+ai_cache.enabled = False
+
+STUB_DELAY = 0.5
+SUBMISSIONS = 12
+
+
+class StubGroq:
+    """Minimal keep-alive HTTP/1.1 server answering chat-completion requests."""
+
+    def __init__(self):
+        self.in_flight = self.peak = self.connections = self.requests = self.rate_limited = 0
+        self.port = None
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        self._ready.wait()
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = next((int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                               if line.lower().startswith(b"content-length")), 0)
+                await reader.readexactly(length)
+                self.requests += 1
+                if self.requests % 3 == 1:
+                    self.rate_limited += 1
+                    await self._reply(writer, 429, {"error": "rate limited"}, b"Retry-After: 0.2\r\n")
+                    continue
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                await asyncio.sleep(STUB_DELAY)
+                self.in_flight -= 1
+                content = json.dumps({"score": 80, "feedback": "Looks good."})
+                await self._reply(writer, 200, {"choices": [{"message": {"content": content}}]})
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            writer.close()
+
+    async def _reply(self, writer, status, body, extra=b""):
+        data = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n".encode()
+                     + extra + b"\r\n" + data)
+        await writer.drain()
+
+
+async def max_loop_lag(work) -> tuple[float, object]:
+    """Run `work` while sampling how late a 10ms sleep wakes up; returns (worst lag, result)."""
+    lag, done = 0.0, asyncio.Event()
+
+    async def ticker():
+        nonlocal lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - start - 0.01)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.05)
+    try:
+        result = await work
+    finally:
+        done.set()
+        await task
+    return lag, result
+
+
+async def main() -> int:
+    stub = StubGroq()
+    stub.start()
+    groq_client.url = f"http://127.0.0.1:{stub.port}/openai/v1/chat/completions"
+
+    async def old_style_call():
+        with httpx.Client(timeout=40.0) as client:
+            return client.post(groq_client.url, json={}).status_code
+
+    # First request of the stub is a 429, so the sync call is made twice to hit a real completion
+    sync_lag, _ = await max_loop_lag(old_style_call())
+    sync_lag2, _ = await max_loop_lag(old_style_call())
+    stub.connections = stub.requests = stub.peak = stub.rate_limited = 0
+
+    started = time.perf_counter()
+    lag, results = await max_loop_lag(asyncio.gather(*[
+        ai_grader.evaluate_submission("Reverse a string", f"print('{i}'[::-1])") for i in range(SUBMISSIONS)
+    ]))
+    elapsed = time.perf_counter() - started
+
+    # The stub's next request is a 429: the chatbot's call must hand it back, not back off
+    stub.requests = 0
+    started = time.perf_counter()
+    chatbot = await groq_client.chat({}, max_retries=0)
+    chatbot_s = time.perf_counter() - started
+    chatbot_requests = stub.requests
+    await groq_client.close()
+
+    print(f"Old sync client: event loop blocked for {max(sync_lag, sync_lag2) * 1000:.0f}ms per call")
+    print(f"Async client: {SUBMISSIONS} gradings in {elapsed:.2f}s, worst loop lag {lag * 1000:.1f}ms, "
+          f"peak in-flight {stub.peak}, connections {stub.connections}, 429s retried {stub.rate_limited}")
+
+    checks = [
+        ("loop stays responsive during grading", lag < 0.1),
+        ("all submissions graded", all(r["score"] == 80 for r in results)),
+        (f"in-flight requests capped at {groq_client.max_concurrency}", stub.peak <= groq_client.max_concurrency),
+        ("connections are pooled", stub.connections <= groq_client.max_concurrency),
+        ("429s were retried", stub.rate_limited > 0),
+        ("max_retries=0 returns the 429 without retrying", chatbot.status_code == 429 and chatbot_requests == 1
+         and chatbot_s < 0.1),
+    ]
+    for name, ok in checks:
+        print(f"[{'OK' if ok else 'FAIL'}] {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,212 @@
+"""
+Checks for the outbox mailer (app/utils/mailer.py) against the local SMTP sink.
+
+The sink answers every SMTP reply after LATENCY seconds, like a remote server.
+Compares the old send-otp (connect, log in, send and quit inside the handler)
+with the queued one, then checks that:
+  - a burst of OTP requests is sent over one connection and one login;
+  - messages are rendered from the templates, with values HTML-escaped;
+  - a 451 is retried, a 550 fails the message without retrying;
+  - a dropped connection is reopened;
+  - MAIL_RATE_PER_MINUTE spaces the messages;
+  - mail queued while the sender is stopped goes out when it starts again;
+  - sent rows no longer hold their context (codes).
+
+Usage (from backend/):
+    python check_mailer.py
+"""
+import os
+import smtplib
+import sys
+import tempfile
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+os.environ["SMTP_USER"] = "lms@check.local"
+os.environ["SMTP_PASSWORD"] = "secret"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app.utils.mailer as mailer_module  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.outbox import OutboxEmail  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.email import leave_status_context  # noqa: E402
+from app.utils.mailer import mailer  # noqa: E402
+from app.utils.smtp_sink import SMTPSink  # noqa: E402
+
+LATENCY = 0.02
+BURST = 30
+
+
+def old_send(to_email: str, code: str) -> None:
+    """What send_verification_email did inside the handler, minus STARTTLS (the sink has none)."""
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = "Verify your Apptech Careers LMS account"
+    msg["From"] = settings.SMTP_SENDER
+    msg["To"] = to_email
+    msg.attach(MIMEText(f"Your verification code is: {code}", "plain"))
+    msg.attach(MIMEText(f"<html><body>{code}</body></html>", "html"))
+    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        server.sendmail(settings.SMTP_USER, to_email, msg.as_string())
+
+
+async def queue(to_email, template, context):
+    async with AsyncSessionLocal() as db:
+        email = await mailer.enqueue(db, to_email, template, context)
+        await db.commit()
+        return email.id
+
+
+async def outbox_row(email_id):
+    async with AsyncSessionLocal() as db:
+        return await db.get(OutboxEmail, email_id)
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="pending-user", email="new@check.local", password="x", name="New", role=Role.STUDENT,
+                    is_verified=False))
+        await db.commit()
+
+
+async def restart_sender():
+    mailer.start()
+
+
+def wait_for(condition, timeout=10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    mailer_module.POLL_INTERVAL_SECONDS = 0.2
+    mailer_module.RETRY_DELAYS_SECONDS = (0.3, 0.3, 0.3, 0.3)
+    settings.MAIL_RATE_PER_MINUTE = 60_000
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        sink = SMTPSink(latency=LATENCY)
+        settings.SMTP_HOST, settings.SMTP_PORT = "127.0.0.1", run(sink.start)
+
+        started = time.perf_counter()
+        old_send("old@check.local", "123456")
+        old_ms = (time.perf_counter() - started) * 1000
+        sink.messages.clear()
+        connections = sink.counters["connections"]
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(BURST):
+            t = time.perf_counter()
+            r = client.post("/api/auth/send-otp", json={"email": f"student{i}@check.local"})
+            latencies.append((time.perf_counter() - t) * 1000)
+            assert r.status_code == 200, r.text
+        delivered = wait_for(lambda: len(sink.messages) == BURST)
+        burst_s = time.perf_counter() - started
+        latencies.sort()
+        print(f"send-otp with {LATENCY * 1000:.0f}ms per SMTP reply: old handler {old_ms:.0f}ms "
+              f"(event loop blocked throughout), queued handler p50 {latencies[len(latencies) // 2]:.1f}ms; "
+              f"{BURST} emails delivered in {burst_s:.2f}s")
+        check("handler no longer waits on SMTP", latencies[len(latencies) // 2] * 5 < old_ms)
+        check("burst delivered over one connection and one login", delivered
+              and sink.counters["connections"] - connections == 1 and sink.counters["logins"] == 2, sink.counters)
+
+        message = sink.messages[0]
+        html = message.get_body(("html",)).get_content()
+        text = message.get_body(("plain",)).get_content()
+        check("rendered from the verification template", message["Subject"] == "Verify your Apptech Careers LMS account"
+              and message.envelope_to == ["student0@check.local"] and "10 minutes" in html
+              and text.startswith("Your verification code is: ") and text.split(": ")[1].strip() in html)
+
+        sink.messages.clear()
+        r = client.post("/api/auth/resend-verification", json={"email": "new@check.local"})
+        check("resend-verification queues the 24-hour code", r.status_code == 200
+              and wait_for(lambda: len(sink.messages) == 1)
+              and "24 hours" in sink.messages[0].get_body(("html",)).get_content(), r.text)
+
+        sink.messages.clear()
+        run(queue, "leave@check.local", "leave_status",
+            leave_status_context("REJECTED", {"start_date": "2026-01-05", "end_date": "2026-01-06"}, "<b>Exams</b>"))
+        wait_for(lambda: len(sink.messages) == 1)
+        html = sink.messages[0].get_body(("html",)).get_content() if sink.messages else ""
+        check("leave template escapes the reason", sink.messages and sink.messages[0]["Subject"] == "Leave Request Rejected"
+              and "&lt;b&gt;Exams&lt;/b&gt;" in html and "#ef4444" in html)
+
+        sink.messages.clear()
+        sink.fail_next = 1
+        email_id = run(queue, "retry@check.local", "verification", {"code": "111111", "expires": "1 hour"})
+        sent = wait_for(lambda: run(outbox_row, email_id).status == "sent")
+        row = run(outbox_row, email_id)
+        check("a 451 is retried", sent and row.attempts == 2 and len(sink.messages) == 1, (row.status, row.attempts))
+        check("sent rows drop their context", row.context is None and row.sent_at is not None)
+
+        sink.refuse.add("ghost@check.local")
+        email_id = run(queue, "ghost@check.local", "verification", {"code": "222222", "expires": "1 hour"})
+        wait_for(lambda: run(outbox_row, email_id).status == "failed")
+        row = run(outbox_row, email_id)
+        check("a 550 fails without retrying", row.status == "failed" and row.attempts == 1
+              and "550" in (row.last_error or ""), (row.status, row.attempts, row.last_error))
+
+        sink.messages.clear()
+        run(sink.disconnect_all)
+        time.sleep(0.1)
+        run(queue, "after-drop@check.local", "verification", {"code": "333333", "expires": "1 hour"})
+        check("a dropped connection is reopened", wait_for(lambda: len(sink.messages) == 1)
+              and mailer.connection.counters["reconnects"] >= 1, mailer.connection.counters)
+
+        sink.messages.clear()
+        settings.MAIL_RATE_PER_MINUTE = 600
+        started = time.perf_counter()
+        for i in range(10):
+            run(queue, f"rate{i}@check.local", "verification", {"code": "444444", "expires": "1 hour"})
+        wait_for(lambda: len(sink.messages) == 10)
+        elapsed = time.perf_counter() - started
+        settings.MAIL_RATE_PER_MINUTE = 60_000
+        check("rate limit spaces messages", len(sink.messages) == 10 and elapsed >= 0.85, elapsed)
+
+        sink.messages.clear()
+        run(mailer.stop)
+        stats = run(_stats)
+        check("stopping lets the batch in flight finish", "sending" not in stats["outbox"], stats["outbox"])
+        ids = [run(queue, f"later{i}@check.local", "verification", {"code": "555555", "expires": "1 hour"})
+               for i in range(3)]
+        time.sleep(0.5)
+        waiting = [run(outbox_row, i).status for i in ids]
+        run(restart_sender)
+        check("outbox survives a stopped sender", waiting == ["pending"] * 3
+              and wait_for(lambda: len(sink.messages) == 3), waiting)
+
+        wait_for(lambda: set(run(_stats)["outbox"]) == {"sent", "failed"})
+        stats = run(_stats)
+        check("every message settled", stats["outbox"] == {"sent": stats["enqueued"] - 1, "failed": 1}, stats)
+        print(f"Mailer: {stats}")
+        run(sink.stop)
+
+    print("Mailer OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+async def _stats():
+    async with AsyncSessionLocal() as db:
+        return await mailer.stats(db)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Checks keyset pagination on the list endpoints.
+
+Seeds a throwaway SQLite DB, including rows that share a timestamp, rows whose
+created_at comes from the CURRENT_TIMESTAMP default and rows whose created_at is
+NULL. Then, for every paginated
+endpoint:
+  - walks it page by page with a small `limit` and checks the pages, joined, equal
+    the legacy (no cursor) response in the same order, with no row repeated;
+  - checks `include_total` against the legacy row count;
+  - checks the page-size cap and that a malformed cursor is a 400.
+Also checks that a cursor page of list_users range-scans ix_users_created_at_id
+(the key compared as stored, not through a function).
+
+Usage (from backend/):
+    python check_pagination.py
+"""
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from app.database import engine, Base  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.attendance import LeaveRequest, TimeTracking  # noqa: E402
+from app.models.course import Batch, Course  # noqa: E402
+from app.models.lead import Lead  # noqa: E402
+from app.models.placement import Job  # noqa: E402
+from app.models.project import Task, Violation, ViolationType  # noqa: E402
+from app.models.session import Session, StudentFeedback  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.pagination import MAX_PAGE_SIZE  # noqa: E402
+
+ADMIN_ID = "check-super-admin"
+ROWS = 37
+# Models seeded with some NULL created_at values (their endpoints serialise a missing timestamp as null)
+NULL_KEYS = (Violation, Task)
+
+# (name, path, key holding the rows when the response is an object)
+CASES = [
+    ("list_users", "/api/admin/users", None),
+    ("list_students", "/api/admin/students", None),
+    ("list_students (all)", "/api/admin/students?all=true", None),
+    ("list_leaves", "/api/admin/leaves", None),
+    ("list_violations", "/api/training/violations", None),
+    ("list_tasks", "/api/training/tasks", None),
+    ("list_leads", "/api/marketing/leads", None),
+    ("list_jobs", "/api/placement/jobs", None),
+    ("get_all_sessions", "/api/sessions/", None),
+    ("get_all_feedback", "/api/sessions/feedback/admin", None),
+    ("get_time_tracking", "/api/training/time-tracking", "logs"),
+]
+
+
+def _uid() -> str:
+    return str(uuid.uuid4())
+
+
+async def seed():
+    base = datetime(2026, 3, 1, 9, 30)
+
+    def ts(i):
+        # Rows share timestamps in runs, so pages must fall back to the id tie-break
+        return base + timedelta(minutes=i - i % 3)
+
+    def created(i):
+        # A run of rows with no timestamp at all, as left by rows older than the column's default
+        return None if i % 7 == 5 else ts(i)
+
+    # Like the production tables (created_at TIMESTAMP DEFAULT NOW()), allow NULL sort keys
+    for model in NULL_KEYS:
+        model.__table__.c.created_at.nullable = True
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        users = [{"id": ADMIN_ID, "email": "sa@check.local", "password": "x", "name": "Super",
+                  "role": Role.SUPER_ADMIN, "created_at": base}]
+        # Half the students get the server-side CURRENT_TIMESTAMP default (no fractional seconds)
+        users += [{"id": _uid(), "email": f"s{i}@check.local", "password": "x", "name": f"Student {i}",
+                   "role": Role.STUDENT, **({"created_at": ts(i)} if i % 2 else {})} for i in range(ROWS)]
+        for defaulted in (False, True):
+            await conn.execute(insert(User), [u for u in users if ("created_at" not in u) == defaulted])
+        student = users[1]["id"]
+        await conn.execute(insert(Course), [{"id": "c1", "name": "Course"}])
+        await conn.execute(insert(Batch), [{"id": "b1", "course_id": "c1", "name": "Batch", "trainer_id": ADMIN_ID,
+                                            "start_date": base, "end_date": base}])
+        for model, row in [
+            (LeaveRequest, lambda i: {"user_id": student, "start_date": base, "end_date": base}),
+            (Violation, lambda i: {"student_id": student, "type": ViolationType.LATE_SUBMISSION, "title": f"V{i}"}),
+            (Task, lambda i: {"title": f"T{i}", "batch_id": "b1", "assigned_by": ADMIN_ID}),
+            (Lead, lambda i: {"name": f"L{i}", "phone": "1"}),
+            (Job, lambda i: {"title": f"J{i}", "company": "Co"}),
+            (StudentFeedback, lambda i: {"target_type": "SESSION", "target_id": "x", "submitted_by": student,
+                                         "rating": 4, "is_anonymous": bool(i % 4 == 0)}),
+        ]:
+            key = created if model in NULL_KEYS else ts
+            await conn.execute(insert(model), [{"id": _uid(), "created_at": key(i), **row(i)} for i in range(ROWS)])
+        await conn.execute(insert(Session), [
+            {"id": _uid(), "title": f"S{i}", "batch_id": "b1", "trainer_id": ADMIN_ID,
+             "start_time": ts(i), "end_time": ts(i) + timedelta(hours=1)} for i in range(ROWS)
+        ])
+        await conn.execute(insert(TimeTracking), [
+            {"id": _uid(), "user_id": users[i % 5 + 1]["id"], "date": base.replace(hour=0, minute=0) + timedelta(days=i),
+             "login_time": ts(i) + timedelta(days=i // 10)} for i in range(ROWS)
+        ])
+
+
+async def explain(statement, parameters):
+    async with engine.connect() as conn:
+        return "\n".join(r[-1] for r in (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement,
+                                                                       parameters)).all())
+
+
+def main() -> int:
+    asyncio.run(seed())
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": ADMIN_ID, "role": "SUPER_ADMIN"})}
+    failures = 0
+
+    with TestClient(app) as client:
+        def get(path, **params):
+            r = client.get(path, params=params, headers=headers)
+            assert r.status_code == 200, f"{path}: HTTP {r.status_code} {r.text[:200]}"
+            return r.json()
+
+        for name, path, field in CASES:
+            rows = field or "items"
+            legacy = get(path)
+            legacy = legacy[field] if field else legacy
+            first = get(path, limit=5, include_total="true")
+            paged, cursor, pages = first[rows], first["next_cursor"], 1
+            while cursor:
+                body = get(path, limit=5, cursor=cursor)
+                paged += body[rows]
+                cursor, pages = body["next_cursor"], pages + 1
+
+            ids = [r["id"] for r in paged]
+            capped = get(path, limit=MAX_PAGE_SIZE * 10)[rows]
+            bad = client.get(path, params={"cursor": "not-a-cursor"}, headers=headers).status_code
+            ok = (paged == legacy and len(ids) == len(set(ids)) and first["total"] == len(legacy)
+                  and len(capped) == min(len(legacy), MAX_PAGE_SIZE) and bad == 400)
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}: {len(legacy)} rows in {pages} pages, total={first['total']}")
+
+        captured = []
+        listener = lambda conn, cursor, statement, parameters, context, executemany: (  # noqa: E731
+            captured.append((statement, parameters)))
+        cursor = get("/api/admin/users", limit=5)["next_cursor"]
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        get("/api/admin/users", limit=5, cursor=cursor)
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+        plans = [client.portal.call(explain, s, p) for s, p in captured if re.search(r"FROM users\b.*LIMIT", s, re.S)]
+        ok = len(plans) == 1 and re.search(r"SEARCH users USING (COVERING )?INDEX ix_users_created_at_id \(created_at<",
+                                           plans[0]) is not None
+        failures += not ok
+        print(f"[{'OK' if ok else 'FAIL'}] a cursor page range-scans its index" + ("" if ok else f"  -> {plans}"))
+
+    print("Paginated endpoints match the unpaginated responses." if not failures
+          else f"{failures} endpoint(s) paginate incorrectly.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
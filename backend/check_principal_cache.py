@@ -0,0 +1,125 @@
+"""
+Checks the authenticated-principal cache behind get_current_user.
+
+Against a throwaway SQLite DB:
+  - counts SQL round trips for repeated authenticated requests, cold vs warm;
+  - checks that admin status / password / permission changes, profile edits and
+    deletes are visible on the very next request (invalidation);
+  - checks that edits made through the cached (merged) User instance persist.
+
+Usage (from backend/):
+    python check_principal_cache.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import Depends  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import engine, AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token, require_admin_permissions  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.routers.auth import get_password_hash  # noqa: E402
+from app.utils.principal_cache import principal_cache  # noqa: E402
+
+SUPER_ID, ADMIN_ID, STUDENT_ID = "check-super-admin", "check-admin", "check-student"
+REQUESTS = 50
+
+
+# require_admin_permissions has no route of its own yet; mount one to exercise it
+@app.get("/_check/manage-users")
+async def _manage_users(user: User = Depends(require_admin_permissions(manage_users=True))):
+    return {"id": user.id}
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            User(id=SUPER_ID, email="sa@check.local", password="x", name="Super", role=Role.SUPER_ADMIN),
+            User(id=ADMIN_ID, email="ad@check.local", password="x", name="Admin", role=Role.ADMIN),
+            User(id=STUDENT_ID, email="st@check.local", password=get_password_hash("old-pass"),
+                 name="Student", role=Role.STUDENT),
+        ])
+        await db.commit()
+
+
+def main() -> int:
+    counter = {"n": 0}
+
+    def count(*_args):
+        counter["n"] += 1
+
+    def auth(user_id, role):
+        return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": role})}
+
+    sa, admin, student = auth(SUPER_ID, "SUPER_ADMIN"), auth(ADMIN_ID, "ADMIN"), auth(STUDENT_ID, "STUDENT")
+    results = []
+
+    def check(name, ok):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}")
+
+    with TestClient(app) as client:
+        asyncio.run(seed())
+
+        def round_trips(cached: bool) -> int:
+            counter["n"] = 0
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+            try:
+                for _ in range(REQUESTS):
+                    if not cached:
+                        principal_cache.forget()
+                    assert client.get("/api/auth/me", headers=student).status_code == 200
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+            return counter["n"]
+
+        cold, warm = round_trips(cached=False), round_trips(cached=True)
+        print(f"GET /api/auth/me x{REQUESTS}: {cold} queries uncached, {warm} cached")
+        check("cached requests skip the user lookup", warm < cold and warm <= 1)
+
+        me = lambda: client.get("/api/auth/me", headers=student)  # noqa: E731
+        me()
+        client.patch(f"/api/admin/users/{STUDENT_ID}/status", json={"is_active": False}, headers=sa)
+        check("status change is visible immediately", me().json()["is_active"] is False)
+
+        client.patch("/api/auth/profile", json={"name": "Renamed"}, headers=student)
+        check("profile edit through the cached user persists", me().json()["name"] == "Renamed")
+
+        client.post("/api/auth/change-password", json={"current_password": "old-pass", "new_password": "new-pass"},
+                    headers=student)
+        r = client.post("/api/auth/change-password", json={"current_password": "new-pass", "new_password": "pass-3"},
+                        headers=student)
+        check("password change is visible immediately", r.status_code == 200)
+
+        client.patch(f"/api/admin/users/{STUDENT_ID}/password", json={"new_password": "admin-set"}, headers=sa)
+        r = client.post("/api/auth/login", json={"email": "st@check.local", "password": "admin-set"})
+        check("admin password reset persists", r.status_code == 200)
+
+        check("admin without permissions is refused",
+              client.get("/_check/manage-users", headers=admin).status_code == 403)
+        client.put(f"/api/admin/users/{ADMIN_ID}/permissions", headers=sa,
+                   json={"manage_users": True, "manage_batches": False, "manage_courses": False, "manage_leaves": False})
+        check("granted permission applies immediately",
+              client.get("/_check/manage-users", headers=admin).status_code == 200)
+        client.put(f"/api/admin/users/{ADMIN_ID}/permissions", headers=sa,
+                   json={"manage_users": False, "manage_batches": False, "manage_courses": False, "manage_leaves": False})
+        check("revoked permission applies immediately",
+              client.get("/_check/manage-users", headers=admin).status_code == 403)
+
+        client.delete(f"/api/admin/users/{STUDENT_ID}", headers=sa)
+        check("deleted user is rejected", me().status_code == 401)
+
+    print("Principal cache OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Checks that the punch paths keep one open session per user and day when
+workers disagree (app/utils/punch.py, ux_time_tracking_open_session).
+
+Two PunchPipeline instances on one SQLite database stand in for two workers
+whose NOTIFY never arrives. Checks that:
+  - concurrent first scans on both workers open one session, not two;
+  - a worker with a stale index does not close a session twice: its punch-out
+    is refused, it reloads and closes the session that is actually open;
+  - startup closes duplicate open sessions left by older versions and creates
+    the unique index;
+  - the row-locking path (PUNCH_BURST_MODE off) answers a conflicting punch-in
+    with a cooldown, not an error.
+
+Usage (from backend/):
+    python check_punch.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+
+import app.utils.punch as punch  # noqa: E402
+from app.database import AsyncSessionLocal, Base, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.attendance import TimeTracking  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.routers.auth import _punch_with_row_lock  # noqa: E402
+from app.utils.dates import day_start  # noqa: E402
+from app.utils.punch import PunchCooldown, PunchPipeline, ist_now  # noqa: E402
+
+
+async def seed_legacy(now):
+    """A database from an older version: no unique index, and a user with three open sessions today."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("DROP INDEX ux_time_tracking_open_session"))
+        # Columns older databases already have; startup cannot add createdAt to SQLite (non-constant default)
+        for column in ("studentId", "isActive", "isVerified", "verificationCode", "verificationExpiry", "createdAt",
+                       "updatedAt", "educationStatus", "highestEducation", "passingYear"):
+            await conn.execute(text(f"ALTER TABLE users ADD COLUMN {column} TEXT"))
+    async with AsyncSessionLocal() as db:
+        for name in ("race", "stale", "legacy", "locked"):
+            db.add(User(id=name, email=f"{name}@check.local", password="x", name=name, role=Role.STUDENT))
+        for minutes in (0, 60, 120):
+            db.add(TimeTracking(user_id="legacy", date=day_start(now.date()), login_time=now + timedelta(minutes=minutes)))
+        await db.commit()
+    await engine.dispose()
+
+
+async def sessions(user_id):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(TimeTracking).where(TimeTracking.user_id == user_id).order_by(TimeTracking.login_time)
+        )
+        return result.scalars().all()
+
+
+async def scan(pipeline, user_id, now):
+    async with AsyncSessionLocal() as db:
+        try:
+            return (await pipeline.scan(db, user_id, now)).punch_type
+        except PunchCooldown:
+            return "cooldown"
+
+
+async def race(user_id, now):
+    workers = [PunchPipeline(), PunchPipeline()]
+    outcomes = await asyncio.gather(*(scan(w, user_id, now) for w in workers))
+    for w in workers:
+        await w.close()
+    return sorted(outcomes)
+
+
+async def stale_punch_out(user_id, now):
+    a, b = PunchPipeline(), PunchPipeline()
+    steps = [
+        await scan(a, user_id, now),                          # IN on worker A
+        await scan(b, user_id, now + timedelta(minutes=10)),  # OUT on worker B; A still thinks it is open
+        await scan(b, user_id, now + timedelta(minutes=20)),  # IN again on worker B
+        await scan(a, user_id, now + timedelta(minutes=30)),  # OUT on A: must close the second session
+    ]
+    for w in (a, b):
+        await w.close()
+    return steps
+
+
+async def has_index():
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(text(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = 'ux_time_tracking_open_session'"
+        ))
+
+
+async def row_lock_race(user_id, now):
+    async def one():
+        async with AsyncSessionLocal() as db:
+            try:
+                return (await _punch_with_row_lock(db, user_id, now)).punch_type
+            except PunchCooldown:
+                return "cooldown"
+    return sorted(await asyncio.gather(one(), one()))
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    now = ist_now().replace(hour=9, minute=0, second=0, microsecond=0)
+    asyncio.run(seed_legacy(now))
+    with TestClient(app) as client:
+        run = client.portal.call
+        rows = run(sessions, "legacy")
+        check("startup closes superseded open sessions", [r.logout_time for r in rows]
+              == [now + timedelta(minutes=60), now + timedelta(minutes=120), None],
+              [(r.login_time, r.logout_time) for r in rows])
+        check("startup creates the unique index", run(has_index) == 1)
+
+        outcomes = run(race, "race", now)
+        rows = run(sessions, "race")
+        check("concurrent first scans on two workers open one session", outcomes == ["IN", "cooldown"]
+              and len(rows) == 1 and rows[0].logout_time is None, (outcomes, len(rows)))
+
+        punch.COOLDOWN_SECONDS = 0
+        steps = run(stale_punch_out, "stale", now)
+        rows = run(sessions, "stale")
+        check("a stale worker's punch-out closes the session that is open", steps == ["IN", "OUT", "IN", "OUT"]
+              and [r.logout_time for r in rows] == [now + timedelta(minutes=10), now + timedelta(minutes=30)]
+              and rows[1].total_minutes == 10, (steps, [(r.login_time, r.logout_time) for r in rows]))
+        punch.COOLDOWN_SECONDS = 30
+
+        outcomes = run(row_lock_race, "locked", now)
+        rows = run(sessions, "locked")
+        check("row-lock path answers a conflicting punch-in with a cooldown", outcomes == ["IN", "cooldown"]
+              and len(rows) == 1, (outcomes, len(rows)))
+
+    print("Punch OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
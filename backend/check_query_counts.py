@@ -0,0 +1,139 @@
+"""
+Checks that list endpoints run a constant number of SQL queries.
+
+Counts statements with a SQLAlchemy `before_cursor_execute` listener while calling
+each endpoint, grows every table, calls it again and fails if the count changed
+(i.e. the endpoint does per-row lookups) or exceeds its budget.
+
+Usage (from backend/):
+    python check_query_counts.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import engine, AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.attendance import LeaveRequest  # noqa: E402
+from app.models.course import Batch, BatchStudent, Course  # noqa: E402
+from app.models.notification import Feedback, Suggestion  # noqa: E402
+from app.models.project import (  # noqa: E402
+    AssessmentSession, Assignment, AssignmentSubmission, Project, ProjectMilestone, Task, Violation, ViolationType,
+)
+from app.models.registration import Registration  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.principal_cache import principal_cache  # noqa: E402
+
+ADMIN_ID = "check-super-admin"
+STUDENT_ID = "check-student"
+
+# (name, path, max queries, caller). The budget includes the (uncached) auth lookup of the caller.
+CASES = [
+    ("list_courses", "/api/admin/courses", 3, ADMIN_ID),
+    ("list_batches", "/api/admin/batches", 5, ADMIN_ID),
+    ("list_leaves", "/api/admin/leaves", 3, ADMIN_ID),
+    ("get_suggestions", "/api/admin/suggestions", 3, ADMIN_ID),
+    ("list_projects", "/api/training/projects", 3, ADMIN_ID),
+    ("list_tasks", "/api/training/tasks", 3, ADMIN_ID),
+    ("list_tasks (student)", "/api/training/tasks", 4, STUDENT_ID),
+    ("list_violations", "/api/training/violations", 2, ADMIN_ID),
+    ("list_feedback", "/api/training/feedback", 2, ADMIN_ID),
+    ("list_assignments", "/api/training/assignments", 4, ADMIN_ID),
+    ("list_assignments (student)", "/api/training/assignments", 7, STUDENT_ID),
+]
+
+
+def _uid() -> str:
+    return str(uuid.uuid4())
+
+
+async def seed(scale: int):
+    """Add `scale` rows to every table the checked endpoints read."""
+    now = datetime(2026, 3, 1)
+    async with AsyncSessionLocal() as db:
+        if not await db.get(User, ADMIN_ID):
+            db.add(User(id=ADMIN_ID, email="sa@check.local", password="x", name="Super", role=Role.SUPER_ADMIN))
+            db.add(User(id=STUDENT_ID, email="st@check.local", password="x", name="Student", role=Role.STUDENT))
+        for _ in range(scale):
+            trainer = User(id=_uid(), email=f"{_uid()}@check.local", password="x", name="Trainer", role=Role.TRAINER)
+            student = User(id=_uid(), email=f"{_uid()}@check.local", password="x", name="Student", role=Role.STUDENT)
+            course = Course(id=_uid(), name="Course")
+            batch = Batch(id=_uid(), course_id=course.id, name="Batch", trainer_id=trainer.id,
+                          start_date=now, end_date=now + timedelta(days=90))
+            db.add_all([trainer, student, course, batch])
+            db.add_all([
+                BatchStudent(batch_id=batch.id, student_id=student.id),
+                Registration(student_id=student.id, course_id=course.id, batch_id=batch.id),
+                LeaveRequest(user_id=student.id, batch_id=batch.id, start_date=now, end_date=now,
+                             approved_by_id=ADMIN_ID),
+                Suggestion(student_id=student.id, message="Named"),
+                Suggestion(student_id=student.id, message="Anon", is_anonymous=True),
+                BatchStudent(batch_id=batch.id, student_id=STUDENT_ID),
+                Task(title="Task", batch_id=batch.id, assigned_by=trainer.id),
+                Violation(student_id=student.id, type=ViolationType.LATE_SUBMISSION, title="Late",
+                          resolved_by_id=trainer.id),
+                Feedback(student_id=student.id, batch_id=batch.id, week=1, rating=4),
+            ])
+            project = Project(id=_uid(), title="Project", batch_id=batch.id, trainer_id=trainer.id)
+            db.add(project)
+            db.add_all([ProjectMilestone(project_id=project.id, title=f"M{i}", order=i) for i in range(3)])
+            assignment = Assignment(id=_uid(), title="Assignment", batch_id=batch.id, assigned_by=trainer.id)
+            db.add(assignment)
+            db.add_all([
+                AssignmentSubmission(assignment_id=assignment.id, student_id=STUDENT_ID, marks=80),
+                AssignmentSubmission(assignment_id=assignment.id, student_id=student.id, marks=70),
+                AssessmentSession(student_id=STUDENT_ID, reference_id=assignment.id, reference_type="ASSIGNMENT"),
+            ])
+        await db.commit()
+
+
+def main() -> int:
+    counter = {"n": 0}
+
+    def count(*_args):
+        counter["n"] += 1
+
+    tokens = {
+        ADMIN_ID: create_access_token({"sub": ADMIN_ID, "role": "SUPER_ADMIN"}),
+        STUDENT_ID: create_access_token({"sub": STUDENT_ID, "role": "STUDENT"}),
+    }
+    failures = 0
+    with TestClient(app) as client:
+        def measure(path, caller):
+            principal_cache.forget()
+            counter["n"] = 0
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+            try:
+                r = client.get(path, headers={"Authorization": f"Bearer {tokens[caller]}"})
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+            assert r.status_code == 200, f"{path}: HTTP {r.status_code} {r.text[:200]}"
+            return counter["n"], len(r.json())
+
+        asyncio.run(seed(2))
+        small = {name: measure(path, caller) for name, path, _, caller in CASES}
+        asyncio.run(seed(20))
+        for name, path, budget, caller in CASES:
+            (q_small, rows_small), (q_large, rows_large) = small[name], measure(path, caller)
+            ok = q_small == q_large and q_large <= budget
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}: {q_small} queries for {rows_small} rows, "
+                  f"{q_large} queries for {rows_large} rows (budget {budget})")
+
+    print("All list endpoints run a constant number of queries." if not failures
+          else f"{failures} endpoint(s) scale their query count with the data.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Checks that the attendance / time-tracking queries use their composite indexes.
+
+Calls the real endpoints (get_attendance, mark_attendance, the QR scan with its
+attendance upsert, export_attendance, get_time_tracking, export_time_tracking,
+and both punch paths) against a seeded database, captures every SELECT they
+send to `attendance` / `time_tracking`, runs EXPLAIN on it with its bound
+parameters and fails unless the plan searches the expected index on the date
+range (an index found through its leading column only, with the date filtered
+row by row, does not count).
+
+Usage (from backend/):
+    python check_query_plans.py                                # throwaway SQLite
+    DATABASE_URL=postgresql://.../scratch python check_query_plans.py
+
+The PostgreSQL database should be a scratch one: tables are created if missing
+and rows are seeded. Sequential scans are disabled for the EXPLAIN session there:
+a small table would otherwise always be scanned, which says nothing about
+whether the index is usable by the predicate.
+"""
+import asyncio
+import base64
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}")
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert, text  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import Base, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.attendance import Attendance, AttendanceStatus, TimeTracking  # noqa: E402
+from app.models.course import Batch, BatchStudent  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.dates import day_start  # noqa: E402
+from app.utils.punch import ist_now  # noqa: E402
+
+DAYS = 30
+STUDENTS = 40
+CHECKED = 10
+RUN = datetime.utcnow().strftime("%H%M%S%f")  # ids unique per run, so a scratch database can be reused
+
+today = ist_now().date()
+week_ago = today - timedelta(days=7)
+
+
+def uid(name):
+    return f"{name}-{RUN}"
+
+
+def token(user_id, role):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": role})}
+
+
+async def create_tables():
+    # PostgreSQL startup only migrates existing tables
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+async def seed():
+    students = [uid(f"student-{i}") for i in range(STUDENTS)]
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"id": user_id, "email": f"{user_id}@plans.local", "password": "x", "name": user_id, "role": role}
+            for user_id, role in [(uid("admin"), Role.ADMIN), (uid("trainer"), Role.TRAINER)]
+            + [(s, Role.STUDENT) for s in students]])
+        await conn.execute(insert(Batch), [
+            {"id": uid(f"batch-{b}"), "name": f"Batch {b}", "start_date": datetime(2026, 1, 1),
+             "end_date": datetime(2026, 12, 31), "trainer_id": uid("trainer")} for b in range(2)])
+        await conn.execute(insert(BatchStudent), [
+            {"id": uid(f"bs-{i}"), "batch_id": uid(f"batch-{i % 2}"), "student_id": s}
+            for i, s in enumerate(students)])
+        # DAYS of history and today; the students the checks punch for (the first CHECKED) have nothing today
+        days = [(i, s, today - timedelta(days=d)) for i, s in enumerate(students) for d in range(DAYS + 1)
+                if d or i >= CHECKED]
+        await conn.execute(insert(Attendance), [
+            {"id": uid(f"att-{i}-{d}"), "student_id": s, "batch_id": uid(f"batch-{i % 2}"), "date": day_start(d),
+             "status": AttendanceStatus.PRESENT} for i, s, d in days])
+        await conn.execute(insert(TimeTracking), [
+            {"id": uid(f"tt-{i}-{d}"), "user_id": s, "date": day_start(d),
+             "login_time": day_start(d) + timedelta(hours=9), "logout_time": day_start(d) + timedelta(hours=17),
+             "total_minutes": 480} for i, s, d in days])
+        if engine.dialect.name == "postgresql":
+            await conn.execute(text("ANALYZE attendance"))
+            await conn.execute(text("ANALYZE time_tracking"))
+
+
+async def explain(statement, parameters):
+    is_sqlite = engine.dialect.name == "sqlite"
+    async with engine.connect() as conn:
+        if not is_sqlite:
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = (await conn.exec_driver_sql(("EXPLAIN QUERY PLAN " if is_sqlite else "EXPLAIN ") + statement,
+                                           parameters)).all()
+        await conn.rollback()
+    return "\n".join(str(r[-1]) for r in rows)
+
+
+def searches(plan, index):
+    """The plan looks up `index` with the date among its search terms."""
+    if engine.dialect.name == "sqlite":
+        # SEARCH time_tracking USING INDEX ix_... (user_id=? AND date>? AND date<?)
+        return re.search(rf"INDEX {index} \([^)]*\bdate\b", plan) is not None
+    # Index Scan using ix_... on ... / Bitmap Index Scan on ix_..., then its Index Cond line
+    lines = plan.splitlines()
+    return any(index in line and i + 1 < len(lines) and "Index Cond" in lines[i + 1]
+               and re.search(r"\bdate\b", lines[i + 1]) for i, line in enumerate(lines))
+
+
+def main() -> int:
+    captured = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    results = []
+
+    def check(name, table, index, call):
+        """Every SELECT `call` sends to `table` is planned with `index`."""
+        captured.clear()
+        response = call()
+        reads = [(s, p) for s, p in captured if re.search(rf"\bFROM {table}\b", s)]
+        plans = [client.portal.call(explain, s, p) for s, p in reads]
+        ok = response.status_code < 300 and bool(reads) and all(searches(plan, index) for plan in plans)
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}: {len(reads)} {table} quer{'y' if len(reads) == 1 else 'ies'}, "
+              f"expected {index}")
+        if not ok:
+            print(f"    HTTP {response.status_code}")
+            for (statement, _), plan in zip(reads, plans):
+                print("    " + " ".join(statement.split())[:200])
+                print("      " + plan.replace("\n", "\n      "))
+
+    asyncio.run(create_tables())
+    print(f"EXPLAIN on {engine.dialect.name}")
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        admin = token(uid("admin"), "ADMIN")
+        trainer = token(uid("trainer"), "TRAINER")
+        batch, student = uid("batch-0"), uid("student-0")
+        day, start, end = today.isoformat(), week_ago.isoformat(), today.isoformat()
+
+        check("get_attendance (batch + day)", "attendance", "ix_attendance_batch_date",
+              lambda: client.get("/api/training/attendance", headers=trainer, params={"batch_id": batch, "date": day}))
+        check("mark_attendance upsert", "attendance", "ix_attendance_student_batch_date",
+              lambda: client.post("/api/training/attendance", headers=trainer, json={"records": [
+                  {"student_id": student, "batch_id": batch, "date": day, "status": "PRESENT"}]}))
+        check("export_attendance (batch + range)", "attendance", "ix_attendance_batch_date",
+              lambda: client.get("/api/training/attendance/export", headers=trainer,
+                                 params={"batch_id": batch, "start_date": start, "end_date": end}))
+
+        # A batch QR: the scan punches in and marks attendance for the day
+        qr = base64.b64encode(json.dumps({"b": batch, "d": day}).encode()).decode()
+        scan = lambda user_id: lambda: client.post(  # noqa: E731
+            "/api/auth/attendance/scan", headers=token(user_id, "STUDENT"), json={"qr_token": qr})
+        check("QR scan, burst mode (user + day)", "time_tracking", "ix_time_tracking_user_date_login",
+              scan(uid("student-2")))
+        check("QR scan attendance upsert", "attendance", "ix_attendance_student_batch_date", scan(uid("student-4")))
+        burst = settings.PUNCH_BURST_MODE
+        settings.PUNCH_BURST_MODE = False
+        try:
+            check("QR scan, row-lock path (user + day)", "time_tracking", "ix_time_tracking_user_date_login",
+                  scan(uid("student-6")))
+        finally:
+            settings.PUNCH_BURST_MODE = burst
+
+        check("get_time_tracking (user + day)", "time_tracking", "ix_time_tracking_user_date_login",
+              lambda: client.get("/api/training/time-tracking", headers=admin,
+                                 params={"user_id": uid("student-2"), "date": day}))
+        check("export_time_tracking (range)", "time_tracking", "ix_time_tracking_date",
+              lambda: client.get("/api/training/time-tracking/export", headers=admin,
+                                 params={"start_date": start, "end_date": end}))
+        check("export_time_tracking (user + range)", "time_tracking", "ix_time_tracking_user_date_login",
+              lambda: client.get("/api/training/time-tracking/export", headers=admin,
+                                 params={"start_date": start, "end_date": end, "user_id": uid("student-3")}))
+
+    failures = results.count(False)
+    print("All plans use their index." if not failures else f"{failures} check(s) missing their index.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
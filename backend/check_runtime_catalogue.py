@@ -0,0 +1,130 @@
+"""
+Checks the runtime catalogue behind GET /api/training/piston/runtimes.
+
+With the code runner backends replaced by the local runner plus a fake remote
+that counts /runtimes fetches and can be made to fail:
+  - the catalogue is loaded at startup and refreshed by an APScheduler job;
+  - requests are served from memory (no fetch per request), with an ETag and
+    Cache-Control, and If-None-Match answers 304;
+  - a language is listed once, by the first backend that has it;
+  - a failing backend keeps its last good list; a changed list changes the ETag;
+  - a new worker with every backend down serves the snapshot from disk.
+
+Usage (from backend/):
+    python check_runtime_catalogue.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+SNAPSHOT = os.path.join(tempfile.mkdtemp(), "runtime_catalogue.json")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'check.db')}"
+os.environ["CODE_RUNNER_BACKENDS"] = "local"  # the sandboxed local runner only
+os.environ["RUNTIMES_SNAPSHOT_PATH"] = SNAPSHOT
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app, scheduler  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.code_runner import RunnerUnavailable, code_executor  # noqa: E402
+from app.utils.runtime_catalogue import REFRESH_JOB_ID, RuntimeCatalogue, runtime_catalogue  # noqa: E402
+
+STUDENT_ID = "check-student"
+
+
+class FakeRemote:
+    name = "fake-remote"
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.entries = [{"language": "python", "version": "3.10.0", "aliases": ["py"]},
+                        {"language": "rust", "version": "1.68.2", "aliases": ["rs"]}]
+
+    async def list_runtimes(self):
+        self.calls += 1
+        if self.fail:
+            raise RunnerUnavailable("fake remote down")
+        return list(self.entries)
+
+    async def close(self):
+        pass
+
+
+remote = FakeRemote()
+code_executor.backends = [code_executor.backend("local"), remote]
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=STUDENT_ID, email="st@check.local", password="x", name="Student", role=Role.STUDENT))
+        await db.commit()
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": STUDENT_ID, "role": "STUDENT"})}
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        deadline = time.monotonic() + 10
+        while remote.calls == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        check("loaded at startup by a scheduler job", remote.calls == 1 and scheduler.get_job(REFRESH_JOB_ID))
+
+        r = client.get("/api/training/piston/runtimes", headers=headers)
+        body = r.json()
+        python = [e for e in body if e["language"] == "python"]
+        check("languages are listed once, first backend wins",
+              len(python) == 1 and python[0]["runtime"] == "local" and any(e["language"] == "rust" for e in body),
+              body)
+        etag = r.headers.get("etag")
+        check("ETag and Cache-Control are set", bool(etag) and "max-age" in r.headers.get("cache-control", ""))
+
+        started = time.perf_counter()
+        for _ in range(200):
+            client.get("/api/training/piston/runtimes", headers=headers)
+        per_request = (time.perf_counter() - started) / 200 * 1000
+        check(f"requests are served from memory ({per_request:.1f}ms each)", remote.calls == 1)
+
+        r = client.get("/api/training/piston/runtimes", headers={**headers, "If-None-Match": etag})
+        check("If-None-Match answers 304", r.status_code == 304 and not r.content and r.headers["etag"] == etag)
+        r = client.get("/api/training/piston/runtimes", headers={**headers, "If-None-Match": f'W/{etag}, "x"'})
+        check("weak and listed ETags match", r.status_code == 304)
+
+        remote.fail = True
+        check("refresh reports the failing backend", run(runtime_catalogue.refresh) is False)
+        r = client.get("/api/training/piston/runtimes", headers=headers)
+        check("a failing backend keeps its last good list",
+              any(e["language"] == "rust" for e in r.json()) and r.headers["etag"] == etag)
+
+        remote.fail = False
+        remote.entries.append({"language": "go", "version": "1.16.2", "aliases": []})
+        run(runtime_catalogue.refresh)
+        r = client.get("/api/training/piston/runtimes", headers={**headers, "If-None-Match": etag})
+        check("a changed list changes the ETag",
+              r.status_code == 200 and r.headers["etag"] != etag and any(e["language"] == "go" for e in r.json()))
+        current = r.json()
+
+    # A new worker while every backend is down
+    remote.fail = True
+    fresh = RuntimeCatalogue(code_executor, SNAPSHOT, 60)
+    check("the snapshot is on disk", os.path.exists(SNAPSHOT) and fresh.load_snapshot())
+    check("a new worker serves the snapshot", fresh.runtimes == current and fresh.etag == runtime_catalogue.etag)
+
+    print("Runtime catalogue OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Checks for the file storage pipeline (app/utils/storage.py).
+
+Runs the app against a temporary SQLite database and upload directory with the
+local backend, then checks that:
+  - documents are uploaded as multipart form data and served from /uploads;
+  - identical content is stored once (one file, one stored_files row counting
+    both uploads) and returns the same URL, while another endpoint's folder
+    keeps its own copy;
+  - a slow backend upload leaves the event loop free: /api/health answers
+    while it runs, where the old in-handler call held every request;
+  - no more uploads run at once than UPLOAD_WORKERS;
+  - a failing Cloudinary upload falls back to the local backend, and the same
+    content sent again is found there instead of being uploaded again;
+  - files over UPLOAD_MAX_MB are refused with 413;
+  - leave proofs and task PDFs go through the same store.
+
+Usage (from backend/):
+    python check_storage.py
+"""
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'check.db')}"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["UPLOAD_WORKERS"] = "4"
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware.auth import create_access_token  # noqa: E402
+from app.models.upload import StoredFile  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+from app.utils.storage import LocalStorage, file_store  # noqa: E402
+
+UPLOAD_SECONDS = 0.5
+PDF = b"%PDF-1.4\n" + b"0" * 200_000
+
+
+class SlowStorage(LocalStorage):
+    """The local backend behind a blocking network round trip, like a Cloudinary upload."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.running = 0
+        self.most = 0
+        self._lock = threading.Lock()
+
+    def put(self, fileobj, folder, name):
+        with self._lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        time.sleep(UPLOAD_SECONDS)
+        with self._lock:
+            self.running -= 1
+        return super().put(fileobj, folder, name)
+
+
+class FailingCloud(LocalStorage):
+    name = "cloudinary"
+
+    def put(self, fileobj, folder, name):
+        raise ConnectionError("cloudinary unreachable")
+
+
+def token(user_id, role="STUDENT"):
+    return {"Authorization": "Bearer " + create_access_token({"sub": user_id, "role": role})}
+
+
+async def seed():
+    async with AsyncSessionLocal() as db:
+        db.add(User(id="student", email="s@check.local", password="x", name="Student", role=Role.STUDENT))
+        db.add(User(id="trainer", email="t@check.local", password="x", name="Trainer", role=Role.TRAINER))
+        await db.commit()
+
+
+async def stored_rows():
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(StoredFile))
+
+
+async def upload_counts():
+    async with AsyncSessionLocal() as db:
+        return dict((await db.execute(select(StoredFile.url, StoredFile.uploads))).all())
+
+
+async def health_during(upload):
+    """Worst /api/health latency, from the moment it is due, while `upload` runs on the same event loop."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        # A full collection landing in the window would be measured as the upload's
+        gc.collect()
+        task = asyncio.ensure_future(upload(client))
+        worst = 0.0
+        while not task.done():
+            due = time.perf_counter() + 0.02
+            await asyncio.sleep(0.02)
+            await client.get("/api/health")
+            worst = max(worst, time.perf_counter() - due)
+        await task
+        return worst
+
+
+def main() -> int:
+    results = []
+
+    def check(name, ok, detail=None):
+        results.append(ok)
+        print(f"[{'OK' if ok else 'FAIL'}] {name}" + ("" if ok or detail is None else f"  -> {detail}"))
+
+    with TestClient(app) as client:
+        run = client.portal.call
+        run(seed)
+        student = token("student")
+
+        r = client.post("/api/auth/documents", headers=student, data={"type": "RESUME"},
+                        files={"file": ("resume.pdf", PDF, "application/pdf")})
+        body = r.json()
+        check("multipart document upload", r.status_code == 201 and body["file_url"].startswith("/uploads/"), body)
+        served = client.get(body["file_url"])
+        check("served from /uploads", served.status_code == 200 and served.content == PDF, served.status_code)
+        docs = client.get("/api/auth/documents", headers=student).json()
+        check("listed with its file name", docs[0]["file_name"] == "resume.pdf" and docs[0]["type"] == "RESUME", docs)
+
+        again = client.post("/api/auth/documents", headers=student, data={"type": "OTHER"},
+                            files={"file": ("copy.pdf", PDF, "application/pdf")}).json()
+        files = [f for _, _, names in os.walk(settings.UPLOAD_DIR) for f in names]
+        check("same content stored once", again["file_url"] == body["file_url"] and len(files) == 1
+              and run(stored_rows) == 1 and run(upload_counts) == {body["file_url"]: 2}
+              and file_store.counters["deduplicated"] == 1, (again, files, run(upload_counts)))
+
+        link = client.post("/api/auth/documents", headers=student,
+                           data={"type": "OTHER", "file_url": "https://example.com/a.pdf"})
+        check("a link without a file is recorded", link.status_code == 201
+              and link.json()["file_url"] == "https://example.com/a.pdf", link.text)
+        check("neither file nor link is refused",
+              client.post("/api/auth/documents", headers=student, data={"type": "OTHER"}).status_code == 400)
+
+        # A slow backend: the old handlers called it on the event loop
+        slow = SlowStorage(settings.UPLOAD_DIR)
+        file_store.use(slow)
+
+        async def old_upload(_client):
+            with open(os.path.join(_tmp, "blob"), "wb") as f:
+                f.write(b"old")
+            with open(os.path.join(_tmp, "blob"), "rb") as f:
+                slow.put(f, "lms/old", "blob")
+
+        async def new_upload(http):
+            r = await http.post("/api/auth/documents", headers=student, data={"type": "OTHER"},
+                                files={"file": ("slow.pdf", b"%PDF slow", "application/pdf")})
+            assert r.status_code == 201, r.text
+
+        old_worst = run(health_during, old_upload)
+        new_worst = run(health_during, new_upload)
+        print(f"Worst /api/health latency during a {UPLOAD_SECONDS * 1000:.0f}ms upload: "
+              f"in the handler {old_worst * 1000:.0f}ms, upload pool {new_worst * 1000:.0f}ms")
+        check("the event loop stays free during an upload", new_worst < 0.1 and old_worst >= UPLOAD_SECONDS * 0.9,
+              (old_worst, new_worst))
+
+        async def burst(http):
+            await asyncio.gather(*(
+                http.post("/api/auth/documents", headers=student, data={"type": "OTHER"},
+                          files={"file": (f"f{i}.pdf", b"%PDF " + str(i).encode(), "application/pdf")})
+                for i in range(10)))
+
+        started = time.perf_counter()
+        run(health_during, burst)
+        elapsed = time.perf_counter() - started
+        check("uploads bounded by UPLOAD_WORKERS", slow.most == settings.UPLOAD_WORKERS, slow.most)
+        print(f"10 slow uploads with {settings.UPLOAD_WORKERS} workers took {elapsed:.2f}s")
+
+        file_store.use(FailingCloud(settings.UPLOAD_DIR))
+        r = client.post("/api/auth/documents", headers=student, data={"type": "OTHER"},
+                        files={"file": ("id.png", b"\x89PNG fallback", "image/png")}).json()
+        check("a failed Cloudinary upload is stored locally",
+              r["file_url"].startswith("/uploads/lms/documents/") and file_store.counters["fallbacks"] == 1, r)
+        again = client.post("/api/auth/documents", headers=student, data={"type": "OTHER"},
+                            files={"file": ("id-again.png", b"\x89PNG fallback", "image/png")}).json()
+        check("content stored by the fallback is not uploaded again", again["file_url"] == r["file_url"]
+              and file_store.counters["fallbacks"] == 1 and run(upload_counts)[r["file_url"]] == 2,
+              (again, file_store.stats()))
+        file_store.use(LocalStorage(settings.UPLOAD_DIR))
+
+        limit = settings.UPLOAD_MAX_MB
+        settings.UPLOAD_MAX_MB = 1
+        r = client.post("/api/auth/documents", headers=student, data={"type": "OTHER"},
+                        files={"file": ("big.pdf", b"0" * (2 * 1024 * 1024), "application/pdf")})
+        settings.UPLOAD_MAX_MB = limit
+        check("oversized files are refused", r.status_code == 413, r.status_code)
+
+        start = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+        r = client.post("/api/training/submit-leave", headers=student,
+                        data={"start_date": start, "end_date": start, "leave_type": "MEDICAL"},
+                        files={"proof": ("note.pdf", b"%PDF medical", "application/pdf")})
+        check("leave proof stored", r.status_code == 201 and r.json()["proof_url"].startswith("/uploads/lms/leaves/"),
+              r.text)
+        r = client.post("/api/training/upload-task-pdf", headers=token("trainer", "TRAINER"),
+                        files={"file": ("task.pdf", PDF, "application/pdf")})
+        check("task PDF stored in its own folder", r.status_code == 200 and r.json()["url"].startswith("/uploads/lms/tasks/")
+              and r.json()["url"].rsplit("/", 1)[1] == body["file_url"].rsplit("/", 1)[1], r.text)
+        print(f"Storage: {file_store.stats()}")
+
+    print("Storage OK." if all(results) else f"{results.count(False)} check(s) failed.")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
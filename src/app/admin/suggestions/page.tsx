@@ -1,7 +1,7 @@
 'use client';
 
 import { useState, useEffect } from 'react';
-import { apiGet, apiFetch } from '@/lib/api';
+import { API_BASE, apiGet, apiFetch } from '@/lib/api';
 
 const CATEGORIES = ['All', 'General', 'Curriculum', 'Technical', 'Faculty', 'Infrastructure', 'Other'];
 
@@ -39,6 +39,16 @@ export default function SuggestionsPage() {
 
     useEffect(() => { load(); }, [filterCategory, filterRead]);
 
+    // Files from the local storage backend are served by the API under /uploads
+    const fileUrl = (url: string) => url.startsWith('/') ? API_BASE + url : url;
+
+    const openScreenshot = async (id: string) => {
+        try {
+            const data = await apiGet(`/api/admin/suggestions/${id}/screenshot`);
+            setViewImage(fileUrl(data.url));
+        } catch { }
+    };
+
     const markRead = async (id: string) => {
         const token = localStorage.getItem('token');
         await fetch((process.env.NEXT_PUBLIC_API_URL || 'https://lms-api-bkuw.onrender.com') + `/api/admin/suggestions/${id}/read`, {
@@ -237,15 +247,24 @@ export default function SuggestionsPage() {
                             </div>
                             
                             {/* Attachment indicator / Viewer */}
-                            {expanded === s.id && (s.screenshot_base64 || s.screenshot_url) && (
+                            {expanded === s.id && s.has_screenshot && (
                                 <div style={{ marginTop: '12px' }}>
-                                    <button 
-                                        className="btn btn-sm" 
-                                        style={{ background: 'var(--bg-secondary)', border: '1px solid var(--border)', color: 'var(--text-primary)', display: 'flex', alignItems: 'center', gap: '6px' }}
-                                        onClick={() => setViewImage(s.screenshot_base64 || s.screenshot_url)}
-                                    >
-                                        <span style={{ fontSize: '16px' }}>🖼️</span> View Attached Screenshot
-                                    </button>
+                                    {s.thumbnail_url ? (
+                                        <img
+                                            src={fileUrl(s.thumbnail_url)}
+                                            alt="Screenshot thumbnail"
+                                            style={{ maxWidth: '160px', borderRadius: '8px', border: '1px solid var(--border)', cursor: 'zoom-in' }}
+                                            onClick={() => openScreenshot(s.id)}
+                                        />
+                                    ) : (
+                                        <button 
+                                            className="btn btn-sm" 
+                                            style={{ background: 'var(--bg-secondary)', border: '1px solid var(--border)', color: 'var(--text-primary)', display: 'flex', alignItems: 'center', gap: '6px' }}
+                                            onClick={() => openScreenshot(s.id)}
+                                        >
+                                            <span style={{ fontSize: '16px' }}>🖼️</span> View Attached Screenshot
+                                        </button>
+                                    )}
                                 </div>
                             )}
 
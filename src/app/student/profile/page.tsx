@@ -1,7 +1,7 @@
 'use client';
 
 import { useState, useEffect, useRef } from 'react';
-import { apiGet, apiPost, getStoredUser } from '@/lib/api';
+import { apiFetch, apiGet, apiPost, getStoredUser } from '@/lib/api';
 
 interface UserProfile {
     id: string; name: string; email: string; phone: string | null;
@@ -91,18 +91,12 @@ export default function StudentProfilePage() {
         if (!file) return;
         setUploading(true);
         try {
-            const reader = new FileReader();
-            reader.onload = async () => {
-                const base64 = (reader.result as string).split(',')[1];
-                await apiPost('/api/auth/documents', {
-                    type: uploadType,
-                    file_name: file.name,
-                    file_data: base64,
-                });
-                setShowUpload(false);
-                loadAll();
-            };
-            reader.readAsDataURL(file);
+            const fd = new FormData();
+            fd.append('type', uploadType);
+            fd.append('file', file);
+            await apiFetch('/api/auth/documents', { method: 'POST', body: fd });
+            setShowUpload(false);
+            loadAll();
         } catch { } finally {
             setTimeout(() => setUploading(false), 1000);
         }
@@ -348,6 +348,25 @@ export default function AssessmentSessionPage() {
                         </div>
                     ) : null}
 
+                    {/* Test case results for coding answers */}
+                    {results.some(r => r.type === 'test_results') && (
+                        <div className="card" style={{ textAlign: 'left', background: 'var(--bg-secondary)', border: '1px solid var(--border)', margin: '20px 0', padding: '20px' }}>
+                            <h3 style={{ margin: '0 0 12px 0' }}>🧪 Test Cases</h3>
+                            {results.filter(r => r.type === 'test_results').map((r, i) => (
+                                <div key={i} style={{ marginBottom: '12px' }}>
+                                    <div style={{ fontWeight: 600, fontSize: '14px', color: r.passed === r.total ? '#4ade80' : '#ef4444' }}>
+                                        Problem {r.index + 1}: {r.passed}/{r.total} passed
+                                    </div>
+                                    {r.cases.filter((c: any) => !c.passed && !c.hidden).slice(0, 3).map((c: any, ci: number) => (
+                                        <div key={ci} style={{ fontSize: '12px', fontFamily: 'monospace', whiteSpace: 'pre-wrap', color: 'var(--text-muted)', marginTop: '6px' }}>
+                                            {`Input: ${c.input || '(none)'}\nExpected: ${c.expected}\nGot: ${c.actual}${c.error ? `\n${c.error}` : ''}`}
+                                        </div>
+                                    ))}
+                                </div>
+                            ))}
+                        </div>
+                    )}
+
                     <button className="btn btn-primary" onClick={() => router.push('/student/tasks')}>Return to Tasks</button>
                     {tabSwitchCount >= 3 && (
                         <p style={{ marginTop: '16px', color: 'red', fontWeight: 'bold' }}>This assessment was auto-submitted due to tab switching rules.</p>
@@ -359,7 +378,7 @@ export default function AssessmentSessionPage() {
                     <div style={{ marginTop: '32px' }}>
                         <h3 className="section-title">Review Answers</h3>
                         <div style={{ display: 'flex', flexDirection: 'column', gap: '16px' }}>
-                            {results.filter(r => r.type !== 'coding_feedback').map((r, i) => (
+                            {results.filter(r => !r.type).map((r, i) => (
                                 <div key={i} className="card" style={{ border: `1px solid ${r.is_correct ? '#4ade80' : '#ef4444'}` }}>
                                     <p style={{ fontWeight: 600, fontSize: '15px' }}>{i + 1}. {r.question}</p>
                                     <div style={{ display: 'flex', flexDirection: 'column', gap: '8px', marginTop: '12px' }}>